@@ -20,29 +20,8 @@ if "user" not in st.session_state:
 if "current_view" not in st.session_state:
     st.session_state.current_view = None
 
-from views import login, teacher_home, student_home
-from views import vocabulary, reading, listening
-from views import writing_submit as writing
-
-def safe_import(module_name):
-    try:
-        return __import__(f"views.{module_name}", fromlist=[module_name])
-    except ImportError:
-        return None
-
-speaking = safe_import("speaking")
-speaking_chat = safe_import("speaking_chat")
-course_settings = safe_import("course_settings")
-class_settings = safe_import("class_settings")
-teacher_dashboard = safe_import("teacher_dashboard")
-student_management = safe_import("student_management")
-student_portfolio = safe_import("student_portfolio")
-assignments = safe_import("assignments")
-grades = safe_import("grades")
-learning_log = safe_import("learning_log")
-test_prep = safe_import("test_prep")
-learning_resources = safe_import("learning_resources")
-material_manager = safe_import("material_manager")
+# 画面モジュールは表示するときに読み込む（views/registry.py）
+from views.registry import resolve_view
 
 def get_student_enabled_modules(user):
     class_key = user.get("class_key")
@@ -74,6 +53,9 @@ if user:
                 st.markdown(f"**{glevel['icon']} Lv.{glevel['level']}** | ⭐{gdata['total_xp']} XP | 🔥{streak}日")
             except Exception:
                 pass
+        # 新着通知（version が変わったときだけ読み直す）
+        from utils.notifications import show_notification_sidebar
+        show_notification_sidebar(user)
         st.markdown("---")
         if user["role"] == "teacher":
             st.markdown("#### 📊 管理")
@@ -189,17 +171,12 @@ if user:
 
 def main():
     if not user:
-        login.show()
+        resolve_view("login", "guest")()
         return
     if user["role"] == "student" and not user.get("student_id"):
         from views.login import show_registration_form
         show_registration_form()
-    default_view = "teacher_home" if user["role"] == "teacher" else "student_home"
-    view = st.session_state.get("current_view", default_view)
-    teacher_only_views = ["teacher_home", "teacher_dashboard", "student_management",
-                          "assignments", "grades", "class_settings", "course_settings"]
-    if user["role"] == "student" and view in teacher_only_views:
-        view = "student_home"
+    view = st.session_state.get("current_view")
     if view == "word_book":
         show_word_book_view()
         return
@@ -215,28 +192,7 @@ def main():
     if view == "help":
         show_help_view()
         return
-    views = {
-        "teacher_home": teacher_home.show,
-        "student_home": student_home.show,
-        "speaking": speaking.show if speaking else student_home.show,
-        "speaking_chat": speaking_chat.show if speaking_chat else student_home.show,
-        "writing": writing.show,
-        "vocabulary": vocabulary.show,
-        "reading": reading.show,
-        "listening": listening.show,
-        "course_settings": course_settings.show if course_settings else teacher_home.show,
-        "class_settings": class_settings.show if class_settings else teacher_home.show,
-        "teacher_dashboard": teacher_dashboard.show if teacher_dashboard else teacher_home.show,
-        "student_management": student_management.show if student_management else teacher_home.show,
-        "student_portfolio": student_portfolio.show if student_portfolio else student_home.show,
-        "assignments": assignments.show if assignments else teacher_home.show,
-        "grades": grades.show if grades else teacher_home.show,
-        "learning_log": learning_log.show if learning_log else student_home.show,
-        "test_prep": test_prep.show if test_prep else student_home.show,
-        "learning_resources": learning_resources.show if learning_resources else student_home.show,
-        "material_manager": material_manager.show if material_manager else teacher_home.show,
-    }
-    views.get(view, student_home.show if user["role"] == "student" else teacher_home.show)()
+    resolve_view(view, user["role"])()
 
 def show_word_book_view():
     st.markdown("## 📖 マイ単語帳 / My Word Book")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — ディクテーション採点の検証・ベンチマーク
+実行: python bench_dictation.py [--iterations 200] [--with-ai]
+
+1. コーパスの各例について、誤りの分類（error_type）が期待どおりか検証する
+2. ローカル採点の処理時間を計測する（--with-ai でAIフィードバック付きと比較）
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.dictation_scoring import score_dictation, find_reference_window
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+
+# (正解文, 入力, 期待する error_type の並び)
+DICTATION_CORPUS = [
+    ("The cat sat on the mat.", "the cat sat on the mat", []),
+    ("It's a beautiful day, isn't it?", "its a beautiful day isnt it", ["spelling", "spelling"]),
+    ("I received your letter yesterday.", "I recieved your letter yesterday", ["spelling"]),
+    ("We walked along the river.", "We talked along the liver", ["spelling", "spelling"]),
+    ("We walked along the river.", "We jumped along the ocean", ["wrong_word", "wrong_word"]),
+    ("She went to the store to buy milk.", "She went store to buy milk", ["missing_word"]),
+    ("Please close the door.", "Please close door", ["missing_word"]),
+    ("He is very happy today.", "He is very very happy today", ["extra_word"]),
+    ("I can not stop now.", "I cannot stop now", []),
+    ("I really like this song.", "I like really this song", ["word_order"]),
+    ("I really like this song.", "I like this song really", ["word_order"]),
+    ("The meeting starts at nine.", "The meeting start at nine o'clock", ["spelling", "extra_word"]),
+    ("Well-known writers visited the school.", "well known writers visited the school", []),
+    ("Could you tell me the way to the station?",
+     "could you tell me way to station", ["missing_word", "missing_word"]),
+]
+
+# (字幕, 入力, 期待する区間)
+WINDOW_CORPUS = [
+    ("long ago in a galaxy far away there was a boy who lived on a farm with his uncle",
+     "there was a boy who lives on the farm",
+     "there was a boy who lived on a farm"),
+]
+
+
+def check_corpus():
+    failures = 0
+    print(f"\n{BOLD}🧪 分類の検証{RESET}")
+    for original, user_input, expected in DICTATION_CORPUS:
+        result = score_dictation(original, user_input)
+        got = [e["error_type"] for e in result["errors"]]
+        if got == expected:
+            print(f"  {GREEN}✅ {user_input!r} → {got or 'OK'} ({result['accuracy_percentage']}%){RESET}")
+        else:
+            failures += 1
+            print(f"  {RED}❌ {user_input!r}: 期待 {expected} / 結果 {got}{RESET}")
+
+    for reference, user_input, expected in WINDOW_CORPUS:
+        got = find_reference_window(reference, user_input)
+        if got == expected:
+            print(f"  {GREEN}✅ 区間検出 {got!r}{RESET}")
+        else:
+            failures += 1
+            print(f"  {RED}❌ 区間検出: 期待 {expected!r} / 結果 {got!r}{RESET}")
+    return failures
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+
+def run_benchmark(iterations, with_ai):
+    print(f"\n{BOLD}⏱  ベンチマーク（1件あたり ms）{RESET}")
+    original, user_input, _ = DICTATION_CORPUS[-1]
+
+    local = _timed(lambda: score_dictation(original, user_input), iterations)
+    print(f"  {BLUE}local   p50={local['p50']:.3f}  p95={local['p95']:.3f}  max={local['max']:.3f}{RESET}")
+
+    long_reference = " ".join(o for o, _, _ in DICTATION_CORPUS) * 20
+    window = _timed(lambda: find_reference_window(long_reference, user_input), max(1, iterations // 10))
+    print(f"  {BLUE}window  p50={window['p50']:.3f}  p95={window['p95']:.3f}  max={window['max']:.3f}"
+          f"  （字幕 {len(long_reference.split())}語）{RESET}")
+
+    if with_ai:
+        from utils.listening import check_dictation
+        ai = _timed(lambda: check_dictation(original, user_input, ai_feedback=True), 3)
+        print(f"  {BLUE}with AI p50={ai['p50']:.1f}  p95={ai['p95']:.1f}  max={ai['max']:.1f}{RESET}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ディクテーション採点の検証とベンチマーク")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--with-ai", action="store_true", help="AIフィードバック付きの時間も計測する")
+    args = parser.parse_args(argv)
+
+    failures = check_corpus()
+    run_benchmark(args.iterations, args.with_ai)
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — スピーチ評価パイプラインのレイテンシ計測
+実行: python bench_speaking_pipeline.py [--seconds 120] [--scale 0.2] [--runs 3]
+
+Azure Speech と GPT の代わりにローカルのスタブ（待ち時間だけを再現）を使い、
+2分程度のスピーチについて次の2通りのエンドツーエンド時間を比較する。
+
+1. sequential : 従来どおり 30秒チャンクを順に認識 → 全文がそろってから GPT 評価
+2. pipelined  : utils/speech_pipeline（チャンク並列認識 → 全文で GPT 評価）
+
+--scale で待ち時間を縮めて実行できる（表示は実時間に換算した値）。
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import statistics
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.audio_buffer import AudioBuffer, wav_header, TARGET_SAMPLE_RATE, SAMPLE_WIDTH
+from utils.speech_pipeline import iter_speech_evaluation, language_scores
+from utils.speech_eval import summarize_recognition
+
+# 色付き出力
+GREEN = "\033[92m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+# スタブの待ち時間モデル（実測の目安: 秒）
+AZURE_BASE_SEC = 0.8        # 1リクエストの固定コスト
+AZURE_PER_AUDIO_SEC = 0.08  # 音声1秒あたり
+GPT_BASE_SEC = 3.0
+GPT_PER_WORD_SEC = 0.004
+WORDS_PER_SEC = 2.2         # 学習者の発話速度
+
+WORDS = "I think that learning English is important because it helps us talk with people".split()
+
+
+def make_speech(seconds: int) -> bytes:
+    """無音の 16kHz mono WAV（メモリ上）"""
+    data_bytes = seconds * TARGET_SAMPLE_RATE * SAMPLE_WIDTH
+    return wav_header(data_bytes) + bytes(data_bytes)
+
+
+class Stubs:
+    def __init__(self, scale: float, seed: int = 0):
+        self.scale = scale
+        self.rng = random.Random(seed)
+
+    def recognize(self, body):
+        nbytes = sum(len(memoryview(part).cast('B')) for part in body) - 44
+        audio_sec = nbytes / (TARGET_SAMPLE_RATE * SAMPLE_WIDTH)
+        jitter = self.rng.uniform(0.8, 1.2)
+        time.sleep((AZURE_BASE_SEC + AZURE_PER_AUDIO_SEC * audio_sec) * jitter * self.scale)
+        n = int(audio_sec * WORDS_PER_SEC)
+        return {"text": " ".join(WORDS[i % len(WORDS)] for i in range(n)), "confidence": 0.86}
+
+    def evaluate_language(self, text):
+        time.sleep((GPT_BASE_SEC + GPT_PER_WORD_SEC * len(text.split())) * self.scale)
+        return {"success": True, "scores": {"content": 72, "vocabulary": 68, "grammar": 70},
+                "content_analysis": {"strengths": "stub", "suggestions": "stub"}}
+
+
+def run_sequential(audio: bytes, stubs: Stubs) -> dict:
+    """従来の _evaluate_speech_real と同じ順序（チャンクを順に認識 → GPT）"""
+    started = time.perf_counter()
+    pcm = AudioBuffer.from_source(audio).to_pcm16()
+    texts, confidences = [], []
+    for body in pcm.wav_chunks(30):
+        result = stubs.recognize(body)
+        texts.append(result["text"])
+        confidences.append(result["confidence"])
+    summary = summarize_recognition(texts, confidences, "", pcm.duration)
+    pronunciation_at = time.perf_counter() - started
+    language_scores(stubs.evaluate_language(summary["recognized_text"]))
+    total = time.perf_counter() - started
+    return {"first_transcript": total, "pronunciation": pronunciation_at, "language": total, "total": total}
+
+
+def run_pipelined(audio: bytes, stubs: Stubs) -> dict:
+    marks = {}
+    for event in iter_speech_evaluation(audio, recognize=stubs.recognize,
+                                        evaluate_language=stubs.evaluate_language):
+        kind = event["type"]
+        if kind == "transcript":
+            marks.setdefault("first_transcript", event["elapsed"])
+        elif kind in ("pronunciation", "language"):
+            marks[kind] = event["elapsed"]
+        elif kind == "done":
+            marks["total"] = event["elapsed"]
+        elif kind == "error":
+            raise RuntimeError(event["error"])
+    return marks
+
+
+def _report(label, samples, scale):
+    keys = ("first_transcript", "pronunciation", "language", "total")
+    parts = []
+    for key in keys:
+        values = [s[key] / scale for s in samples if key in s]
+        parts.append(f"{key}={statistics.median(values):.1f}s")
+    print(f"  {BLUE}{label:<22} " + "  ".join(parts) + RESET)
+    return statistics.median(s["total"] / scale for s in samples)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="スピーチ評価パイプラインのレイテンシ計測")
+    parser.add_argument("--seconds", type=int, default=120, help="スピーチの長さ（秒）")
+    parser.add_argument("--scale", type=float, default=0.2, help="スタブの待ち時間の倍率")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    audio = make_speech(args.seconds)
+    print(f"\n{BOLD}⏱  {args.seconds}秒のスピーチ（中央値、実時間換算）{RESET}")
+
+    sequential = [run_sequential(audio, Stubs(args.scale, seed)) for seed in range(args.runs)]
+    base = _report("sequential", sequential, args.scale)
+
+    samples = [run_pipelined(audio, Stubs(args.scale, seed)) for seed in range(args.runs)]
+    total = _report("pipelined", samples, args.scale)
+    print(f"  {GREEN}  → {base / total:.1f}x faster{RESET}")
+
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 起動時間ベンチマーク
+実行: python bench_startup.py [--runs 5] [--reruns 1000]
+
+1. コールドスタート: 新しいプロセスで、画面ごとに必要なモジュールを import する時間を計測する
+   - before: 以前の app.py / views・utils の __init__ が毎回読み込んでいたモジュール一式
+   - after : views.registry 経由で、その画面のモジュールだけを読み込む場合
+   あわせて openai / pandas / supabase / numpy が読み込まれたかを表示する
+2. 再実行（rerun）ごとのオーバーヘッド: 読み込み済みの状態で、画面の解決にかかる時間を比べる
+"""
+
+import sys
+import os
+import json
+import time
+import argparse
+import importlib
+import statistics
+import subprocess
+
+# プロジェクトルートをパスに追加
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+HEAVY_MODULES = ("openai", "pandas", "supabase", "numpy")
+
+# 以前の app.py（と views / utils の __init__）が、どの画面でも読み込んでいたモジュール
+EAGER_MODULES = [
+    "utils.auth", "utils.database",
+    "views.login", "views.teacher_home", "views.student_home", "views.teacher_settings",
+    "views.vocabulary", "views.reading", "views.listening", "views.writing_submit",
+    "views.speaking", "views.speaking_chat", "views.course_settings", "views.class_settings",
+    "views.teacher_dashboard", "views.student_management", "views.student_portfolio",
+    "views.assignments", "views.grades", "views.learning_log", "views.test_prep",
+    "views.learning_resources", "views.material_manager",
+]
+SAFE_IMPORTED = [m.split(".")[1] for m in EAGER_MODULES[10:]]
+
+SCENARIOS = [
+    ("before: 全画面を読み込み", EAGER_MODULES),
+    ("after : ログイン画面", ["utils.auth", "views.registry", "views.login"]),
+    ("after : 学生ホーム", ["utils.auth", "views.registry", "views.student_home"]),
+    ("after : 教員ホーム", ["utils.auth", "views.registry", "views.teacher_home"]),
+    ("after : Vocabulary", ["utils.auth", "views.registry", "views.vocabulary"]),
+]
+
+_CHILD = """
+import importlib, json, sys, time
+sys.path.insert(0, {root!r})
+errors = {{}}
+started = time.perf_counter()
+for name in {modules!r}:
+    try:
+        importlib.import_module(name)
+    except Exception as e:
+        errors[name] = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - started
+print(json.dumps({{"ms": elapsed * 1000, "errors": errors,
+                   "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def cold_import(modules, runs):
+    """新しいプロセスで modules を import する時間（runs 回の中央値）"""
+    samples, last = [], {}
+    code = _CHILD.format(root=ROOT, modules=modules, heavy=list(HEAVY_MODULES))
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+        if out.returncode != 0:
+            return {"error": out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "失敗"}
+        last = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(last["ms"])
+    return {"ms": statistics.median(samples), "errors": last["errors"], "heavy": last["heavy"]}
+
+
+def _eager_resolve():
+    """以前の app.py が再実行のたびに行っていた import と画面表の組み立て"""
+    modules = {name: importlib.import_module(f"views.{name}")
+               for name in ("login", "teacher_home", "student_home", "vocabulary",
+                            "reading", "listening", "writing_submit")}
+    for name in SAFE_IMPORTED:
+        try:
+            modules[name] = __import__(f"views.{name}", fromlist=[name])
+        except Exception:
+            # 実行中の Python で読み込めない画面（構文・依存の問題）は飛ばして計測を続ける
+            modules[name] = None
+    return {name: getattr(m, "show", None) for name, m in modules.items()}
+
+
+def rerun_overhead(reruns):
+    from views.registry import resolve_view
+
+    for name in EAGER_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+
+    def timed(fn):
+        fn()
+        started = time.perf_counter()
+        for _ in range(reruns):
+            fn()
+        return (time.perf_counter() - started) / reruns * 1e6
+
+    return {
+        "before": timed(_eager_resolve),
+        "after": timed(lambda: resolve_view("student_home", "student")),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="画面モジュールの読み込み時間を計測する")
+    parser.add_argument("--runs", type=int, default=5, help="コールドスタートの計測回数（中央値）")
+    parser.add_argument("--reruns", type=int, default=1000, help="再実行オーバーヘッドの計測回数")
+    args = parser.parse_args(argv)
+
+    print(f"\n{BOLD}{'='*60}")
+    print("  🚀 起動時間ベンチマーク")
+    print(f"{'='*60}{RESET}")
+
+    print(f"\n{BOLD}🧊 コールドスタート（{args.runs}回の中央値）{RESET}")
+    failed = 0
+    for label, modules in SCENARIOS:
+        result = cold_import(modules, args.runs)
+        if "error" in result:
+            failed += 1
+            print(f"  {RED}❌ {label}: {result['error']}{RESET}")
+            continue
+        heavy = ", ".join(result["heavy"]) or "なし"
+        print(f"  {BLUE}{label:<24}{RESET} {result['ms']:8.1f}ms  重い依存: {heavy}")
+        for name, error in result["errors"].items():
+            print(f"    {RED}⚠️ {name}: {error}{RESET}")
+
+    print(f"\n{BOLD}🔁 再実行ごとの画面解決（{args.reruns}回の平均）{RESET}")
+    overhead = rerun_overhead(args.reruns)
+    print(f"  before: {overhead['before']:8.1f}µs")
+    print(f"  after : {GREEN}{overhead['after']:8.1f}µs{RESET}")
+    print()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 教材難易度分析の検証・ベンチマーク
+実行: python bench_text_difficulty.py [--iterations 50] [--minutes 60]
+
+1. レベル別の例文で、推定 CEFR が期待どおりか検証する
+2. 1時間分の字幕（句読点なしの自動字幕を含む）の分析時間を計測する
+"""
+
+import sys
+import os
+import time
+import argparse
+import statistics
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.text_difficulty import analyze_text, get_lookup_table
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+
+# (期待する CEFR, 例文)
+LEVEL_CORPUS = [
+    ("A1",
+     "My name is Ken. I am a student. I live in Tokyo with my family. I have one brother and one sister. Every morning I eat bread and drink milk. I go to school by bus. I like music and sport. On Sunday I play tennis with my friends. It is fun."),
+    ("A2",
+     "Last summer I visited my aunt in Osaka. The weather was very hot, so we went to the beach almost every day. In the evening we cooked dinner together and talked about our plans. I also took a lot of photos of the old castle. I want to go there again next year because it was a wonderful holiday."),
+    ("B1",
+     "Many university students find it difficult to manage their time because they have to balance classes, part-time jobs and social activities. Experts recommend making a weekly schedule and setting clear goals for each day. It is also important to get enough sleep, since a lack of rest can reduce concentration and affect exam results. Students who plan ahead usually feel less stressed."),
+    ("B2",
+     "Although renewable energy has become considerably cheaper over the past decade, many governments remain reluctant to abandon fossil fuels entirely. Critics argue that the transition requires substantial investment in infrastructure, whereas supporters insist that the long-term benefits, including reduced emissions and greater energy security, far outweigh the initial costs. Consequently, the debate increasingly focuses on how quickly, rather than whether, the shift should occur."),
+    ("C1",
+     "The proliferation of algorithmic curation has fundamentally reshaped the epistemic landscape, insofar as individuals are increasingly exposed to information that corroborates their preexisting convictions. Scholars contend that this phenomenon exacerbates polarization, engendering echo chambers in which dissenting perspectives are marginalized. Nonetheless, empirical evidence remains equivocal, and some researchers caution against attributing societal fragmentation to technological determinism."),
+]
+
+
+def check_corpus():
+    failures = 0
+    print(f"\n{BOLD}🧪 推定レベルの検証{RESET}")
+    for expected, text in LEVEL_CORPUS:
+        profile = analyze_text(text)
+        got = profile["estimated_cefr"]
+        detail = f"index={profile['level_index']} {profile['level_components']}"
+        if got == expected:
+            print(f"  {GREEN}✅ {expected} → {got}  {detail}{RESET}")
+        else:
+            failures += 1
+            print(f"  {RED}❌ 期待 {expected} / 結果 {got}  {detail}{RESET}")
+    return failures
+
+
+def _timed(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+
+def run_benchmark(iterations, minutes):
+    print(f"\n{BOLD}⏱  ベンチマーク（1件あたり ms）{RESET}")
+    # 話速 150 WPM 相当の長さにする
+    base = " ".join(text for _, text in LEVEL_CORPUS)
+    target_words = minutes * 150
+    transcript = " ".join([base] * (target_words // len(base.split()) + 1))
+    captions = transcript.lower().replace(".", "").replace(",", "")
+
+    for label, text in (("punctuated", transcript), ("captions", captions)):
+        timing = _timed(lambda: analyze_text(text, duration_sec=minutes * 60), iterations)
+        print(f"  {BLUE}{label:<10} p50={timing['p50']:.1f}  p95={timing['p95']:.1f}  max={timing['max']:.1f}"
+              f"  （{len(text.split()):,}語）{RESET}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="教材難易度分析の検証とベンチマーク")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--minutes", type=int, default=60, help="ベンチマーク用字幕の長さ（分）")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    table = get_lookup_table()
+    print(f"\n{BLUE}参照表の構築: {(time.perf_counter() - start) * 1000:.0f}ms（{len(table):,}語形）{RESET}")
+
+    failures = check_corpus()
+    run_benchmark(args.iterations, args.minutes)
+    print()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,7 @@
 import streamlit as st
 import streamlit.components.v1 as components
-from openai import OpenAI
 import base64
-
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
+from utils.openai_gateway import synthesize_speech
 
 
 def text_to_speech_openai(text, voice="alloy"):
@@ -21,16 +18,13 @@ def text_to_speech_openai(text, voice="alloy"):
     """
     
     try:
-        client = get_openai_client()
-        
-        response = client.audio.speech.create(
-            model="tts-1",  # tts-1-hd はより高品質だが高い
+        return synthesize_speech(
+            "web_speech.text_to_speech_openai",
+            text,
             voice=voice,
-            input=text
+            model="tts-1",  # tts-1-hd はより高品質だが高い
         )
         
-        return response.content
-        
     except Exception as e:
         st.warning(f"TTS Error: {e}")
         return None
@@ -0,0 +1,22 @@
+-- api_usage: OpenAI Gateway 用の列追加
+-- Supabase SQL Editor で実行してください
+
+-- TTS / Whisper も記録できるよう api_name の制約を拡張
+ALTER TABLE api_usage DROP CONSTRAINT IF EXISTS api_usage_api_name_check;
+ALTER TABLE api_usage ADD CONSTRAINT api_usage_api_name_check CHECK (api_name IN (
+    'azure_speech',
+    'speechace',
+    'openai_gpt4o',
+    'openai_gpt4o_mini',
+    'openai_tts',
+    'openai_whisper',
+    'edge_tts'
+));
+
+-- 呼び出し箇所・モデル・レイテンシ
+ALTER TABLE api_usage ADD COLUMN IF NOT EXISTS call_site TEXT;
+ALTER TABLE api_usage ADD COLUMN IF NOT EXISTS model TEXT;
+ALTER TABLE api_usage ADD COLUMN IF NOT EXISTS latency_ms INTEGER;
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_api_usage_call_site ON api_usage(call_site);
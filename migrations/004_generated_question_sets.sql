@@ -0,0 +1,24 @@
+-- generated_question_sets: 記事ごとに生成した問題セットの共有キャッシュ
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS generated_question_sets (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    -- {kind}:{level}:{content_hash}:{params_hash}
+    cache_key TEXT NOT NULL UNIQUE,
+
+    -- comprehension, true_false, exam, essay, summary
+    kind TEXT NOT NULL,
+    content_hash TEXT NOT NULL,        -- 記事本文のSHA-256
+    level TEXT,
+    params JSONB NOT NULL DEFAULT '{}', -- 問題分布・検定種別など
+
+    -- 生成結果（questions, essay, summary 等）
+    payload JSONB NOT NULL DEFAULT '{}',
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_question_sets_content ON generated_question_sets(content_hash);
@@ -0,0 +1,10 @@
+-- learning_materials.derived: 教材から事前生成した練習問題
+-- Supabase SQL Editor で実行してください
+--
+-- 形式: {task_key: {"source_hash": ..., "generated_at": ..., "result": {...}}}
+--   task_key 例: reading_questions:B1, listening_quiz:B1,
+--                youtube_exercises:B1, word_exercises:abandon
+-- pregenerate_exercises.py が source_hash を比較して未生成分だけを埋める
+
+ALTER TABLE learning_materials
+    ADD COLUMN IF NOT EXISTS derived JSONB NOT NULL DEFAULT '{}';
@@ -0,0 +1,29 @@
+-- youtube_transcripts: YouTube字幕と分析結果の永続キャッシュ
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS youtube_transcripts (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    video_id TEXT NOT NULL,
+    -- en, any_en, translated
+    method TEXT NOT NULL,
+    language TEXT,
+
+    -- セグメントを ' ' で連結した全文
+    transcript TEXT NOT NULL DEFAULT '',
+
+    -- 列指向のセグメント情報（ミリ秒・全文中の文字オフセット）
+    -- {"start_ms": [...], "duration_ms": [...], "offset": [...]}
+    segments JSONB NOT NULL DEFAULT '{}',
+
+    -- 分析結果のキャッシュ {"difficulty:B1": {...}, "exercises:B1": {...}}
+    analyses JSONB NOT NULL DEFAULT '{}',
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+
+    UNIQUE (video_id, method)
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_youtube_transcripts_video ON youtube_transcripts(video_id);
@@ -0,0 +1,55 @@
+-- speaking_eval_jobs: スピーキング課題の評価ジョブキュー
+-- 提出時は音声を Storage に保存してジョブを積むだけにし、評価はワーカー
+-- （python speaking_eval_worker.py）が行う
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS speaking_eval_jobs (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    submission_id UUID NOT NULL REFERENCES submissions(id) ON DELETE CASCADE,
+    student_id UUID NOT NULL,
+    assignment_id UUID,
+    course_id TEXT,
+
+    -- Storage（speaking-submissions バケット）内のパスと元のファイル名
+    audio_path TEXT NOT NULL,
+    audio_name TEXT,
+
+    -- 評価パラメータ
+    reference_text TEXT NOT NULL DEFAULT '',
+    task_type TEXT NOT NULL DEFAULT 'monologue',
+
+    -- queued → running → done / failed（失敗時は attempts < max_attempts なら queued に戻る）
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    -- 再試行のバックオフ（この時刻以降に取得できる）
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+
+    -- 取得したワーカーとリース開始時刻（期限切れはキューに戻す）
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ,
+    last_error TEXT,
+
+    -- 評価結果 {"scores": {...}, "total_score": 78, "timings": {...}}
+    result JSONB,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_speaking_eval_jobs_queue
+    ON speaking_eval_jobs(status, available_at, created_at);
+CREATE INDEX IF NOT EXISTS idx_speaking_eval_jobs_submission ON speaking_eval_jobs(submission_id);
+CREATE INDEX IF NOT EXISTS idx_speaking_eval_jobs_student
+    ON speaking_eval_jobs(student_id, assignment_id, created_at DESC);
+
+-- 提出音声の保存先（非公開バケット）
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('speaking-submissions', 'speaking-submissions', false)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,35 @@
+-- test_question_items: 教員が承認した検定対策問題
+-- 組み込みの問題バンク（utils/test_question_bank）と同じインデックスに読み込まれる
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS test_question_items (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    -- 内容から決まる問題ID（utils.test_question_bank.question_id）
+    item_id TEXT NOT NULL UNIQUE,
+
+    -- toefl_itp, toeic, toefl_ibt, ielts, eiken
+    test_type TEXT NOT NULL,
+    section TEXT NOT NULL,
+    -- short_conversation, 5, main_idea など（なければ general）
+    sub_type TEXT NOT NULL DEFAULT 'general',
+    -- easy, medium, hard
+    difficulty TEXT NOT NULL DEFAULT 'medium',
+
+    -- pending, approved, rejected
+    status TEXT NOT NULL DEFAULT 'approved',
+
+    -- 問題本体（dialogue / sentence / passage, question, choices, correct, explanation）
+    payload JSONB NOT NULL DEFAULT '{}',
+
+    -- NULLなら全コース共通
+    course_id TEXT,
+    created_by UUID,
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_test_question_items_lookup
+    ON test_question_items(status, test_type, section);
@@ -0,0 +1,78 @@
+-- mock_test_attempts / mock_test_responses / test_item_stats: 模擬テストの受験記録と問題統計
+-- 回答は提出時にまとめて保存し、問題統計は十分統計量を逐次更新する
+-- （全履歴からの再計算: python recompute_item_stats.py --course <course_id>）
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS mock_test_attempts (
+    id UUID PRIMARY KEY,
+
+    student_id UUID NOT NULL,
+    course_id TEXT,
+    -- toefl_itp, toeic, toefl_ibt, ielts, eiken
+    test_type TEXT NOT NULL,
+
+    answered INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    percent INTEGER NOT NULL DEFAULT 0,
+    -- Rasch モデルの能力推定値と標準誤差
+    ability REAL,
+    ability_se REAL,
+    duration_sec INTEGER,
+
+    -- [{"key": "listening", "answered": 10, "correct": 7, "percent": 70, "timed_out": false, ...}]
+    section_results JSONB NOT NULL DEFAULT '[]',
+
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS mock_test_responses (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+
+    attempt_id UUID NOT NULL REFERENCES mock_test_attempts(id) ON DELETE CASCADE,
+    student_id UUID NOT NULL,
+    course_id TEXT,
+    test_type TEXT NOT NULL,
+    section TEXT NOT NULL,
+
+    -- 問題バンクの問題ID（utils.test_question_bank.question_id）
+    item_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    choice TEXT,
+    correct BOOLEAN NOT NULL,
+    latency_ms INTEGER,
+
+    -- 出題時の難易度 b と能力値、受験全体の最終能力値
+    difficulty_b REAL,
+    ability_before REAL,
+    ability REAL,
+
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 問題統計（course_id = '' はコースなし）
+CREATE TABLE IF NOT EXISTS test_item_stats (
+    course_id TEXT NOT NULL DEFAULT '',
+    item_id TEXT NOT NULL,
+
+    -- 十分統計量（x = 正誤, y = 同じ受験の残り問題の正答率, theta = 受験者の能力値）
+    n INTEGER NOT NULL DEFAULT 0,
+    sum_x DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_y DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_yy DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_xy DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sum_theta DOUBLE PRECISION NOT NULL DEFAULT 0,
+
+    -- 導出値
+    p_value REAL,
+    difficulty_b REAL,
+    discrimination REAL,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (course_id, item_id)
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_mock_test_attempts_student
+    ON mock_test_attempts(student_id, test_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_mock_test_responses_course ON mock_test_responses(course_id, id);
+CREATE INDEX IF NOT EXISTS idx_mock_test_responses_attempt ON mock_test_responses(attempt_id);
@@ -0,0 +1,11 @@
+-- exam_practice_logs: コース単位のスコア予測（utils/score_prediction）用に course_id を追加
+-- 練習タブ・模擬テストの結果がここに記録される
+-- Supabase SQL Editor で実行してください
+
+ALTER TABLE exam_practice_logs ADD COLUMN IF NOT EXISTS course_id TEXT;
+
+-- インデックス（新しいログだけを読む差分更新用）
+CREATE INDEX IF NOT EXISTS idx_exam_practice_student_time
+    ON exam_practice_logs(student_id, practiced_at);
+CREATE INDEX IF NOT EXISTS idx_practice_logs_course_time
+    ON practice_logs(course_id, practiced_at);
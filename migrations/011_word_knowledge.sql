@@ -0,0 +1,27 @@
+-- word_knowledge: 単語の詳細情報・練習問題の共有キャッシュ
+-- 見出し語（と品詞）ごとに1回だけ生成し、全コース・全学生で再利用する
+-- （事前生成: python prefill_word_knowledge.py --course <course_id>）
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS word_knowledge (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    -- {kind}:{lemma}[:{sense}]（utils.word_knowledge.knowledge_key）
+    knowledge_key TEXT NOT NULL UNIQUE,
+
+    -- details, exercises
+    kind TEXT NOT NULL,
+    -- 小文字・空白正規化した見出し語
+    lemma TEXT NOT NULL,
+    -- 品詞（語義の区別がなければ ''）
+    sense TEXT NOT NULL DEFAULT '',
+
+    -- get_word_details / generate_exercises_for_word の生成結果
+    payload JSONB NOT NULL DEFAULT '{}',
+
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_word_knowledge_lemma ON word_knowledge(lemma);
@@ -0,0 +1,24 @@
+-- student_skill_levels: 学生ごと・技能ごとの推定CEFRレベル
+-- 練習スコアを記録するたびに指数加重平均を更新する（ログを読み直さずにレベルを返す）
+-- （既存ログからの再計算: python rebuild_skill_levels.py [--course <course_id>]）
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS student_skill_levels (
+    student_id UUID NOT NULL,
+    -- '' は全コース通算
+    course_id TEXT NOT NULL DEFAULT '',
+    -- speaking, writing, reading, listening, vocabulary, overall
+    skill TEXT NOT NULL,
+
+    -- レベル指数（0=A1 … 4=C1）の指数加重平均と件数
+    ewma REAL NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    last_score REAL,
+    level TEXT NOT NULL,
+
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (student_id, course_id, skill)
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_student_skill_levels_course ON student_skill_levels(course_id, skill);
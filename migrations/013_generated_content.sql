@@ -0,0 +1,53 @@
+-- generated_content: AI生成したリーディング記事・リスニング素材の共有ライブラリ
+-- 正規化した生成パラメータ（種類・トピック・レベル・長さ・スタイル）ごとに複数のバリエーションを持ち、
+-- コース設定 content_reuse の方針で再利用する（utils/content_library.py）
+-- （事前生成: python prefill_content_library.py --course <course_id>）
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS generated_content (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    -- {kind}:{level}:{length_key}:{style}:{topic_hash}（utils.content_library.normalize_params）
+    param_key TEXT NOT NULL,
+
+    -- reading, listening
+    kind TEXT NOT NULL,
+    -- 依頼時のトピックと正規化したトピック
+    topic TEXT NOT NULL DEFAULT '',
+    topic_norm TEXT NOT NULL DEFAULT '',
+    level TEXT NOT NULL DEFAULT '',
+    -- 語数は50語単位（w250）、リスニングは short / medium / long
+    length_key TEXT NOT NULL DEFAULT '',
+    style TEXT NOT NULL DEFAULT '',
+
+    -- 検索・一覧用
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+
+    -- 生成関数に渡した元の引数（事前生成で作り直すため）と生成結果
+    params JSONB NOT NULL DEFAULT '{}',
+    content JSONB NOT NULL DEFAULT '{}',
+
+    -- 生成したコース（事前生成の候補集計用）
+    course_id TEXT,
+
+    -- 提供回数（limited 方針ではこの回数まで再利用する）
+    use_count INTEGER NOT NULL DEFAULT 0,
+    last_used_at TIMESTAMPTZ,
+
+    -- 全文検索（日本語のトピックは部分一致で補う）
+    search_tsv TSVECTOR GENERATED ALWAYS AS (
+        to_tsvector('simple', title || ' ' || topic || ' ' || body)
+    ) STORED,
+
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_generated_content_param_key
+    ON generated_content(param_key, use_count);
+CREATE INDEX IF NOT EXISTS idx_generated_content_course ON generated_content(course_id, kind);
+CREATE INDEX IF NOT EXISTS idx_generated_content_search ON generated_content USING GIN(search_tsv);
+
+-- 再利用方針 {"mode": "always" | "limited" | "fresh", "max_uses": 5}
+ALTER TABLE course_settings ADD COLUMN IF NOT EXISTS content_reuse JSONB;
@@ -0,0 +1,138 @@
+-- messaging: ダイレクトメッセージ・お知らせ・質問掲示板（utils/messaging.py）
+-- 受信箱は受信者ごとの行を (recipient_id, created_at) のインデックスでページングして読む。
+-- お知らせはクラスの全員分の行をまとめて作り、未読数はトリガーで message_counters に増減する
+-- Supabase SQL Editor で実行してください
+
+-- お知らせ本体（コースのお知らせ一覧用）
+CREATE TABLE IF NOT EXISTS announcements (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    course_id TEXT NOT NULL,
+    sender_id UUID,
+    sender_name TEXT NOT NULL DEFAULT '',
+
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    -- normal, high
+    priority TEXT NOT NULL DEFAULT 'normal',
+    -- 配信した人数
+    recipient_count INTEGER NOT NULL DEFAULT 0,
+
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- 受信者ごとのメッセージ（ダイレクトメッセージと、お知らせの配信分）
+CREATE TABLE IF NOT EXISTS messages (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    -- direct, announcement
+    kind TEXT NOT NULL DEFAULT 'direct'
+        CHECK (kind IN ('direct', 'announcement')),
+    -- 返信の場合はスレッドの最初のメッセージ
+    thread_id UUID,
+    announcement_id UUID REFERENCES announcements(id) ON DELETE CASCADE,
+
+    sender_id UUID,
+    sender_name TEXT NOT NULL DEFAULT '',
+    sender_role TEXT NOT NULL DEFAULT 'student',
+    recipient_id UUID NOT NULL,
+    recipient_name TEXT NOT NULL DEFAULT '',
+    course_id TEXT,
+
+    subject TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    priority TEXT NOT NULL DEFAULT 'normal',
+
+    -- NULL なら未読
+    read_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- 未読数（messages のトリガーで増減する）
+CREATE TABLE IF NOT EXISTS message_counters (
+    user_id UUID PRIMARY KEY,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 質問掲示板（parent_id があれば回答）
+CREATE TABLE IF NOT EXISTS board_posts (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    course_id TEXT NOT NULL,
+    parent_id UUID REFERENCES board_posts(id) ON DELETE CASCADE,
+
+    author_id UUID,
+    author_name TEXT NOT NULL DEFAULT '',
+    author_role TEXT NOT NULL DEFAULT 'student',
+
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    tags TEXT[] NOT NULL DEFAULT '{}',
+
+    resolved BOOLEAN NOT NULL DEFAULT FALSE,
+    is_best_answer BOOLEAN NOT NULL DEFAULT FALSE,
+    upvotes INTEGER NOT NULL DEFAULT 0,
+    -- 回答数（トリガーで増減する）
+    reply_count INTEGER NOT NULL DEFAULT 0,
+
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_announcements_course
+    ON announcements(course_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_inbox
+    ON messages(recipient_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_messages_unread
+    ON messages(recipient_id) WHERE read_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_messages_sent
+    ON messages(sender_id, created_at DESC, id DESC) WHERE kind = 'direct';
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages(thread_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_board_posts_questions
+    ON board_posts(course_id, created_at DESC, id DESC) WHERE parent_id IS NULL;
+CREATE INDEX IF NOT EXISTS idx_board_posts_replies ON board_posts(parent_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_board_posts_tags ON board_posts USING GIN(tags);
+
+-- 未読数の増減
+CREATE OR REPLACE FUNCTION messages_update_unread_counter() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.read_at IS NULL THEN
+        INSERT INTO message_counters (user_id, unread_count, updated_at)
+        VALUES (NEW.recipient_id, 1, NOW())
+        ON CONFLICT (user_id) DO UPDATE
+            SET unread_count = message_counters.unread_count + 1, updated_at = NOW();
+    ELSIF TG_OP = 'UPDATE' AND OLD.read_at IS NULL AND NEW.read_at IS NOT NULL THEN
+        UPDATE message_counters
+            SET unread_count = GREATEST(unread_count - 1, 0), updated_at = NOW()
+            WHERE user_id = NEW.recipient_id;
+    ELSIF TG_OP = 'DELETE' AND OLD.read_at IS NULL THEN
+        UPDATE message_counters
+            SET unread_count = GREATEST(unread_count - 1, 0), updated_at = NOW()
+            WHERE user_id = OLD.recipient_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_messages_unread_counter ON messages;
+CREATE TRIGGER trg_messages_unread_counter
+    AFTER INSERT OR UPDATE OF read_at OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_update_unread_counter();
+
+-- 回答数の増減
+CREATE OR REPLACE FUNCTION board_posts_update_reply_count() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' AND NEW.parent_id IS NOT NULL THEN
+        UPDATE board_posts SET reply_count = reply_count + 1 WHERE id = NEW.parent_id;
+    ELSIF TG_OP = 'DELETE' AND OLD.parent_id IS NOT NULL THEN
+        UPDATE board_posts SET reply_count = GREATEST(reply_count - 1, 0) WHERE id = OLD.parent_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_board_posts_reply_count ON board_posts;
+CREATE TRIGGER trg_board_posts_reply_count
+    AFTER INSERT OR DELETE ON board_posts
+    FOR EACH ROW EXECUTE FUNCTION board_posts_update_reply_count();
@@ -0,0 +1,62 @@
+-- notifications: 新着通知のユーザー別キュー（utils/notifications.py）
+-- フィードバック・お知らせ・メッセージの書き込み時に受信者ごとの行を作る。
+-- notification_versions.version はトリガーで進み、サイドバーはこの1行だけを見て変化を検知する
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+
+    user_id UUID NOT NULL,
+    -- feedback, announcement, message
+    kind TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    -- 通知から開く画面（current_view）と元の行
+    view TEXT,
+    ref_id TEXT,
+    course_id TEXT,
+
+    -- NULL なら未読
+    read_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- ユーザーごとの version（通知の追加・既読で +1）
+CREATE TABLE IF NOT EXISTS notification_versions (
+    user_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_notifications_unread
+    ON notifications(user_id, created_at DESC) WHERE read_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_notifications_created ON notifications(created_at);
+
+-- version と未読数の更新
+CREATE OR REPLACE FUNCTION notifications_bump_version() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO notification_versions (user_id, version, unread_count, updated_at)
+        VALUES (NEW.user_id, 1, CASE WHEN NEW.read_at IS NULL THEN 1 ELSE 0 END, NOW())
+        ON CONFLICT (user_id) DO UPDATE
+            SET version = notification_versions.version + 1,
+                unread_count = notification_versions.unread_count
+                    + CASE WHEN NEW.read_at IS NULL THEN 1 ELSE 0 END,
+                updated_at = NOW();
+    ELSIF TG_OP = 'UPDATE' AND OLD.read_at IS NULL AND NEW.read_at IS NOT NULL THEN
+        UPDATE notification_versions
+            SET version = version + 1,
+                unread_count = GREATEST(unread_count - 1, 0),
+                updated_at = NOW()
+            WHERE user_id = NEW.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notifications_version ON notifications;
+CREATE TRIGGER trg_notifications_version
+    AFTER INSERT OR UPDATE OF read_at ON notifications
+    FOR EACH ROW EXECUTE FUNCTION notifications_bump_version();
@@ -0,0 +1,16 @@
+-- generated_content_views: 共有ライブラリの素材を誰に提供したか（utils/content_library.py）
+-- 同じ生成パラメータの依頼では、そのユーザーにまだ提供していないバリエーションを選ぶ
+-- Supabase SQL Editor で実行してください
+
+CREATE TABLE IF NOT EXISTS generated_content_views (
+    content_id UUID NOT NULL REFERENCES generated_content(id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    -- generated_content.param_key（ユーザー×キーで提供済みを引くため）
+    param_key TEXT NOT NULL,
+    served_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (content_id, user_id)
+);
+
+-- インデックス
+CREATE INDEX IF NOT EXISTS idx_generated_content_views_user
+    ON generated_content_views(user_id, param_key);
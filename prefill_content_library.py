@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — AI生成教材の事前生成
+実行: python prefill_content_library.py --course <course_id> [--top 10]
+
+コースでよく依頼されるトピック×レベル（共有ライブラリの提供回数が多い順）について、
+再利用できる在庫が足りない組み合わせだけ新しいバリエーションを generated_content に追加する。
+在庫が足りている組み合わせはAPIを呼ばないので、何度実行しても問題ない。
+"""
+
+import sys
+import os
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.content_library import DEFAULT_MAX_WORKERS, prefill_course_library
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="よく使われるAI生成教材を事前に生成する")
+    parser.add_argument("--course", required=True, help="コースID")
+    parser.add_argument("--top", type=int, default=10, help="対象にする組み合わせの数")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="並列数")
+    args = parser.parse_args(argv)
+
+    print(f"\n{BOLD}{'='*60}")
+    print("  ♻️ AI生成教材の事前生成")
+    print(f"{'='*60}{RESET}")
+
+    report = prefill_course_library(args.course, top_n=args.top, max_workers=args.workers)
+
+    print(f"\n  候補: {report['candidates']} / 新規生成: {GREEN}{report['generated']}{RESET}"
+          f" / 在庫あり: {report['skipped']} / 失敗: {RED}{report['failed']}{RESET}\n")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 単語情報の事前生成
+実行: python prefill_word_knowledge.py [--course <course_id>] [--kinds details exercises]
+
+DEMO_WORD_LISTS・教材DBの単語リスト・教員が保存した単語リストの全単語について、
+詳細情報と練習問題を word_knowledge に保存する。
+保存済みの単語はAPIを呼ばないので、何度実行しても問題ない。
+"""
+
+import sys
+import os
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.word_knowledge import KINDS, prefill_word_knowledge
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="単語リストの詳細情報と練習問題を事前に生成する")
+    parser.add_argument("--course", help="コースID（省略時は共通教材と全教員リスト）")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--workers", type=int, default=4, help="並列数")
+    args = parser.parse_args(argv)
+
+    print(f"\n{BOLD}{'='*60}")
+    print("  📚 単語情報の事前生成")
+    print(f"{'='*60}{RESET}")
+
+    report = prefill_word_knowledge(kinds=args.kinds, course_id=args.course,
+                                    max_workers=args.workers)
+
+    print(f"\n  単語: {report['words']} / 新規生成: {GREEN}{report['generated']}{RESET}"
+          f" / 保存済み: {report['cached']} / 失敗: {RED}{report['failed']}{RESET}\n")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
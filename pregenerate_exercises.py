@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 練習問題の事前生成バッチ
+実行: python pregenerate_exercises.py --course <course_id> [--levels A2 B1] [--workers 4]
+
+教材ごとの派生問題を learning_materials.derived に書き戻す。
+生成済み（元データのハッシュが一致）のタスクはスキップするので、途中で止まっても再実行で再開できる。
+"""
+
+import sys
+import os
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.exercise_pregen import run_pregeneration, MODULE_TYPES, DEFAULT_MAX_WORKERS
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="コース教材の練習問題を事前生成する")
+    parser.add_argument("--course", default=None, help="コースID（省略時は共通教材のみ）")
+    parser.add_argument("--modules", nargs="+", choices=MODULE_TYPES, default=list(MODULE_TYPES),
+                        help="対象モジュール")
+    parser.add_argument("--levels", nargs="+", default=None,
+                        help="生成するCEFRレベル（省略時は教材のレベル）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="並列数")
+    parser.add_argument("--force", action="store_true", help="生成済みでも作り直す")
+    parser.add_argument("--dry-run", action="store_true", help="対象件数だけ表示する")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"\n{BOLD}{'='*60}")
+    print("  📦 練習問題の事前生成")
+    print(f"{'='*60}{RESET}")
+
+    report = run_pregeneration(
+        course_id=args.course,
+        module_types=args.modules,
+        levels=args.levels,
+        max_workers=args.workers,
+        force=args.force,
+        dry_run=args.dry_run,
+    )
+
+    print(f"\n{BOLD}📊 結果{RESET}")
+    print(f"  生成: {GREEN}{report['generated']}{RESET} / 対象: {report['planned']}"
+          f" / スキップ: {report['skipped']} / 失敗: {RED}{report['failed']}{RESET}")
+    print(f"  所要時間: {report['elapsed_sec']}秒 ({report['tasks_per_min']}件/分)")
+    print(f"  推定コスト: ¥{report['cost_jpy']}\n")
+
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
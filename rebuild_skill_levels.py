@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 技能別の推定レベルを再計算
+実行: python rebuild_skill_levels.py [--course <course_id>]
+      python rebuild_skill_levels.py --bench [--students 200] [--logs 100]
+
+practice_logs のスコア付きログを古い順に読み直し、student_skill_levels を作り直す。
+導入時（既存ログの取り込み）や、記録の失敗で状態がずれたときに使う。
+--bench は合成データで、ログ1件ごとの逐次更新と一括再計算の一致と処理時間を確認する（DB不要）。
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.level_estimator import (
+    SKILLS, OVERALL, LEVELS, update_state, score_to_level_index, replay_logs, rebuild_levels,
+)
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+MODULES = {
+    "speaking": "speaking_pronunciation", "writing": "writing_practice",
+    "reading": "reading_practice", "listening": "listening_dictation",
+    "vocabulary": "vocabulary_quiz",
+}
+
+
+def make_logs(n_students: int, per_student: int, seed: int = 0) -> list:
+    """学生ごとに実力（レベル指数）を決めた合成ログ（古い順）"""
+    rng = random.Random(seed)
+    start = datetime(2026, 4, 1)
+    logs = []
+    for s in range(n_students):
+        ability = rng.uniform(0, len(LEVELS) - 1)
+        for i in range(per_student):
+            skill = rng.choice(SKILLS)
+            level = rng.choice(LEVELS[max(0, int(ability) - 1):int(ability) + 2])
+            gap = ability - LEVELS.index(level)
+            score = max(0, min(100, 65 + 15 * gap + rng.gauss(0, 8)))
+            logs.append({
+                "student_id": f"s{s:04d}", "course_id": "c1", "module_type": MODULES[skill],
+                "score": round(score, 1), "activity_details": {"level": level},
+                "practiced_at": (start + timedelta(hours=i * 7 + s)).isoformat(),
+            })
+    logs.sort(key=lambda r: r["practiced_at"])
+    return logs
+
+
+def run_bench(args) -> int:
+    logs = make_logs(args.students, args.logs)
+    print(f"\n{BOLD}🧮 {len(logs):,}件の練習ログ（{args.students}人 × {args.logs}件）{RESET}")
+
+    started = time.perf_counter()
+    batch = replay_logs(logs)
+    elapsed = time.perf_counter() - started
+    print(f"  {BLUE}一括再計算: {elapsed:.2f}s（{len(batch):,}状態）{RESET}")
+
+    # 記録ごとの逐次更新（record_score と同じ update_state の積み重ね）
+    states = {}
+    started = time.perf_counter()
+    for log in logs:
+        skill = next(k for k, v in MODULES.items() if v == log["module_type"])
+        value = score_to_level_index(log["score"], log["activity_details"]["level"])
+        for course_key in ("", log["course_id"]):
+            for name in (skill, OVERALL):
+                key = (log["student_id"], course_key, name)
+                states[key] = update_state(states.get(key), value, log["score"], log["practiced_at"])
+    per_log_us = (time.perf_counter() - started) / max(1, len(logs)) * 1e6
+    print(f"  {BLUE}逐次更新: {per_log_us:.1f}µs/件{RESET}")
+
+    # 参照は辞書引き1回
+    keys = list(batch)
+    started = time.perf_counter()
+    for i in range(100000):
+        batch[keys[i % len(keys)]]["level"]
+    print(f"  {BLUE}レベル参照: {(time.perf_counter() - started) / 100000 * 1e6:.2f}µs/回{RESET}")
+
+    mismatch = sum(1 for k, v in batch.items()
+                   if abs(v["ewma"] - states[k]["ewma"]) > 1e-3 or v["count"] != states[k]["count"])
+    if mismatch:
+        print(f"  {RED}❌ 逐次更新と一括再計算が {mismatch}件で不一致{RESET}\n")
+        return 1
+    print(f"  {GREEN}✅ 逐次更新と一括再計算が一致{RESET}\n")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="技能別の推定レベルを練習ログから再計算")
+    parser.add_argument("--course", help="コースID（省略時は全コースと通算）")
+    parser.add_argument("--bench", action="store_true", help="合成データで計算時間を計測する")
+    parser.add_argument("--students", type=int, default=200)
+    parser.add_argument("--logs", type=int, default=100, help="学生1人あたりのログ数")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        return run_bench(args)
+
+    result = rebuild_levels(args.course)
+    if not result.get("success"):
+        print(f"{RED}❌ 再計算に失敗しました: {result.get('error')}{RESET}")
+        return 1
+    t = result["timings"]
+    print(f"\n{GREEN}✅ {result['logs']:,}件のログから {result['states']:,}件の状態を更新{RESET}")
+    print(f"  読み込み {t['load']}s / 計算 {t['compute']}s / 保存 {t['save']}s\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — 模擬テストの問題統計を再計算
+実行: python recompute_item_stats.py --course <course_id>
+      python recompute_item_stats.py --bench [--attempts 5000] [--items 400]
+
+mock_test_responses の全回答から test_item_stats（正答率・難易度 b・識別力）を作り直す。
+提出ごとの逐次更新で取りこぼした分（同時提出など）をまとめて整合させる。
+--bench は合成データで計算時間と、逐次更新との一致を確認する（DB不要）。
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from utils.mock_test import compute_item_stats, accumulate_item_stats, recompute_item_stats
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BLUE = "\033[94m"
+RESET = "\033[0m"
+BOLD = "\033[1m"
+
+
+def make_responses(n_attempts: int, n_items: int, per_attempt: int, seed: int = 0) -> list:
+    """Rasch モデルに従う合成回答"""
+    rng = np.random.default_rng(seed)
+    b = rng.normal(0, 1, n_items)
+    rows = []
+    for a in range(n_attempts):
+        theta = rng.normal(0, 1)
+        items = rng.choice(n_items, size=per_attempt, replace=False)
+        p = 1 / (1 + np.exp(-(theta - b[items])))
+        correct = rng.random(per_attempt) < p
+        for item, x in zip(items, correct):
+            rows.append({"attempt_id": f"a{a}", "item_id": f"q{item:05d}",
+                         "correct": bool(x), "ability": round(float(theta), 3)})
+    return rows, b
+
+
+def run_bench(args) -> int:
+    responses, true_b = make_responses(args.attempts, args.items, args.per_attempt)
+    print(f"\n{BOLD}🧮 {len(responses):,}件の回答（{args.attempts:,}受験 × {args.per_attempt}問, {args.items}問題）{RESET}")
+
+    started = time.perf_counter()
+    rows = compute_item_stats(responses)
+    elapsed = time.perf_counter() - started
+    print(f"  {BLUE}一括再計算: {elapsed:.2f}s{RESET}")
+
+    # 受験ごとの逐次更新と一致するか
+    started = time.perf_counter()
+    by_attempt = {}
+    for r in responses:
+        by_attempt.setdefault(r["attempt_id"], []).append(r)
+    stats = {}
+    for attempt in list(by_attempt.values())[:args.incremental]:
+        for row in accumulate_item_stats(stats, attempt):
+            stats[row["item_id"]] = row
+    per_attempt_ms = (time.perf_counter() - started) / max(1, min(args.incremental, len(by_attempt))) * 1000
+    subset = [r for a in list(by_attempt.values())[:args.incremental] for r in a]
+    batch = {row["item_id"]: row for row in compute_item_stats(subset)}
+    mismatch = sum(1 for k, row in batch.items()
+                   if abs(row["difficulty_b"] - stats[k]["difficulty_b"]) > 1e-3
+                   or abs(row["discrimination"] - stats[k]["discrimination"]) > 1e-3)
+    print(f"  {BLUE}逐次更新: {per_attempt_ms:.2f}ms/受験{RESET}")
+
+    est = np.array([row["difficulty_b"] for row in rows])
+    truth = true_b[[int(row["item_id"][1:]) for row in rows]]
+    corr = float(np.corrcoef(est, truth)[0, 1])
+    print(f"  {BLUE}推定 b と真の b の相関: {corr:.3f}{RESET}")
+
+    if mismatch:
+        print(f"  {RED}❌ 逐次更新と一括再計算が {mismatch}問で不一致{RESET}\n")
+        return 1
+    print(f"  {GREEN}✅ 逐次更新と一括再計算が一致{RESET}\n")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模擬テストの問題統計を再計算")
+    parser.add_argument("--course", help="コースID（省略時はコースなしの回答）")
+    parser.add_argument("--bench", action="store_true", help="合成データで計算時間を計測する")
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=400)
+    parser.add_argument("--per-attempt", type=int, default=40)
+    parser.add_argument("--incremental", type=int, default=300, help="逐次更新で確認する受験数")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        return run_bench(args)
+
+    result = recompute_item_stats(args.course)
+    if not result.get("success"):
+        print(f"{RED}❌ 再計算に失敗しました: {result.get('error')}{RESET}")
+        return 1
+    t = result["timings"]
+    print(f"\n{GREEN}✅ {result['responses']:,}件の回答から {result['items']}問の統計を更新{RESET}")
+    print(f"  読み込み {t['load']}s / 計算 {t['compute']}s / 保存 {t['save']}s\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
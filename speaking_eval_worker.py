@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — スピーキング課題の評価ワーカー
+実行: python speaking_eval_worker.py [--workers 4] [--drain]
+      python speaking_eval_worker.py --metrics [--window 60]
+
+speaking_eval_jobs に積まれた提出を取得し、Azure Speech + GPT で評価して
+submissions に書き戻す。複数台・複数プロセスで起動してもジョブは重複しない。
+締切前は --metrics でキューの深さと待ち時間を確認できる。
+"""
+
+import sys
+import os
+import signal
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.speaking_jobs import (
+    SpeakingEvalWorker, get_queue_metrics, DEFAULT_CONCURRENCY, POLL_INTERVAL_SEC, LEASE_SEC,
+)
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+YELLOW = "\033[93m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="スピーキング課題の評価ワーカー")
+    parser.add_argument("--workers", type=int, default=DEFAULT_CONCURRENCY, help="同時に評価する提出数")
+    parser.add_argument("--poll", type=float, default=POLL_INTERVAL_SEC, help="キュー確認の間隔（秒）")
+    parser.add_argument("--lease", type=int, default=LEASE_SEC, help="この秒数を超えた評価中ジョブはキューに戻す")
+    parser.add_argument("--drain", action="store_true", help="キューが空になったら終了する")
+    parser.add_argument("--metrics", action="store_true", help="キューの指標だけ表示する")
+    parser.add_argument("--window", type=int, default=60, help="指標の集計期間（分）")
+    return parser.parse_args(argv)
+
+
+def _fmt(p):
+    if p["p50"] is None:
+        return "-"
+    return f"p50 {p['p50']}s / p95 {p['p95']}s / max {p['max']}s"
+
+
+def show_metrics(window):
+    m = get_queue_metrics(window)
+    if not m.get("success"):
+        print(f"{RED}❌ 指標を取得できませんでした: {m.get('error')}{RESET}")
+        return 1
+
+    color = YELLOW if m["queued"] else GREEN
+    print(f"\n{BOLD}📊 評価キュー（直近{m['window_minutes']}分）{RESET}")
+    print(f"  待ち: {color}{m['queued']}{RESET}（うち再試行 {m['retrying']}） / 評価中: {m['running']}")
+    print(f"  最も古い待ち: {m['oldest_queued_sec']}秒")
+    print(f"  完了: {GREEN}{m['done']}{RESET} / 失敗: {RED}{m['failed']}{RESET}"
+          f" / {m['throughput_per_min']}件/分")
+    print(f"  待ち時間: {_fmt(m['wait_sec'])}")
+    print(f"  評価時間: {_fmt(m['run_sec'])}\n")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics:
+        return show_metrics(args.window)
+
+    worker = SpeakingEvalWorker(concurrency=args.workers, poll_interval=args.poll, lease_sec=args.lease)
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+
+    print(f"\n{BOLD}🎤 評価ワーカー {worker.worker_id}（同時 {worker.concurrency} 件）{RESET}")
+    print("  Ctrl+C で処理中のジョブを終えてから停止します\n")
+    stats = worker.run(drain=args.drain)
+
+    print(f"\n{BOLD}📊 結果{RESET}")
+    print(f"  完了: {GREEN}{stats['done']}{RESET} / 再試行: {stats['retried']}"
+          f" / 失敗: {RED}{stats['failed']}{RESET} / リース切れで破棄: {stats['lost']}\n")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
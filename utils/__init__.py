@@ -4,49 +4,57 @@ Utils Package
 ユーティリティモジュール
 """
 
-from .auth import (
-    is_authenticated,
-    get_current_user,
-    is_teacher,
-    is_student,
-    login_with_google,
-    logout,
-    require_auth,
-    require_teacher,
-    require_student,
-    handle_oauth_callback,
-)
+import importlib
 
-from .database import (
-    get_supabase_client,
-    get_user_by_email,
-    create_user,
-    update_user,
-    get_or_create_user,
-    get_teacher_courses,
-    get_student_courses,
-    create_course,
-    get_course,
-    update_course,
-    enroll_student,
-    get_course_students,
-    create_assignment,
-    get_course_assignments,
-    get_assignment,
-    create_submission,
-    get_student_submissions,
-    get_assignment_submissions,
-    update_submission,
-    create_chat_session,
-    update_chat_session,
-    get_student_chat_sessions,
-    add_vocabulary,
-    get_vocabulary_for_review,
-    update_vocabulary_after_review,
-    log_practice,
-    get_student_practice_stats,
-    log_api_usage
-)
+# 名前 → 定義しているサブモジュール。
+# パッケージの読み込み時に database（supabase）まで読み込まないよう、最初に使われたときに読み込む
+_LAZY_EXPORTS = {
+    'is_authenticated': 'auth',
+    'get_current_user': 'auth',
+    'is_teacher': 'auth',
+    'is_student': 'auth',
+    'login_with_google': 'auth',
+    'logout': 'auth',
+    'require_auth': 'auth',
+    'require_teacher': 'auth',
+    'require_student': 'auth',
+    'handle_oauth_callback': 'auth',
+    'get_supabase_client': 'database',
+    'get_user_by_email': 'database',
+    'create_user': 'database',
+    'update_user': 'database',
+    'get_or_create_user': 'database',
+    'get_teacher_courses': 'database',
+    'get_student_courses': 'database',
+    'create_course': 'database',
+    'get_course': 'database',
+    'update_course': 'database',
+    'enroll_student': 'database',
+    'get_course_students': 'database',
+    'create_assignment': 'database',
+    'get_course_assignments': 'database',
+    'get_assignment': 'database',
+    'create_submission': 'database',
+    'get_student_submissions': 'database',
+    'get_assignment_submissions': 'database',
+    'update_submission': 'database',
+    'create_chat_session': 'database',
+    'update_chat_session': 'database',
+    'get_student_chat_sessions': 'database',
+    'add_vocabulary': 'database',
+    'get_vocabulary_for_review': 'database',
+    'update_vocabulary_after_review': 'database',
+    'log_practice': 'database',
+    'get_student_practice_stats': 'database',
+    'log_api_usage': 'database',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_EXPORTS:
+        module = importlib.import_module(f".{_LAZY_EXPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     # Auth
@@ -0,0 +1,210 @@
+"""
+Audio Buffer
+============
+録音・アップロードされた音声を、一時ファイルを経由せずに
+デコード → 分割 → 送信まで持ち回るためのバッファ。
+
+- 入力: bytes / UploadedFile（BytesIO）/ ファイルパス（mmapで開く）
+- 変換: ffmpeg に stdin で渡し、stdout から 16kHz mono PCM を受け取る
+  （動画由来の長い音声は匿名一時ファイルに書かせて mmap する）
+- 分割: PCM の memoryview をスライスするだけ（コピーしない）
+- 送信: WAVヘッダ + PCMスライスをそのまま requests のチャンク送信に渡す
+
+使い方:
+    from utils.audio_buffer import AudioBuffer
+    pcm = AudioBuffer.from_source(uploaded_file).to_pcm16()
+    for body in pcm.wav_chunks(30):
+        requests.post(url, data=body, ...)
+"""
+
+import io
+import mmap
+import os
+import struct
+import subprocess
+import tempfile
+from typing import Iterator, List, Optional
+
+
+TARGET_SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16bit
+
+AUDIO_SUFFIXES = ('.wav', '.mp3', '.m4a', '.webm', '.ogg')
+VIDEO_SUFFIXES = ('.mp4', '.mov', '.avi')
+
+# 末尾にインデックスを持つコンテナは stdin（シーク不可）から読めないことがある
+_NEEDS_SEEK = ('.mp4', '.mov', '.m4a')
+
+
+def wav_header(data_bytes: int, sample_rate: int = TARGET_SAMPLE_RATE,
+               channels: int = 1, sample_width: int = SAMPLE_WIDTH) -> bytes:
+    """PCM用の44バイトWAVヘッダ"""
+    byte_rate = sample_rate * channels * sample_width
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_bytes, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8,
+        b'data', data_bytes,
+    )
+
+
+def _parse_wav(view: memoryview) -> Optional[dict]:
+    """WAV(PCM)なら形式とデータ部の位置を返す"""
+    if len(view) < 12 or bytes(view[0:4]) != b'RIFF' or bytes(view[8:12]) != b'WAVE':
+        return None
+    pos, fmt = 12, None
+    while pos + 8 <= len(view):
+        chunk_id = bytes(view[pos:pos + 4])
+        size = struct.unpack('<I', view[pos + 4:pos + 8])[0]
+        if chunk_id == b'fmt ':
+            audio_format, channels, sample_rate = struct.unpack('<HHI', view[pos + 8:pos + 16])
+            bits = struct.unpack('<H', view[pos + 22:pos + 24])[0]
+            fmt = {"format": audio_format, "channels": channels,
+                   "sample_rate": sample_rate, "sample_width": bits // 8}
+        elif chunk_id == b'data' and fmt:
+            end = min(len(view), pos + 8 + size)
+            return {**fmt, "offset": pos + 8, "end": end}
+        pos += 8 + size + (size & 1)
+    return None
+
+
+class AudioBuffer:
+    """音声データ（エンコード済み or PCM）をコピーせずに扱う入れ物"""
+
+    def __init__(self, data, suffix: str = '.wav', pcm: bool = False,
+                 sample_rate: int = TARGET_SAMPLE_RATE, owner=None):
+        self.view = memoryview(data).cast('B')
+        self.suffix = suffix.lower()
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        # mmap / BytesIO など、view の元オブジェクトを生かしておく
+        self._owner = owner if owner is not None else data
+
+    # ---------- 生成 ----------
+
+    @classmethod
+    def from_source(cls, source, name: str = None) -> "AudioBuffer":
+        """bytes / UploadedFile / BytesIO / ファイルパス から作る"""
+        name = name or getattr(source, 'name', '') or ''
+        suffix = os.path.splitext(str(name))[1].lower() or '.wav'
+
+        if isinstance(source, AudioBuffer):
+            return source
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return cls(source, suffix)
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return cls(mapped, os.path.splitext(str(source))[1] or suffix)
+        if hasattr(source, 'getbuffer'):
+            # UploadedFile は BytesIO のサブクラス → 中身をそのまま参照
+            return cls(source.getbuffer(), suffix, owner=source)
+        if hasattr(source, 'read'):
+            return cls(source.read(), suffix)
+        raise TypeError(f"unsupported audio source: {type(source).__name__}")
+
+    # ---------- 情報 ----------
+
+    @property
+    def is_video(self) -> bool:
+        return self.suffix in VIDEO_SUFFIXES
+
+    @property
+    def nbytes(self) -> int:
+        return self.view.nbytes
+
+    @property
+    def duration(self) -> float:
+        """PCMの再生時間（秒）"""
+        if not self.pcm:
+            raise ValueError("duration is only known after to_pcm16()")
+        return self.nbytes / (self.sample_rate * SAMPLE_WIDTH)
+
+    # ---------- 変換 ----------
+
+    def to_pcm16(self, sample_rate: int = TARGET_SAMPLE_RATE, timeout: int = 180) -> "AudioBuffer":
+        """16bit mono PCM に変換（すでにその形式のWAVならヘッダを外すだけ）"""
+        if self.pcm and self.sample_rate == sample_rate:
+            return self
+
+        wav = _parse_wav(self.view)
+        if (wav and wav["format"] == 1 and wav["channels"] == 1
+                and wav["sample_width"] == SAMPLE_WIDTH and wav["sample_rate"] == sample_rate):
+            return AudioBuffer(self.view[wav["offset"]:wav["end"]], '.pcm', pcm=True,
+                               sample_rate=sample_rate, owner=self._owner)
+
+        out_args = ['-vn', '-f', 's16le', '-acodec', 'pcm_s16le', '-ar', str(sample_rate), '-ac', '1']
+        if self.is_video:
+            return self._transcode_to_mmap(out_args, sample_rate, timeout)
+
+        result = self._ffmpeg(out_args, timeout)
+        if result is None and self.suffix in _NEEDS_SEEK:
+            # moov が末尾にあるファイルはパイプから読めないので、このときだけ一時ファイルに書く
+            result = self._ffmpeg(out_args, timeout, from_file=True)
+        if not result:
+            raise RuntimeError("ffmpeg could not decode the audio")
+        return AudioBuffer(result, '.pcm', pcm=True, sample_rate=sample_rate)
+
+    def _ffmpeg(self, out_args: List[str], timeout: int, stdout=subprocess.PIPE,
+                from_file: bool = False) -> Optional[bytes]:
+        """ffmpeg で変換して stdout の内容を返す（失敗時はNone）"""
+        base = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y']
+        if not from_file:
+            proc = subprocess.run(base + ['-i', 'pipe:0'] + out_args + ['pipe:1'],
+                                  input=self.view, stdout=stdout, stderr=subprocess.PIPE, timeout=timeout)
+        else:
+            with tempfile.NamedTemporaryFile(suffix=self.suffix) as tmp:
+                tmp.write(self.view)
+                tmp.flush()
+                proc = subprocess.run(base + ['-i', tmp.name] + out_args + ['pipe:1'],
+                                      stdout=stdout, stderr=subprocess.PIPE, timeout=timeout)
+        if proc.returncode != 0:
+            return None
+        return proc.stdout or b''
+
+    def _transcode_to_mmap(self, out_args: List[str], sample_rate: int, timeout: int) -> "AudioBuffer":
+        """動画由来の長い音声は ffmpeg に匿名一時ファイルへ直接書かせて mmap する"""
+        out = tempfile.TemporaryFile()
+        try:
+            ok = self._ffmpeg(out_args, timeout, stdout=out) is not None
+            if not ok and self.suffix in _NEEDS_SEEK:
+                out.seek(0)
+                out.truncate()
+                ok = self._ffmpeg(out_args, timeout, stdout=out, from_file=True) is not None
+            if not ok or os.fstat(out.fileno()).st_size == 0:
+                raise RuntimeError("ffmpeg could not extract audio from the video")
+            mapped = mmap.mmap(out.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            # mmap は閉じたファイルでも有効（ファイルは最後の参照が消えた時点で削除される）
+            out.close()
+        return AudioBuffer(mapped, '.pcm', pcm=True, sample_rate=sample_rate)
+
+    # ---------- 分割・送信 ----------
+
+    def chunks(self, chunk_seconds: int = 30) -> Iterator[memoryview]:
+        """PCMを chunk_seconds ごとの memoryview に分割（コピーなし）"""
+        if not self.pcm:
+            raise ValueError("chunks() requires PCM; call to_pcm16() first")
+        step = chunk_seconds * self.sample_rate * SAMPLE_WIDTH
+        for start in range(0, self.nbytes, step):
+            yield self.view[start:start + step]
+
+    def wav_chunks(self, chunk_seconds: int = 30) -> Iterator[Iterator]:
+        """各チャンクを「WAVヘッダ + PCMスライス」のイテレータとして返す
+
+        requests の data= に渡すとチャンク転送で送られ、PCM はコピーされない。
+        """
+        for pcm in self.chunks(chunk_seconds):
+            yield iter((wav_header(pcm.nbytes, self.sample_rate), pcm))
+
+    def to_wav_bytes(self) -> bytes:
+        """WAVファイルとしてのバイト列（保存・再生用。ここで1回だけコピーする）"""
+        if not self.pcm:
+            return bytes(self.view)
+        return b''.join((wav_header(self.nbytes, self.sample_rate), self.view))
+
+    def as_file(self, name: str = None) -> io.BytesIO:
+        """ファイルライクオブジェクトが必要なAPI（Whisper等）向け"""
+        f = io.BytesIO(self.to_wav_bytes())
+        f.name = name or ('audio.wav' if self.pcm else f'audio{self.suffix}')
+        return f
@@ -0,0 +1,230 @@
+"""
+Background Tasks
+================
+AI生成などの重い処理を Streamlit のスクリプトスレッドの外で実行する。
+
+- プロセス共通のスレッドプールで実行し、タスクの控え（task_id）を session_state に置く
+  → 生成中にウィジェットを操作して再実行（rerun）されても処理は続き、
+    次の再実行で poll_task が結果を受け取る
+- 同じ関数・同じ引数のタスクが実行中なら、新しく投入せずその結果を共有する（重複排除）
+- cancel_task で取り消せる（開始前ならプールから外す。実行中なら結果を捨てる）
+- API 使用量は投入したユーザーに記録する（openai_gateway.acting_user）
+
+使い方:
+    from utils.background_tasks import start_task, poll_task, is_running
+    if st.button("生成", disabled=is_running("article")):
+        start_task("article", "reading.generate_article", generate_article_from_prompt, prompt, level)
+    result = poll_task("article", "記事を生成中...")
+    if result is not None:
+        ...  # 完了した結果（1回だけ返る）
+"""
+
+import copy
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+MAX_WORKERS = 4
+# 完了したタスクを受け取りに来なかった場合に捨てるまでの秒数
+FINISHED_TTL_SEC = 1800
+SESSION_KEY = "_background_tasks"
+
+
+# ============================================================
+# プロセス共通のタスク管理
+# ============================================================
+
+_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+# task_id → {"id", "key", "name", "future", "subscribers", "cancelled", "started_at", "finished_at"}
+_tasks: Dict[str, Dict] = {}
+# 重複排除キー → 実行中の task_id
+_running_by_key: Dict[str, str] = {}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="bg-task")
+        return _executor
+
+
+def task_key(name: str, args: tuple = (), kwargs: Dict = None) -> str:
+    """重複排除キー（関数名と引数の内容から作る）"""
+    raw = json.dumps([name, list(args), kwargs or {}], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _expire_finished(now: float):
+    for task_id in [tid for tid, t in _tasks.items()
+                    if t["finished_at"] and now - t["finished_at"] > FINISHED_TTL_SEC]:
+        _tasks.pop(task_id, None)
+
+
+def _on_done(task: Dict, future: Future):
+    with _lock:
+        task["finished_at"] = time.time()
+        if _running_by_key.get(task["key"]) == task["id"]:
+            _running_by_key.pop(task["key"], None)
+
+
+def _run(fn: Callable, args: tuple, kwargs: Dict, user_id: Optional[str]):
+    from utils.openai_gateway import acting_user
+    with acting_user(user_id):
+        return fn(*args, **kwargs)
+
+
+def submit_task(name: str, fn: Callable, *args, user_id: str = None,
+                dedupe: bool = True, **kwargs) -> str:
+    """タスクを投入して task_id を返す
+
+    dedupe=True なら、同じ name・引数のタスクが実行中のときはそのタスクに相乗りする。
+    """
+    key = task_key(name, args, kwargs) if dedupe else uuid.uuid4().hex
+    executor = _get_executor()
+    with _lock:
+        _expire_finished(time.time())
+        running_id = _running_by_key.get(key)
+        if running_id and running_id in _tasks:
+            _tasks[running_id]["subscribers"] += 1
+            return running_id
+        task = {
+            "id": uuid.uuid4().hex, "key": key, "name": name, "future": None,
+            "subscribers": 1, "cancelled": False,
+            "started_at": time.time(), "finished_at": None,
+        }
+        _tasks[task["id"]] = task
+        _running_by_key[key] = task["id"]
+        task["future"] = executor.submit(_run, fn, args, kwargs, user_id)
+    task["future"].add_done_callback(lambda f, task=task: _on_done(task, f))
+    return task["id"]
+
+
+def get_task(task_id: str) -> Optional[Dict]:
+    """{"status": running / done / failed / cancelled, "result", "error", "elapsed"}（不明なら None）"""
+    with _lock:
+        task = _tasks.get(task_id)
+    if task is None:
+        return None
+    future = task["future"]
+    elapsed = (task["finished_at"] or time.time()) - task["started_at"]
+    info = {"id": task_id, "name": task["name"], "elapsed": round(elapsed, 1)}
+    if task["cancelled"] or future.cancelled():
+        return {**info, "status": "cancelled"}
+    if not future.done():
+        return {**info, "status": "running"}
+    try:
+        return {**info, "status": "done", "result": future.result()}
+    except CancelledError:
+        return {**info, "status": "cancelled"}
+    except Exception as e:
+        return {**info, "status": "failed", "error": str(e)}
+
+
+def cancel_task(task_id: str) -> bool:
+    """購読をやめる。誰も待っていなければタスク自体を取り消す
+
+    実行中のスレッドは止められないので、結果を捨てるだけになる。
+    """
+    with _lock:
+        task = _tasks.get(task_id)
+        if task is None:
+            return False
+        task["subscribers"] -= 1
+        if task["subscribers"] > 0:
+            return True
+        task["cancelled"] = True
+        if _running_by_key.get(task["key"]) == task_id:
+            _running_by_key.pop(task["key"], None)
+    task["future"].cancel()
+    return True
+
+
+def get_task_metrics() -> Dict[str, int]:
+    """プール全体のタスク数（監視用）"""
+    with _lock:
+        tasks = list(_tasks.values())
+    return {
+        "running": sum(1 for t in tasks if not t["future"].done() and not t["cancelled"]),
+        "finished": sum(1 for t in tasks if t["future"].done()),
+        "workers": MAX_WORKERS,
+    }
+
+
+# ============================================================
+# セッション（画面）側
+# ============================================================
+
+def _handles() -> Dict[str, str]:
+    import streamlit as st
+    return st.session_state.setdefault(SESSION_KEY, {})
+
+
+def start_task(slot: str, name: str, fn: Callable, *args, **kwargs) -> str:
+    """タスクを投入し、控えを session_state の slot に置く（同じ slot の前のタスクは取り消す）"""
+    import streamlit as st
+
+    handles = _handles()
+    if handles.get(slot):
+        cancel_task(handles[slot])
+    user = st.session_state.get("user") or {}
+    handles[slot] = submit_task(name, fn, *args, user_id=user.get("id"), **kwargs)
+    return handles[slot]
+
+
+def is_running(slot: str) -> bool:
+    task_id = _handles().get(slot)
+    info = get_task(task_id) if task_id else None
+    return bool(info and info["status"] == "running")
+
+
+def cancel(slot: str) -> bool:
+    """slot のタスクを取り消して控えを消す"""
+    task_id = _handles().pop(slot, None)
+    return cancel_task(task_id) if task_id else False
+
+
+def poll_task(slot: str, label: str = "処理中...", show_status: bool = True) -> Optional[Any]:
+    """slot のタスクの結果を受け取る
+
+    実行中なら状況（経過時間・更新/取り消しボタン）を表示して None、
+    完了していれば控えを消して結果を1回だけ返す。
+    失敗・取り消し・期限切れは {"success": False, "error": ...} を返す。
+    """
+    import streamlit as st
+
+    handles = _handles()
+    task_id = handles.get(slot)
+    if not task_id:
+        return None
+    info = get_task(task_id)
+
+    if info is None:
+        handles.pop(slot, None)
+        return {"success": False, "error": "処理結果の保存期限が切れました。もう一度実行してください。"}
+    if info["status"] == "running":
+        if show_status:
+            st.info(f"⏳ {label}（{int(info['elapsed'])}秒経過）— 他の操作を続けても処理は止まりません。")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("🔄 状態を更新 / Refresh", key=f"bg_refresh_{slot}"):
+                    st.rerun()
+            with col2:
+                if st.button("✖️ 取り消す / Cancel", key=f"bg_cancel_{slot}"):
+                    cancel(slot)
+                    st.rerun()
+        return None
+
+    handles.pop(slot, None)
+    if info["status"] == "done":
+        # 重複排除で相乗りした他のセッションと結果を共有しているので、書き換えても影響しないよう複製する
+        return copy.deepcopy(info["result"])
+    if info["status"] == "cancelled":
+        return {"success": False, "error": "取り消されました", "cancelled": True}
+    return {"success": False, "error": info.get("error")}
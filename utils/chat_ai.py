@@ -1,5 +1,5 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion
 import json
 
 # シチュエーション定義
@@ -121,10 +121,6 @@ FREE_TOPICS = {
 }
 
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
-
 def get_system_prompt(situation_key, level):
     """システムプロンプトを生成"""
     
@@ -179,8 +175,6 @@ IMPORTANT GUIDELINES:
 def get_ai_response(messages, situation, level, is_first=False, request_hint=False):
     """AI応答を取得"""
     
-    client = get_openai_client()
-    
     if is_first:
         if situation in FREE_TOPICS:
             first_messages = {
@@ -204,13 +198,13 @@ Keep it to one simple suggestion. Format: 「〜と言ってみましょう」
 Last few messages:
 {messages[-3:] if len(messages) >= 3 else messages}
 """
-        response = client.chat.completions.create(
+        return chat_completion(
+            "chat_ai.hint",
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": hint_prompt}],
             max_tokens=100,
             temperature=0.7
         )
-        return response.choices[0].message.content
     
     system_prompt = get_system_prompt(situation, level)
     
@@ -221,21 +215,18 @@ Last few messages:
             "content": msg["content"]
         })
     
-    response = client.chat.completions.create(
+    return chat_completion(
+        "chat_ai.get_ai_response",
         model="gpt-4o-mini",
         messages=api_messages,
         max_tokens=150,
         temperature=0.8
     )
-    
-    return response.choices[0].message.content
 
 
 def get_session_feedback(messages, level, situation, used_voice_input=False):
     """セッション終了時のフィードバックを生成"""
     
-    client = get_openai_client()
-    
     user_messages = [m["content"] for m in messages if m["role"] == "user"]
     user_text = "\n".join(user_messages)
     
@@ -287,7 +278,8 @@ Important notes:
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "chat_ai.get_session_feedback",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert English teacher specializing in Japanese EFL learners. Respond only in valid JSON."},
@@ -297,7 +289,7 @@ Important notes:
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["used_voice_input"] = used_voice_input
         return result
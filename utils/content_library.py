@@ -0,0 +1,439 @@
+"""
+Content Library
+===============
+AI生成したリーディング記事・リスニング素材の共有ライブラリ。
+
+- 生成パラメータ（種類・トピック・レベル・長さ・スタイル）を正規化したキーで
+  generated_content に保存し、同じ組み合わせの依頼にはクラスメートが生成した素材を再利用する
+- 1つのキーに複数のバリエーションを持ち、提供回数（use_count）を数える
+- 誰に提供したかを generated_content_views に記録し、同じユーザーには未提供のバリエーションを選ぶ
+  （すべて提供済みなら新しく生成する。「新しく生成」ボタンは fresh=True で常に生成）
+- 再利用の方針はコース設定（course_settings.content_reuse）で切り替える
+    - always : 保存済みがあれば常に再利用
+    - limited: 各バリエーションを max_uses 回まで再利用し、使い切ったら新しく生成
+    - fresh  : 毎回生成（生成結果はライブラリに追加する）
+- 同じキーへの同時リクエストは1回の生成を待ち合わせる（single-flight）
+- 過去の生成はタイトル・トピック・本文で全文検索できる（教員が選択中のクラスで生成したものだけ）
+- コースでよく使われるトピック×レベルは prefill_course_library で事前生成できる
+
+使い方:
+    from utils.content_library import get_or_generate
+    result = get_or_generate("reading", topic, level, lambda: _generate(...),
+                             length=word_count, course_id=course_id)
+    （事前生成: python prefill_content_library.py --course <course_id>）
+    show_library_search("generated_article", "reading", teacher_course_id())   # 教員画面の検索
+"""
+
+import hashlib
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+KINDS = ("reading", "listening")
+POLICY_MODES = ("always", "limited", "fresh")
+DEFAULT_POLICY = {"mode": "limited", "max_uses": 5}
+# 語数はこの幅で丸めてキーにする（240語と250語の依頼は同じ素材でよい）
+WORD_COUNT_STEP = 50
+# 他の呼び出しの生成完了を待つ上限（秒）
+WAIT_TIMEOUT = 120
+DEFAULT_MAX_WORKERS = 2
+
+_TOPIC_STRIP_RE = re.compile(r"[\s「」『』\"'“”‘’。、，,.!?！？]+")
+
+
+def normalize_topic(topic: str) -> str:
+    """キー用のトピック（全角半角・大文字小文字・空白と記号の揺れを吸収）"""
+    text = unicodedata.normalize("NFKC", topic or "").lower()
+    return " ".join(t for t in _TOPIC_STRIP_RE.split(text) if t)
+
+
+def normalize_length(length) -> str:
+    """語数（int）は WORD_COUNT_STEP 語単位、"short" などの文字列はそのまま"""
+    if length is None or length == "":
+        return ""
+    if isinstance(length, (int, float)):
+        return f"w{int(round(length / WORD_COUNT_STEP)) * WORD_COUNT_STEP}"
+    return str(length).strip().lower()
+
+
+def normalize_params(kind: str, topic: str, level: str, length=None, style: str = None) -> Dict:
+    """生成パラメータを正規化した dict（param_key を含む）"""
+    params = {
+        "kind": kind,
+        "topic_norm": normalize_topic(topic),
+        "level": (level or "").strip().upper(),
+        "length_key": normalize_length(length),
+        "style": "_".join((style or "").strip().lower().split()),
+    }
+    topic_hash = hashlib.sha1(params["topic_norm"].encode("utf-8")).hexdigest()[:16]
+    params["param_key"] = ":".join([kind, params["level"], params["length_key"],
+                                    params["style"], topic_hash])
+    return params
+
+
+def get_reuse_policy(course_id: str = None) -> Dict:
+    """コースの再利用方針（設定がなければ DEFAULT_POLICY）"""
+    policy = dict(DEFAULT_POLICY)
+    if course_id:
+        try:
+            from utils.database import get_course_settings
+            policy.update((get_course_settings(course_id) or {}).get("content_reuse") or {})
+        except Exception:
+            pass
+    if policy.get("mode") not in POLICY_MODES:
+        policy["mode"] = DEFAULT_POLICY["mode"]
+    policy["max_uses"] = max(1, int(policy.get("max_uses") or DEFAULT_POLICY["max_uses"]))
+    return policy
+
+
+# ============================================================
+# 再利用・生成
+# ============================================================
+
+_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+
+
+def _serve(param_key: str, policy: Dict, user_id: str = None) -> Optional[Dict]:
+    """方針に合う保存済みバリエーションを1件選び、提供回数を1つ進めて返す
+
+    user_id があれば、そのユーザーに提供済みのバリエーションは選ばない
+    """
+    from utils.database import (
+        get_generated_contents, get_viewed_generated_content_ids, mark_generated_content_served,
+    )
+
+    variants = get_generated_contents(param_key)
+    if user_id and variants:
+        viewed = get_viewed_generated_content_ids(user_id, param_key)
+        variants = [v for v in variants if v["id"] not in viewed]
+    if policy["mode"] == "limited":
+        variants = [v for v in variants if (v.get("use_count") or 0) < policy["max_uses"]]
+    # 提供回数の少ない順に、同時に選ばれて数え損ねたら次の候補へ
+    for row in sorted(variants, key=lambda v: (v.get("use_count") or 0, v.get("created_at") or "")):
+        served = mark_generated_content_served(row["id"], row.get("use_count") or 0)
+        if served:
+            return served
+    return None
+
+
+def _record_view(result: Dict, user_id: Optional[str], param_key: str):
+    """提供したバリエーションを記録（記録に失敗しても素材は返す）"""
+    if not (user_id and result.get("success") and result.get("library_id")):
+        return
+    try:
+        from utils.database import record_generated_content_view
+        record_generated_content_view(result["library_id"], user_id, param_key)
+    except Exception:
+        pass
+
+
+def _result_from_row(row: Dict, reused: bool) -> Dict:
+    return {
+        **(row.get("content") or {}),
+        "success": True,
+        "library_id": row.get("id"),
+        "reused": reused,
+        "use_count": row.get("use_count"),
+    }
+
+
+def _store(params: Dict, topic: str, generation_args: Dict, result: Dict,
+           course_id: str = None, use_count: int = 1) -> Optional[Dict]:
+    content = {k: v for k, v in result.items() if k not in ("success", "library_id", "reused", "use_count")}
+    body = content.get("text") or content.get("script") or ""
+    try:
+        from utils.database import save_generated_content
+        return save_generated_content({
+            **params,
+            "topic": topic,
+            "title": content.get("title") or "",
+            "body": body,
+            "params": generation_args,
+            "content": content,
+            "course_id": course_id,
+            "use_count": use_count,
+            "last_used_at": datetime.utcnow().isoformat() if use_count else None,
+        })
+    except Exception:
+        return None
+
+
+def get_or_generate(kind: str, topic: str, level: str, generate: Callable[[], Dict],
+                    length=None, style: str = None, course_id: str = None,
+                    policy: Dict = None, generation_args: Dict = None,
+                    user_id: str = None, fresh: bool = False) -> Dict:
+    """ライブラリから素材を返す。方針上再利用できなければ generate() で生成して追加する
+
+    Args:
+        generation_args: 事前生成で同じ素材を作り直すための元の引数（params 列に保存）
+        user_id: 提供先（省略時はログイン中・acting_user のユーザー）。提供済みのバリエーションは選ばない
+        fresh: True なら方針によらず生成する（「新しく生成」ボタン用）
+    Returns:
+        generate() の結果に "library_id", "reused", "use_count" を足したもの
+    """
+    policy = policy or get_reuse_policy(course_id)
+    params = normalize_params(kind, topic, level, length, style)
+    key = params["param_key"]
+    generation_args = generation_args or {"topic": topic, "level": level, "length": length, "style": style}
+    if user_id is None:
+        from utils.openai_gateway import _current_user_id
+        user_id = _current_user_id()
+
+    if fresh or policy["mode"] == "fresh":
+        result = generate()
+        if result.get("success"):
+            row = _store(params, topic, generation_args, result, course_id)
+            result = {**result, "library_id": (row or {}).get("id"), "reused": False, "use_count": 1}
+            _record_view(result, user_id, key)
+        return result
+
+    try:
+        row = _serve(key, policy, user_id)
+    except Exception:
+        row = None
+    if row:
+        result = _result_from_row(row, reused=True)
+        _record_view(result, user_id, key)
+        return result
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        try:
+            result = future.result(timeout=WAIT_TIMEOUT)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        if result.get("success") and result.get("library_id"):
+            try:
+                from utils.database import mark_generated_content_served
+                mark_generated_content_served(result["library_id"], None)
+            except Exception:
+                pass
+            _record_view(result, user_id, key)
+            return {**result, "reused": True}
+        return result
+
+    try:
+        result = generate()
+        if result.get("success"):
+            row = _store(params, topic, generation_args, result, course_id)
+            result = {**result, "library_id": (row or {}).get("id"), "reused": False, "use_count": 1}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+    future.set_result(result)
+    _record_view(result, user_id, key)
+    return result
+
+
+def search_library(query: str, course_id: str, kind: str = None, level: str = None,
+                   limit: int = 20) -> List[Dict]:
+    """コースで生成した素材をタイトル・トピック・本文で全文検索（course_id がなければ空）"""
+    if not (query or "").strip() or not course_id:
+        return []
+    try:
+        from utils.database import search_generated_content
+        return search_generated_content(query.strip(), course_id, kind=kind, level=level, limit=limit)
+    except Exception:
+        return []
+
+
+def library_item_to_result(row: Dict) -> Dict:
+    """検索結果の1行を生成関数と同じ形式の結果にする（提供回数は進めない）"""
+    return _result_from_row(row, reused=True)
+
+
+# ============================================================
+# 画面（リーディング・リスニングの教員用）
+# ============================================================
+
+# 種類ごとの表示名（素材の呼び方, 検索欄の見出し, 入力例）
+_KIND_LABELS = {
+    "reading": ("記事", "🔎 生成済みの記事を検索 / Search Generated Articles", "例: climate, 食文化"),
+    "listening": ("素材", "🔎 生成済みの素材を検索", "例: cafe, 自己紹介"),
+}
+
+
+def teacher_course_id() -> Optional[str]:
+    """教員ホームで選択中のクラスの course_id（未選択なら None）"""
+    import streamlit as st
+    from utils.auth import get_current_user
+
+    selected_class = st.session_state.get('selected_class')
+    user = get_current_user()
+    if not selected_class or not user:
+        return None
+    from views.teacher_home import _load_classes
+    c = _load_classes(user['id']).get(selected_class) or {}
+    return c.get('db_id') or c.get('course_id')
+
+
+def show_library_source(result: Dict, kind: str = "reading"):
+    """共有ライブラリから再利用した記事・素材なら表示"""
+    import streamlit as st
+    if result.get('reused'):
+        noun = _KIND_LABELS[kind][0]
+        st.caption(f"♻️ ライブラリの{noun}を再利用しました（{result.get('use_count') or 1}回目の提供）")
+
+
+def show_library_search(session_key: str, kind: str, course_id: Optional[str]):
+    """選択中のクラスで過去に生成した記事・素材を検索して session_state[session_key] に読み込む"""
+    import streamlit as st
+
+    noun, title, placeholder = _KIND_LABELS[kind]
+    with st.expander(title):
+        if not course_id:
+            st.info(f"クラスを選択すると、そのクラスで生成した{noun}を検索できます")
+            return
+        query = st.text_input("キーワード / Keywords", key=f"{session_key}_lib_query",
+                              placeholder=placeholder)
+        if not query:
+            return
+        rows = search_library(query, course_id, kind=kind)
+        if not rows:
+            st.info(f"該当する{noun}はありません")
+            return
+        for row in rows:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.markdown(f"**{row.get('title') or row.get('topic')}** — {row.get('level')}")
+                st.caption(f"トピック: {row.get('topic')} | 提供 {row.get('use_count') or 0}回")
+            with col2:
+                if st.button("読み込む", key=f"{session_key}_lib_{row['id']}"):
+                    st.session_state[session_key] = library_item_to_result(row)
+                    st.rerun()
+
+
+# ============================================================
+# 事前生成
+# ============================================================
+
+def _generator_for(kind: str) -> Callable[[Dict], Dict]:
+    """保存済みの生成引数から素材を作る関数（API を直接呼ぶ・ライブラリは通さない）"""
+    if kind == "reading":
+        from utils.reading import _generate_article
+        return lambda a: _generate_article(a["topic"], a["level"], a.get("length") or 200)
+    if kind == "listening":
+        from utils.listening import _generate_listening
+        return lambda a: _generate_listening(a["topic"], a["level"], a.get("length") or "short")
+    raise ValueError(f"未対応の種類です: {kind}")
+
+
+def popular_requests(course_id: str, top_n: int = 10, kinds: List[str] = None) -> List[Dict]:
+    """コースでよく依頼される組み合わせ（提供回数の合計が多い順）
+
+    Returns:
+        [{"param_key", "kind", "topic", "level", "params", "requests", "variants", "remaining"}]
+    """
+    from utils.database import get_course_generated_content
+
+    policy = get_reuse_policy(course_id)
+    groups: Dict[str, Dict] = {}
+    for row in get_course_generated_content(course_id, kinds or list(KINDS)):
+        g = groups.setdefault(row["param_key"], {
+            "param_key": row["param_key"], "kind": row["kind"], "topic": row.get("topic"),
+            "level": row.get("level"), "params": row.get("params") or {},
+            "requests": 0, "variants": 0, "remaining": 0,
+        })
+        uses = row.get("use_count") or 0
+        g["requests"] += uses
+        g["variants"] += 1
+        # limited のときは残り提供回数、それ以外はバリエーション数を在庫とみなす
+        g["remaining"] += max(0, policy["max_uses"] - uses) if policy["mode"] == "limited" else 1
+    ranked = sorted(groups.values(), key=lambda g: (-g["requests"], g["param_key"]))
+    return ranked[:top_n]
+
+
+def prefill_course_library(course_id: str, top_n: int = 10, min_remaining: int = None,
+                           max_workers: int = DEFAULT_MAX_WORKERS,
+                           progress: Optional[Callable[[str], None]] = print) -> Dict:
+    """よく依頼される組み合わせについて、再利用できる在庫が足りなければ1件ずつ追加生成する
+
+    Args:
+        min_remaining: 在庫（残り提供回数）の目標。省略時は max_uses（= 新しいバリエーション1件分）
+    Returns:
+        {"candidates", "generated", "skipped", "failed"}
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    log = progress or (lambda msg: None)
+    policy = get_reuse_policy(course_id)
+    target = min_remaining or (policy["max_uses"] if policy["mode"] == "limited" else 1)
+    candidates = popular_requests(course_id, top_n)
+    pending = [g for g in candidates if g["remaining"] < target and g["params"].get("topic")]
+    report = {"candidates": len(candidates), "generated": 0,
+              "skipped": len(candidates) - len(pending), "failed": 0}
+    log(f"候補 {len(candidates)}件 / 生成対象 {len(pending)}件 / 在庫あり {report['skipped']}件")
+
+    def run(group: Dict) -> Dict:
+        args = group["params"]
+        result = _generator_for(group["kind"])(args)
+        if result.get("success"):
+            params = normalize_params(group["kind"], args["topic"], args["level"],
+                                      args.get("length"), args.get("style"))
+            # 事前生成分はまだ誰にも提供していない
+            _store(params, args["topic"], args, result, course_id, use_count=0)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(run, g): g for g in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            group = futures[future]
+            label = f"{group['kind']} {group['level']} {group['topic']}"
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result.get("success"):
+                report["generated"] += 1
+                log(f"[{i}/{len(pending)}] ✅ {label}")
+            else:
+                report["failed"] += 1
+                log(f"[{i}/{len(pending)}] ❌ {label}: {result.get('error')}")
+    return report
+
+
+# バックグラウンド事前生成の状態（course_id → {"status", "report", "started_at", "finished_at"}）
+_prefill_jobs: Dict[str, Dict] = {}
+
+
+def start_background_prefill(course_id: str, top_n: int = 10) -> bool:
+    """事前生成をデーモンスレッドで開始（同じコースで実行中なら False）"""
+    with _lock:
+        job = _prefill_jobs.get(course_id)
+        if job and job["status"] == "running":
+            return False
+        job = {"status": "running", "report": None,
+               "started_at": datetime.utcnow().isoformat(), "finished_at": None}
+        _prefill_jobs[course_id] = job
+
+    def worker():
+        try:
+            job["report"] = prefill_course_library(course_id, top_n=top_n, progress=None)
+            job["status"] = "done"
+        except Exception as e:
+            job["report"] = {"error": str(e)}
+            job["status"] = "failed"
+        job["finished_at"] = datetime.utcnow().isoformat()
+
+    threading.Thread(target=worker, name=f"content-prefill-{course_id}", daemon=True).start()
+    return True
+
+
+def get_prefill_status(course_id: str) -> Optional[Dict]:
+    """直近のバックグラウンド事前生成の状態（このプロセスで開始したもの）"""
+    with _lock:
+        job = _prefill_jobs.get(course_id)
+        return dict(job) if job else None
@@ -6,7 +6,7 @@ Supabase Database Client
 
 import streamlit as st
 from supabase import create_client, Client
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set
 from datetime import datetime, timedelta
 
 
@@ -493,6 +493,14 @@ def log_practice(student_id: str, module_type: str,
         **kwargs
     }
     result = supabase.table('practice_logs').insert(log_data).execute()
+    if kwargs.get('score') is not None:
+        # 技能別の推定レベルを更新（失敗しても練習ログの記録は成功扱い）
+        try:
+            from utils.level_estimator import record_score
+            level = (kwargs.get('activity_details') or {}).get('level')
+            record_score(student_id, module_type, kwargs['score'], level, course_id)
+        except Exception:
+            pass
     return result.data[0] if result.data else None
 
 
@@ -544,6 +552,15 @@ def log_api_usage(api_name: str, cost_jpy: float,
     return result.data[0] if result.data else None
 
 
+def log_api_usage_batch(rows: List[Dict]) -> int:
+    """API使用量をまとめて記録（openai_gatewayのバッチ書き込み用）"""
+    if not rows:
+        return 0
+    supabase = get_supabase_client()
+    result = supabase.table('api_usage').insert(rows).execute()
+    return len(result.data) if result.data else 0
+
+
 # ============================================================
 # Speaking Materials Operations (Phase B)
 # ============================================================
@@ -710,6 +727,9 @@ def upsert_course_settings(course_id: str, updates: Dict) -> Dict:
         data, on_conflict='course_id'
     ).execute()
     _get_course_settings_cached.clear()
+    # 設定から組み立てた評価プロンプトを破棄（他プロセスは updated_at の変化で作り直す）
+    from utils.prompt_templates import invalidate_prompt_templates
+    invalidate_prompt_templates(course_id)
     return result.data[0] if result.data else None
 
 
@@ -829,8 +849,25 @@ def create_speaking_submission(student_id: str, assignment_id: str,
 
 def update_submission_feedback(submission_id: str, feedback: str = None,
                                 teacher_comment: str = None,
-                                teacher_score: float = None) -> Dict:
-    """提出にフィードバックを追加（教員用）"""
+                                teacher_score: float = None,
+                                scores: Dict = None, total_score: float = None,
+                                recognized_text: str = None,
+                                feedback_detailed: Dict = None,
+                                by_teacher: bool = False) -> Dict:
+    """提出にフィードバックを追加（教員用・評価ワーカー用）
+
+    by_teacher=True（教員画面からの保存）で、教員のフィードバック・コメント・点数が
+    初めて入った・変わったときだけ学生に通知する。評価ワーカーのAI評価は通知しない。
+    """
+    teacher_fields = {k: v for k, v in (('feedback', feedback), ('teacher_comment', teacher_comment),
+                                        ('teacher_score', teacher_score)) if v is not None}
+    previous = None
+    if by_teacher and teacher_fields:
+        supabase = get_supabase_client()
+        rows = supabase.table('submissions').select(', '.join(teacher_fields))\
+            .eq('id', submission_id).execute().data
+        previous = rows[0] if rows else {}
+
     updates = {}
     if feedback is not None:
         updates['feedback'] = feedback
@@ -838,7 +875,22 @@ def update_submission_feedback(submission_id: str, feedback: str = None,
         updates['teacher_comment'] = teacher_comment
     if teacher_score is not None:
         updates['teacher_score'] = teacher_score
-    return update_submission(submission_id, updates)
+    if scores is not None:
+        updates['scores'] = scores
+    if total_score is not None:
+        updates['total_score'] = total_score
+    if recognized_text is not None:
+        updates['recognized_text'] = recognized_text
+    if feedback_detailed is not None:
+        updates['feedback_detailed'] = feedback_detailed
+    result = update_submission(submission_id, updates)
+    if result and previous is not None:
+        changed = [k for k, v in teacher_fields.items() if previous.get(k) != v]
+        if changed:
+            # 学生のサイドバーに新着として出す（通知の失敗で保存を失敗にしない）
+            from utils.notifications import notify_feedback
+            notify_feedback(result, updated=any(previous.get(k) not in (None, '') for k in changed))
+    return result
 
 
 def get_speaking_submissions_for_assignment(assignment_id: str) -> List[Dict]:
@@ -1148,6 +1200,22 @@ def save_word_list(student_id: str = None, teacher_id: str = None,
     return result.data[0] if result.data else None
 
 
+def get_teacher_word_lists(course_id: str = None) -> List[Dict]:
+    """教員が保存した単語リスト（save_word_list）を取得。course_id指定でそのコースのみ"""
+    supabase = get_supabase_client()
+    try:
+        query = supabase.table('ai_generated_texts')\
+            .select('id, title, level, course_id, details')\
+            .not_.is_('teacher_id', 'null')\
+            .in_('category', ['custom', 'ai_generated'])
+        if course_id:
+            query = query.eq('course_id', course_id)
+        result = query.order('created_at', desc=True).execute()
+        return result.data or []
+    except Exception:
+        return []
+
+
 # ============================================================
 # Learning Resources Operations (プロンプト集・教材コンテンツ管理)
 # ============================================================
@@ -2049,6 +2117,24 @@ def upsert_learning_material(data: Dict) -> Optional[Dict]:
         return None
 
 
+def save_learning_material_derived(material_id: str, task_key: str, entry: Dict) -> bool:
+    """教材の事前生成結果（derived[task_key]）を保存。他のキーは保持する"""
+    supabase = get_supabase_client()
+    try:
+        result = supabase.table('learning_materials')\
+            .select('derived').eq('id', material_id).execute()
+        if not result.data:
+            return False
+        derived = result.data[0].get('derived') or {}
+        derived[task_key] = entry
+        supabase.table('learning_materials')\
+            .update({'derived': derived, 'updated_at': datetime.utcnow().isoformat()})\
+            .eq('id', material_id).execute()
+        return True
+    except Exception:
+        return False
+
+
 def delete_learning_material(material_id: str) -> bool:
     """教材を削除（論理削除: is_active=False）"""
     supabase = get_supabase_client()
@@ -2120,59 +2206,830 @@ def seed_default_materials() -> int:
     return count
 
 
-def get_student_reading_level(student_id: str, course_id: str = None) -> str:
-    """学生のリーディングレベルをクイズ履歴から自動判定
-    
-    ロジック:
-    - 履歴なし → B1（デフォルト）
-    - 直近3回の平均スコアで判定
-      80%以上 → 現レベルより1つ上
-      50%未満 → 現レベルより1つ下
-      その他  → 現レベル維持
+# ============================================================
+# Generated Question Sets (生成済み問題セットの共有キャッシュ)
+# ============================================================
+
+# 生成済み問題セットを再利用する期間（これより古いものは作り直す）
+QUESTION_SET_TTL_DAYS = 30
+
+
+def get_generated_question_set(cache_key: str) -> Optional[Dict]:
+    """生成済み問題セットを取得（キャッシュ付き）。なければ・期限切れならNone
+
+    キャッシュするのは見つかったものだけ。未保存（別プロセスの事前生成で後から保存されうる）と
+    取得失敗は例外でキャッシュを素通りさせ、次の呼び出しで読み直す。
     """
+    try:
+        return _get_generated_question_set_cached(cache_key)
+    except Exception:
+        return None
+
+@st.cache_data(ttl=600)
+def _get_generated_question_set_cached(cache_key: str) -> Dict:
     supabase = get_supabase_client()
-    
-    LEVELS = ["A1", "A2", "B1", "B2", "C1"]
-    DEFAULT_LEVEL = "B1"
-    
+    cutoff = (datetime.utcnow() - timedelta(days=QUESTION_SET_TTL_DAYS)).isoformat()
+    result = supabase.table('generated_question_sets')\
+        .select('payload')\
+        .eq('cache_key', cache_key)\
+        .gte('updated_at', cutoff)\
+        .execute()
+    if not result.data:
+        raise LookupError(cache_key)
+    return result.data[0]['payload']
+
+
+def save_generated_question_set(cache_key: str, kind: str, content_hash: str,
+                                level: str, params: Dict, payload: Dict) -> Optional[Dict]:
+    """生成済み問題セットを保存（同一キーは上書き）"""
+    supabase = get_supabase_client()
+    data = {
+        'cache_key': cache_key,
+        'kind': kind,
+        'content_hash': content_hash,
+        'level': level,
+        'params': params,
+        'payload': payload,
+        'updated_at': datetime.utcnow().isoformat(),
+    }
     try:
-        query = supabase.table('reading_logs')\
-            .select('quiz_score, estimated_level')\
-            .eq('student_id', student_id)\
-            .not_.is_('quiz_score', 'null')\
-            .order('completed_at', desc=True)\
-            .limit(3)
-        
-        if course_id:
-            query = query.eq('course_id', course_id)
-        
-        result = query.execute()
-        logs = result.data if result.data else []
-        
-        if not logs:
-            return DEFAULT_LEVEL
-        
-        scores = [l['quiz_score'] for l in logs if l.get('quiz_score') is not None]
-        if not scores:
-            return DEFAULT_LEVEL
-        
-        avg_score = sum(scores) / len(scores)
-        current_level = logs[0].get('estimated_level', DEFAULT_LEVEL)
-        if current_level not in LEVELS:
-            current_level = DEFAULT_LEVEL
-        
-        current_idx = LEVELS.index(current_level)
-        
-        if avg_score >= 80 and current_idx < len(LEVELS) - 1:
-            return LEVELS[current_idx + 1]
-        elif avg_score < 50 and current_idx > 0:
-            return LEVELS[current_idx - 1]
+        result = supabase.table('generated_question_sets').upsert(
+            data, on_conflict='cache_key'
+        ).execute()
+        _get_generated_question_set_cached.clear()
+        return result.data[0] if result.data else None
+    except Exception:
+        return None
+
+
+# ============================================================
+# Word Knowledge (単語の詳細情報・練習問題の共有キャッシュ)
+# ============================================================
+
+def get_word_knowledge(knowledge_key: str) -> Optional[Dict]:
+    """保存済みの単語情報を取得。なければNone
+
+    見つかったものは utils.word_knowledge がキーごとにメモリに保持するので、ここではキャッシュしない
+    （未保存の結果をキャッシュすると、保存後もしばらく見つからないことになる）。
+    """
+    supabase = get_supabase_client()
+    try:
+        result = supabase.table('word_knowledge')\
+            .select('payload')\
+            .eq('knowledge_key', knowledge_key)\
+            .execute()
+        return result.data[0]['payload'] if result.data else None
+    except Exception:
+        return None
+
+
+def get_existing_word_knowledge_keys(knowledge_keys: List[str]) -> set:
+    """保存済みのキーだけを返す（事前生成のスキップ判定用）"""
+    supabase = get_supabase_client()
+    existing = set()
+    for i in range(0, len(knowledge_keys), _BULK_CHUNK):
+        chunk = knowledge_keys[i:i + _BULK_CHUNK]
+        result = supabase.table('word_knowledge')\
+            .select('knowledge_key')\
+            .in_('knowledge_key', chunk)\
+            .execute()
+        existing.update(r['knowledge_key'] for r in result.data or [])
+    return existing
+
+
+def save_word_knowledge(knowledge_key: str, kind: str, lemma: str, sense: str,
+                        payload: Dict) -> Optional[Dict]:
+    """単語情報を保存（同一キーは上書き）"""
+    supabase = get_supabase_client()
+    data = {
+        'knowledge_key': knowledge_key,
+        'kind': kind,
+        'lemma': lemma,
+        'sense': sense,
+        'payload': payload,
+        'updated_at': datetime.utcnow().isoformat(),
+    }
+    try:
+        result = supabase.table('word_knowledge').upsert(
+            data, on_conflict='knowledge_key'
+        ).execute()
+        return result.data[0] if result.data else None
+    except Exception:
+        return None
+
+
+# ============================================================
+# Generated Content (AI生成した記事・リスニング素材の共有ライブラリ)
+# ============================================================
+
+_GENERATED_CONTENT_COLUMNS = 'id, param_key, kind, topic, level, length_key, style, title, '\
+    'params, content, course_id, use_count, created_at, last_used_at'
+
+
+def get_generated_contents(param_key: str) -> List[Dict]:
+    """同じ生成パラメータの保存済みバリエーション（提供回数が変わるのでキャッシュしない）"""
+    supabase = get_supabase_client()
+    result = supabase.table('generated_content')\
+        .select(_GENERATED_CONTENT_COLUMNS)\
+        .eq('param_key', param_key)\
+        .order('created_at')\
+        .execute()
+    return result.data or []
+
+
+def mark_generated_content_served(content_id: str, expected_use_count: Optional[int]) -> Optional[Dict]:
+    """提供回数を1つ進める
+
+    expected_use_count が現在値と一致したときだけ更新するので、
+    同じバリエーションを同時に選んだ場合は片方が None を受け取り次の候補を選び直す。
+    None を渡すと現在値を読んでから更新する（回数の厳密さより提供を優先する場合）。
+    """
+    supabase = get_supabase_client()
+    if expected_use_count is None:
+        current = supabase.table('generated_content')\
+            .select('use_count').eq('id', content_id).execute()
+        if not current.data:
+            return None
+        expected_use_count = current.data[0].get('use_count') or 0
+    result = supabase.table('generated_content')\
+        .update({
+            'use_count': expected_use_count + 1,
+            'last_used_at': datetime.utcnow().isoformat(),
+        })\
+        .eq('id', content_id)\
+        .eq('use_count', expected_use_count)\
+        .execute()
+    return result.data[0] if result.data else None
+
+
+def save_generated_content(data: Dict) -> Optional[Dict]:
+    """生成した素材をライブラリに追加"""
+    supabase = get_supabase_client()
+    result = supabase.table('generated_content').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def get_viewed_generated_content_ids(user_id: str, param_key: str) -> Set[str]:
+    """同じ生成パラメータでこのユーザーに提供済みのバリエーションID"""
+    supabase = get_supabase_client()
+    result = supabase.table('generated_content_views')\
+        .select('content_id')\
+        .eq('user_id', user_id)\
+        .eq('param_key', param_key)\
+        .execute()
+    return {row['content_id'] for row in result.data or []}
+
+
+def record_generated_content_view(content_id: str, user_id: str, param_key: str) -> None:
+    """バリエーションをこのユーザーに提供したことを記録（同じ組み合わせは提供日時を更新）"""
+    supabase = get_supabase_client()
+    supabase.table('generated_content_views').upsert({
+        'content_id': content_id,
+        'user_id': user_id,
+        'param_key': param_key,
+        'served_at': datetime.utcnow().isoformat(),
+    }, on_conflict='content_id,user_id').execute()
+
+
+def search_generated_content(query: str, course_id: str, kind: str = None, level: str = None,
+                             limit: int = 20) -> List[Dict]:
+    """コースで生成した素材のタイトル・トピック・本文の全文検索。
+    語の区切りがない日本語のトピックは部分一致で探す"""
+    supabase = get_supabase_client()
+
+    def _filtered(q):
+        q = q.eq('course_id', course_id)
+        if kind:
+            q = q.eq('kind', kind)
+        if level:
+            q = q.eq('level', level)
+        return q
+
+    result = _filtered(supabase.table('generated_content').select(_GENERATED_CONTENT_COLUMNS))\
+        .text_search('search_tsv', query, options={'config': 'simple', 'type': 'web_search'})\
+        .order('use_count', desc=True)\
+        .limit(limit)\
+        .execute()
+    if result.data:
+        return result.data
+    pattern = f"%{query.replace('%', '').replace(',', ' ')}%"
+    result = _filtered(supabase.table('generated_content').select(_GENERATED_CONTENT_COLUMNS))\
+        .or_(f"topic.ilike.{pattern},title.ilike.{pattern}")\
+        .order('use_count', desc=True)\
+        .limit(limit)\
+        .execute()
+    return result.data or []
+
+
+def get_course_generated_content(course_id: str, kinds: List[str] = None,
+                                 page_size: int = 1000) -> List[Dict]:
+    """コースで生成した素材の一覧（本文なし・事前生成の候補集計用、ページングして全件）"""
+    supabase = get_supabase_client()
+    rows, start = [], 0
+    while True:
+        query = supabase.table('generated_content')\
+            .select('id, param_key, kind, topic, level, params, use_count')\
+            .eq('course_id', course_id)
+        if kinds:
+            query = query.in_('kind', kinds)
+        result = query.order('id').range(start, start + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+# ============================================================
+# YouTube Transcripts (字幕・分析結果の永続キャッシュ)
+# ============================================================
+
+def get_youtube_transcript_record(video_id: str) -> List[Dict]:
+    """動画の保存済み字幕を取得（取得方法ごとに1行）。なければ空リスト
+
+    未保存と取得失敗はキャッシュしない（事前生成のワーカーが別プロセスで保存するため）
+    """
+    try:
+        return _get_youtube_transcript_cached(video_id)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=3600)
+def _get_youtube_transcript_cached(video_id: str) -> List[Dict]:
+    supabase = get_supabase_client()
+    result = supabase.table('youtube_transcripts')\
+        .select('*')\
+        .eq('video_id', video_id)\
+        .execute()
+    if not result.data:
+        raise LookupError(video_id)
+    return result.data
+
+
+def save_youtube_transcript_record(video_id: str, method: str, language: str,
+                                   transcript: str, segments: Dict) -> Optional[Dict]:
+    """字幕を保存（video_id + method で上書き）"""
+    supabase = get_supabase_client()
+    data = {
+        'video_id': video_id,
+        'method': method,
+        'language': language,
+        'transcript': transcript,
+        'segments': segments,
+        'updated_at': datetime.utcnow().isoformat(),
+    }
+    try:
+        result = supabase.table('youtube_transcripts').upsert(
+            data, on_conflict='video_id,method'
+        ).execute()
+        _get_youtube_transcript_cached.clear()
+        return result.data[0] if result.data else None
+    except Exception:
+        return None
+
+
+def save_youtube_transcript_analysis(video_id: str, method: str,
+                                     analysis_key: str, result_data: Dict) -> bool:
+    """字幕に紐づく分析結果（analyses[analysis_key]）を保存。他のキーは保持する"""
+    supabase = get_supabase_client()
+    try:
+        result = supabase.table('youtube_transcripts')\
+            .select('analyses')\
+            .eq('video_id', video_id).eq('method', method)\
+            .execute()
+        if not result.data:
+            return False
+        analyses = result.data[0].get('analyses') or {}
+        analyses[analysis_key] = result_data
+        supabase.table('youtube_transcripts')\
+            .update({'analyses': analyses, 'updated_at': datetime.utcnow().isoformat()})\
+            .eq('video_id', video_id).eq('method', method)\
+            .execute()
+        _get_youtube_transcript_cached.clear()
+        return True
+    except Exception:
+        return False
+
+
+# ============================================================
+# Test Question Items (教員承認済みの検定対策問題)
+# ============================================================
+
+def get_approved_test_questions(course_id: str = None) -> List[Dict]:
+    """承認済みの検定対策問題（全コース共通 + 指定コース）。取得失敗はキャッシュせず空リスト"""
+    try:
+        return _get_approved_test_questions_cached(course_id)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=300)
+def _get_approved_test_questions_cached(course_id: str = None) -> List[Dict]:
+    supabase = get_supabase_client()
+    result = supabase.table('test_question_items')\
+        .select('item_id, test_type, section, sub_type, difficulty, payload, course_id')\
+        .eq('status', 'approved')\
+        .execute()
+    return [r for r in (result.data or []) if not r.get('course_id') or r['course_id'] == course_id]
+
+
+def save_test_question_item(item_id: str, test_type: str, section: str, payload: Dict,
+                            sub_type: str = 'general', difficulty: str = 'medium',
+                            status: str = 'approved', course_id: str = None,
+                            created_by: str = None) -> Optional[Dict]:
+    """検定対策問題を保存（同じ item_id は上書き）"""
+    supabase = get_supabase_client()
+    data = {
+        'item_id': item_id,
+        'test_type': test_type,
+        'section': section,
+        'sub_type': sub_type or 'general',
+        'difficulty': difficulty,
+        'status': status,
+        'payload': payload,
+        'course_id': course_id,
+        'created_by': created_by,
+        'updated_at': datetime.utcnow().isoformat(),
+    }
+    try:
+        result = supabase.table('test_question_items').upsert(
+            data, on_conflict='item_id'
+        ).execute()
+        _get_approved_test_questions_cached.clear()
+        return result.data[0] if result.data else None
+    except Exception:
+        return None
+
+
+def update_test_question_status(item_id: str, status: str) -> bool:
+    """検定対策問題のステータスを変更（approved / rejected など）"""
+    supabase = get_supabase_client()
+    try:
+        supabase.table('test_question_items')\
+            .update({'status': status, 'updated_at': datetime.utcnow().isoformat()})\
+            .eq('item_id', item_id)\
+            .execute()
+        _get_approved_test_questions_cached.clear()
+        return True
+    except Exception:
+        return False
+
+
+# ============================================================
+# Speaking Evaluation Jobs (スピーキング評価ジョブキュー)
+# ============================================================
+
+SPEAKING_AUDIO_BUCKET = 'speaking-submissions'
+
+
+def upload_speaking_audio(path: str, data: bytes, content_type: str = 'audio/wav') -> str:
+    """提出音声を Storage に保存してパスを返す（失敗時は例外）"""
+    supabase = get_supabase_client()
+    supabase.storage.from_(SPEAKING_AUDIO_BUCKET).upload(
+        path, data, {'content-type': content_type, 'upsert': 'true'}
+    )
+    return path
+
+
+def download_speaking_audio(path: str) -> bytes:
+    """Storage から提出音声を取得（失敗時は例外）"""
+    supabase = get_supabase_client()
+    return supabase.storage.from_(SPEAKING_AUDIO_BUCKET).download(path)
+
+
+def enqueue_speaking_eval_job(submission_id: str, student_id: str, audio_path: str,
+                              assignment_id: str = None, course_id: str = None,
+                              audio_name: str = None, reference_text: str = '',
+                              task_type: str = 'monologue', max_attempts: int = 3) -> Optional[Dict]:
+    """評価ジョブを積む"""
+    supabase = get_supabase_client()
+    data = {
+        'submission_id': submission_id,
+        'student_id': student_id,
+        'assignment_id': assignment_id,
+        'course_id': course_id,
+        'audio_path': audio_path,
+        'audio_name': audio_name,
+        'reference_text': reference_text or '',
+        'task_type': task_type,
+        'max_attempts': max_attempts,
+    }
+    result = supabase.table('speaking_eval_jobs').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def claim_speaking_eval_jobs(worker_id: str, limit: int = 1) -> List[Dict]:
+    """取得可能なジョブを古い順に最大 limit 件取得して running にする
+
+    status と attempts を条件にした更新で取得するので、複数ワーカーが同じジョブを取ることはない。
+    """
+    supabase = get_supabase_client()
+    now = datetime.utcnow().isoformat()
+    candidates = supabase.table('speaking_eval_jobs')\
+        .select('*')\
+        .eq('status', 'queued')\
+        .lte('available_at', now)\
+        .order('created_at')\
+        .limit(limit * 3)\
+        .execute()
+
+    claimed = []
+    for job in candidates.data or []:
+        if len(claimed) >= limit:
+            break
+        result = supabase.table('speaking_eval_jobs')\
+            .update({
+                'status': 'running',
+                'attempts': job['attempts'] + 1,
+                'locked_by': worker_id,
+                'locked_at': now,
+                'started_at': now,
+                'updated_at': now,
+            })\
+            .eq('id', job['id'])\
+            .eq('status', 'queued')\
+            .eq('attempts', job['attempts'])\
+            .execute()
+        if result.data:
+            claimed.append(result.data[0])
+    return claimed
+
+
+def complete_speaking_eval_job(job: Dict, result_data: Dict) -> bool:
+    """ジョブを完了にする
+
+    取得したときの running・attempts のままのときだけ更新する。リース切れで別のワーカーに
+    取り直された・失敗にされたジョブを遅れて終えたワーカーは False を受け取る。
+    """
+    supabase = get_supabase_client()
+    now = datetime.utcnow().isoformat()
+    result = supabase.table('speaking_eval_jobs')\
+        .update({'status': 'done', 'result': result_data, 'finished_at': now,
+                 'last_error': None, 'updated_at': now})\
+        .eq('id', job['id'])\
+        .eq('status', 'running')\
+        .eq('attempts', job.get('attempts', 1))\
+        .execute()
+    return bool(result.data)
+
+
+def renew_speaking_eval_job_lease(job: Dict) -> bool:
+    """リースを延長する（locked_at を更新）。まだこのワーカーが持っていれば True"""
+    supabase = get_supabase_client()
+    now = datetime.utcnow().isoformat()
+    result = supabase.table('speaking_eval_jobs')\
+        .update({'locked_at': now, 'updated_at': now})\
+        .eq('id', job['id'])\
+        .eq('status', 'running')\
+        .eq('attempts', job.get('attempts', 1))\
+        .execute()
+    return bool(result.data)
+
+
+def fail_speaking_eval_job(job: Dict, error: str, retry_delay_sec: int = 30) -> Optional[str]:
+    """ジョブの失敗を記録。再試行回数が残っていればバックオフしてキューに戻す
+
+    complete_speaking_eval_job と同じく、取得したときの running・attempts のときだけ更新する。
+    Returns: 更新後の status（'queued' / 'failed'）。リースを失っていれば None
+    """
+    supabase = get_supabase_client()
+    now = datetime.utcnow()
+    attempts = job.get('attempts', 1)
+    if attempts < job.get('max_attempts', 3):
+        delay = retry_delay_sec * (2 ** (attempts - 1))
+        updates = {'status': 'queued', 'available_at': (now + timedelta(seconds=delay)).isoformat(),
+                   'locked_by': None, 'locked_at': None}
+    else:
+        updates = {'status': 'failed', 'finished_at': now.isoformat()}
+    updates.update({'last_error': (error or '')[:1000], 'updated_at': now.isoformat()})
+    result = supabase.table('speaking_eval_jobs')\
+        .update(updates)\
+        .eq('id', job['id'])\
+        .eq('status', 'running')\
+        .eq('attempts', attempts)\
+        .execute()
+    return updates['status'] if result.data else None
+
+
+def requeue_stale_speaking_eval_jobs(lease_sec: int = 900) -> Dict[str, int]:
+    """リースが切れた running ジョブ（ワーカー停止など）をキューに戻す
+
+    再試行回数（attempts）が max_attempts に達したジョブは戻さず failed にする
+    （ワーカーを落とすジョブが延々と再実行されないように）。
+    Returns: {"requeued": 件数, "failed": 件数}
+    """
+    supabase = get_supabase_client()
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(seconds=lease_sec)).isoformat()
+    stale = supabase.table('speaking_eval_jobs')\
+        .select('id, attempts, max_attempts, locked_at')\
+        .eq('status', 'running')\
+        .lt('locked_at', cutoff)\
+        .execute()
+
+    counts = {"requeued": 0, "failed": 0}
+    for job in stale.data or []:
+        if job.get('attempts', 0) >= job.get('max_attempts', 3):
+            updates = {'status': 'failed', 'finished_at': now.isoformat(),
+                       'last_error': f"lease expired after {job.get('attempts', 0)} attempts"}
+            outcome = 'failed'
         else:
-            return current_level
-            
+            updates = {'status': 'queued', 'last_error': 'lease expired'}
+            outcome = 'requeued'
+        updates.update({'locked_by': None, 'locked_at': None, 'updated_at': now.isoformat()})
+        # その間に別のワーカーが処理を終えた・取り直した場合は触らない
+        result = supabase.table('speaking_eval_jobs')\
+            .update(updates)\
+            .eq('id', job['id'])\
+            .eq('status', 'running')\
+            .eq('locked_at', job['locked_at'])\
+            .execute()
+        if result.data:
+            counts[outcome] += 1
+    return counts
+
+
+def get_speaking_eval_jobs(student_id: str, assignment_id: str = None, limit: int = 10) -> List[Dict]:
+    """学生の評価ジョブを新しい順に取得（提出状況のポーリング用・キャッシュなし）"""
+    supabase = get_supabase_client()
+    try:
+        query = supabase.table('speaking_eval_jobs')\
+            .select('id, submission_id, assignment_id, status, attempts, max_attempts, '
+                    'last_error, result, created_at, started_at, finished_at')\
+            .eq('student_id', student_id)
+        if assignment_id:
+            query = query.eq('assignment_id', assignment_id)
+        result = query.order('created_at', desc=True).limit(limit).execute()
+        return result.data or []
+    except Exception:
+        return []
+
+
+def get_speaking_eval_job_rows(since: str) -> List[Dict]:
+    """キュー指標の集計用: 未完了のジョブと since 以降に終わったジョブ"""
+    supabase = get_supabase_client()
+    columns = 'status, attempts, created_at, started_at, finished_at'
+    active = supabase.table('speaking_eval_jobs')\
+        .select(columns)\
+        .in_('status', ['queued', 'running'])\
+        .execute()
+    finished = supabase.table('speaking_eval_jobs')\
+        .select(columns)\
+        .in_('status', ['done', 'failed'])\
+        .gte('finished_at', since)\
+        .execute()
+    return (active.data or []) + (finished.data or [])
+
+
+# ============================================================
+# Mock Tests (模擬テストの受験記録と問題統計)
+# ============================================================
+
+_BULK_CHUNK = 500
+
+
+def save_mock_test_attempt(data: Dict) -> Optional[Dict]:
+    """模擬テストの受験記録を保存"""
+    supabase = get_supabase_client()
+    result = supabase.table('mock_test_attempts').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def save_mock_test_responses(rows: List[Dict]) -> int:
+    """模擬テストの回答をまとめて保存（500件ずつ insert）"""
+    supabase = get_supabase_client()
+    for start in range(0, len(rows), _BULK_CHUNK):
+        supabase.table('mock_test_responses').insert(rows[start:start + _BULK_CHUNK]).execute()
+    return len(rows)
+
+
+def get_mock_test_responses(course_id: str = None, page_size: int = 1000) -> List[Dict]:
+    """問題統計の再計算用: コースの全回答（ページングして全件）"""
+    supabase = get_supabase_client()
+    rows, start = [], 0
+    while True:
+        query = supabase.table('mock_test_responses')\
+            .select('attempt_id, item_id, correct, ability')
+        query = query.eq('course_id', course_id) if course_id else query.is_('course_id', 'null')
+        result = query.order('id').range(start, start + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def get_mock_test_attempts(student_id: str, test_type: str = None, limit: int = 20) -> List[Dict]:
+    """学生の模擬テスト受験記録（新しい順）"""
+    supabase = get_supabase_client()
+    try:
+        query = supabase.table('mock_test_attempts')\
+            .select('*')\
+            .eq('student_id', student_id)
+        if test_type:
+            query = query.eq('test_type', test_type)
+        result = query.order('created_at', desc=True).limit(limit).execute()
+        return result.data or []
+    except Exception:
+        return []
+
+
+def get_item_stats(course_id: str = None) -> Dict[str, Dict]:
+    """問題統計 {item_id: row}。取得失敗はキャッシュせず空"""
+    try:
+        return _get_item_stats_cached(course_id or '')
+    except Exception:
+        return {}
+
+@st.cache_data(ttl=300)
+def _get_item_stats_cached(course_id: str) -> Dict[str, Dict]:
+    supabase = get_supabase_client()
+    result = supabase.table('test_item_stats')\
+        .select('*')\
+        .eq('course_id', course_id)\
+        .execute()
+    return {r['item_id']: r for r in (result.data or [])}
+
+
+def upsert_item_stats(rows: List[Dict]) -> int:
+    """問題統計をまとめて保存（同じ course_id, item_id は上書き）"""
+    if not rows:
+        return 0
+    supabase = get_supabase_client()
+    now = datetime.utcnow().isoformat()
+    rows = [{**r, 'updated_at': now} for r in rows]
+    for start in range(0, len(rows), _BULK_CHUNK):
+        supabase.table('test_item_stats').upsert(
+            rows[start:start + _BULK_CHUNK], on_conflict='course_id,item_id'
+        ).execute()
+    _get_item_stats_cached.clear()
+    return len(rows)
+
+
+# ============================================================
+# Exam Practice Logs (検定対策の練習記録・スコア予測用)
+# ============================================================
+
+def log_exam_practice(student_id: str, exam_type: str, section: str, score: float,
+                      course_id: str = None, **kwargs) -> Optional[Dict]:
+    """検定対策の練習結果を記録（score は正答率 0-100）"""
+    supabase = get_supabase_client()
+    data = {
+        'student_id': student_id,
+        'course_id': course_id,
+        'exam_type': exam_type,
+        'section': section,
+        'score': score,
+        'practiced_at': datetime.utcnow().isoformat(),
+        **kwargs
+    }
+    result = supabase.table('exam_practice_logs').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def get_prediction_logs(student_ids: List[str], course_id: str = None, since: str = None,
+                        page_size: int = 1000) -> List[Dict]:
+    """スコア予測用: exam_practice_logs と practice_logs のスコア付きログ（ページングして全件）
+
+    exam_practice_logs はコースを持たない古い行もあるので学生IDで、
+    practice_logs は course_id があればコースで絞り込む。
+    since の時刻を含めて (practiced_at, id) の順に読み、次のページは前のページの最後の
+    (practiced_at, id) より後から読む（オフセットではないので、読んでいる間に行が増えても
+    ページ境界の行を読み飛ばしたり二重に読んだりしない）。
+    Returns: [{id, student_id, score, practiced_at, source, module_type}]
+    """
+    if not student_ids:
+        return []
+    supabase = get_supabase_client()
+
+    def exam_query():
+        return supabase.table('exam_practice_logs')\
+            .select('id, student_id, score, practiced_at')\
+            .in_('student_id', student_ids)\
+            .not_.is_('score', 'null')\
+            .not_.is_('practiced_at', 'null')
+
+    def practice_query():
+        query = supabase.table('practice_logs')\
+            .select('id, student_id, score, practiced_at, module_type')\
+            .not_.is_('score', 'null')\
+            .not_.is_('practiced_at', 'null')
+        return query.eq('course_id', course_id) if course_id else query.in_('student_id', student_ids)
+
+    rows = []
+    for make_query, extra in ((exam_query, {'source': 'exam_practice_logs', 'module_type': 'exam_practice'}),
+                              (practice_query, {'source': 'practice_logs'})):
+        last = None
+        while True:
+            query = make_query()
+            if last:
+                # 時刻の ":" や "+" が区切りと誤解されないよう値は引用符で囲む
+                query = query.or_(f'practiced_at.gt."{last["practiced_at"]}",'
+                                  f'and(practiced_at.eq."{last["practiced_at"]}",id.gt.{last["id"]})')
+            elif since:
+                query = query.gte('practiced_at', since)
+            result = query.order('practiced_at').order('id').limit(page_size).execute()
+            page = result.data or []
+            rows.extend({**r, **extra} for r in page)
+            if len(page) < page_size:
+                break
+            last = page[-1]
+    return rows
+
+
+def get_student_reading_level(student_id: str, course_id: str = None) -> str:
+    """学生のリーディングレベル（utils.level_estimator の推定値。記録がなければ B1）
+
+    クイズスコアは記録時に教材レベル ± 1（80%以上で1つ上・50%未満で1つ下）として
+    指数加重平均に反映済みなので、ここではログを読まない。
+    """
+    try:
+        from utils.level_estimator import get_level
+        return get_level(student_id, "reading", course_id, default="B1")
     except Exception as e:
         print(f"[database] get_student_reading_level error: {e}")
-        return DEFAULT_LEVEL
+        return "B1"
+
+
+# ============================================================
+# Student Skill Levels (技能別の推定レベル)
+# ============================================================
+
+def get_student_skill_levels(student_id: str, course_id: str = '') -> List[Dict]:
+    """学生の技能別推定レベル（course_id = '' は全コース通算）"""
+    supabase = get_supabase_client()
+    result = supabase.table('student_skill_levels')\
+        .select('skill, ewma, count, last_score, level, updated_at')\
+        .eq('student_id', student_id)\
+        .eq('course_id', course_id)\
+        .execute()
+    return result.data or []
+
+
+def get_course_skill_levels(course_id: str, student_ids: List[str] = None) -> List[Dict]:
+    """コース全員の技能別推定レベル（教員ダッシュボード用・1クエリ）"""
+    supabase = get_supabase_client()
+    query = supabase.table('student_skill_levels')\
+        .select('student_id, skill, ewma, count, last_score, level, updated_at')\
+        .eq('course_id', course_id)
+    if student_ids:
+        query = query.in_('student_id', student_ids)
+    return query.execute().data or []
+
+
+def upsert_student_skill_levels(rows: List[Dict]) -> int:
+    """技能別推定レベルをまとめて保存（同じ student_id, course_id, skill は上書き）"""
+    if not rows:
+        return 0
+    supabase = get_supabase_client()
+    for start in range(0, len(rows), _BULK_CHUNK):
+        supabase.table('student_skill_levels').upsert(
+            rows[start:start + _BULK_CHUNK], on_conflict='student_id,course_id,skill'
+        ).execute()
+    return len(rows)
+
+
+def update_student_skill_level(row: Dict, expected_count: int) -> bool:
+    """技能別推定レベル1行を、保存済みの件数が expected_count のときだけ更新する
+
+    別のプロセスが先に更新していたら False（読み直してやり直す）。
+    """
+    supabase = get_supabase_client()
+    result = supabase.table('student_skill_levels')\
+        .update({k: v for k, v in row.items() if k not in ('student_id', 'course_id', 'skill')})\
+        .eq('student_id', row['student_id'])\
+        .eq('course_id', row['course_id'])\
+        .eq('skill', row['skill'])\
+        .eq('count', expected_count)\
+        .execute()
+    return bool(result.data)
+
+
+def insert_student_skill_level(row: Dict) -> bool:
+    """技能別推定レベル1行を新規作成する（同じキーの行が先にできていたら False）"""
+    supabase = get_supabase_client()
+    try:
+        result = supabase.table('student_skill_levels').insert(row).execute()
+        return bool(result.data)
+    except Exception:
+        return False
+
+
+def get_practice_logs_for_levels(course_id: str = None, page_size: int = 1000) -> List[Dict]:
+    """推定レベルの再計算用: スコア付きの練習ログを古い順に全件（ページングして取得）"""
+    supabase = get_supabase_client()
+    rows, start = [], 0
+    while True:
+        query = supabase.table('practice_logs')\
+            .select('student_id, course_id, module_type, score, activity_details, practiced_at')\
+            .not_.is_('score', 'null')
+        if course_id:
+            query = query.eq('course_id', course_id)
+        result = query.order('practiced_at').order('id').range(start, start + page_size - 1).execute()
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
 
 
 def get_extracurricular_score_for_course(course_id: str) -> dict:
@@ -2195,3 +3052,201 @@ def get_extracurricular_score_for_course(course_id: str) -> dict:
         }
     except Exception:
         return {}
+
+
+# ============================================================
+# Messaging (ダイレクトメッセージ・お知らせ・質問掲示板)
+# ============================================================
+# 一覧は (created_at, id) の降順で、カーソル "created_at|id" より古いものを limit 件ずつ返す。
+# 未読数は messages のトリガーが message_counters に増減するので、主キー1回の参照で済む。
+
+def _before_cursor(query, cursor: Optional[str]):
+    """カーソルより古い行に絞る（同じ時刻の行は id で区切る）"""
+    if not cursor:
+        return query
+    created_at, _, row_id = cursor.partition('|')
+    # 時刻の ":" や "+" が区切りと誤解されないよう値は引用符で囲む
+    return query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})')
+
+
+def _page(query, cursor: Optional[str], limit: int) -> Dict:
+    """{"items": [...], "next_cursor": 次のページのカーソル（最後なら None）}"""
+    result = _before_cursor(query, cursor)\
+        .order('created_at', desc=True)\
+        .order('id', desc=True)\
+        .limit(limit + 1)\
+        .execute()
+    rows = result.data or []
+    items = rows[:limit]
+    next_cursor = f"{items[-1]['created_at']}|{items[-1]['id']}" if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def insert_messages(rows: List[Dict]) -> List[Dict]:
+    """メッセージをまとめて保存（500件ずつ insert）"""
+    supabase = get_supabase_client()
+    saved = []
+    for start in range(0, len(rows), _BULK_CHUNK):
+        result = supabase.table('messages').insert(rows[start:start + _BULK_CHUNK]).execute()
+        saved.extend(result.data or [])
+    return saved
+
+
+def get_unread_message_count(user_id: str) -> int:
+    """未読数（message_counters の1行）"""
+    supabase = get_supabase_client()
+    result = supabase.table('message_counters')\
+        .select('unread_count')\
+        .eq('user_id', user_id)\
+        .execute()
+    return result.data[0]['unread_count'] if result.data else 0
+
+
+def get_inbox_page(user_id: str, cursor: str = None, limit: int = 20, kind: str = None) -> Dict:
+    """受信箱の1ページ（recipient_id, created_at のインデックスを使う）"""
+    supabase = get_supabase_client()
+    query = supabase.table('messages').select('*').eq('recipient_id', user_id)
+    if kind:
+        query = query.eq('kind', kind)
+    return _page(query, cursor, limit)
+
+
+def get_sent_messages_page(user_id: str, cursor: str = None, limit: int = 20) -> Dict:
+    """送信済みダイレクトメッセージの1ページ"""
+    supabase = get_supabase_client()
+    query = supabase.table('messages').select('*')\
+        .eq('sender_id', user_id)\
+        .eq('kind', 'direct')
+    return _page(query, cursor, limit)
+
+
+def get_message_thread_page(thread_id: str, cursor: str = None, limit: int = 20) -> Dict:
+    """スレッド（最初のメッセージと返信）の1ページ（新しい順）"""
+    supabase = get_supabase_client()
+    query = supabase.table('messages').select('*')\
+        .or_(f"id.eq.{thread_id},thread_id.eq.{thread_id}")
+    return _page(query, cursor, limit)
+
+
+def mark_messages_read(user_id: str, message_ids: List[str] = None) -> int:
+    """自分宛の未読を既読にする（message_ids 省略時はすべて）"""
+    supabase = get_supabase_client()
+    query = supabase.table('messages')\
+        .update({'read_at': datetime.utcnow().isoformat()})\
+        .eq('recipient_id', user_id)\
+        .is_('read_at', 'null')
+    if message_ids is not None:
+        if not message_ids:
+            return 0
+        query = query.in_('id', message_ids)
+    result = query.execute()
+    return len(result.data or [])
+
+
+def create_announcement(data: Dict) -> Optional[Dict]:
+    """お知らせ本体を保存（受信者ごとの行は insert_messages で作る）"""
+    supabase = get_supabase_client()
+    result = supabase.table('announcements').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def get_course_announcements_page(course_id: str, cursor: str = None, limit: int = 20) -> Dict:
+    """コースのお知らせの1ページ"""
+    supabase = get_supabase_client()
+    query = supabase.table('announcements').select('*').eq('course_id', course_id)
+    return _page(query, cursor, limit)
+
+
+def create_board_post(data: Dict) -> Optional[Dict]:
+    """質問掲示板に質問または回答（parent_id あり）を保存"""
+    supabase = get_supabase_client()
+    result = supabase.table('board_posts').insert(data).execute()
+    return result.data[0] if result.data else None
+
+
+def get_board_questions_page(course_id: str, cursor: str = None, limit: int = 20,
+                             tag: str = None) -> Dict:
+    """コースの質問（回答を除く）の1ページ"""
+    supabase = get_supabase_client()
+    query = supabase.table('board_posts').select('*')\
+        .eq('course_id', course_id)\
+        .is_('parent_id', 'null')
+    if tag:
+        query = query.contains('tags', [tag])
+    return _page(query, cursor, limit)
+
+
+def get_board_replies(question_ids: List[str]) -> List[Dict]:
+    """複数の質問の回答をまとめて取得（古い順）"""
+    if not question_ids:
+        return []
+    supabase = get_supabase_client()
+    result = supabase.table('board_posts').select('*')\
+        .in_('parent_id', question_ids)\
+        .order('created_at')\
+        .execute()
+    return result.data or []
+
+
+def increment_board_upvotes(post_id: str, expected_upvotes: int) -> Optional[Dict]:
+    """いいね数を1つ増やす（現在値が expected_upvotes のときだけ。競合したら None）"""
+    supabase = get_supabase_client()
+    result = supabase.table('board_posts')\
+        .update({'upvotes': expected_upvotes + 1})\
+        .eq('id', post_id)\
+        .eq('upvotes', expected_upvotes)\
+        .execute()
+    return result.data[0] if result.data else None
+
+
+# ============================================================
+# Notifications (新着通知)
+# ============================================================
+# notification_versions.version はトリガーが通知の追加・既読のたびに進める。
+# サイドバーは version だけを見て、変わったときに未読を読み直す。
+
+def insert_notifications(rows: List[Dict]) -> List[Dict]:
+    """通知をまとめて保存（500件ずつ insert）"""
+    supabase = get_supabase_client()
+    saved = []
+    for start in range(0, len(rows), _BULK_CHUNK):
+        result = supabase.table('notifications').insert(rows[start:start + _BULK_CHUNK]).execute()
+        saved.extend(result.data or [])
+    return saved
+
+
+def get_notification_version(user_id: str) -> int:
+    """通知の version（notification_versions の1行）"""
+    supabase = get_supabase_client()
+    result = supabase.table('notification_versions')\
+        .select('version')\
+        .eq('user_id', user_id)\
+        .execute()
+    return result.data[0]['version'] if result.data else 0
+
+
+def get_unread_notifications(user_id: str, limit: int = 10) -> List[Dict]:
+    """未読の通知（新しい順）"""
+    supabase = get_supabase_client()
+    result = supabase.table('notifications').select('*')\
+        .eq('user_id', user_id)\
+        .is_('read_at', 'null')\
+        .order('created_at', desc=True)\
+        .limit(limit)\
+        .execute()
+    return result.data or []
+
+
+def mark_notifications_read(user_id: str, notification_ids: List[str] = None) -> int:
+    """未読の通知を既読にする（notification_ids 省略時はすべて）"""
+    supabase = get_supabase_client()
+    query = supabase.table('notifications')\
+        .update({'read_at': datetime.utcnow().isoformat()})\
+        .eq('user_id', user_id)\
+        .is_('read_at', 'null')
+    if notification_ids is not None:
+        if not notification_ids:
+            return 0
+        query = query.in_('id', notification_ids)
+    result = query.execute()
+    return len(result.data or [])
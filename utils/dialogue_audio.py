@@ -0,0 +1,135 @@
+"""
+Dialogue Audio Renderer
+=======================
+会話スクリプトの全行を並列に音声合成し、1本のMP3に組み立てる。
+
+- 行ごとの合成はスレッドプールで同時に実行（プロバイダごとに同時実行数を制限）
+- 同じ「声 + テキスト」の音声はプロセス内で再利用
+- 行の順番どおりに結合し、同じ話者の続き / 話者交代で別々の無音を挟む
+
+使い方:
+    from utils.dialogue_audio import render_dialogue
+    audio = render_dialogue(parse_dialogue(script), {"A": "nova", "B": "echo"})
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from utils.mp3_stream import assemble_mp3
+
+
+# プロバイダごとの同時実行数
+PROVIDER_LIMITS = {"edge": 20, "openai": 4}
+MAX_WORKERS = 20
+
+# 行間の無音（ms）
+SAME_SPEAKER_GAP_MS = 250
+SPEAKER_CHANGE_GAP_MS = 600
+
+MAX_CACHED_LINES = 512
+
+_provider_semaphores = {name: threading.BoundedSemaphore(n) for name, n in PROVIDER_LIMITS.items()}
+
+
+# ============================================================
+# 行単位の音声キャッシュ
+# ============================================================
+
+class _LineCache:
+    def __init__(self, max_entries: int):
+        self._max = max_entries
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._data.get(key)
+            if audio is not None:
+                self._data.move_to_end(key)
+            return audio
+
+    def set(self, key: str, audio: bytes):
+        with self._lock:
+            self._data[key] = audio
+            self._data.move_to_end(key)
+            while len(self._data) > self._max:
+                self._data.popitem(last=False)
+
+
+_line_cache = _LineCache(MAX_CACHED_LINES)
+
+
+def _line_key(text: str, voice: str) -> str:
+    return hashlib.sha256(f"{voice}\n{text}".encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# 1行の合成
+# ============================================================
+
+def synthesize_line(text: str, voice: str = "alloy") -> Optional[bytes]:
+    """1行を合成（Edge TTS優先 → OpenAI TTS）。プロバイダごとの同時実行数を守る"""
+    key = _line_key(text, voice)
+    cached = _line_cache.get(key)
+    if cached is not None:
+        return cached
+
+    from utils.listening import EDGE_VOICE_MAP, _generate_edge_tts_direct
+
+    audio = None
+    with _provider_semaphores["edge"]:
+        try:
+            audio = _generate_edge_tts_direct(text, EDGE_VOICE_MAP.get(voice, "en-US-JennyNeural"))
+        except Exception:
+            audio = None
+
+    if not audio:
+        from utils.openai_gateway import synthesize_speech
+        with _provider_semaphores["openai"]:
+            try:
+                audio = synthesize_speech("dialogue_audio.synthesize_line", text, voice=voice)
+            except Exception:
+                audio = None
+
+    if audio:
+        _line_cache.set(key, audio)
+    return audio
+
+
+# ============================================================
+# 会話全体
+# ============================================================
+
+def _gaps(lines: List[Dict], same_speaker_gap_ms: int, speaker_change_gap_ms: int) -> List[int]:
+    return [
+        same_speaker_gap_ms if a["speaker"] == b["speaker"] else speaker_change_gap_ms
+        for a, b in zip(lines, lines[1:])
+    ]
+
+
+def render_dialogue(lines: List[Dict], voice_mapping: Dict[str, str],
+                    same_speaker_gap_ms: int = SAME_SPEAKER_GAP_MS,
+                    speaker_change_gap_ms: int = SPEAKER_CHANGE_GAP_MS,
+                    max_workers: int = MAX_WORKERS) -> Optional[bytes]:
+    """parse_dialogue の結果を並列に合成して1本のMP3にする
+
+    合成に失敗した行は飛ばす（全行失敗ならNone）。
+    """
+    if not lines:
+        return None
+    default_voice = voice_mapping.get("default", "alloy")
+    voices = [voice_mapping.get(line["speaker"], default_voice) for line in lines]
+
+    from utils.openai_gateway import bind_current_user
+    # 合成の API 使用量は呼び出し元のユーザーに記録する
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(lines)))) as executor:
+        audios = list(executor.map(bind_current_user(synthesize_line), [l["text"] for l in lines], voices))
+
+    rendered = [(line, audio) for line, audio in zip(lines, audios) if audio]
+    if not rendered:
+        return None
+    gaps = _gaps([line for line, _ in rendered], same_speaker_gap_ms, speaker_change_gap_ms)
+    return assemble_mp3([audio for _, audio in rendered], gaps)
@@ -0,0 +1,311 @@
+"""
+Dictation Scoring
+=================
+ディクテーションのローカル採点エンジン（APIを使わない決定的な採点）。
+
+1. 正規化・トークン化（小文字化、記号除去、数字・短縮形はそのまま）
+2. 単語単位の編集距離アラインメント
+   - 綴りが近い置換（文字単位の編集距離で判定）→ spelling
+   - 綴りが遠い置換 → wrong_word
+   - 正解側にしかない語 → missing_word / 入力側にしかない語 → extra_word
+   - 抜けた語と余分な語が同じ単語なら → word_order
+3. check_dictation と同じ JSON 形式で結果を返す
+
+使い方:
+    from utils.dictation_scoring import score_dictation
+    result = score_dictation("The cat sat on the mat.", "the cat sat in mat")
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+
+# 綴り誤りとみなす文字単位の類似度（1 - 編集距離/長い方の長さ）
+SPELLING_SIMILARITY = 0.5
+
+# 減点の重み（正解語数あたり）
+ERROR_WEIGHTS = {
+    "spelling": 0.5,
+    "word_order": 0.5,
+    "wrong_word": 1.0,
+    "missing_word": 1.0,
+    "extra_word": 0.5,
+}
+
+_QUOTES = str.maketrans({"’": "'", "‘": "'", "`": "'", "“": '"', "”": '"', "–": "-", "—": "-"})
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# 1語でも2語でも書ける表記は分割して比較する
+_SPLIT_FORMS = {"cannot": "can not"}
+
+
+# ============================================================
+# 正規化・トークン化
+# ============================================================
+
+def normalize_text(text: str) -> str:
+    """比較用に正規化（小文字・引用符統一・ハイフンは空白扱い）"""
+    text = unicodedata.normalize("NFKC", text or "").translate(_QUOTES).lower()
+    return text.replace("-", " ")
+
+
+def tokenize(text: str) -> List[Tuple[str, str]]:
+    """(正規化済みトークン, 元の表記) のリスト"""
+    tokens = []
+    for raw in (text or "").split():
+        for m in _TOKEN_RE.finditer(normalize_text(raw)):
+            for part in _SPLIT_FORMS.get(m.group(0), m.group(0)).split():
+                tokens.append((part, raw.strip(".,!?;:\"()[]")))
+    return tokens
+
+
+# ============================================================
+# アラインメント
+# ============================================================
+
+def char_distance(a: str, b: str) -> int:
+    """文字単位のレーベンシュタイン距離"""
+    if len(a) < len(b):
+        a, b = b, a
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return prev[-1]
+
+
+def char_similarity(a: str, b: str) -> float:
+    if not a and not b:
+        return 1.0
+    return 1.0 - char_distance(a, b) / max(len(a), len(b))
+
+
+@lru_cache(maxsize=65536)
+def _sub_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    return 0.6 if char_similarity(a, b) >= SPELLING_SIMILARITY else 1.0
+
+
+def align_words(ref: List[str], hyp: List[str]) -> List[Tuple[str, Optional[int], Optional[int]]]:
+    """単語列の編集距離アラインメント
+
+    Returns:
+        [(op, ref_index, hyp_index)]  op は match / sub / del / ins
+    """
+    n, m = len(ref), len(hyp)
+    dp = [[0.0] * (m + 1) for _ in range(n + 1)]
+    for i in range(1, n + 1):
+        dp[i][0] = float(i)
+    for j in range(1, m + 1):
+        dp[0][j] = float(j)
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            dp[i][j] = min(
+                dp[i - 1][j - 1] + _sub_cost(ref[i - 1], hyp[j - 1]),
+                dp[i - 1][j] + 1.0,
+                dp[i][j - 1] + 1.0,
+            )
+
+    ops = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and dp[i][j] == dp[i - 1][j - 1] + _sub_cost(ref[i - 1], hyp[j - 1]):
+            ops.append(("match" if ref[i - 1] == hyp[j - 1] else "sub", i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif i > 0 and dp[i][j] == dp[i - 1][j] + 1.0:
+            ops.append(("del", i - 1, None))
+            i -= 1
+        else:
+            ops.append(("ins", None, j - 1))
+            j -= 1
+    ops.reverse()
+    return ops
+
+
+def find_reference_window(reference: str, user_text: str) -> str:
+    """長い字幕の中から入力に最も近い区間を探す（両端の読み飛ばしは無料の半大域アラインメント）"""
+    ref_tokens = tokenize(reference)
+    hyp = [t for t, _ in tokenize(user_text)]
+    if not ref_tokens or not hyp:
+        return ""
+    ref = [t for t, _ in ref_tokens]
+    n, m = len(ref), len(hyp)
+
+    # 列方向に1本ずつ更新（メモリ O(m)）。start[j] は現在の整列が始まった字幕位置
+    prev = [float(j) for j in range(m + 1)]
+    prev_start = [0] * (m + 1)
+    best_cost, best_end, best_start = prev[m], 0, 0
+    for i in range(1, n + 1):
+        cur = [0.0] * (m + 1)
+        cur_start = [i] * (m + 1)
+        for j in range(1, m + 1):
+            diag = prev[j - 1] + _sub_cost(ref[i - 1], hyp[j - 1])
+            up = prev[j] + 1.0
+            left = cur[j - 1] + 1.0
+            if diag <= up and diag <= left:
+                cur[j], cur_start[j] = diag, prev_start[j - 1]
+            elif up <= left:
+                cur[j], cur_start[j] = up, prev_start[j]
+            else:
+                cur[j], cur_start[j] = left, cur_start[j - 1]
+        if cur[m] < best_cost:
+            best_cost, best_end, best_start = cur[m], i, cur_start[m]
+        prev, prev_start = cur, cur_start
+
+    return " ".join(orig for _, orig in ref_tokens[best_start:best_end])
+
+
+# ============================================================
+# 誤りの分類
+# ============================================================
+
+def _classify(ref_tokens, hyp_tokens, ops) -> List[Dict]:
+    errors = []
+    for pos, (op, i, j) in enumerate(ops):
+        if op == "sub":
+            a, b = ref_tokens[i][0], hyp_tokens[j][0]
+            kind = "spelling" if char_similarity(a, b) >= SPELLING_SIMILARITY else "wrong_word"
+            errors.append({"type": kind, "ref": [i], "hyp": [j], "pos": pos,
+                           "char_edits": char_distance(a, b)})
+        elif op == "del":
+            errors.append({"type": "missing_word", "ref": [i], "hyp": [], "pos": pos})
+        elif op == "ins":
+            errors.append({"type": "extra_word", "ref": [], "hyp": [j], "pos": pos})
+
+    # 隣り合う2語の入れ替え（置換2つとして整列される）→ 語順の誤り
+    used = set()
+    moved = []
+    for k in range(len(errors) - 1):
+        a, b = errors[k], errors[k + 1]
+        if k in used or a["pos"] + 1 != b["pos"] or not (a["ref"] and a["hyp"] and b["ref"] and b["hyp"]):
+            continue
+        if (ref_tokens[a["ref"][0]][0] == hyp_tokens[b["hyp"][0]][0]
+                and ref_tokens[b["ref"][0]][0] == hyp_tokens[a["hyp"][0]][0]):
+            used.update((k, k + 1))
+            moved.append({"type": "word_order", "ref": a["ref"] + b["ref"],
+                          "hyp": a["hyp"] + b["hyp"], "pos": a["pos"]})
+
+    # 抜けた語と余分な語が同じ単語 → 語順の誤り
+    for a_idx, a in enumerate(errors):
+        if a["type"] != "missing_word" or a_idx in used:
+            continue
+        word = ref_tokens[a["ref"][0]][0]
+        for b_idx, b in enumerate(errors):
+            if b_idx in used or b["type"] != "extra_word" or hyp_tokens[b["hyp"][0]][0] != word:
+                continue
+            used.update((a_idx, b_idx))
+            moved.append({"type": "word_order", "ref": a["ref"], "hyp": b["hyp"], "pos": a["pos"]})
+            break
+    errors = sorted([e for k, e in enumerate(errors) if k not in used] + moved, key=lambda e: e["pos"])
+
+    # 連続する抜け・余分は1件にまとめる
+    merged = []
+    for e in errors:
+        last = merged[-1] if merged else None
+        if last and e["type"] == last["type"] == "missing_word" and e["ref"][0] == last["ref"][-1] + 1:
+            last["ref"].append(e["ref"][0])
+        elif last and e["type"] == last["type"] == "extra_word" and e["hyp"][0] == last["hyp"][-1] + 1:
+            last["hyp"].append(e["hyp"][0])
+        else:
+            merged.append(e)
+    return merged
+
+
+def _word_order_span(ref_tokens, hyp_tokens, e) -> Tuple[str, str]:
+    """語順の誤りは移動した語の前後1語を含めて表示する"""
+    if len(e["ref"]) > 1:
+        return (" ".join(hyp_tokens[j][1] for j in e["hyp"]),
+                " ".join(ref_tokens[i][1] for i in e["ref"]))
+    r, h = e["ref"][0], e["hyp"][0]
+    should_be = " ".join(o for _, o in ref_tokens[max(r - 1, 0):r + 2])
+    user_wrote = " ".join(o for _, o in hyp_tokens[max(h - 1, 0):h + 2])
+    return user_wrote, should_be
+
+
+def _feedback(accuracy: int, counts: Dict[str, int]) -> Tuple[str, str]:
+    if accuracy == 100:
+        return "Perfect! Every word is correct. / 完璧です！", "次はスピードを上げて挑戦してみましょう。"
+    if accuracy >= 80:
+        feedback = "Great job! Just a few small mistakes. / よくできました！あと少しです。"
+    elif accuracy >= 50:
+        feedback = "Good effort! Keep listening carefully. / いい調子です。もう一度よく聞いてみましょう。"
+    else:
+        feedback = "Keep going! Try listening in shorter chunks. / 短く区切って聞いてみましょう。"
+
+    tips = []
+    if counts.get("missing_word"):
+        tips.append("聞き取れなかった語があります。冠詞・前置詞など弱く発音される語に注意しましょう。")
+    if counts.get("spelling"):
+        tips.append("綴りの誤りがあります。聞き取れた単語の綴りを確認しましょう。")
+    if counts.get("wrong_word"):
+        tips.append("似た音の別の単語と聞き間違えています。文脈から意味を考えてみましょう。")
+    if counts.get("extra_word"):
+        tips.append("元の文にない語が入っています。聞こえた音だけを書きましょう。")
+    if counts.get("word_order"):
+        tips.append("語順が入れ替わっています。文の構造を意識して聞きましょう。")
+    return feedback, " ".join(tips)
+
+
+# ============================================================
+# 採点
+# ============================================================
+
+def score_dictation(original: str, user_input: str) -> Dict:
+    """ディクテーションを採点（check_dictation と同じ形式）
+
+    Returns:
+        {"success", "accuracy_percentage", "correct_parts", "errors",
+         "feedback", "tips", "scoring": "local"}
+    """
+    ref_tokens = tokenize(original)
+    hyp_tokens = tokenize(user_input)
+    ops = align_words([t for t, _ in ref_tokens], [t for t, _ in hyp_tokens])
+    classified = _classify(ref_tokens, hyp_tokens, ops)
+
+    errors = []
+    counts: Dict[str, int] = {}
+    penalty = 0.0
+    for e in classified:
+        if e["type"] == "word_order":
+            user_wrote, should_be = _word_order_span(ref_tokens, hyp_tokens, e)
+        else:
+            user_wrote = " ".join(hyp_tokens[j][1] for j in e["hyp"])
+            should_be = " ".join(ref_tokens[i][1] for i in e["ref"])
+        error = {"user_wrote": user_wrote, "should_be": should_be, "error_type": e["type"]}
+        if "char_edits" in e:
+            error["char_edits"] = e["char_edits"]
+        errors.append(error)
+        counts[e["type"]] = counts.get(e["type"], 0) + 1
+        penalty += ERROR_WEIGHTS[e["type"]] * max(len(e["ref"]), len(e["hyp"]), 1)
+
+    if ref_tokens:
+        accuracy = max(0, min(100, round(100 * (1 - penalty / len(ref_tokens)))))
+    else:
+        accuracy = 100 if not hyp_tokens else 0
+
+    # 連続して正しく書けた部分
+    correct_parts, run = [], []
+    for op, i, _ in ops:
+        if op == "match":
+            run.append(ref_tokens[i][1])
+        elif run:
+            correct_parts.append(" ".join(run))
+            run = []
+    if run:
+        correct_parts.append(" ".join(run))
+
+    feedback, tips = _feedback(accuracy, counts)
+    return {
+        "success": True,
+        "accuracy_percentage": accuracy,
+        "correct_parts": correct_parts,
+        "errors": errors,
+        "feedback": feedback,
+        "tips": tips,
+        "scoring": "local",
+    }
@@ -0,0 +1,239 @@
+"""
+Distractors
+===========
+単語クイズの誤答選択肢（ディストラクタ）を単語リストごとに事前計算する。
+
+- 各単語について、紛らわしい候補を上位 TOP_K 件まで索引化する
+  - 綴りの近さ: 文字3-gram（ハッシュ化）のコサイン類似度
+  - 意味の近さ: 日本語訳の漢字・カタカナを含む2-gram のコサイン類似度
+  - 品詞が同じか / 語彙レベル（utils.text_difficulty.word_band）の近さ
+- 索引はリストの内容から作るバージョンごとにプロセス内でキャッシュし、
+  出題は索引の上位候補から選ぶだけなので1問あたり O(1)
+- 訳が同じ語は正解と区別できないので候補から外す
+
+使い方:
+    from utils.distractors import build_quiz_set
+    questions = build_quiz_set(words, quiz_type="meaning", num_questions=10)
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+QUIZ_TYPES = ("meaning", "word", "fill")
+NUM_DISTRACTORS = 3
+# 索引に残す候補数と、出題時にランダムに選ぶ範囲（毎回同じ選択肢にならないように）
+TOP_K = 8
+SAMPLE_POOL = 5
+# 類似度の重み（綴り, 意味, 品詞, 語彙レベル）
+SCORE_WEIGHTS = (0.35, 0.35, 0.2, 0.1)
+FEATURE_DIMS = 256
+# 類似度行列をこの行数ずつ計算する（大きなリストでもメモリを抑える）
+BLOCK_ROWS = 512
+MAX_INDEXES_IN_MEMORY = 32
+
+_HIRAGANA_RE = re.compile(r"^[぀-ゟ]+$")
+_GLOSS_SPLIT_RE = re.compile(r"[、,，／/;；・\s]+")
+
+
+def _word_text(w: Dict) -> str:
+    return (w.get("word") or "").strip()
+
+
+def _meaning_text(w: Dict) -> str:
+    # 単語帳（utils.dictionary）の項目は definition に訳を持つ
+    return (w.get("meaning") or w.get("definition") or "").strip()
+
+
+def _coarse_pos(pos: str) -> str:
+    """"phrasal verb" → "verb" のように最後の語で大まかに分ける"""
+    parts = (pos or "").strip().lower().split()
+    return parts[-1] if parts else ""
+
+
+def list_version(words: List[Dict]) -> str:
+    """単語リストの内容から作るバージョン（語・訳・品詞・例文が変われば変わる）"""
+    raw = json.dumps([[_word_text(w), _meaning_text(w), w.get("pos") or "", w.get("example") or ""]
+                      for w in words], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# 特徴量
+# ============================================================
+
+def _ortho_grams(word: str) -> List[str]:
+    text = f"#{word.lower()}#"
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _gloss_grams(meaning: str) -> List[str]:
+    """訳語の2-gram（ひらがなだけの2-gram は「する」「な」などの活用なので除く）"""
+    grams = []
+    for part in _GLOSS_SPLIT_RE.split(meaning):
+        if len(part) == 1:
+            grams.append(part)
+        grams.extend(g for g in (part[i:i + 2] for i in range(len(part) - 1))
+                     if not _HIRAGANA_RE.match(g))
+    return grams
+
+
+def _hashed(rows: List[List[str]]) -> np.ndarray:
+    """n-gram のリストを FEATURE_DIMS 次元に畳み込み、行ごとに L2 正規化"""
+    matrix = np.zeros((len(rows), FEATURE_DIMS), dtype=np.float32)
+    for i, grams in enumerate(rows):
+        for g in grams:
+            matrix[i, zlib.crc32(g.encode("utf-8")) % FEATURE_DIMS] += 1.0
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ============================================================
+# 索引
+# ============================================================
+
+class DistractorIndex:
+    """単語リスト1つ分の誤答候補の索引"""
+
+    def __init__(self, words: List[Dict]):
+        from utils.text_difficulty import BANDS, word_band
+
+        self.words = words
+        self.positions: Dict[str, int] = {}
+        for i, w in enumerate(words):
+            self.positions.setdefault(_word_text(w).lower(), i)
+        self._templates: Dict[str, List[Optional[Dict]]] = {}
+
+        n = len(words)
+        texts = [_word_text(w) for w in words]
+        meanings = [_meaning_text(w) for w in words]
+        w_ortho, w_gloss, w_pos, w_band = SCORE_WEIGHTS
+        # 重みの平方根を掛けて連結すると、1回の行列積で綴り・意味の加重和になる
+        features = np.hstack([np.sqrt(w_ortho) * _hashed([_ortho_grams(t) for t in texts]),
+                              np.sqrt(w_gloss) * _hashed([_gloss_grams(m) for m in meanings])])
+        coarse = [_coarse_pos(w.get("pos")) for w in words]
+        pos_ids = np.unique(coarse, return_inverse=True)[1] if n else np.array([])
+        has_pos = np.array([bool(p) for p in coarse])
+        bands = np.array([word_band(t) for t in texts], dtype=np.float32)
+        word_ids = np.unique([t.lower() for t in texts], return_inverse=True)[1] if n else np.array([])
+        meaning_ids = np.unique(meanings, return_inverse=True)[1] if n else np.array([])
+
+        k = min(TOP_K, max(0, n - 1))
+        self.neighbors = np.zeros((n, k), dtype=np.int32)
+        for start in range(0, n, BLOCK_ROWS):
+            rows = slice(start, min(n, start + BLOCK_ROWS))
+            score = features[rows] @ features.T
+            score += w_pos * ((pos_ids[rows, None] == pos_ids[None, :]) & has_pos[rows, None])
+            score += w_band * (1.0 - np.abs(bands[rows, None] - bands[None, :]) / len(BANDS))
+            # 同じ語・同じ訳の語は正解と区別できない
+            score[(word_ids[rows, None] == word_ids[None, :])
+                  | (meaning_ids[rows, None] == meaning_ids[None, :])] = -np.inf
+            if not k:
+                continue
+            top = np.argpartition(-score, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(score, top, axis=1), axis=1)
+            ranked = np.take_along_axis(top, order, axis=1)
+            # 候補が足りない行（-inf）は -1 で埋める
+            valid = np.isfinite(np.take_along_axis(score, ranked, axis=1))
+            self.neighbors[rows] = np.where(valid, ranked, -1)
+
+    def __len__(self):
+        return len(self.words)
+
+    def distractors(self, i: int, count: int = NUM_DISTRACTORS, rng=random) -> List[int]:
+        """i番目の単語の誤答候補（上位 SAMPLE_POOL 件から count 件）"""
+        ranked = [int(j) for j in self.neighbors[i] if j >= 0]
+        pool = ranked[:max(count, SAMPLE_POOL)]
+        return rng.sample(pool, min(count, len(pool)))
+
+    def _template(self, i: int, quiz_type: str) -> Optional[Dict]:
+        """問題文・正解・ヒント（選択肢以外の部分）"""
+        w = self.words[i]
+        word, meaning, example = _word_text(w), _meaning_text(w), w.get("example", "")
+        if quiz_type == "word":
+            return {"question": f"Which word means **{meaning}**?", "correct": word,
+                    "field": "word", "hint": None}
+        if quiz_type == "fill":
+            blank = re.sub(re.escape(word), "_____", example, flags=re.IGNORECASE) if example else ""
+            if "_____" not in blank:
+                return None
+            return {"question": f"Fill in the blank:\n\n*{blank}*", "correct": word,
+                    "field": "word", "hint": f"Meaning: {meaning}"}
+        return {"question": f"What does **{word}** mean?", "correct": meaning,
+                "field": "meaning", "hint": f"Example: {example}" if example else None}
+
+    def templates(self, quiz_type: str) -> List[Optional[Dict]]:
+        """リスト全体の問題テンプレート（種別ごとに1回だけ作る）"""
+        if quiz_type not in self._templates:
+            self._templates[quiz_type] = [self._template(i, quiz_type) for i in range(len(self))]
+        return self._templates[quiz_type]
+
+    def question(self, target, quiz_type: str = "meaning", rng=random) -> Dict:
+        """1問分（generate_quiz_question と同じ形式）。target は単語の dict か位置"""
+        i = target if isinstance(target, int) else self.positions[_word_text(target).lower()]
+        template = self.templates(quiz_type)[i] if quiz_type in QUIZ_TYPES else None
+        if template is None:
+            # 例文のない語の穴埋めは意味を問う
+            template = self.templates("meaning")[i]
+        text_of = _word_text if template["field"] == "word" else _meaning_text
+        options = [template["correct"]] + [text_of(self.words[j]) for j in self.distractors(i, rng=rng)]
+        rng.shuffle(options)
+        return {
+            "question": template["question"],
+            "correct": template["correct"],
+            "options": options,
+            "hint": template["hint"],
+            "word_data": self.words[i],
+        }
+
+
+# ============================================================
+# キャッシュ・公開API
+# ============================================================
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[str, DistractorIndex]" = OrderedDict()
+
+
+def get_distractor_index(words: List[Dict], version: str = None) -> DistractorIndex:
+    """単語リストの索引（同じバージョンなら再利用）"""
+    version = version or list_version(words)
+    with _lock:
+        if version in _indexes:
+            _indexes.move_to_end(version)
+            return _indexes[version]
+    index = DistractorIndex(words)
+    with _lock:
+        _indexes[version] = index
+        _indexes.move_to_end(version)
+        while len(_indexes) > MAX_INDEXES_IN_MEMORY:
+            _indexes.popitem(last=False)
+    return index
+
+
+def build_quiz_set(words: List[Dict], quiz_type: str = "meaning", num_questions: int = 10,
+                   targets: List[Dict] = None, rng=None) -> List[Dict]:
+    """出題順に並べたクイズ一式
+
+    Args:
+        words: 選択肢の候補になる単語リスト全体
+        targets: 出題する単語（省略時は words から num_questions 語をランダムに選ぶ）
+    """
+    rng = rng or random.Random()
+    valid = [w for w in words if _word_text(w) and _meaning_text(w)]
+    index = get_distractor_index(valid)
+    if targets is None:
+        positions = rng.sample(range(len(index)), min(num_questions, len(index)))
+    else:
+        positions = [index.positions[key] for key in (_word_text(t).lower() for t in targets)
+                     if key in index.positions]
+    return [index.question(i, quiz_type, rng=rng) for i in positions]
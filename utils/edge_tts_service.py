@@ -0,0 +1,157 @@
+"""
+Edge TTS Service
+================
+Edge TTS 用の常駐 asyncio ループ。
+
+- バックグラウンドスレッドで1本のイベントループを動かし続け、Streamlitの各スレッドから
+  合成ジョブを投入する（呼び出しごとにループやスレッドを作らない）
+- 音声チャンクはストリームのままメモリに溜める（一時ファイルを使わない）
+- 同じ「声・速度・テキスト」は完了済みキャッシュ / 実行中ジョブを共有する
+- prefetch / synthesize_many でまとめて投入できる
+
+使い方:
+    from utils.edge_tts_service import get_edge_tts_service
+    service = get_edge_tts_service()
+    audio = service.synthesize("Hello", "en-US-JennyNeural")
+    service.prefetch([("apple", "en-US-JennyNeural", "-15%"), ...])
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Iterable, List, Optional, Tuple
+
+
+MAX_CONCURRENCY = 16
+MAX_CACHED_AUDIO = 512
+DEFAULT_TIMEOUT = 30
+
+
+def rate_for_speed(speed: float) -> str:
+    """再生速度（1.0 = 等速）を Edge TTS の rate 表記に変換"""
+    pct = int(round((speed - 1.0) * 100))
+    return f"+{pct}%" if pct >= 0 else f"{pct}%"
+
+
+def is_available() -> bool:
+    try:
+        import edge_tts  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class EdgeTTSService:
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, cache_size: int = MAX_CACHED_AUDIO):
+        self._max_concurrency = max_concurrency
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], bytes]" = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+
+    # ---------- ループ ----------
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._loop.is_running():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self._max_concurrency)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            threading.Thread(target=_run, name="edge-tts-loop", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    async def _stream(self, text: str, voice: str, rate: str) -> bytes:
+        import edge_tts
+
+        async with self._semaphore:
+            communicate = edge_tts.Communicate(text, voice, rate=rate)
+            buf = bytearray()
+            async for chunk in communicate.stream():
+                if chunk.get("type") == "audio":
+                    buf.extend(chunk["data"])
+        if not buf:
+            raise RuntimeError("Edge TTS returned no audio")
+        return bytes(buf)
+
+    # ---------- ジョブ投入 ----------
+
+    def _finish(self, key, future: Future):
+        with self._lock:
+            self._inflight.pop(key, None)
+            if not future.cancelled() and future.exception() is None:
+                self._cache[key] = future.result()
+                self._cache.move_to_end(key)
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+    def submit(self, text: str, voice: str, rate: str = "+0%") -> Future:
+        """合成ジョブを投入して Future を返す（キャッシュ済み・実行中なら共有）"""
+        key = (voice, rate, text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                done = Future()
+                done.set_result(self._cache[key])
+                return done
+            if key in self._inflight:
+                return self._inflight[key]
+
+        loop = self._ensure_loop()
+        with self._lock:
+            if key in self._inflight:
+                return self._inflight[key]
+            future = asyncio.run_coroutine_threadsafe(self._stream(text, voice, rate), loop)
+            self._inflight[key] = future
+        future.add_done_callback(lambda f: self._finish(key, f))
+        return future
+
+    def synthesize(self, text: str, voice: str, rate: str = "+0%",
+                   timeout: float = DEFAULT_TIMEOUT) -> bytes:
+        """1件を合成して音声バイトを返す（失敗時は例外）"""
+        return self.submit(text, voice, rate).result(timeout=timeout)
+
+    def synthesize_many(self, items: Iterable[Tuple[str, str, str]],
+                        timeout: float = DEFAULT_TIMEOUT) -> List[Optional[bytes]]:
+        """まとめて投入し、入力順に結果を返す（失敗した要素はNone）"""
+        futures = [self.submit(text, voice, rate) for text, voice, rate in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=timeout))
+            except Exception:
+                results.append(None)
+        return results
+
+    def prefetch(self, items: Iterable[Tuple[str, str, str]]):
+        """結果を待たずに投入だけ行う（完了分はキャッシュに入る）"""
+        for text, voice, rate in items:
+            self.submit(text, voice, rate)
+
+    def cached(self, text: str, voice: str, rate: str = "+0%") -> Optional[bytes]:
+        with self._lock:
+            return self._cache.get((voice, rate, text))
+
+
+_service: Optional[EdgeTTSService] = None
+_service_lock = threading.Lock()
+
+
+def get_edge_tts_service() -> EdgeTTSService:
+    """プロセス共通のサービス（初回呼び出し時に生成）"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EdgeTTSService()
+        return _service
@@ -0,0 +1,250 @@
+"""
+Exercise Pre-generation
+=======================
+コース教材（learning_materials）から派生する練習問題を事前生成するバッチ処理。
+
+- reading    : レベル別・通常・検定対策の読解問題と要約/語彙（共有問題キャッシュに書き込む）
+- listening  : スクリプトからの理解度クイズ / YouTube字幕からの練習問題
+- vocabulary : 単語ごとの練習問題
+
+結果は learning_materials.derived に {task_key: {...}} として保存する。
+各タスクは元データのハッシュを持ち、同じハッシュの結果が既にあればスキップするため
+何度実行しても同じ結果になり、途中で止まっても再実行で続きから処理できる。
+
+画面が共有ストアから読む結果（読解問題 = 問題セット共有キャッシュ、YouTube の練習問題 =
+transcript_store の分析キャッシュ、単語の練習問題 = word_knowledge）は、そのストアに
+書き込むだけにして derived には完了の印（source_hash）だけを残す。
+
+使い方:
+    python pregenerate_exercises.py --course <course_id> --workers 4
+"""
+
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List, Callable, Optional
+
+
+MODULE_TYPES = ("reading", "listening", "vocabulary")
+DEFAULT_MAX_WORKERS = 4
+
+
+def _source_hash(*parts) -> str:
+    raw = "\n".join(str(p) for p in parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# ============================================================
+# タスク計画
+# ============================================================
+
+def _reading_tasks(row: Dict, levels: List[str]) -> List[Dict]:
+    """views/reading のクイズ・分析ボタンと同じ生成関数・引数（= 同じ共有キャッシュのキー）"""
+    from utils.reading import (
+        EXAM_CONFIGS, generate_comprehension_questions, generate_exam_questions,
+        generate_level_based_questions, generate_summary_and_vocabulary,
+    )
+
+    content = row.get("content") or {}
+    text = content.get("text", "")
+    # 画面の記事は content が行の列より優先される（materials_loader と同じ）
+    title = content.get("title") or row.get("title", "")
+    if not text:
+        return []
+
+    tasks = []
+    for level in levels or [content.get("level") or row.get("level") or "B1"]:
+        src = _source_hash(title, text, level)
+        runs = {
+            # クイズモード「レベル別 (推奨)」
+            f"reading_level_questions:{level}":
+                lambda level=level: generate_level_based_questions(text, title, level=level),
+            # クイズモード「通常 (True/False + 4択)」
+            f"reading_questions:{level}":
+                lambda level=level: generate_comprehension_questions(text, title, level=level),
+            f"reading_summary:{level}":
+                lambda level=level: generate_summary_and_vocabulary(text, title, level=level),
+        }
+        for exam_type in EXAM_CONFIGS:
+            runs[f"reading_exam:{exam_type}:{level}"] = (
+                lambda level=level, exam_type=exam_type:
+                    generate_exam_questions(text, title, exam_type=exam_type, level=level))
+        tasks.extend({"task_key": key, "source_hash": src, "run": run, "shared_store": True}
+                     for key, run in runs.items())
+    return tasks
+
+
+def _youtube_exercises(video_id: str, transcript: str, title: str, level: str) -> Dict:
+    """動画の練習問題を transcript_store に保存（画面の generate_exercises_from_transcript と同じキー）"""
+    from utils.listening_youtube import get_youtube_transcript, generate_exercises_from_transcript
+
+    if not transcript:
+        fetched = get_youtube_transcript(video_id)
+        if not fetched.get("success"):
+            return fetched
+        transcript = fetched["transcript"]
+    return generate_exercises_from_transcript(transcript, title, level, video_id=video_id)
+
+
+def _listening_tasks(row: Dict, levels: List[str]) -> List[Dict]:
+    from utils.listening import generate_quiz_from_script
+
+    content = row.get("content") or {}
+    title = row.get("title", "")
+    script = content.get("script", "")
+    video_id = content.get("video_id", "")
+    transcript = content.get("transcript", "")
+
+    tasks = []
+    for level in levels or [row.get("level") or "B1"]:
+        if script:
+            tasks.append({
+                "task_key": f"listening_quiz:{level}",
+                "source_hash": _source_hash(script, level),
+                "run": lambda level=level: generate_quiz_from_script(script, level),
+            })
+        if video_id:
+            tasks.append({
+                "task_key": f"youtube_exercises:{level}",
+                "source_hash": _source_hash(video_id, transcript, level),
+                "run": lambda level=level: _youtube_exercises(video_id, transcript, title, level),
+                "shared_store": True,
+            })
+    return tasks
+
+
+def _vocabulary_tasks(row: Dict, levels: List[str]) -> List[Dict]:
+    from utils.vocabulary import generate_exercises_for_word
+
+    content = row.get("content") or {}
+    tasks = []
+    for w in content.get("words", []):
+        word = (w.get("word") or "").strip()
+        if not word:
+            continue
+        pos = w.get("pos") or ""
+        tasks.append({
+            "task_key": f"word_exercises:{word.lower()}",
+            "source_hash": _source_hash(word),
+            "run": lambda word=word, pos=pos: generate_exercises_for_word(word, pos=pos),
+            "shared_store": True,
+        })
+    return tasks
+
+
+_TASK_BUILDERS = {
+    "reading": _reading_tasks,
+    "listening": _listening_tasks,
+    "vocabulary": _vocabulary_tasks,
+}
+
+
+def plan_tasks(rows: List[Dict], levels: List[str] = None, force: bool = False) -> Dict:
+    """教材行から生成タスクを組み立て、生成済み（同じハッシュ）のものを除外する
+
+    Returns:
+        {"pending": [task...], "skipped": int}
+    """
+    pending = []
+    skipped = 0
+    for row in rows:
+        builder = _TASK_BUILDERS.get(row.get("module_type"))
+        if not builder:
+            continue
+        derived = row.get("derived") or {}
+        for task in builder(row, levels):
+            done = derived.get(task["task_key"]) or {}
+            if not force and done.get("source_hash") == task["source_hash"]:
+                skipped += 1
+                continue
+            task["material_id"] = row["id"]
+            task["material_title"] = row.get("title", "")
+            pending.append(task)
+    return {"pending": pending, "skipped": skipped}
+
+
+# ============================================================
+# 実行
+# ============================================================
+
+def _total_cost_jpy() -> float:
+    from utils.openai_gateway import get_gateway_metrics
+    return sum(m["cost_jpy"] for m in get_gateway_metrics().values())
+
+
+def run_pregeneration(course_id: str = None, module_types: List[str] = None,
+                      levels: List[str] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                      force: bool = False, dry_run: bool = False,
+                      progress: Optional[Callable[[str], None]] = print) -> Dict:
+    """コース教材の練習問題を並列に事前生成して learning_materials.derived に書き戻す
+
+    Returns:
+        {"planned", "skipped", "generated", "failed", "elapsed_sec",
+         "tasks_per_min", "cost_jpy"}
+    """
+    from utils.database import get_learning_materials, save_learning_material_derived
+    from utils.openai_gateway import flush_usage
+
+    log = progress or (lambda msg: None)
+    rows = []
+    for mt in module_types or MODULE_TYPES:
+        rows.extend(get_learning_materials(mt, course_id=course_id))
+
+    plan = plan_tasks(rows, levels=levels, force=force)
+    pending = plan["pending"]
+    report = {
+        "planned": len(pending),
+        "skipped": plan["skipped"],
+        "generated": 0,
+        "failed": 0,
+        "elapsed_sec": 0.0,
+        "tasks_per_min": 0.0,
+        "cost_jpy": 0.0,
+    }
+    log(f"教材 {len(rows)}件 / 生成対象 {len(pending)}件 / 生成済みスキップ {plan['skipped']}件")
+    if dry_run or not pending:
+        return report
+
+    write_lock = threading.Lock()
+    cost_before = _total_cost_jpy()
+    start = time.time()
+
+    def _execute(task):
+        result = task["run"]()
+        if not result.get("success"):
+            return task, result
+        entry = {
+            "source_hash": task["source_hash"],
+            "generated_at": datetime.utcnow().isoformat(),
+        }
+        if not task.get("shared_store"):
+            entry["result"] = {k: v for k, v in result.items() if k not in ("success", "cached")}
+        # 同じ教材行への書き込みが競合しないよう直列化
+        with write_lock:
+            save_learning_material_derived(task["material_id"], task["task_key"], entry)
+        return task, result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(_execute, t) for t in pending]
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                task, result = future.result()
+            except Exception as e:
+                report["failed"] += 1
+                log(f"[{i}/{len(pending)}] ❌ {e}")
+                continue
+            if result.get("success"):
+                report["generated"] += 1
+                log(f"[{i}/{len(pending)}] ✅ {task['material_title']} — {task['task_key']}")
+            else:
+                report["failed"] += 1
+                log(f"[{i}/{len(pending)}] ❌ {task['material_title']} — {task['task_key']}: {result.get('error')}")
+
+    elapsed = time.time() - start
+    flush_usage()
+    report["elapsed_sec"] = round(elapsed, 1)
+    report["tasks_per_min"] = round(report["generated"] / elapsed * 60, 1) if elapsed > 0 else 0.0
+    report["cost_jpy"] = round(_total_cost_jpy() - cost_before, 2)
+    return report
@@ -1,10 +1,6 @@
 import streamlit as st
-from openai import OpenAI
-
-
-def get_openai_client():
-    """OpenAIクライアントを取得"""
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
+from utils.openai_gateway import chat_completion
+from utils.prompt_templates import PromptTemplate, TemplateCache, settings_version
 
 
 def _get_ai_settings(course_id: str) -> dict:
@@ -109,22 +105,18 @@ def _build_weights_instruction(weights: dict) -> str:
 # Speaking評価（gpt_eval.py メイン関数）
 # ============================================================
 
-def evaluate_language_use(text, context="speaking",
-                          course_id: str = None,
-                          task_type: str = "monologue",
-                          assignment_id: str = None):
-    """
-    GPT-4oで語彙・文法・内容・自然さを評価。
-    course_idが指定された場合、course_settingsの設定をプロンプトに反映。
+_LANGUAGE_USE_TEMPLATES = TemplateCache("gpt_eval.evaluate_language_use")
 
-    引数:
-        text          : 評価対象テキスト
-        context       : "speaking" / "dialogue" / "read_aloud" など
-        course_id     : コースID（設定反映に使用、Noneなら従来通り）
-        task_type     : "read_aloud" / "monologue" / "dialogue"
-        assignment_id : 課題ID（課題別設定を優先する場合）
-    """
-    client = get_openai_client()
+_LANGUAGE_USE_SYSTEM = (
+    "You are an expert in World Englishes and English language education, "
+    "specializing in helping Japanese EFL learners communicate effectively "
+    "in international contexts. Always respond in valid JSON format. "
+    "Be encouraging while providing specific, actionable feedback."
+)
+
+
+def _build_language_use_template(course_id: str, task_type: str, assignment_id: str) -> PromptTemplate:
+    """コース設定を反映した静的プレフィックスを組み立てる（学生のテキストは含まない）"""
 
     # ── 設定取得 ──────────────────────────────────────────
     ai_settings = _get_ai_settings(course_id)
@@ -142,7 +134,7 @@ def evaluate_language_use(text, context="speaking",
     weights_block   = _build_weights_instruction(weights)
     extra_block     = f"\n## 教員からの追加指示:\n{extra_instr}" if extra_instr else ""
 
-    prompt = f"""あなたは World Englishes（世界の多様な英語）に精通した英語教育の専門家です。
+    prefix = f"""あなたは World Englishes（世界の多様な英語）に精通した英語教育の専門家です。
 
 ## 重要な前提:
 - 英語には「正しい」単一の形はありません
@@ -156,11 +148,6 @@ def evaluate_language_use(text, context="speaking",
 ## フィードバック言語: {lang_block}
 ## フィードバック詳細度: {detail_block}
 
-## 分析対象テキスト:
-{text}
-
-## コンテキスト: {context} / タスクタイプ: {task_type}
-
 ## 評価項目と出力形式（JSON形式で出力してください）:
 
 {{
@@ -230,26 +217,49 @@ def evaluate_language_use(text, context="speaking",
 ## 注意:
 - 「間違い」という言葉は極力避け、「より広く通じる表現」という言い方をする
 - 学習者の努力を認め、励ましを含める
+
+## 分析対象テキストはこの後に示します。
+"""
+    return PromptTemplate(_LANGUAGE_USE_SYSTEM, prefix)
+
+
+def evaluate_language_use(text, context="speaking",
+                          course_id: str = None,
+                          task_type: str = "monologue",
+                          assignment_id: str = None):
+    """
+    GPT-4oで語彙・文法・内容・自然さを評価。
+    course_idが指定された場合、course_settingsの設定をプロンプトに反映。
+    設定から組み立てたプロンプトの前半はキャッシュし、学生のテキストは末尾に付ける。
+
+    引数:
+        text          : 評価対象テキスト
+        context       : "speaking" / "dialogue" / "read_aloud" など
+        course_id     : コースID（設定反映に使用、Noneなら従来通り）
+        task_type     : "read_aloud" / "monologue" / "dialogue"
+        assignment_id : 課題ID（課題別設定を優先する場合）
+    """
+    key = (course_id, task_type, assignment_id, settings_version(course_id))
+    template = _LANGUAGE_USE_TEMPLATES.get(
+        key, lambda: _build_language_use_template(course_id, task_type, assignment_id))
+
+    suffix = f"""## コンテキスト: {context} / タスクタイプ: {task_type}
+
+## 分析対象テキスト:
+{text}
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "gpt_eval.evaluate_language_use",
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": (
-                    "You are an expert in World Englishes and English language education, "
-                    "specializing in helping Japanese EFL learners communicate effectively "
-                    "in international contexts. Always respond in valid JSON format. "
-                    "Be encouraging while providing specific, actionable feedback."
-                )},
-                {"role": "user", "content": prompt}
-            ],
+            messages=template.messages(suffix),
             temperature=0.3,
             response_format={"type": "json_object"}
         )
 
         import json
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
 
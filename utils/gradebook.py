@@ -0,0 +1,203 @@
+"""
+Gradebook
+=========
+成績集計の計算エンジン（views/grades.py）。
+
+- コースの学生 × 評価項目（Speaking〜出席）のスコアを NumPy の行列に1回だけ詰める
+- 合計点 = 行列 @ 配分ベクトル。評定・パーセンタイル・ヒストグラム・評定分布もまとめて計算する
+- 配分ごとの結果は行列側にキャッシュする（配分スライダーを動かしたときの試算は再計算だけで済む）
+- 行列は (コース, データの版) ごとに作り直す。データの版はスコア・出席データを読み込んだ時刻
+
+使い方:
+    from utils.gradebook import GradeMatrix
+    matrix = GradeMatrix(students, attendance_map, version=loaded_at)
+    rows = matrix.rows(weights)                 # 成績一覧の行（合計点・評定つき）
+    summary = matrix.summary(weights)           # 平均・標準偏差・評定分布・項目別平均
+    diff = matrix.what_if(saved, new_weights)   # 配分変更の試算
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+# 評価項目（行列の列の順番）と学生データの列名
+CATEGORIES = ("speaking", "writing", "vocabulary", "reading", "listening",
+              "assignment", "extracurricular", "attendance")
+SOURCE_COLUMNS = {
+    "speaking": "speaking_avg", "writing": "writing_avg", "vocabulary": "vocabulary_avg",
+    "reading": "reading_avg", "listening": "listening_avg", "assignment": "assignment_avg",
+    "extracurricular": "extracurricular_score",
+}
+# 練習回数を持つ項目
+COUNTED = ("speaking", "writing", "vocabulary", "reading", "listening", "assignment")
+# 項目別平均を出す項目（授業外・出席は除く）
+MODULES = COUNTED
+
+GRADE_ORDER = ("A+", "A", "B+", "B", "C+", "C", "D", "F")
+# 評定の下限（昇順）。searchsorted で何本超えたかを数えて評定にする
+_GRADE_CUTS = np.array([50, 60, 65, 70, 75, 80, 90], dtype=np.float64)
+_GRADES_ASC = np.array(["F", "D", "C", "C+", "B", "B+", "A", "A+"], dtype=object)
+
+HISTOGRAM_BINS = np.arange(0, 110, 10, dtype=np.float64)
+MAX_CACHED_WEIGHTS = 32
+
+
+def weights_key(weights: Dict) -> Tuple[float, ...]:
+    """配分 dict → キャッシュキー（CATEGORIES の順の値）"""
+    return tuple(float(weights.get(c, 0) or 0) for c in CATEGORIES)
+
+
+def grade_letters(totals: np.ndarray) -> np.ndarray:
+    """合計点の配列 → 評定の配列"""
+    return _GRADES_ASC[np.searchsorted(_GRADE_CUTS, totals, side="right")]
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class GradeMatrix:
+    """コースの学生 × 評価項目のスコア行列と、配分ごとの計算結果"""
+
+    def __init__(self, students: List[Dict], attendance_map: Dict = None, version=None):
+        attendance_map = attendance_map or {}
+        self.version = version
+        self.students = students
+        n = len(students)
+
+        self.scores = np.zeros((n, len(CATEGORIES)), dtype=np.float64)
+        self.counts = np.zeros((n, len(COUNTED)), dtype=np.int64)
+        self.attendance_input = np.zeros(n, dtype=bool)
+        self.extracurricular_points = np.zeros(n, dtype=np.int64)
+        self.extracurricular_count = np.zeros(n, dtype=np.int64)
+
+        for j, c in enumerate(CATEGORIES[:-1]):
+            self.scores[:, j] = [_to_float(s.get(SOURCE_COLUMNS[c])) for s in students]
+        for j, c in enumerate(COUNTED):
+            self.counts[:, j] = [int(s.get(f"{c}_count") or 0) for s in students]
+        att = [attendance_map.get(s.get("student_id", "")) for s in students]
+        self.attendance_input[:] = [a is not None for a in att]
+        self.scores[:, -1] = [_to_float(a) for a in att]
+        self.extracurricular_points[:] = [int(s.get("extracurricular_points") or 0) for s in students]
+        self.extracurricular_count[:] = [int(s.get("extracurricular_count") or 0) for s in students]
+
+        self._results: "OrderedDict[Tuple, Dict]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    # ------------------------------------------------------------
+    # 配分ごとの計算
+    # ------------------------------------------------------------
+
+    def compute(self, weights: Dict) -> Dict[str, np.ndarray]:
+        """{"totals": 合計点, "rounded": 小数1桁, "grades": 評定, "percentiles": 0-100}"""
+        key = weights_key(weights)
+        cached = self._results.get(key)
+        if cached is not None:
+            self._results.move_to_end(key)
+            return cached
+
+        totals = self.scores @ (np.array(key) / 100.0)
+        # 同点は中間の順位（ties の半分を下に数える）
+        ordered = np.sort(totals)
+        below = np.searchsorted(ordered, totals, side="left")
+        at_or_below = np.searchsorted(ordered, totals, side="right")
+        percentiles = (below + at_or_below) / 2.0 / max(len(totals), 1) * 100.0
+
+        result = {
+            "totals": totals,
+            "rounded": np.round(totals, 1),
+            "grades": grade_letters(totals),
+            "percentiles": percentiles,
+        }
+        self._results[key] = result
+        if len(self._results) > MAX_CACHED_WEIGHTS:
+            self._results.popitem(last=False)
+        return result
+
+    def rows(self, weights: Dict) -> List[Dict]:
+        """成績一覧の行（以前の _calc_student_total と同じキー + percentile）"""
+        result = self.compute(weights)
+        scores = self.scores.tolist()
+        counts = self.counts.tolist()
+        rows = []
+        for i, s in enumerate(self.students):
+            row = {
+                'name': s.get('name', ''),
+                'student_id': s.get('student_id', ''),
+                'user_id': s.get('user_id', ''),
+                'email': s.get('email', ''),
+            }
+            for j, c in enumerate(CATEGORIES):
+                row[c] = scores[i][j]
+            for j, c in enumerate(COUNTED):
+                row[f'{c}_count'] = counts[i][j]
+            row.update({
+                'extracurricular_points': int(self.extracurricular_points[i]),
+                'extracurricular_count': int(self.extracurricular_count[i]),
+                'attendance_input': bool(self.attendance_input[i]),
+                'total': float(result['rounded'][i]),
+                'grade': result['grades'][i],
+                'percentile': float(result['percentiles'][i]),
+                '_raw': s,
+            })
+            rows.append(row)
+        return rows
+
+    def grade_distribution(self, weights: Dict) -> Dict[str, int]:
+        """評定ごとの人数（GRADE_ORDER の順）"""
+        grades = self.compute(weights)["grades"]
+        return {g: int(np.count_nonzero(grades == g)) for g in GRADE_ORDER}
+
+    def histogram(self, weights: Dict, bins: np.ndarray = HISTOGRAM_BINS) -> Dict[str, int]:
+        """合計点の度数分布 {"0-10": 人数, ...}（最後の階級は上端を含む）"""
+        counts, edges = np.histogram(self.compute(weights)["totals"], bins=bins)
+        return {f"{edges[i]:.0f}-{edges[i + 1]:.0f}": int(c) for i, c in enumerate(counts)}
+
+    def module_averages(self) -> Dict[str, Dict]:
+        """項目別のクラス平均（スコアがある学生だけ）{"speaking": {"avg", "n"}, ...}"""
+        cols = self.scores[:, :len(MODULES)]
+        has = cols > 0
+        n = has.sum(axis=0)
+        sums = np.where(has, cols, 0.0).sum(axis=0)
+        return {
+            m: {"avg": float(sums[j] / n[j]) if n[j] else None, "n": int(n[j])}
+            for j, m in enumerate(MODULES)
+        }
+
+    def summary(self, weights: Dict) -> Dict:
+        """合計点が0より大きい学生の平均・最高・最低・標準偏差と評定分布"""
+        rounded = self.compute(weights)["rounded"]
+        scored = rounded[rounded > 0]
+        return {
+            "count": int(scored.size),
+            "mean": float(scored.mean()) if scored.size else None,
+            "max": float(scored.max()) if scored.size else None,
+            "min": float(scored.min()) if scored.size else None,
+            "stdev": float(scored.std(ddof=1)) if scored.size > 1 else 0.0,
+            "grades": self.grade_distribution(weights),
+        }
+
+    def what_if(self, base_weights: Dict, new_weights: Dict) -> Dict:
+        """配分を base → new に変えたときの試算"""
+        base = self.compute(base_weights)
+        new = self.compute(new_weights)
+        delta = new["totals"] - base["totals"]
+        # 評定の段階（大きいほど上）
+        step = (np.searchsorted(_GRADE_CUTS, new["totals"], side="right")
+                - np.searchsorted(_GRADE_CUTS, base["totals"], side="right"))
+        return {
+            "mean_before": float(base["totals"].mean()) if len(self) else None,
+            "mean_after": float(new["totals"].mean()) if len(self) else None,
+            "max_change": float(np.abs(delta).max()) if len(self) else 0.0,
+            "grade_up": int(np.count_nonzero(step > 0)),
+            "grade_down": int(np.count_nonzero(step < 0)),
+            "grades_before": self.grade_distribution(base_weights),
+            "grades_after": self.grade_distribution(new_weights),
+        }
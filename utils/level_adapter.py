@@ -8,6 +8,7 @@ CEFR_LEVELS = {
         'name': 'Beginner',
         'vocab_range': '500-1000',
         'sentence_length': 'short (5-8 words)',
+        'sentence_words': (5, 8),
         'grammar': 'simple present, simple past, basic questions',
         'topics': 'self, family, daily routines, food, weather',
         'wpm_target': 80,
@@ -17,6 +18,7 @@ CEFR_LEVELS = {
         'name': 'Elementary',
         'vocab_range': '1000-2000',
         'sentence_length': 'short to medium (8-12 words)',
+        'sentence_words': (8, 12),
         'grammar': 'present continuous, future (will/going to), comparatives',
         'topics': 'hobbies, travel, shopping, directions, health',
         'wpm_target': 100,
@@ -26,6 +28,7 @@ CEFR_LEVELS = {
         'name': 'Intermediate',
         'vocab_range': '2000-4000',
         'sentence_length': 'medium (10-15 words)',
+        'sentence_words': (10, 15),
         'grammar': 'present perfect, conditionals (1st/2nd), passive voice, relative clauses',
         'topics': 'work, education, technology, environment, culture',
         'wpm_target': 130,
@@ -35,6 +38,7 @@ CEFR_LEVELS = {
         'name': 'Upper-Intermediate',
         'vocab_range': '4000-8000',
         'sentence_length': 'medium to long (12-20 words)',
+        'sentence_words': (12, 20),
         'grammar': 'all conditionals, reported speech, complex passives, subjunctive',
         'topics': 'society, politics, science, philosophy, media',
         'wpm_target': 160,
@@ -44,6 +48,7 @@ CEFR_LEVELS = {
         'name': 'Advanced',
         'vocab_range': '8000-15000',
         'sentence_length': 'long and complex (15-25 words)',
+        'sentence_words': (15, 25),
         'grammar': 'inversion, cleft sentences, mixed conditionals, advanced modals',
         'topics': 'academic research, ethics, global issues, abstract concepts',
         'wpm_target': 200,
@@ -53,19 +58,11 @@ CEFR_LEVELS = {
 
 
 def get_student_level():
-    """学生の現在のCEFRレベルを取得"""
+    """学生の現在のCEFRレベルを取得（utils.level_estimator の総合レベル）"""
     try:
-        from utils.analytics import get_analytics_data, estimate_cefr
-        data = get_analytics_data()
-        
-        all_scores = []
-        for key in ['speaking_scores', 'writing_scores', 'reading_scores', 'vocabulary_scores', 'listening_scores']:
-            all_scores.extend([s['score'] for s in data.get(key, [])])
-        
-        if all_scores:
-            recent = all_scores[-20:]
-            avg = sum(recent) / len(recent)
-            return estimate_cefr(avg)
+        from utils.level_estimator import get_level, OVERALL
+        user = st.session_state.get('user') or {}
+        return get_level(user.get('id'), OVERALL, default='A2')
     except Exception:
         pass
     
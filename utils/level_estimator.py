@@ -0,0 +1,294 @@
+"""
+Level Estimator
+===============
+学生ごと・技能ごとの CEFR レベル推定。
+
+- 練習スコアを記録するたびに（log_practice から）その技能と総合（overall）の状態を更新する
+- 状態は「レベル指数（0=A1 … 4=C1）の指数加重平均 + 件数」だけなので、
+  student_skill_levels に1行ずつ保存し、ログを読み直さずに O(1) で答えられる
+- 記録時は必ずDBの最新の状態から計算し、件数（count）が変わっていないときだけ書き込む。
+  複数のプロセスが同じ学生のスコアを同時に記録しても、互いの更新を上書きしない
+- 読み取り用のプロセス内キャッシュは STATE_TTL_SEC で読み直す（他プロセスの更新を反映する）
+- 教材レベルつきのスコアは教材レベル ± 1（80%以上で1つ上・50%未満で1つ下）、
+  レベルのないスコアは analytics.estimate_cefr と同じ閾値でレベル指数に直す
+- コース単位（course_id）と全体（course_id = ''）の両方を持つ
+
+使い方:
+    from utils.level_estimator import get_level, get_course_levels
+    level = get_level(student_id, "reading", course_id, default="B1")
+    levels = get_course_levels(course_id)   # {student_id: {skill: state}}
+    （既存ログからの再計算: python rebuild_skill_levels.py --course <course_id>）
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+SKILLS = ("speaking", "writing", "reading", "listening", "vocabulary")
+OVERALL = "overall"
+LEVELS = ["A1", "A2", "B1", "B2", "C1"]
+
+# 指数加重平均の重み（直近およそ 2/α - 1 ≈ 9 件分）。件数が少ないうちは単純平均
+EWMA_ALPHA = 0.2
+# これより少ない件数の推定は暫定扱い
+MIN_CONFIDENT_COUNT = 3
+
+# レベルのないスコア → レベル指数（analytics.estimate_cefr: 55/70/80/90 → A2/B1/B2/C1）
+_SCORE_POINTS = ([40, 55, 70, 80, 90], [0, 1, 2, 3, 4])
+# 教材レベルつきスコア: この点で教材レベル -1 / +1（get_student_reading_level の基準）
+LEVEL_DOWN_SCORE = 50
+LEVEL_UP_SCORE = 80
+
+MAX_STATES_IN_MEMORY = 20000
+STATE_TTL_SEC = 60
+# 記録時に他プロセスと競合した場合のやり直し回数
+MAX_WRITE_RETRIES = 5
+
+
+def skill_for_module(module_type: str) -> Optional[str]:
+    """practice_logs.module_type → 技能（対象外なら None）"""
+    from utils.analytics import MODULE_CATEGORY
+    skill = MODULE_CATEGORY.get(module_type, (module_type or "").split("_")[0])
+    return skill if skill in SKILLS else None
+
+
+def score_to_level_index(score: float, level: str = None) -> float:
+    """スコア（0-100）をレベル指数に直す"""
+    if level in LEVELS:
+        mid = (LEVEL_DOWN_SCORE + LEVEL_UP_SCORE) / 2
+        step = max(-1.0, min(1.0, (score - mid) / (LEVEL_UP_SCORE - mid)))
+        return max(0.0, min(len(LEVELS) - 1.0, LEVELS.index(level) + step))
+    xs, ys = _SCORE_POINTS
+    if score <= xs[0]:
+        return float(ys[0])
+    for i in range(1, len(xs)):
+        if score <= xs[i]:
+            return ys[i - 1] + (ys[i] - ys[i - 1]) * (score - xs[i - 1]) / (xs[i] - xs[i - 1])
+    return float(ys[-1])
+
+
+def level_from_index(value: float) -> str:
+    # 境界ちょうどの浮動小数誤差で1つ下にならないよう少し足す
+    return LEVELS[max(0, min(len(LEVELS) - 1, int(math.floor(value + 1e-9))))]
+
+
+def update_state(state: Optional[Dict], value: float, score: float, at: str = None) -> Dict:
+    """状態に1件の観測（レベル指数）を足し込んだ新しい状態"""
+    count = (state or {}).get("count", 0) + 1
+    ewma = (state or {}).get("ewma")
+    alpha = max(EWMA_ALPHA, 1.0 / count)
+    ewma = value if ewma is None else ewma + alpha * (value - ewma)
+    return {
+        "ewma": round(ewma, 4),
+        "count": count,
+        "last_score": score,
+        "level": level_from_index(ewma),
+        "updated_at": at or datetime.utcnow().isoformat(),
+    }
+
+
+# ============================================================
+# プロセス内キャッシュ
+# ============================================================
+
+_lock = threading.Lock()
+# (student_id, course_key) → (読み込んだ時刻, {skill: state})。DBに行がない学生も {} として覚える
+_states: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Dict]]]" = OrderedDict()
+
+
+def _course_key(course_id: str = None) -> str:
+    return course_id or ""
+
+
+def _remember(student_id: str, course_key: str, skills: Dict[str, Dict]):
+    with _lock:
+        _states[(student_id, course_key)] = (time.time(), skills)
+        _states.move_to_end((student_id, course_key))
+        while len(_states) > MAX_STATES_IN_MEMORY:
+            _states.popitem(last=False)
+
+
+def _state_from_row(row: Dict) -> Dict:
+    return {k: row.get(k) for k in ("ewma", "count", "last_score", "level", "updated_at")}
+
+
+def _fetch(student_id: str, course_key: str) -> Dict[str, Dict]:
+    """DBの最新の状態（キャッシュを使わない）"""
+    from utils.database import get_student_skill_levels
+    rows = get_student_skill_levels(student_id, course_key)
+    skills = {r["skill"]: _state_from_row(r) for r in rows}
+    _remember(student_id, course_key, skills)
+    return skills
+
+
+def _load(student_id: str, course_key: str) -> Dict[str, Dict]:
+    with _lock:
+        entry = _states.get((student_id, course_key))
+        if entry is not None and time.time() - entry[0] < STATE_TTL_SEC:
+            _states.move_to_end((student_id, course_key))
+            return entry[1]
+    try:
+        return _fetch(student_id, course_key)
+    except Exception:
+        return {}
+
+
+def _write_observations(student_id: str, course_key: str, skills: Iterable[str],
+                        value: float, score: float, at: str) -> Dict[str, Dict]:
+    """(コース, 技能) の状態に観測を足し込んで保存する（件数による楽観的排他）
+
+    最新の状態を1回読み、技能ごとに「件数が読んだときのまま」なら書き込む。
+    他のプロセスに先を越された技能だけ、読み直してやり直す。
+    Returns: 書き込み後の {skill: state}
+    """
+    from utils.database import insert_student_skill_level, update_student_skill_level
+
+    pending = list(skills)
+    for _ in range(MAX_WRITE_RETRIES):
+        current = dict(_fetch(student_id, course_key))
+        for name in list(pending):
+            previous = current.get(name)
+            state = update_state(previous, value, score, at)
+            row = {"student_id": student_id, "course_id": course_key, "skill": name, **state}
+            if previous is None:
+                ok = insert_student_skill_level(row)
+            else:
+                ok = update_student_skill_level(row, previous.get("count") or 0)
+            if ok:
+                current[name] = state
+                pending.remove(name)
+        if not pending:
+            _remember(student_id, course_key, current)
+            return current
+    raise RuntimeError(f"skill level update conflicted {MAX_WRITE_RETRIES} times: "
+                       f"{student_id}/{course_key or '*'}/{', '.join(pending)}")
+
+
+def invalidate_levels(student_id: str = None):
+    """プロセス内キャッシュを破棄（student_id 省略時は全員）"""
+    with _lock:
+        if student_id is None:
+            _states.clear()
+        else:
+            for key in [k for k in _states if k[0] == student_id]:
+                _states.pop(key, None)
+
+
+# ============================================================
+# 公開API
+# ============================================================
+
+def record_score(student_id: str, module_type: str, score: float, level: str = None,
+                 course_id: str = None) -> Dict:
+    """スコア1件を技能・総合の状態に反映して保存する
+
+    Returns:
+        {"success", "skill", "states": {course_key: {skill: state}}}
+    """
+    skill = skill_for_module(module_type)
+    if not student_id or skill is None or score is None:
+        return {"success": False, "error": "対象外のスコアです"}
+    try:
+        score = float(score)
+        value = score_to_level_index(score, level)
+        now = datetime.utcnow().isoformat()
+        updated = {}
+        for course_key in {"", _course_key(course_id)}:
+            updated[course_key] = _write_observations(student_id, course_key, (skill, OVERALL),
+                                                      value, score, now)
+        return {"success": True, "skill": skill, "states": updated}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def get_skill_levels(student_id: str, course_id: str = None) -> Dict[str, Dict]:
+    """{skill: {"ewma", "count", "last_score", "level", "updated_at"}}（記録がなければ空）"""
+    return dict(_load(student_id, _course_key(course_id)))
+
+
+def get_level(student_id: str, skill: str = OVERALL, course_id: str = None,
+              default: str = None) -> Optional[str]:
+    """推定 CEFR レベル（記録がなければ default）"""
+    if not student_id:
+        return default
+    state = _load(student_id, _course_key(course_id)).get(skill)
+    return state["level"] if state and state.get("level") else default
+
+
+def get_course_levels(course_id: str, student_ids: List[str] = None) -> Dict[str, Dict[str, Dict]]:
+    """コース全体の推定レベル（1クエリ）。{student_id: {skill: state}}"""
+    from utils.database import get_course_skill_levels
+
+    course_key = _course_key(course_id)
+    result: Dict[str, Dict[str, Dict]] = {}
+    for row in get_course_skill_levels(course_key, student_ids):
+        result.setdefault(row["student_id"], {})[row["skill"]] = _state_from_row(row)
+    for sid in student_ids or []:
+        result.setdefault(sid, {})
+    for sid, skills in result.items():
+        _remember(sid, course_key, skills)
+    return result
+
+
+def replay_logs(logs: Iterable[Dict]) -> Dict[Tuple[str, str, str], Dict]:
+    """練習ログ（practiced_at の昇順）から状態を作り直す
+
+    logs: [{student_id, course_id, module_type, score, practiced_at, activity_details?}]
+    Returns: {(student_id, course_key, skill): state}
+    """
+    states: Dict[Tuple[str, str, str], Dict] = {}
+    for log in logs:
+        skill = skill_for_module(log.get("module_type"))
+        if skill is None or log.get("score") is None:
+            continue
+        score = float(log["score"])
+        value = score_to_level_index(score, (log.get("activity_details") or {}).get("level"))
+        for course_key in {"", _course_key(log.get("course_id"))}:
+            for name in (skill, OVERALL):
+                key = (log["student_id"], course_key, name)
+                states[key] = update_state(states.get(key), value, score, log.get("practiced_at"))
+    return states
+
+
+def rebuild_levels(course_id: str = None) -> Dict:
+    """practice_logs 全体から状態を作り直して保存する（導入時・不整合の修復用）
+
+    course_id 指定時はそのコースのログだけを読み、コース単位の状態だけを保存する。
+    Returns:
+        {"success", "logs", "states", "timings": {"load", "compute", "save"}}
+    """
+    import time
+    from utils.database import get_practice_logs_for_levels, upsert_student_skill_levels
+
+    try:
+        started = time.perf_counter()
+        logs = get_practice_logs_for_levels(course_id)
+        loaded = time.perf_counter()
+
+        states = replay_logs(logs)
+        if course_id:
+            states = {k: v for k, v in states.items() if k[1] == course_id}
+        computed = time.perf_counter()
+
+        upsert_student_skill_levels([
+            {"student_id": sid, "course_id": course_key, "skill": skill, **state}
+            for (sid, course_key, skill), state in states.items()
+        ])
+        invalidate_levels()
+        saved = time.perf_counter()
+        return {
+            "success": True,
+            "logs": len(logs),
+            "states": len(states),
+            "timings": {
+                "load": round(loaded - started, 2),
+                "compute": round(computed - loaded, 2),
+                "save": round(saved - computed, 2),
+            },
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
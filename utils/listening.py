@@ -1,11 +1,8 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion, synthesize_speech
 import json
 import io
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
 # 話者用の声の設定
 VOICES = {
     "A": "nova",
@@ -121,77 +118,47 @@ def parse_dialogue(script):
     return parsed
 
 
+# OpenAIの声 → Edge TTSの声
+EDGE_VOICE_MAP = {
+    "alloy": "en-US-JennyNeural",
+    "nova": "en-US-JennyNeural",
+    "shimmer": "en-GB-SoniaNeural",
+    "echo": "en-US-GuyNeural",
+    "onyx": "en-GB-RyanNeural",
+    "fable": "en-AU-NatashaNeural",
+}
+
+
 def generate_audio_with_openai(text, voice="alloy"):
     """音声を生成（Edge TTS優先 → OpenAI TTS フォールバック）"""
-    edge_voice_map = {
-        "alloy": "en-US-JennyNeural",
-        "nova": "en-US-JennyNeural",
-        "shimmer": "en-GB-SoniaNeural",
-        "echo": "en-US-GuyNeural",
-        "onyx": "en-GB-RyanNeural",
-        "fable": "en-AU-NatashaNeural",
-    }
     try:
-        from utils.tts_natural import _generate_edge_tts
-        edge_voice = edge_voice_map.get(voice, "en-US-JennyNeural")
+        edge_voice = EDGE_VOICE_MAP.get(voice, "en-US-JennyNeural")
         audio = _generate_edge_tts_direct(text, edge_voice)
         if audio:
             return audio
     except Exception:
         pass
     try:
-        client = get_openai_client()
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text
-        )
-        return response.content
+        return synthesize_speech("listening.generate_audio_with_openai", text, voice=voice)
     except Exception as e:
         st.error(f"TTS Error: {e}")
         return None
 
 
 def _generate_edge_tts_direct(text, voice_name="en-US-JennyNeural", speed=1.0):
-    """Edge TTSで直接音声生成"""
-    try:
-        import edge_tts
-        import asyncio
-        import tempfile
-        import os
-    except ImportError:
+    """Edge TTSで直接音声生成（常駐ループにジョブを投入する）"""
+    from utils.edge_tts_service import get_edge_tts_service, is_available, rate_for_speed
+    if not is_available():
         return None
-
-    rate_str = "+0%"
-
-    async def _gen():
-        communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
-            tmp_path = tmp.name
-        await communicate.save(tmp_path)
-        with open(tmp_path, 'rb') as f:
-            data = f.read()
-        os.unlink(tmp_path)
-        return data
-
     try:
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(asyncio.run, _gen())
-                    return future.result(timeout=30)
-            else:
-                return loop.run_until_complete(_gen())
-        except RuntimeError:
-            return asyncio.run(_gen())
+        return get_edge_tts_service().synthesize(text, voice_name, rate_for_speed(speed))
     except Exception:
         return None
 
 
-def generate_dialogue_audio(script, voice_mapping=None):
-    """会話スクリプトを話者別の声で音声生成"""
+def generate_dialogue_audio(script, voice_mapping=None, same_speaker_gap_ms=None, speaker_change_gap_ms=None):
+    """会話スクリプトを話者別の声で音声生成（全行を並列に合成して1本のMP3に結合）"""
+    from utils.dialogue_audio import render_dialogue, SAME_SPEAKER_GAP_MS, SPEAKER_CHANGE_GAP_MS
     if voice_mapping is None:
         voice_mapping = {
             "A": "nova",
@@ -203,70 +170,82 @@ def generate_dialogue_audio(script, voice_mapping=None):
     parsed = parse_dialogue(script)
     if not parsed:
         return generate_audio_with_openai(script, voice_mapping.get("narrator", "alloy"))
-    audio_parts = []
-    for part in parsed:
-        speaker = part["speaker"]
-        text = part["text"]
-        voice = voice_mapping.get(speaker, voice_mapping.get("default", "alloy"))
-        audio = generate_audio_with_openai(text, voice)
-        if audio:
-            audio_parts.append(audio)
-    if audio_parts:
-        return combine_audio_parts(audio_parts)
-    return None
+    return render_dialogue(
+        parsed, voice_mapping,
+        same_speaker_gap_ms=SAME_SPEAKER_GAP_MS if same_speaker_gap_ms is None else same_speaker_gap_ms,
+        speaker_change_gap_ms=SPEAKER_CHANGE_GAP_MS if speaker_change_gap_ms is None else speaker_change_gap_ms,
+    )
+
 
+def combine_audio_parts(audio_parts, gap_ms=0):
+    """複数の音声データを1本のMP3ストリームに結合"""
+    from utils.mp3_stream import assemble_mp3
+    return assemble_mp3(audio_parts, gap_ms)
 
-def combine_audio_parts(audio_parts):
-    """複数の音声データを結合"""
-    combined = b''
-    for part in audio_parts:
-        combined += part
-    return combined
 
+def check_dictation(original, user_input, ai_feedback=False):
+    """ディクテーションの正確さをチェック（ローカル採点）
 
-def check_dictation(original, user_input):
-    """ディクテーションの正確さをチェック"""
-    client = get_openai_client()
-    prompt = f"""Compare the original text with the user's dictation and provide feedback.
+    ai_feedback=True のときだけ、励ましのフィードバック文をAIで生成する
+    """
+    from utils.dictation_scoring import score_dictation
+    result = score_dictation(original, user_input)
+    if ai_feedback and result["errors"]:
+        result.update(_dictation_ai_feedback(original, user_input, result))
+    return result
+
+
+def _dictation_ai_feedback(original, user_input, scored):
+    """採点済みの誤りをもとにフィードバック文だけを生成（失敗時は定型文のまま）"""
+    errors = "\n".join(
+        f"- {e['error_type']}: wrote \"{e['user_wrote']}\", should be \"{e['should_be']}\""
+        for e in scored["errors"]
+    )
+    prompt = f"""A learner did a dictation exercise.
 
 Original text: {original}
 User's dictation: {user_input}
+Accuracy: {scored['accuracy_percentage']}%
+Errors:
+{errors}
 
 Provide feedback in JSON format:
 {{
-    "accuracy_percentage": <0-100>,
-    "correct_parts": ["<correctly transcribed parts>"],
-    "errors": [
-        {{
-            "user_wrote": "<what user wrote>",
-            "should_be": "<correct text>",
-            "error_type": "<spelling/missing_word/extra_word/word_order>"
-        }}
-    ],
     "feedback": "<Encouraging feedback in English and Japanese>",
     "tips": "<Specific tips for improvement / 改善のためのヒント>"
 }}
 """
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening.check_dictation",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a dictation checker for English learners. Be encouraging but specific. Respond in valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
+            max_tokens=300,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
-        result["success"] = True
-        return result
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+        data = json.loads(content)
+        return {k: data[k] for k in ("feedback", "tips") if data.get(k)}
+    except Exception:
+        return {}
 
 
-def generate_listening_from_prompt(prompt, level="B1", duration="short"):
+def generate_listening_from_prompt(prompt, level="B1", duration="short", course_id=None, fresh=False):
+    """プロンプトからリスニング素材を生成（共有ライブラリ経由・コースの再利用方針に従う。fresh=True なら必ず新しく生成）"""
+    from utils.content_library import get_or_generate
+    return get_or_generate(
+        "listening", prompt, level,
+        lambda: _generate_listening(prompt, level, duration),
+        length=duration, course_id=course_id, fresh=fresh,
+        generation_args={"topic": prompt, "level": level, "length": duration},
+    )
+
+
+def _generate_listening(prompt, level="B1", duration="short"):
     """プロンプトからリスニング素材を生成"""
-    client = get_openai_client()
     duration_guide = {
         "short": "30-60 seconds, about 80-120 words",
         "medium": "1-2 minutes, about 150-250 words",
@@ -301,7 +280,8 @@ Output in JSON format:
 }}
 """
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening.generate_listening_from_prompt",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -310,7 +290,7 @@ Output in JSON format:
             temperature=0.8,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["generated"] = True
         return result
@@ -320,7 +300,6 @@ Output in JSON format:
 
 def generate_quiz_from_script(script, level="B1"):
     """スクリプトから理解度クイズを生成"""
-    client = get_openai_client()
     prompt = f"""Create 3 comprehension questions for this listening script. Level: {level}
 
 Script:
@@ -345,7 +324,8 @@ Rules:
 - The "correct" value must exactly match one of the four options
 """
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening.generate_quiz_from_script",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an English quiz creator. Create questions that genuinely test comprehension of the given text. Respond in valid JSON."},
@@ -354,7 +334,7 @@ Rules:
             temperature=0.5,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -376,34 +356,20 @@ def extract_youtube_id(url):
 
 
 def get_youtube_transcript(video_id):
-    """YouTube動画の字幕を取得"""
-    try:
-        from youtube_transcript_api import YouTubeTranscriptApi
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-        try:
-            transcript = transcript_list.find_transcript(['en'])
-        except:
-            try:
-                transcript = transcript_list.find_generated_transcript(['en'])
-            except:
-                return {"success": False, "error": "英語字幕が見つかりませんでした / No English subtitles found"}
-        captions = transcript.fetch()
-        full_text = ' '.join([item['text'] for item in captions])
-        return {
-            "success": True,
-            "transcript": full_text,
-            "segments": captions,
-            "language": transcript.language
-        }
-    except ImportError:
-        return {"success": False, "error": "youtube-transcript-api がインストールされていません"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    """YouTube動画の英語字幕を取得（utils.listening_youtube の保存付き実装を使う）
+
+    以前と同じく英語の字幕（手動・自動生成）だけを返し、翻訳字幕は使わない。
+    language は字幕の言語名（例: "English (auto-generated)"）。
+    """
+    from utils.listening_youtube import get_youtube_transcript as _get_youtube_transcript
+    result = _get_youtube_transcript(video_id)
+    if result.get("success") and result.get("method") == "translated":
+        return {"success": False, "error": "英語字幕が見つかりませんでした / No English subtitles found"}
+    return result
 
 
 def generate_exercises_from_transcript(transcript, video_title="", level="B1"):
     """字幕から学習素材を生成"""
-    client = get_openai_client()
     if len(transcript) > 3000:
         transcript = transcript[:3000] + "..."
     prompt = f"""Based on this YouTube video transcript, create English learning materials for a Japanese university student (Level: {level}).
@@ -444,7 +410,8 @@ Create learning materials in JSON format:
 }}
 """
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening.generate_exercises_from_transcript",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an English learning material creator for Japanese learners. Respond in valid JSON."},
@@ -453,7 +420,7 @@ Create learning materials in JSON format:
             temperature=0.7,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -461,42 +428,9 @@ Create learning materials in JSON format:
 
 
 def analyze_video_difficulty(transcript, level="B1"):
-    """動画の難易度を分析"""
-    client = get_openai_client()
-    sample = transcript[:1500] if len(transcript) > 1500 else transcript
-    prompt = f"""Analyze the difficulty of this English video transcript for a Japanese learner.
-
-Transcript sample: {sample}
-
-Provide analysis in JSON format:
-{{
-    "estimated_cefr": "<A2/B1/B2/C1/C2>",
-    "difficulty_factors": {{
-        "speech_speed": "<slow/moderate/fast>",
-        "vocabulary_level": "<basic/intermediate/advanced>",
-        "accent": "<description>",
-        "technical_terms": <true/false>,
-        "slang_informal": <true/false>
-    }},
-    "suitability_score": <1-10>,
-    "recommendations": "<Tips for studying with this video>"
-}}
-"""
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert in assessing English learning materials. Respond in valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        result = json.loads(response.choices[0].message.content)
-        result["success"] = True
-        return result
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    """動画の難易度を分析（ローカルの語彙・文長・読みやすさ指標で判定）"""
+    from utils.text_difficulty import analyze_difficulty
+    return analyze_difficulty(transcript, level)
 
 
 def get_voice_for_speaker(speaker, speaker_info=None):
@@ -522,9 +456,44 @@ def generate_dialogue_audio_with_speakers(script, speakers_info=None):
     return generate_dialogue_audio(script, voice_mapping)
 
 
-def check_youtube_dictation(user_text):
-    """YouTubeディクテーションのAI添削"""
-    client = get_openai_client()
+_ERROR_REASONS = {
+    "spelling": "綴りの誤り",
+    "wrong_word": "聞き間違い",
+    "missing_word": "聞き落とし",
+    "extra_word": "余分な語",
+    "word_order": "語順の誤り",
+}
+
+
+def check_youtube_dictation(user_text, reference=None):
+    """YouTubeディクテーションの添削
+
+    reference（動画の字幕）があれば該当区間を探してローカル採点し、APIは使わない。
+    なければAIが文法・綴りを添削する。
+    """
+    if reference:
+        from utils.dictation_scoring import find_reference_window, score_dictation
+        window = find_reference_window(reference, user_text)
+        if window:
+            scored = score_dictation(window, user_text)
+            good = scored["correct_parts"][:3]
+            return {
+                "success": True,
+                "score": scored["accuracy_percentage"],
+                "corrections": [
+                    {
+                        "original": e["user_wrote"] or "—",
+                        "corrected": e["should_be"] or "（削除）",
+                        "reason": _ERROR_REASONS.get(e["error_type"], e["error_type"]),
+                    }
+                    for e in scored["errors"]
+                ],
+                "good_points": f"正しく書けた部分: {' / '.join(good)}" if good else "",
+                "tip": scored["tips"] or scored["feedback"],
+                "reference": window,
+                "scoring": "local",
+            }
+
     prompt = f"""A Japanese university student wrote the following while watching an English YouTube video (dictation practice).
 Check their writing and provide feedback.
 
@@ -549,7 +518,8 @@ If the input looks correct with no issues, return an empty corrections list and
 Keep feedback encouraging and concise."""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening.check_youtube_dictation",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful English teacher giving encouraging feedback. Respond in valid JSON only."},
@@ -558,7 +528,7 @@ Keep feedback encouraging and concise."""
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
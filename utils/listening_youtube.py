@@ -1,16 +1,12 @@
 """YouTube関連の機能"""
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion
 import json
 import re
 import tempfile
 import os
 
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
-
 def extract_youtube_id(url):
     """YouTubeのURLからVideo IDを抽出"""
     patterns = [
@@ -24,8 +20,14 @@ def extract_youtube_id(url):
     return None
 
 
-def get_youtube_transcript(video_id):
-    """YouTube動画の字幕を取得（v1.0+ 新API対応）"""
+def get_youtube_transcript(video_id, use_cache=True):
+    """YouTube動画の字幕を取得（保存済みならネットワークに出ない）"""
+    from utils.transcript_store import get_transcript
+    return get_transcript(video_id, fetch=_fetch_youtube_transcript, use_cache=use_cache)
+
+
+def _fetch_youtube_transcript(video_id):
+    """YouTube動画の字幕をネットワークから取得（v1.0+ 新API対応）"""
     try:
         from youtube_transcript_api import YouTubeTranscriptApi
 
@@ -38,7 +40,7 @@ def get_youtube_transcript(video_id):
             transcript = transcript_list.find_transcript(['en', 'en-US', 'en-GB'])
             captions = transcript.fetch()
             full_text = ' '.join([item['text'] for item in captions])
-            return {"success": True, "transcript": full_text, "segments": list(captions), "method": "en"}
+            return {"success": True, "transcript": full_text, "segments": list(captions), "method": "en", "language": transcript.language}
         except Exception:
             pass
 
@@ -48,7 +50,7 @@ def get_youtube_transcript(video_id):
                 try:
                     captions = transcript.fetch()
                     full_text = ' '.join([item['text'] for item in captions])
-                    return {"success": True, "transcript": full_text, "segments": list(captions), "method": "any_en"}
+                    return {"success": True, "transcript": full_text, "segments": list(captions), "method": "any_en", "language": transcript.language}
                 except Exception:
                     continue
 
@@ -58,7 +60,7 @@ def get_youtube_transcript(video_id):
                 translated = transcript.translate('en')
                 captions = translated.fetch()
                 full_text = ' '.join([item['text'] for item in captions])
-                return {"success": True, "transcript": full_text, "segments": list(captions), "method": "translated"}
+                return {"success": True, "transcript": full_text, "segments": list(captions), "method": "translated", "language": translated.language}
             except Exception:
                 continue
 
@@ -90,7 +92,6 @@ def generate_learning_from_topic(topic, video_description="", level="B1"):
     トピックから学習素材を生成（動画の字幕なしで使用）
     学生が動画を見ながら使う補助教材
     """
-    client = get_openai_client()
     prompt = f"""A Japanese university student wants to learn English by watching a YouTube video about the following topic.
 Create learning materials to help them understand and learn from the video.
 
@@ -146,7 +147,8 @@ Guidelines:
 - Consider what Japanese learners might find difficult
 """
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening_youtube.generate_learning_from_topic",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Create English learning materials for Japanese students. Respond in valid JSON."},
@@ -155,16 +157,29 @@ Guidelines:
             temperature=0.7,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def generate_exercises_from_transcript(transcript, video_title="", level="B1"):
-    """字幕から学習素材を生成"""
-    client = get_openai_client()
+def generate_exercises_from_transcript(transcript, video_title="", level="B1", video_id=None):
+    """字幕から学習素材を生成（video_id指定時は生成結果を字幕と一緒に保存・再利用）"""
+    if video_id:
+        from utils.transcript_store import get_cached_analysis, annotate_dictation_segments
+        result = get_cached_analysis(
+            video_id, f"exercises:{level}",
+            lambda: _generate_exercises_from_transcript(transcript, video_title, level)
+        )
+        if result.get("success"):
+            result = {**result, "dictation_segments": annotate_dictation_segments(
+                video_id, result.get("dictation_segments", []))}
+        return result
+    return _generate_exercises_from_transcript(transcript, video_title, level)
+
+
+def _generate_exercises_from_transcript(transcript, video_title="", level="B1"):
     if len(transcript) > 3000:
         transcript = transcript[:3000] + "..."
     prompt = f"""Based on this video transcript, create English learning materials for a Japanese student (Level: {level}).
@@ -206,7 +221,8 @@ Create in JSON format:
 
 Include 8-12 vocabulary, 5 questions, 3-5 dictation segments."""
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "listening_youtube.generate_exercises_from_transcript",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Create learning materials from transcripts. Respond in valid JSON."},
@@ -215,47 +231,26 @@ Include 8-12 vocabulary, 5 questions, 3-5 dictation segments."""
             temperature=0.7,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def analyze_video_difficulty(transcript, level="B1"):
-    """動画の難易度を分析"""
-    client = get_openai_client()
-    sample = transcript[:1500] if len(transcript) > 1500 else transcript
-    prompt = f"""Analyze this transcript's difficulty for a Japanese learner ({level}).
-
-Transcript: {sample}
+def analyze_video_difficulty(transcript, level="B1", video_id=None):
+    """動画の難易度を分析（ローカルの語彙・文長・読みやすさ指標で判定）
 
-JSON format:
-{{
-    "estimated_cefr": "<A2/B1/B2/C1>",
-    "difficulty_factors": {{
-        "speech_speed": "<slow/moderate/fast>",
-        "vocabulary_level": "<basic/intermediate/advanced>",
-        "technical_terms": <true/false>
-    }},
-    "suitability_score": <1-10>,
-    "recommendations": "<学習アドバイス>"
-}}"""
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Assess difficulty. Respond in valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            response_format={"type": "json_object"}
-        )
-        result = json.loads(response.choices[0].message.content)
-        result["success"] = True
-        return result
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    video_id 指定時は保存済み字幕の再生時間から話速も求める。
+    """
+    from utils.text_difficulty import analyze_difficulty
+    duration_sec = None
+    if video_id:
+        from utils.transcript_store import get_transcript_index
+        index = get_transcript_index(video_id)
+        if index is not None and len(index):
+            duration_sec = index.duration_sec
+    return analyze_difficulty(transcript, level, duration_sec)
 
 
 # 教員用：動画リスト管理
@@ -50,6 +50,7 @@ def _load_from_db(module_type: str, course_id: str = None) -> Dict:
                 'category': row.get('category', ''),
                 'description': row.get('description', ''),
                 '_db_id': row.get('id'),  # DB管理用
+                '_derived': row.get('derived') or {},  # 事前生成済みの問題
                 **content,
             }
             materials[key] = data
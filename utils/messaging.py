@@ -1,337 +1,487 @@
+"""
+Messaging
+=========
+ダイレクトメッセージ・お知らせ・質問掲示板。
+
+- すべて DB（messages / announcements / board_posts）に保存し、ユーザー間で共有する
+- お知らせはクラスの全員分の受信行をまとめて insert する（受信箱は自分宛の行を読むだけ）
+- 未読数は message_counters の1行（トリガーが増減する）
+- 一覧はカーソルでページングするので、受信箱の表示は履歴の長さに関係なく
+  未読数1回 + ページ1回のインデックス付きクエリで済む
+
+使い方:
+    from utils.messaging import get_unread_count, get_inbox
+    page = get_inbox(user["id"])          # {"items": [...], "next_cursor": ...}
+"""
+
 import streamlit as st
-from datetime import datetime
-
-
-def get_user_key():
-    user = st.session_state.get('user')
-    if user:
-        return user.get('student_id') or user.get('email') or 'unknown'
-    return 'unknown'
-
-
-def get_messages_store():
-    """メッセージストアを取得"""
-    if 'messages_store' not in st.session_state:
-        st.session_state.messages_store = {
-            'direct_messages': [],
-            'announcements': [],
-            'question_board': [],
-        }
-    return st.session_state.messages_store
-
-
-def send_direct_message(from_id, from_name, from_role, to_id, to_name, subject, body):
-    """ダイレクトメッセージ送信"""
-    store = get_messages_store()
-    msg = {
-        'id': f"dm_{len(store['direct_messages'])+1}",
-        'from_id': from_id,
-        'from_name': from_name,
-        'from_role': from_role,
-        'to_id': to_id,
-        'to_name': to_name,
-        'subject': subject,
-        'body': body,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-        'read': False,
-    }
-    store['direct_messages'].append(msg)
-    return msg
-
-
-def post_announcement(from_id, from_name, class_key, title, body, priority='normal'):
-    """お知らせ投稿"""
-    store = get_messages_store()
-    ann = {
-        'id': f"ann_{len(store['announcements'])+1}",
-        'from_id': from_id,
-        'from_name': from_name,
-        'class_key': class_key,
-        'title': title,
-        'body': body,
-        'priority': priority,
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-        'read_by': [],
-    }
-    store['announcements'].append(ann)
+from typing import Dict, List, Optional
+
+
+PAGE_SIZE = 20
+TAGS = ["speaking", "writing", "reading", "listening", "vocabulary", "grammar", "pronunciation", "other"]
+
+
+def format_timestamp(value: str) -> str:
+    """"2026-04-01T09:30:00.123+00:00" → "2026-04-01 09:30\""""
+    return (value or "")[:16].replace("T", " ")
+
+
+# ============================================================
+# ダイレクトメッセージ
+# ============================================================
+
+def send_direct_message(from_id, from_name, from_role, to_id, to_name, subject, body,
+                        course_id=None, thread_id=None) -> Optional[Dict]:
+    """ダイレクトメッセージ送信（thread_id を渡すとそのスレッドへの返信）"""
+    from utils.database import insert_messages
+    rows = insert_messages([{
+        "kind": "direct",
+        "thread_id": thread_id,
+        "sender_id": from_id,
+        "sender_name": from_name,
+        "sender_role": from_role,
+        "recipient_id": to_id,
+        "recipient_name": to_name,
+        "course_id": course_id,
+        "subject": subject,
+        "body": body,
+    }])
+    if rows:
+        from utils.notifications import notify
+        notify([to_id], "message", f"✉️ {from_name}: {subject}", body,
+               view="messaging", ref_id=rows[0]["id"], course_id=course_id)
+    return rows[0] if rows else None
+
+
+def get_unread_count(user_id) -> int:
+    """未読メッセージ数（ダイレクトメッセージとお知らせ）"""
+    try:
+        from utils.database import get_unread_message_count
+        return get_unread_message_count(user_id)
+    except Exception:
+        return 0
+
+
+def get_inbox(user_id, cursor: str = None, limit: int = PAGE_SIZE, kind: str = None) -> Dict:
+    """自分宛のメッセージ（新しい順）の1ページ"""
+    from utils.database import get_inbox_page
+    return get_inbox_page(user_id, cursor, limit, kind)
+
+
+def get_sent_messages(user_id, cursor: str = None, limit: int = PAGE_SIZE) -> Dict:
+    """送信済みメッセージの1ページ"""
+    from utils.database import get_sent_messages_page
+    return get_sent_messages_page(user_id, cursor, limit)
+
+
+def get_thread(thread_id, cursor: str = None, limit: int = PAGE_SIZE) -> Dict:
+    """スレッドの1ページ（新しい順）"""
+    from utils.database import get_message_thread_page
+    return get_message_thread_page(thread_id, cursor, limit)
+
+
+def mark_read(user_id, message_ids: List[str] = None) -> int:
+    """既読にする（message_ids 省略時はすべて）。未読数はトリガーが減らす"""
+    from utils.database import mark_messages_read
+    return mark_messages_read(user_id, message_ids)
+
+
+# ============================================================
+# お知らせ
+# ============================================================
+
+def post_announcement(from_id, from_name, course_id, title, body, priority='normal') -> Optional[Dict]:
+    """お知らせを投稿し、コースの学生全員の受信箱にまとめて配信する"""
+    from utils.database import create_announcement, get_course_students, insert_messages
+
+    recipients = [s for s in get_course_students(course_id) if s.get("id") and s["id"] != from_id]
+    ann = create_announcement({
+        "course_id": course_id,
+        "sender_id": from_id,
+        "sender_name": from_name,
+        "title": title,
+        "body": body,
+        "priority": priority,
+        "recipient_count": len(recipients),
+    })
+    if not ann:
+        return None
+    insert_messages([{
+        "kind": "announcement",
+        "announcement_id": ann["id"],
+        "sender_id": from_id,
+        "sender_name": from_name,
+        "sender_role": "teacher",
+        "recipient_id": s["id"],
+        "recipient_name": s.get("name") or "",
+        "course_id": course_id,
+        "subject": title,
+        "body": body,
+        "priority": priority,
+    } for s in recipients])
+    from utils.notifications import notify
+    notify([s["id"] for s in recipients], "announcement", f"📢 {title}", body,
+           view="messaging", ref_id=ann["id"], course_id=course_id)
     return ann
 
 
-def post_question(from_id, from_name, class_key, title, body, tags=None):
+def get_class_announcements(course_id, cursor: str = None, limit: int = PAGE_SIZE) -> Dict:
+    """コースのお知らせの1ページ"""
+    from utils.database import get_course_announcements_page
+    return get_course_announcements_page(course_id, cursor, limit)
+
+
+# ============================================================
+# 質問掲示板
+# ============================================================
+
+def post_question(from_id, from_name, course_id, title, body, tags=None) -> Optional[Dict]:
     """質問掲示板に投稿"""
-    store = get_messages_store()
-    q = {
-        'id': f"q_{len(store['question_board'])+1}",
-        'from_id': from_id,
-        'from_name': from_name,
-        'class_key': class_key,
-        'title': title,
-        'body': body,
-        'tags': tags or [],
-        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-        'replies': [],
-        'resolved': False,
-        'upvotes': 0,
-    }
-    store['question_board'].append(q)
-    return q
-
-
-def reply_to_question(question_id, from_id, from_name, from_role, body):
-    """質問に回答"""
-    store = get_messages_store()
-    for q in store['question_board']:
-        if q['id'] == question_id:
-            reply = {
-                'id': f"r_{len(q['replies'])+1}",
-                'from_id': from_id,
-                'from_name': from_name,
-                'from_role': from_role,
-                'body': body,
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-                'is_best_answer': False,
-            }
-            q['replies'].append(reply)
-            return reply
-    return None
-
-
-def get_unread_count(user_id):
-    """未読メッセージ数"""
-    store = get_messages_store()
-    count = 0
-    for msg in store['direct_messages']:
-        if msg['to_id'] == user_id and not msg['read']:
-            count += 1
-    return count
-
-
-def get_my_messages(user_id):
-    """自分宛のメッセージ"""
-    store = get_messages_store()
-    return [m for m in store['direct_messages'] if m['to_id'] == user_id]
-
-
-def get_sent_messages(user_id):
-    """送信済みメッセージ"""
-    store = get_messages_store()
-    return [m for m in store['direct_messages'] if m['from_id'] == user_id]
-
-
-def get_class_announcements(class_key=None):
-    """クラスのお知らせ"""
-    store = get_messages_store()
-    if class_key:
-        return [a for a in store['announcements'] if a['class_key'] == class_key]
-    return store['announcements']
-
-
-def get_class_questions(class_key=None):
-    """クラスの質問"""
-    store = get_messages_store()
-    if class_key:
-        return [q for q in store['question_board'] if q['class_key'] == class_key]
-    return store['question_board']
-
-
-# ===== 初期データ（空） =====
-
-def init_demo_messages():
-    """メッセージストアを初期化（空の状態で開始）"""
-    # デモデータは使用しない。
-    # 教員がお知らせを投稿するか、学生が質問を投稿するまで空。
-    pass
-
-
-# ===== UI表示関数 =====
+    from utils.database import create_board_post
+    return create_board_post({
+        "course_id": course_id,
+        "author_id": from_id,
+        "author_name": from_name,
+        "author_role": "student",
+        "title": title,
+        "body": body,
+        "tags": tags or [],
+    })
+
+
+def reply_to_question(question, from_id, from_name, from_role, body) -> Optional[Dict]:
+    """質問に回答（回答数はトリガーが増やす）"""
+    from utils.database import create_board_post
+    return create_board_post({
+        "course_id": question["course_id"],
+        "parent_id": question["id"],
+        "author_id": from_id,
+        "author_name": from_name,
+        "author_role": from_role,
+        "body": body,
+    })
+
+
+def get_class_questions(course_id, cursor: str = None, limit: int = PAGE_SIZE, tag: str = None) -> Dict:
+    """コースの質問の1ページ。回答は1回のクエリでまとめて各質問の "replies" に入れる"""
+    from utils.database import get_board_questions_page, get_board_replies
+
+    page = get_board_questions_page(course_id, cursor, limit, tag)
+    replies: Dict[str, List[Dict]] = {}
+    for r in get_board_replies([q["id"] for q in page["items"] if q.get("reply_count")]):
+        replies.setdefault(r["parent_id"], []).append(r)
+    for q in page["items"]:
+        q["replies"] = replies.get(q["id"], [])
+    return page
+
+
+def upvote_question(question: Dict) -> bool:
+    """いいね（表示時の値からの条件付き更新。同時に押されて競合したら False）"""
+    from utils.database import increment_board_upvotes
+    return increment_board_upvotes(question["id"], question.get("upvotes") or 0) is not None
+
+
+# ============================================================
+# UI表示関数
+# ============================================================
+
+def _current_course_id(user) -> Optional[str]:
+    """教員は選択中のクラス、学生は履修コースの course_id"""
+    if user.get('role') == 'teacher':
+        selected = st.session_state.get('selected_class')
+        c = st.session_state.get('teacher_classes', {}).get(selected) or {}
+        if c.get('db_id') or c.get('course_id'):
+            return c.get('db_id') or c.get('course_id')
+        try:
+            from utils.database import get_teacher_courses
+            courses = get_teacher_courses(user['id'])
+        except Exception:
+            courses = []
+    else:
+        try:
+            from utils.database import get_student_courses
+            courses = get_student_courses(user['id'])
+        except Exception:
+            courses = []
+    return courses[0].get('id') if courses else None
+
+
+def _pager(state_key: str, next_cursor: Optional[str]):
+    """「次へ」「最初に戻る」ボタン（カーソルを session_state に置く）"""
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.session_state.get(state_key) and st.button("⏮ 最初に戻る", key=f"{state_key}_first"):
+            st.session_state.pop(state_key, None)
+            st.rerun()
+    with col2:
+        if next_cursor and st.button("次へ ▶", key=f"{state_key}_next"):
+            st.session_state[state_key] = next_cursor
+            st.rerun()
+
 
 def show_messaging_page(user):
     """メッセージングページ"""
-    
-    init_demo_messages()
-    
-    user_id = user.get('student_id') or user.get('email') or 'unknown'
+
+    user_id = user.get('id')
     user_name = user.get('name', 'Unknown')
     user_role = user.get('role', 'student')
-    
+    course_id = _current_course_id(user)
+
     st.markdown("## 💬 メッセージ / Messages")
-    
+
     if st.button("← ホームに戻る"):
         st.session_state['current_view'] = 'teacher_home' if user_role == 'teacher' else 'student_home'
         st.rerun()
-    
+
+    if not user_id:
+        st.warning("ログインしてください")
+        return
+
     unread = get_unread_count(user_id)
     if unread > 0:
         st.info(f"📩 未読メッセージが{unread}件あります")
-    
+
     st.markdown("---")
-    
+
     if user_role == 'teacher':
         tab1, tab2, tab3, tab4 = st.tabs(["📢 お知らせ", "📩 受信箱", "✉️ メッセージ送信", "❓ 質問掲示板"])
     else:
         tab1, tab2, tab3, tab4 = st.tabs(["📢 お知らせ", "📩 メッセージ", "✉️ 先生に質問", "❓ 質問掲示板"])
-    
+
     with tab1:
-        show_announcements_tab(user_id, user_name, user_role)
-    
+        show_announcements_tab(user_id, user_name, user_role, course_id)
+
     with tab2:
-        show_inbox_tab(user_id, user_name, user_role)
-    
+        show_inbox_tab(user_id, user_name, user_role, course_id)
+
     with tab3:
-        show_compose_tab(user_id, user_name, user_role)
-    
+        show_compose_tab(user_id, user_name, user_role, course_id)
+
     with tab4:
-        show_question_board_tab(user_id, user_name, user_role)
+        show_question_board_tab(user_id, user_name, user_role, course_id)
 
 
-def show_announcements_tab(user_id, user_name, user_role):
+def show_announcements_tab(user_id, user_name, user_role, course_id):
     """お知らせタブ"""
-    
+
+    if not course_id:
+        st.info("クラスが選択されていません")
+        return
+
     if user_role == 'teacher':
         st.markdown("#### 📢 お知らせを投稿")
-        
-        class_key = st.session_state.get('selected_class', '')
+
         title = st.text_input("タイトル", key="ann_title")
         body = st.text_area("内容", key="ann_body", height=100)
         priority = st.radio("重要度", ["normal", "high"], format_func=lambda x: {"normal": "通常", "high": "🔴 重要"}[x], horizontal=True)
-        
+
         if st.button("📢 投稿", type="primary"):
             if title and body:
-                post_announcement(user_id, user_name, class_key, title, body, priority)
-                st.success("お知らせを投稿しました！")
-                st.rerun()
+                try:
+                    ann = post_announcement(user_id, user_name, course_id, title, body, priority)
+                    st.success(f"お知らせを投稿しました！（{(ann or {}).get('recipient_count', 0)}人に配信）")
+                    st.session_state.pop('ann_cursor', None)
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"投稿に失敗しました: {e}")
             else:
                 st.warning("タイトルと内容を入力してください")
-        
+
         st.markdown("---")
-    
+
     st.markdown("#### 📋 お知らせ一覧")
-    announcements = get_class_announcements()
-    
-    if not announcements:
+    try:
+        page = get_class_announcements(course_id, st.session_state.get('ann_cursor'))
+    except Exception as e:
+        st.error(f"読み込みエラー: {e}")
+        return
+
+    if not page["items"]:
         st.info("お知らせはまだありません")
         return
-    
-    for ann in reversed(announcements):
+
+    for ann in page["items"]:
         priority_icon = "🔴" if ann['priority'] == 'high' else "📢"
-        with st.expander(f"{priority_icon} {ann['title']} ({ann['timestamp']})"):
+        with st.expander(f"{priority_icon} {ann['title']} ({format_timestamp(ann['created_at'])})"):
             st.markdown(ann['body'])
-            st.caption(f"投稿者: {ann['from_name']}")
+            st.caption(f"投稿者: {ann['sender_name']}")
+    _pager('ann_cursor', page["next_cursor"])
 
 
-def show_inbox_tab(user_id, user_name, user_role):
+def show_inbox_tab(user_id, user_name, user_role, course_id):
     """受信箱タブ"""
-    
-    messages = get_my_messages(user_id)
-    
-    st.markdown(f"#### 📩 受信メッセージ ({len(messages)}件)")
-    
+
+    try:
+        page = get_inbox(user_id, st.session_state.get('inbox_cursor'))
+    except Exception as e:
+        st.error(f"読み込みエラー: {e}")
+        return
+    messages = page["items"]
+
+    st.markdown("#### 📩 受信メッセージ")
+
     if not messages:
         st.info("メッセージはまだありません")
         return
-    
-    for msg in reversed(messages):
-        read_icon = "📩" if not msg['read'] else "✉️"
-        with st.expander(f"{read_icon} {msg['subject']} - {msg['from_name']} ({msg['timestamp']})"):
+
+    for msg in messages:
+        read_icon = "📩" if not msg.get('read_at') else "✉️"
+        kind_icon = "📢 " if msg['kind'] == 'announcement' else ""
+        with st.expander(f"{read_icon} {kind_icon}{msg['subject']} - {msg['sender_name']} ({format_timestamp(msg['created_at'])})"):
             st.markdown(msg['body'])
-            st.caption(f"送信者: {msg['from_name']}")
-            if not msg['read']:
-                msg['read'] = True
+            st.caption(f"送信者: {msg['sender_name']}")
+            if msg['kind'] == 'direct' and msg.get('sender_id'):
+                reply = st.text_area("返信", key=f"dm_reply_{msg['id']}", height=80)
+                if st.button("↩️ 返信する", key=f"dm_reply_btn_{msg['id']}") and reply:
+                    send_direct_message(
+                        user_id, user_name, user_role, msg['sender_id'], msg['sender_name'],
+                        f"Re: {msg['subject']}", reply,
+                        course_id=msg.get('course_id') or course_id,
+                        thread_id=msg.get('thread_id') or msg['id'],
+                    )
+                    st.success("返信しました！")
+
+    # 表示したページの未読はまとめて既読にする
+    unread_ids = [m['id'] for m in messages if not m.get('read_at')]
+    if unread_ids:
+        try:
+            mark_read(user_id, unread_ids)
+        except Exception:
+            pass
+    _pager('inbox_cursor', page["next_cursor"])
+
+
+def show_compose_tab(user_id, user_name, user_role, course_id):
+    """メッセージ作成タブ"""
 
+    if not course_id:
+        st.info("クラスが選択されていません")
+        return
 
-def show_compose_tab(user_id, user_name, user_role):
-    """メッセージ作成タブ"""
-    
     if user_role == 'teacher':
         st.markdown("#### ✉️ メッセージ送信")
-        to_name = st.text_input("宛先（学生名）", key="compose_to")
-        to_id = to_name.lower().replace(' ', '_') if to_name else ''
+        try:
+            from utils.database import get_course_students
+            students = [s for s in get_course_students(course_id) if s.get('id')]
+        except Exception:
+            students = []
+        if not students:
+            st.info("このクラスには学生がいません")
+            return
+        recipient = st.selectbox(
+            "宛先（学生）", students,
+            format_func=lambda s: f"{s.get('name', '')} ({s.get('student_id') or s.get('email', '')})",
+            key="compose_to",
+        )
+        to_id, to_name = recipient['id'], recipient.get('name', '')
     else:
         st.markdown("#### ✉️ 先生にメッセージ")
+        try:
+            from utils.database import get_course
+            to_id = (get_course(course_id) or {}).get('teacher_id')
+        except Exception:
+            to_id = None
         to_name = "先生"
-        to_id = "teacher"
-    
+        if not to_id:
+            st.info("担当の先生が見つかりません")
+            return
+
     subject = st.text_input("件名", key="compose_subject")
     body = st.text_area("本文", key="compose_body", height=150)
-    
+
     if st.button("📤 送信", type="primary", key="compose_send"):
         if subject and body:
-            send_direct_message(user_id, user_name, user_role, to_id, to_name, subject, body)
-            st.success(f"メッセージを{to_name}に送信しました！")
+            try:
+                send_direct_message(user_id, user_name, user_role, to_id, to_name, subject, body,
+                                    course_id=course_id)
+                st.success(f"メッセージを{to_name}に送信しました！")
+            except Exception as e:
+                st.error(f"送信に失敗しました: {e}")
         else:
             st.warning("件名と本文を入力してください")
 
 
-def show_question_board_tab(user_id, user_name, user_role):
+def show_question_board_tab(user_id, user_name, user_role, course_id):
     """質問掲示板タブ"""
-    
+
     st.markdown("#### ❓ 質問掲示板")
-    
+
+    if not course_id:
+        st.info("クラスが選択されていません")
+        return
+
     # 新規質問
     with st.expander("📝 新しい質問を投稿"):
         q_title = st.text_input("質問タイトル", key="q_title")
         q_body = st.text_area("質問内容", key="q_body", height=100)
-        q_tags = st.multiselect("タグ", ["speaking", "writing", "reading", "listening", "vocabulary", "grammar", "pronunciation", "other"], key="q_tags")
-        
-        class_key = st.session_state.get('selected_class', 'english_1_a')
-        
+        q_tags = st.multiselect("タグ", TAGS, key="q_tags")
+
         if st.button("📤 質問を投稿", key="q_submit"):
             if q_title and q_body:
-                post_question(user_id, user_name, class_key, q_title, q_body, q_tags)
+                post_question(user_id, user_name, course_id, q_title, q_body, q_tags)
+                st.session_state.pop('board_cursor', None)
                 st.success("質問を投稿しました！")
                 st.rerun()
             else:
                 st.warning("タイトルと内容を入力してください")
-    
+
     st.markdown("---")
-    
+
     # フィルター
-    filter_tag = st.selectbox("タグでフィルター", ["all"] + ["speaking", "writing", "reading", "listening", "vocabulary", "grammar", "pronunciation"],
+    filter_tag = st.selectbox("タグでフィルター", ["all"] + TAGS[:-1],
                               format_func=lambda x: "すべて" if x == "all" else x)
-    
-    questions = get_class_questions()
-    
-    if filter_tag != "all":
-        questions = [q for q in questions if filter_tag in q.get('tags', [])]
-    
+    if st.session_state.get('board_filter_tag') != filter_tag:
+        st.session_state['board_filter_tag'] = filter_tag
+        st.session_state.pop('board_cursor', None)
+
+    try:
+        page = get_class_questions(course_id, st.session_state.get('board_cursor'),
+                                   tag=None if filter_tag == "all" else filter_tag)
+    except Exception as e:
+        st.error(f"読み込みエラー: {e}")
+        return
+    questions = page["items"]
+
     if not questions:
         st.info("質問はまだありません。最初の質問を投稿してみましょう！")
         return
-    
+
     # 質問表示
-    for q in reversed(questions):
+    for q in questions:
         resolved_icon = "✅" if q['resolved'] else "❓"
-        reply_count = len(q.get('replies', []))
-        
+        reply_count = q.get('reply_count') or 0
+
         with st.expander(f"{resolved_icon} {q['title']} ({reply_count}件の回答) - 👍{q['upvotes']}"):
-            st.markdown(f"**{q['from_name']}** ({q['timestamp']})")
+            st.markdown(f"**{q['author_name']}** ({format_timestamp(q['created_at'])})")
             st.markdown(q['body'])
-            
+
             if q.get('tags'):
                 st.caption(f"タグ: {', '.join(q['tags'])}")
-            
+
             # 回答表示
             if q['replies']:
                 st.markdown("---")
                 st.markdown("**回答:**")
                 for reply in q['replies']:
-                    role_badge = "👨‍🏫" if reply['from_role'] == 'teacher' else "🎓"
+                    role_badge = "👨‍🏫" if reply['author_role'] == 'teacher' else "🎓"
                     best = "⭐ ベストアンサー" if reply.get('is_best_answer') else ""
-                    st.markdown(f"{role_badge} **{reply['from_name']}** {best}")
+                    st.markdown(f"{role_badge} **{reply['author_name']}** {best}")
                     st.markdown(f"> {reply['body']}")
-                    st.caption(reply['timestamp'])
-            
+                    st.caption(format_timestamp(reply['created_at']))
+
             # 回答入力
             reply_body = st.text_area("回答を入力", key=f"reply_{q['id']}", height=80)
-            
+
             col1, col2 = st.columns(2)
             with col1:
                 if st.button("💬 回答する", key=f"reply_btn_{q['id']}"):
                     if reply_body:
-                        reply_to_question(q['id'], user_id, user_name, user_role, reply_body)
+                        reply_to_question(q, user_id, user_name, user_role, reply_body)
                         st.success("回答を投稿しました！")
                         st.rerun()
             with col2:
                 if st.button(f"👍 {q['upvotes']}", key=f"upvote_{q['id']}"):
-                    q['upvotes'] += 1
+                    upvote_question(q)
                     st.rerun()
+    _pager('board_cursor', page["next_cursor"])
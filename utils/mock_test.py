@@ -0,0 +1,447 @@
+"""
+Mock Test Engine
+================
+検定試験の模擬テストを問題バンク（utils/test_question_bank）から組み立てて実施・採点する。
+
+- セクションごとに本番と同じ1問あたりの時間で制限時間を決める（full は本番の問題数まで、short は10問）
+- 出題は適応型: 1問ごとに能力値 θ（Rasch モデル, EAP 推定）を更新し、
+  いまの θ で情報量 p(1-p) が最大に近い問題を選ぶ（同じ問題ばかり出ないよう上位数問から選ぶ）
+- 回答・所要時間はセッション内にため、提出時に mock_test_responses へまとめて保存する
+- 問題ごとの統計（正答率・難易度 b・識別力 = 残り得点との点双列相関）は十分統計量
+  （n, Σx, Σy, Σy², Σxy, Σθ）で持つので、提出ごとの逐次更新とコース全体の再計算が同じ値になる
+- 全履歴からの再計算は NumPy でベクトル化（python recompute_item_stats.py）
+
+使い方:
+    from utils.mock_test import build_section_plan, MockTestSession, save_mock_test
+    plan = build_section_plan(test_type, test_info, bank, length="short")
+    session = MockTestSession(test_type, plan, bank, item_stats)
+    q = session.current_question()
+    session.answer("B")
+"""
+
+import math
+import random
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.test_question_bank import DIFFICULTY_ORDER, difficulty_key
+
+
+# ====================================================================
+# 設定
+# ====================================================================
+
+SHORT_FORM_QUESTIONS = 10        # short: 1セクションあたりの問題数
+DEFAULT_SEC_PER_QUESTION = 60    # 時間配分が決まっていない試験（英検など）
+MIN_RESPONSES_FOR_STATS = 20     # これ未満の回答数の問題はバンクの難易度ラベルを使う
+SELECTION_TOP_K = 3              # 情報量上位 K 問から選ぶ（露出の偏りを抑える）
+
+# バンクの難易度ラベル → Rasch 難易度 b の事前値
+PRIOR_DIFFICULTY = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+THETA_GRID = np.linspace(-4.0, 4.0, 161)
+_LOG_PRIOR = -0.5 * THETA_GRID ** 2   # N(0, 1)
+
+
+# ====================================================================
+# 能力推定と出題
+# ====================================================================
+
+def estimate_ability(difficulties, responses) -> Tuple[float, float]:
+    """Rasch モデルの EAP 推定（全問正解・全問不正解でも有限値になる）
+
+    Returns: (θ, 標準誤差)
+    """
+    b = np.asarray(difficulties, dtype=float)
+    x = np.asarray(responses, dtype=float)
+    log_post = _LOG_PRIOR.copy()
+    if b.size:
+        z = THETA_GRID[:, None] - b[None, :]
+        # log p = -log(1+e^-z), log(1-p) = -log(1+e^z)
+        log_post += (-(x * np.logaddexp(0, -z)) - (1 - x) * np.logaddexp(0, z)).sum(axis=1)
+    w = np.exp(log_post - log_post.max())
+    w /= w.sum()
+    theta = float((w * THETA_GRID).sum())
+    se = float(math.sqrt(max((w * (THETA_GRID - theta) ** 2).sum(), 0.0)))
+    return theta, se
+
+
+def item_information(theta: float, difficulties) -> np.ndarray:
+    p = 1.0 / (1.0 + np.exp(-(theta - np.asarray(difficulties, dtype=float))))
+    return p * (1 - p)
+
+
+def item_difficulty(qid: str, difficulty: str, item_stats: Dict = None) -> float:
+    """回答が十分あれば統計の b、なければバンクの難易度ラベルから"""
+    row = (item_stats or {}).get(qid)
+    if row and row.get("n", 0) >= MIN_RESPONSES_FOR_STATS and row.get("difficulty_b") is not None:
+        return float(row["difficulty_b"])
+    return PRIOR_DIFFICULTY[difficulty_key(difficulty)]
+
+
+def select_item(candidates: List[Tuple[str, float]], theta: float,
+                rng: random.Random = None, top_k: int = SELECTION_TOP_K) -> Optional[str]:
+    """候補 [(qid, b)] から θ での情報量が大きい上位 top_k 問のうち1問を選ぶ"""
+    if not candidates:
+        return None
+    rng = rng or random
+    info = item_information(theta, [b for _, b in candidates])
+    order = np.argsort(-info, kind="stable")[:max(1, top_k)]
+    return candidates[int(rng.choice(list(order)))][0]
+
+
+# ====================================================================
+# 試験の組み立て
+# ====================================================================
+
+def _seconds_per_question(section: Dict) -> int:
+    minutes, count = section.get("time"), section.get("questions")
+    if isinstance(minutes, (int, float)) and isinstance(count, int) and count > 0:
+        return max(10, int(minutes * 60 / count))
+    return DEFAULT_SEC_PER_QUESTION
+
+
+def build_section_plan(test_type: str, test_info: Dict, bank, length: str = "short") -> List[Dict]:
+    """セクションごとの問題数と制限時間
+
+    full は本番の問題数、short は SHORT_FORM_QUESTIONS 問（いずれもバンクにある問題数まで）。
+    バンクに問題のないセクション（スピーキング・ライティングなど）は含めない。
+    """
+    plan = []
+    for section in test_info.get("sections", []):
+        key = section.get("key")
+        available = bank.count(test_type, key)
+        if not key or not available:
+            continue
+        official = section.get("questions")
+        wanted = official if length == "full" and isinstance(official, int) else SHORT_FORM_QUESTIONS
+        n_items = min(wanted, available)
+        per_question = _seconds_per_question(section)
+        plan.append({
+            "key": key,
+            "name": section.get("name", key),
+            "n_items": n_items,
+            "sec_per_question": per_question,
+            "time_limit_sec": n_items * per_question,
+        })
+    return plan
+
+
+def _section_pool(bank, test_type: str, section: str, item_stats: Dict) -> Dict[str, float]:
+    """セクションの全問題 → 難易度 b"""
+    pool = {}
+    for difficulty in DIFFICULTY_ORDER:
+        for qid in bank.ids(test_type, section, difficulty=difficulty):
+            pool.setdefault(qid, item_difficulty(qid, difficulty, item_stats))
+    return pool
+
+
+class MockTestSession:
+    """1回分の模擬テスト（st.session_state に置いて再実行をまたいで使う）
+
+    セクションは順番に進み、制限時間を過ぎたセクションはその時点で打ち切る。
+    θ はセクションをまたいで引き継ぐ（出題の初期値として使う）。
+    """
+
+    def __init__(self, test_type: str, plan: List[Dict], bank, item_stats: Dict = None,
+                 exclude=(), rng: random.Random = None, clock=time.time):
+        self.attempt_id = str(uuid.uuid4())
+        self.test_type = test_type
+        self.plan = plan
+        self.rng = rng or random.Random()
+        self._clock = clock
+        self._bank = bank
+        self._pools = {s["key"]: _section_pool(bank, test_type, s["key"], item_stats) for s in plan}
+        self._exclude = set(exclude or ())
+
+        self.responses: List[Dict] = []
+        self.theta, self.se = 0.0, 1.0
+        self.section_index = 0
+        self.section_started_at = None
+        self.pending = None          # 表示中の問題 {"qid", "question", "b", "shown_at"}
+        self.started_at = self._clock()
+        self.finished_at = None if plan else self.started_at
+        self.timed_out_sections: List[str] = []
+
+    # ---- 進行状況 ----
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def section(self) -> Optional[Dict]:
+        if self.section_index < len(self.plan):
+            return self.plan[self.section_index]
+        return None
+
+    def section_responses(self, key: str) -> List[Dict]:
+        return [r for r in self.responses if r["section"] == key]
+
+    def time_left(self, now: float = None) -> float:
+        section = self.section
+        if section is None or self.section_started_at is None:
+            return section["time_limit_sec"] if section else 0
+        now = self._clock() if now is None else now
+        return section["time_limit_sec"] - (now - self.section_started_at)
+
+    def _advance_section(self, timed_out: bool = False):
+        if timed_out and self.section:
+            self.timed_out_sections.append(self.section["key"])
+        self.pending = None
+        self.section_index += 1
+        self.section_started_at = None
+        if self.section is None:
+            self.finished_at = self._clock()
+
+    def end_section(self):
+        """残りの問題を解かずに次のセクションへ"""
+        if not self.finished:
+            self._advance_section()
+
+    # ---- 出題と回答 ----
+
+    def current_question(self) -> Optional[Dict]:
+        """表示する問題（なければ次の問題を選ぶ）。テスト終了なら None"""
+        while not self.finished:
+            section = self.section
+            if self.section_started_at is None:
+                self.section_started_at = self._clock()
+            if self.time_left() <= 0:
+                self._advance_section(timed_out=True)
+                continue
+            if self.pending:
+                return self.pending["question"]
+            if len(self.section_responses(section["key"])) >= section["n_items"]:
+                self._advance_section()
+                continue
+            qid = self._next_item(section["key"])
+            if qid is None:
+                self._advance_section()
+                continue
+            self.pending = {"qid": qid, "b": self._pools[section["key"]][qid],
+                            "question": self._question(qid), "shown_at": self._clock()}
+        return None
+
+    def _next_item(self, section_key: str) -> Optional[str]:
+        used = {r["item_id"] for r in self.responses}
+        pool = self._pools[section_key]
+        fresh = [(qid, b) for qid, b in pool.items() if qid not in used and qid not in self._exclude]
+        candidates = fresh or [(qid, b) for qid, b in pool.items() if qid not in used]
+        return select_item(candidates, self.theta, self.rng)
+
+    def _question(self, qid: str) -> Dict:
+        q = dict(self._bank.get(qid))
+        q["bank_id"] = qid
+        return q
+
+    def answer(self, choice: Optional[str], now: float = None) -> Optional[Dict]:
+        """表示中の問題に回答する（choice は "A"〜"D"、None は無回答）
+
+        制限時間を過ぎていれば回答は記録せずセクションを打ち切る（None を返す）。
+        """
+        if self.finished or not self.pending:
+            return None
+        now = self._clock() if now is None else now
+        if self.time_left(now) <= 0:
+            self._advance_section(timed_out=True)
+            return None
+
+        pending = self.pending
+        q = pending["question"]
+        correct = bool(choice) and choice == q.get("correct")
+        response = {
+            "item_id": pending["qid"],
+            "section": self.section["key"],
+            "position": len(self.responses) + 1,
+            "choice": choice,
+            "correct": correct,
+            "latency_ms": int(max(0.0, now - pending["shown_at"]) * 1000),
+            "difficulty_b": pending["b"],
+            "ability_before": round(self.theta, 4),
+        }
+        self.responses.append(response)
+        self.theta, self.se = estimate_ability([r["difficulty_b"] for r in self.responses],
+                                               [r["correct"] for r in self.responses])
+        self.pending = None
+        return response
+
+    # ---- 結果 ----
+
+    def results(self) -> Dict:
+        sections = []
+        for s in self.plan:
+            rows = self.section_responses(s["key"])
+            n_correct = sum(1 for r in rows if r["correct"])
+            sections.append({
+                "key": s["key"],
+                "name": s["name"],
+                "planned": s["n_items"],
+                "answered": len(rows),
+                "correct": n_correct,
+                "percent": round(n_correct / len(rows) * 100) if rows else 0,
+                "avg_latency_sec": round(sum(r["latency_ms"] for r in rows) / len(rows) / 1000, 1) if rows else 0,
+                "timed_out": s["key"] in self.timed_out_sections,
+            })
+        answered = len(self.responses)
+        n_correct = sum(1 for r in self.responses if r["correct"])
+        planned = sum(s["n_items"] for s in self.plan)
+        end = self.finished_at or self._clock()
+        return {
+            "attempt_id": self.attempt_id,
+            "test_type": self.test_type,
+            "answered": answered,
+            "planned": planned,
+            "correct": n_correct,
+            "percent": round(n_correct / planned * 100) if planned else 0,
+            "ability": round(self.theta, 3),
+            "ability_se": round(self.se, 3),
+            "duration_sec": int(end - self.started_at),
+            "sections": sections,
+        }
+
+
+# ====================================================================
+# 問題統計（十分統計量）
+# ====================================================================
+
+STAT_SUMS = ("n", "sum_x", "sum_y", "sum_yy", "sum_xy", "sum_theta")
+
+
+def _rest_scores(correct: np.ndarray, attempt_idx: np.ndarray) -> np.ndarray:
+    """各回答について、同じ受験の他の問題の正答率（その問題を除いた得点）"""
+    totals = np.bincount(attempt_idx, weights=correct)
+    counts = np.bincount(attempt_idx)
+    return (totals[attempt_idx] - correct) / np.maximum(counts[attempt_idx] - 1, 1)
+
+
+def finalize_item_stats(sums: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """十分統計量 → 正答率 p、難易度 b、識別力（点双列相関）をまとめて計算
+
+    b は受験者の平均 θ から正答率のロジットを引いた近似（PROX 法の簡略版）。
+    """
+    n = np.asarray(sums["n"], dtype=float)
+    sx, sy = np.asarray(sums["sum_x"], dtype=float), np.asarray(sums["sum_y"], dtype=float)
+    syy, sxy = np.asarray(sums["sum_yy"], dtype=float), np.asarray(sums["sum_xy"], dtype=float)
+    s_theta = np.asarray(sums["sum_theta"], dtype=float)
+
+    safe_n = np.maximum(n, 1)
+    p_value = sx / safe_n
+    p_smooth = (sx + 0.5) / (n + 1.0)
+    difficulty_b = s_theta / safe_n - np.log(p_smooth / (1 - p_smooth))
+
+    cov = n * sxy - sx * sy
+    var = (n * sx - sx ** 2) * (n * syy - sy ** 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(var > 0, cov / np.sqrt(np.where(var > 0, var, 1)), 0.0)
+    return {"p_value": p_value, "difficulty_b": difficulty_b, "discrimination": discrimination}
+
+
+def _stat_rows(item_ids, sums: Dict[str, np.ndarray], course_id: str) -> List[Dict]:
+    derived = finalize_item_stats(sums)
+    rows = []
+    for i, item_id in enumerate(item_ids):
+        row = {"course_id": course_id or "", "item_id": item_id}
+        for key in STAT_SUMS:
+            row[key] = int(sums[key][i]) if key == "n" else round(float(sums[key][i]), 6)
+        for key, values in derived.items():
+            row[key] = round(float(values[i]), 4)
+        rows.append(row)
+    return rows
+
+
+def compute_item_stats(responses: List[Dict], course_id: str = "") -> List[Dict]:
+    """回答履歴（attempt_id, item_id, correct, ability）から全問題の統計をまとめて計算"""
+    if not responses:
+        return []
+    item_ids, item_idx = np.unique([r["item_id"] for r in responses], return_inverse=True)
+    _, attempt_idx = np.unique([r["attempt_id"] for r in responses], return_inverse=True)
+    x = np.fromiter((1.0 if r["correct"] else 0.0 for r in responses), float, len(responses))
+    theta = np.fromiter((float(r.get("ability") or 0.0) for r in responses), float, len(responses))
+    y = _rest_scores(x, attempt_idx)
+
+    m = len(item_ids)
+    sums = {
+        "n": np.bincount(item_idx, minlength=m),
+        "sum_x": np.bincount(item_idx, weights=x, minlength=m),
+        "sum_y": np.bincount(item_idx, weights=y, minlength=m),
+        "sum_yy": np.bincount(item_idx, weights=y * y, minlength=m),
+        "sum_xy": np.bincount(item_idx, weights=x * y, minlength=m),
+        "sum_theta": np.bincount(item_idx, weights=theta, minlength=m),
+    }
+    return _stat_rows(list(item_ids), sums, course_id)
+
+
+def accumulate_item_stats(existing: Dict[str, Dict], responses: List[Dict], course_id: str = "") -> List[Dict]:
+    """1回分の受験の回答を既存の統計に足し込む（変更のあった問題の行だけ返す）"""
+    if not responses:
+        return []
+    delta = compute_item_stats(responses, course_id)
+    item_ids = [row["item_id"] for row in delta]
+    sums = {key: np.array([float(row[key]) + float((existing.get(row["item_id"]) or {}).get(key) or 0)
+                           for row in delta]) for key in STAT_SUMS}
+    return _stat_rows(item_ids, sums, course_id)
+
+
+# ====================================================================
+# 保存
+# ====================================================================
+
+def save_mock_test(session: MockTestSession, student_id: str, course_id: str = None) -> Dict:
+    """受験結果と回答をまとめて保存し、問題統計を逐次更新する"""
+    try:
+        from utils.database import (
+            save_mock_test_attempt, save_mock_test_responses, get_item_stats, upsert_item_stats,
+        )
+        result = session.results()
+        save_mock_test_attempt({
+            "id": session.attempt_id,
+            "student_id": student_id,
+            "course_id": course_id,
+            "test_type": session.test_type,
+            "answered": result["answered"],
+            "correct": result["correct"],
+            "percent": result["percent"],
+            "ability": result["ability"],
+            "ability_se": result["ability_se"],
+            "duration_sec": result["duration_sec"],
+            "section_results": result["sections"],
+        })
+        rows = [{**r, "attempt_id": session.attempt_id, "student_id": student_id, "course_id": course_id,
+                 "test_type": session.test_type, "ability": result["ability"]} for r in session.responses]
+        save_mock_test_responses(rows)
+
+        # 同時提出で取りこぼした分は recompute_item_stats で整合させる
+        existing = get_item_stats(course_id)
+        updated = accumulate_item_stats(existing, rows, course_id or "")
+        upsert_item_stats(updated)
+        return {"success": True, "responses": len(rows), "items_updated": len(updated)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def recompute_item_stats(course_id: str = None) -> Dict:
+    """コースの全回答から問題統計を作り直す"""
+    try:
+        from utils.database import get_mock_test_responses, upsert_item_stats
+        started = time.perf_counter()
+        responses = get_mock_test_responses(course_id)
+        loaded = time.perf_counter()
+        rows = compute_item_stats(responses, course_id or "")
+        computed = time.perf_counter()
+        upsert_item_stats(rows)
+        return {
+            "success": True,
+            "responses": len(responses),
+            "items": len(rows),
+            "timings": {
+                "load": round(loaded - started, 3),
+                "compute": round(computed - loaded, 3),
+                "save": round(time.perf_counter() - computed, 3),
+            },
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
@@ -0,0 +1,154 @@
+"""
+MP3 Stream Assembly
+===================
+TTSで生成した複数のMP3を1本のストリームに結合する（外部ライブラリ不要）。
+
+- 各パートの先頭 ID3v2 タグ・末尾 ID3v1 タグ・Xing/Info/VBRI ヘッダフレームを除去し、
+  フレームだけを順番に並べる（ヘッダが途中に何度も出てくる壊れたストリームにしない）
+- パート間の無音は、直前のパートと同じ形式の無音フレーム（サイド情報がすべて0）で作る
+- 結合は b''.join で1回だけ行う
+
+使い方:
+    from utils.mp3_stream import assemble_mp3
+    audio = assemble_mp3([part1, part2, part3], gaps_ms=[300, 600])
+"""
+
+import math
+from typing import List, Optional, Sequence, Union
+
+
+_BITRATES_V1_L3 = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+_BITRATES_V2_L3 = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+_SAMPLE_RATES = {
+    3: [44100, 48000, 32000],  # MPEG1
+    2: [22050, 24000, 16000],  # MPEG2
+    0: [11025, 12000, 8000],   # MPEG2.5
+}
+
+
+# ============================================================
+# フレームヘッダ
+# ============================================================
+
+def parse_frame_header(data: bytes, pos: int = 0) -> Optional[dict]:
+    """pos から始まる Layer III フレームヘッダを解析。フレームでなければNone"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or (data[pos + 1] & 0xE0) != 0xE0:
+        return None
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    version = (b1 >> 3) & 0x03
+    layer = (b1 >> 1) & 0x03
+    bitrate_idx = b2 >> 4
+    sr_idx = (b2 >> 2) & 0x03
+    if version == 1 or layer != 1 or bitrate_idx in (0, 15) or sr_idx == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = (_BITRATES_V1_L3 if mpeg1 else _BITRATES_V2_L3)[bitrate_idx] * 1000
+    sample_rate = _SAMPLE_RATES[version][sr_idx]
+    padding = (b2 >> 1) & 0x01
+    mono = (b3 >> 6) == 3
+    coef = 144 if mpeg1 else 72
+    return {
+        "mpeg1": mpeg1,
+        "crc": not (b1 & 0x01),
+        "sample_rate": sample_rate,
+        "bitrate": bitrate,
+        "mono": mono,
+        "length": coef * bitrate // sample_rate + padding,
+        "samples": 1152 if mpeg1 else 576,
+        "raw": bytes(data[pos:pos + 4]),
+    }
+
+
+def _is_info_frame(data: bytes, pos: int, header: dict) -> bool:
+    """Xing / Info / VBRI のヘッダフレーム（音声ではなく長さ情報）か"""
+    if header["mpeg1"]:
+        side = 17 if header["mono"] else 32
+    else:
+        side = 9 if header["mono"] else 17
+    offset = pos + 4 + (2 if header["crc"] else 0) + side
+    tag = data[offset:offset + 4]
+    return tag in (b"Xing", b"Info") or data[pos + 36:pos + 40] == b"VBRI"
+
+
+def _strip_id3(data: bytes) -> memoryview:
+    view = memoryview(data)
+    start, end = 0, len(data)
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size + (10 if data[5] & 0x10 else 0)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return view[start:end]
+
+
+def audio_frames(data: bytes):
+    """メタデータを除いた音声フレームの (開始位置, ヘッダ) を順に返す"""
+    body = _strip_id3(data)
+    pos = 0
+    first = True
+    while pos < len(body):
+        header = parse_frame_header(body, pos)
+        if header is None:
+            # 次の同期ワードまで読み飛ばす
+            pos += 1
+            continue
+        if first and _is_info_frame(body, pos, header):
+            first = False
+            pos += header["length"]
+            continue
+        first = False
+        yield body, pos, header
+        pos += header["length"]
+
+
+# ============================================================
+# 無音・結合
+# ============================================================
+
+def silent_frames(template: dict, duration_ms: int) -> bytes:
+    """template と同じ形式で duration_ms 分の無音フレームを作る"""
+    if duration_ms <= 0:
+        return b""
+    raw = bytearray(template["raw"])
+    raw[1] |= 0x01   # CRCなし
+    raw[2] &= ~0x02  # パディングなし
+    length = (144 if template["mpeg1"] else 72) * template["bitrate"] // template["sample_rate"]
+    frame = bytes(raw) + bytes(length - 4)
+    count = math.ceil(duration_ms / 1000 * template["sample_rate"] / template["samples"])
+    return frame * count
+
+
+def mp3_duration_seconds(data: bytes) -> float:
+    """フレームを数えて再生時間を求める"""
+    total = 0.0
+    for _, _, header in audio_frames(data):
+        total += header["samples"] / header["sample_rate"]
+    return total
+
+
+def assemble_mp3(parts: Sequence[bytes], gaps_ms: Union[int, List[int]] = 0) -> bytes:
+    """複数のMP3をフレーム単位で結合し、パート間に無音を挟む
+
+    Args:
+        gaps_ms: 全パート共通の無音長、またはパート間ごとの無音長（len(parts)-1 個）
+    """
+    parts = [p for p in parts if p]
+    if not parts:
+        return b""
+    if isinstance(gaps_ms, int):
+        gaps_ms = [gaps_ms] * (len(parts) - 1)
+
+    chunks = []
+    for i, part in enumerate(parts):
+        template = None
+        for body, pos, header in audio_frames(part):
+            chunks.append(body[pos:pos + header["length"]])
+            template = template or header
+        if template is None:
+            # MP3として解析できないデータはそのまま
+            chunks.append(part)
+            continue
+        if i < len(parts) - 1 and i < len(gaps_ms):
+            chunks.append(silent_frames(template, gaps_ms[i]))
+    return b"".join(chunks)
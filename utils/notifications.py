@@ -0,0 +1,277 @@
+"""
+Notifications
+=============
+新着通知（教員のフィードバック・お知らせ・メッセージ）。
+
+- 書き込み時に受信者ごとのキューへ配る（fan-out）。読む側は提出・メッセージ・お知らせを検索しない
+- ユーザーごとに version を持ち、通知が届く・既読になるたびに進める
+- サイドバーは再実行（rerun）ごとに version を1回見るだけで、変わったときだけ未読を読み直す
+- バックエンドは明示して選ぶ（環境変数 NOTIFICATION_BACKEND か secrets の app.notification_backend）:
+  - "database"（既定）: notifications / notification_versions（version はトリガーが進める）。
+    別プロセスからの通知も届く
+  - "local": プロセス内の pub/sub（LocalNotificationBus）。Supabase なしでの動作確認用
+  設定が読めない・不明な値のときに黙って local にはしない（別プロセスに届かなくなるため）
+
+使い方:
+    from utils.notifications import notify, show_notification_sidebar
+    notify([student_id], "feedback", "フィードバックが届きました", view="speaking")
+    show_notification_sidebar(user)       # app.py のサイドバー
+"""
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("database", "local")
+KINDS = ("feedback", "announcement", "message")
+KIND_ICONS = {"feedback": "📝", "announcement": "📢", "message": "✉️"}
+MAX_SHOWN = 10
+# 同じセッションで version を見に行く最短間隔（連続したウィジェット操作で DB を叩かない）
+CHECK_INTERVAL_SEC = 3.0
+SESSION_KEY = "_notifications"
+
+# 提出の content_type → 通知から開く画面
+_FEEDBACK_VIEWS = {"speaking": "speaking", "writing": "writing"}
+
+
+# ============================================================
+# バックエンド
+# ============================================================
+
+class LocalNotificationBus:
+    """プロセス内の通知キュー（pub/sub）
+
+    ユーザーごとに最新 max_queue 件を保持する。subscribe したコールバックには
+    publish のたびに (user_id, 通知) が渡される。
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self._lock = threading.Lock()
+        self._queues: Dict[str, deque] = {}
+        self._versions: Dict[str, int] = {}
+        self._subscribers: Dict[str, List[Callable[[str, Dict], None]]] = {}
+        self._ids = itertools.count(1)
+        self._max_queue = max_queue
+
+    def publish(self, rows: List[Dict]) -> int:
+        delivered = []
+        with self._lock:
+            for row in rows:
+                user_id = row["user_id"]
+                item = {**row, "id": str(next(self._ids)), "read_at": None,
+                        "created_at": datetime.utcnow().isoformat()}
+                self._queues.setdefault(user_id, deque(maxlen=self._max_queue)).append(item)
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+                delivered.append((user_id, item, list(self._subscribers.get(user_id, []))))
+        for user_id, item, callbacks in delivered:
+            for callback in callbacks:
+                try:
+                    callback(user_id, item)
+                except Exception:
+                    pass
+        return len(delivered)
+
+    def get_version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def get_unread(self, user_id: str, limit: int = MAX_SHOWN) -> List[Dict]:
+        with self._lock:
+            items = [dict(n) for n in self._queues.get(user_id, ()) if not n["read_at"]]
+        return items[::-1][:limit]
+
+    def mark_read(self, user_id: str, notification_ids: List[str] = None) -> int:
+        now = datetime.utcnow().isoformat()
+        count = 0
+        with self._lock:
+            for n in self._queues.get(user_id, ()):
+                if not n["read_at"] and (notification_ids is None or n["id"] in notification_ids):
+                    n["read_at"] = now
+                    count += 1
+            if count:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        return count
+
+    def subscribe(self, user_id: str, callback: Callable[[str, Dict], None]) -> Callable[[], None]:
+        """通知を受け取るコールバックを登録し、解除する関数を返す"""
+        with self._lock:
+            self._subscribers.setdefault(user_id, []).append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(user_id, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+        return unsubscribe
+
+
+class DatabaseNotificationBus:
+    """Supabase の notifications / notification_versions を使う"""
+
+    def publish(self, rows: List[Dict]) -> int:
+        from utils.database import insert_notifications
+        return len(insert_notifications(rows))
+
+    def get_version(self, user_id: str) -> int:
+        from utils.database import get_notification_version
+        return get_notification_version(user_id)
+
+    def get_unread(self, user_id: str, limit: int = MAX_SHOWN) -> List[Dict]:
+        from utils.database import get_unread_notifications
+        return get_unread_notifications(user_id, limit)
+
+    def mark_read(self, user_id: str, notification_ids: List[str] = None) -> int:
+        from utils.database import mark_notifications_read
+        return mark_notifications_read(user_id, notification_ids)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def _configured_backend() -> str:
+    backend = os.environ.get("NOTIFICATION_BACKEND")
+    if not backend:
+        try:
+            import streamlit as st
+            backend = st.secrets.get("app", {}).get("notification_backend")
+        except Exception:
+            backend = None
+    return (backend or "database").strip().lower()
+
+
+def _default_bus():
+    backend = _configured_backend()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown notification backend: {backend!r} (expected one of {BACKENDS})")
+    if backend == "local":
+        logger.warning("notifications: using the in-process LocalNotificationBus; "
+                       "notifications from other processes will not be delivered")
+        return LocalNotificationBus()
+    return DatabaseNotificationBus()
+
+
+def get_bus():
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = _default_bus()
+        return _bus
+
+
+def set_bus(bus):
+    """バックエンドを差し替える（LocalNotificationBus での動作確認用）"""
+    global _bus
+    with _bus_lock:
+        _bus = bus
+
+
+# ============================================================
+# 通知の送信（書き込み側）
+# ============================================================
+
+def notify(user_ids: Iterable[str], kind: str, title: str, body: str = "",
+           view: str = None, ref_id: str = None, course_id: str = None) -> int:
+    """受信者ごとのキューに通知を配る（配った件数を返す）
+
+    通知は本体の書き込みのおまけなので、失敗しても例外にせず（ログに残して）0 を返す。
+    """
+    rows = [{
+        "user_id": uid, "kind": kind, "title": title, "body": (body or "")[:200],
+        "view": view, "ref_id": ref_id, "course_id": course_id,
+    } for uid in dict.fromkeys(u for u in user_ids if u)]
+    if not rows:
+        return 0
+    try:
+        return get_bus().publish(rows)
+    except Exception:
+        logger.exception("notifications: failed to publish %s to %d user(s)", kind, len(rows))
+        return 0
+
+
+def notify_feedback(submission: Dict, updated: bool = False) -> int:
+    """教員のフィードバック・採点を学生に通知（updated=True なら「更新」として）"""
+    if not submission or not submission.get("student_id"):
+        return 0
+    content_type = submission.get("content_type") or ""
+    # 教員の0点も採点として扱う（未採点のときだけ自動採点のスコア）
+    score = submission.get("teacher_score")
+    if score is None:
+        score = submission.get("total_score")
+    body = f"スコア: {score}" if score is not None else ""
+    title = "📝 先生のフィードバックが更新されました" if updated else "📝 先生からフィードバックが届きました"
+    return notify([submission["student_id"]], "feedback", title, body,
+                  view=_FEEDBACK_VIEWS.get(content_type, "student_portfolio"),
+                  ref_id=submission.get("id"), course_id=submission.get("course_id"))
+
+
+# ============================================================
+# 通知の確認（サイドバー側）
+# ============================================================
+
+def check_notifications(user_id: str, force: bool = False) -> Dict:
+    """{"version", "items": 未読（新しい順）}。version が変わったときだけ未読を読み直す"""
+    import streamlit as st
+
+    state = st.session_state.get(SESSION_KEY)
+    if not state or state.get("user_id") != user_id:
+        state = {"user_id": user_id, "version": None, "items": [], "checked_at": 0.0}
+        st.session_state[SESSION_KEY] = state
+
+    now = time.time()
+    if force or now - state["checked_at"] >= CHECK_INTERVAL_SEC:
+        state["checked_at"] = now
+        try:
+            bus = get_bus()
+            version = bus.get_version(user_id)
+            if version != state["version"]:
+                state["items"] = bus.get_unread(user_id, MAX_SHOWN)
+                state["version"] = version
+        except Exception:
+            logger.exception("notifications: failed to check notifications for user %s", user_id)
+    return state
+
+
+def mark_notifications_read(user_id: str, notification_ids: List[str] = None) -> int:
+    """既読にする（notification_ids 省略時はすべて）"""
+    import streamlit as st
+    try:
+        count = get_bus().mark_read(user_id, notification_ids)
+    except Exception:
+        logger.exception("notifications: failed to mark notifications read for user %s", user_id)
+        return 0
+    st.session_state.pop(SESSION_KEY, None)
+    return count
+
+
+def show_notification_sidebar(user):
+    """サイドバーの新着通知（未読がなければ何も表示しない）"""
+    import streamlit as st
+
+    user_id = user.get("id")
+    if not user_id:
+        return
+    items = check_notifications(user_id)["items"]
+    if not items:
+        return
+
+    with st.expander(f"🔔 新着 {len(items)}{'+' if len(items) >= MAX_SHOWN else ''}件", expanded=False):
+        for n in items:
+            icon = KIND_ICONS.get(n.get("kind"), "🔔")
+            if st.button(f"{icon} {n['title']}", key=f"notif_{n['id']}", use_container_width=True):
+                mark_notifications_read(user_id, [n["id"]])
+                if n.get("view"):
+                    st.session_state["current_view"] = n["view"]
+                st.rerun()
+            if n.get("body"):
+                st.caption(n["body"])
+        if st.button("✅ すべて既読", key="notif_read_all", use_container_width=True):
+            mark_notifications_read(user_id)
+            st.rerun()
@@ -0,0 +1,568 @@
+"""
+OpenAI Gateway
+==============
+OpenAI API呼び出しの共通窓口
+
+全モジュールのChat / TTS / Whisper呼び出しはここを経由する。
+- 決定的プロンプト（temperature=0 または cacheable=True）の応答キャッシュ（TTL付き）
+- グローバル同時実行数制限 + モデル別トークン/分（TPM）予算
+- トークン数・コストを api_usage テーブルへバッチ書き込み
+- 呼び出し箇所（call_site）ごとのレイテンシ・キャッシュヒット率
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Callable
+
+import streamlit as st
+
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# 設定
+# ============================================================
+
+USD_TO_JPY = 150
+
+# 1Mトークンあたりの料金（USD）: (input, output)
+CHAT_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# TTS: 1M文字あたりの料金（USD）
+TTS_PRICING = {
+    "tts-1": 15.00,
+    "tts-1-hd": 30.00,
+}
+
+# Whisper: 1分あたりの料金（USD）
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+# モデル別のトークン/分予算（組織のレート上限より少し低めに設定）
+MODEL_TPM_BUDGET = {
+    "gpt-4o": 30000,
+    "gpt-4o-mini": 200000,
+}
+DEFAULT_TPM_BUDGET = 30000
+
+# api_usage.api_name へのマッピング
+API_NAME_BY_MODEL = {
+    "gpt-4o": "openai_gpt4o",
+    "gpt-4o-mini": "openai_gpt4o_mini",
+    "tts-1": "openai_tts",
+    "tts-1-hd": "openai_tts",
+    "whisper-1": "openai_whisper",
+}
+
+MAX_CONCURRENT_REQUESTS = 8
+DEFAULT_CACHE_TTL = 24 * 3600      # 24時間
+CACHE_MAX_ENTRIES = 2000
+USAGE_FLUSH_INTERVAL = 5.0         # 秒
+USAGE_BATCH_SIZE = 50
+USAGE_MAX_ATTEMPTS = 5             # 書き込みに失敗した行を再送する回数（超えたらログに残して捨てる）
+LATENCY_WINDOW = 200               # call_siteごとに保持するレイテンシ件数
+
+
+# ============================================================
+# クライアント
+# ============================================================
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_openai_client() -> "OpenAI":
+    """プロセス全体で共有するOpenAIクライアントを取得"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # openai パッケージの読み込みは重いので、最初の API 呼び出しまで遅らせる
+                from openai import OpenAI
+                _client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+    return _client
+
+
+# ============================================================
+# 応答キャッシュ（TTL + LRU）
+# ============================================================
+
+class _ResponseCache:
+    """スレッドセーフなTTL付きLRUキャッシュ"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self._max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_cache = _ResponseCache()
+
+
+def _make_cache_key(kind: str, payload: Dict) -> str:
+    raw = json.dumps({"kind": kind, **payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def clear_response_cache():
+    """応答キャッシュを全削除"""
+    _cache.clear()
+
+
+# ============================================================
+# 同時実行数制限 + TPM予算
+# ============================================================
+
+_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+class _TokenBudget:
+    """直近60秒の使用トークン数でモデル別の流量を制御する"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self._events = deque()
+        self._used = 0
+        self._cond = threading.Condition()
+
+    def _expire(self, now: float):
+        while self._events and self._events[0][0] <= now - 60:
+            _, tokens = self._events.popleft()
+            self._used -= tokens
+
+    def acquire(self, tokens: int, timeout: float = 60.0):
+        """予算に空きができるまで待機してからトークンを予約する"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                self._expire(now)
+                # 単発で予算を超えるリクエストは窓が空なら通す
+                if self._used + tokens <= self.tokens_per_minute or not self._events:
+                    break
+                wait = min(self._events[0][0] + 60 - now, deadline - now)
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+            self._events.append((now, tokens))
+            self._used += tokens
+
+    def adjust(self, delta: int):
+        """見積もりと実績の差分を反映"""
+        if delta == 0:
+            return
+        with self._cond:
+            self._events.append((time.time(), delta))
+            self._used += delta
+            self._cond.notify_all()
+
+
+_budgets: Dict[str, _TokenBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def _get_budget(model: str) -> _TokenBudget:
+    with _budgets_lock:
+        if model not in _budgets:
+            _budgets[model] = _TokenBudget(MODEL_TPM_BUDGET.get(model, DEFAULT_TPM_BUDGET))
+        return _budgets[model]
+
+
+def _estimate_tokens(messages: List[Dict], max_tokens: Optional[int]) -> int:
+    """ざっくり4文字=1トークンで入力を見積もり、出力上限を加算"""
+    chars = sum(len(str(m.get("content", ""))) for m in messages)
+    return chars // 4 + (max_tokens or 1000)
+
+
+# ============================================================
+# コスト計算
+# ============================================================
+
+def estimate_chat_cost_jpy(model: str, tokens_input: int, tokens_output: int) -> float:
+    price_in, price_out = CHAT_PRICING.get(model, CHAT_PRICING["gpt-4o"])
+    usd = (tokens_input * price_in + tokens_output * price_out) / 1_000_000
+    return round(usd * USD_TO_JPY, 4)
+
+
+def estimate_tts_cost_jpy(model: str, characters: int) -> float:
+    usd = characters * TTS_PRICING.get(model, TTS_PRICING["tts-1"]) / 1_000_000
+    return round(usd * USD_TO_JPY, 4)
+
+
+def estimate_whisper_cost_jpy(audio_seconds: float) -> float:
+    usd = (audio_seconds / 60) * WHISPER_PRICE_PER_MINUTE
+    return round(usd * USD_TO_JPY, 4)
+
+
+# ============================================================
+# api_usage バッチ書き込み
+# ============================================================
+
+class _UsageWriter:
+    """api_usage への書き込みをキューに溜め、バックグラウンドでまとめてINSERTする"""
+
+    def __init__(self):
+        self._rows = []  # (row, 失敗回数)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="openai-usage-writer", daemon=True
+            )
+            self._thread.start()
+
+    def add(self, row: Dict):
+        with self._lock:
+            self._rows.append((row, 0))
+            size = len(self._rows)
+            self._ensure_thread()
+        if size >= USAGE_BATCH_SIZE:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """溜まっている行を書き込み、書き込めた件数を返す
+
+        まとめての INSERT に失敗したら1行ずつ書き込み、それでも失敗した行は
+        USAGE_MAX_ATTEMPTS 回までキューに戻して次回に再送する。
+        """
+        with self._lock:
+            items, self._rows = self._rows, []
+        if not items:
+            return 0
+        from utils.database import log_api_usage_batch
+        try:
+            log_api_usage_batch([row for row, _ in items])
+            return len(items)
+        except Exception:
+            logger.exception("openai_gateway: usage batch insert failed (%d rows), retrying one by one",
+                             len(items))
+
+        written, retry = 0, []
+        for row, attempts in items:
+            try:
+                log_api_usage_batch([row])
+                written += 1
+            except Exception as e:
+                if attempts + 1 < USAGE_MAX_ATTEMPTS:
+                    retry.append((row, attempts + 1))
+                else:
+                    logger.error("openai_gateway: dropping usage row after %d attempts: %s (%s)",
+                                 USAGE_MAX_ATTEMPTS, row, e)
+        if retry:
+            with self._lock:
+                self._rows[:0] = retry
+        return written
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(USAGE_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("openai_gateway: usage flush failed")
+
+
+_usage_writer = _UsageWriter()
+
+
+def flush_usage() -> int:
+    """溜まっている使用量を即時書き込み（バッチジョブ終了時など）"""
+    return _usage_writer.flush()
+
+
+# バックグラウンドタスクのスレッドでは、投入したユーザーを acting_user で渡す
+_acting = threading.local()
+
+
+@contextmanager
+def acting_user(user_id: Optional[str]):
+    """このスレッドの API 使用量を user_id に記録する（スクリプトスレッド外での実行用）"""
+    previous = getattr(_acting, "user_id", None)
+    _acting.user_id = user_id
+    try:
+        yield
+    finally:
+        _acting.user_id = previous
+
+
+def bind_current_user(fn: Callable) -> Callable:
+    """呼び出し元スレッドのユーザーを引き継いで fn を実行する関数を返す（ThreadPoolExecutor 用）"""
+    user_id = _current_user_id()
+
+    def run(*args, **kwargs):
+        with acting_user(user_id):
+            return fn(*args, **kwargs)
+    return run
+
+
+def _current_user_id() -> Optional[str]:
+    """ログイン中ユーザーのIDを取得（スクリプトスレッド外では acting_user の値かNone）"""
+    if getattr(_acting, "user_id", None):
+        return _acting.user_id
+    try:
+        user = st.session_state.get("user")
+        return user.get("id") if user else None
+    except Exception:
+        return None
+
+
+def _record_usage(call_site: str, model: str, cost_jpy: float,
+                  user_id: str = None, course_id: str = None,
+                  tokens_input: int = 0, tokens_output: int = 0,
+                  audio_seconds: float = None, latency_ms: int = None):
+    # バルク INSERT は全行が同じ列を持つ必要がある（PostgREST）ので、Chat / TTS / Whisper で列を揃える
+    _usage_writer.add({
+        "api_name": API_NAME_BY_MODEL.get(model, model),
+        "model": model,
+        "call_site": call_site,
+        "cost_jpy": cost_jpy,
+        "user_id": user_id or _current_user_id(),
+        "course_id": course_id,
+        "tokens_input": tokens_input,
+        "tokens_output": tokens_output,
+        "audio_seconds": audio_seconds,
+        "latency_ms": latency_ms,
+    })
+
+
+# ============================================================
+# call_site 別メトリクス
+# ============================================================
+
+_metrics: Dict[str, Dict[str, Any]] = {}
+_metrics_lock = threading.Lock()
+
+
+def _record_metrics(call_site: str, latency_ms: float, cached: bool,
+                    error: bool = False, tokens_input: int = 0,
+                    tokens_output: int = 0, cost_jpy: float = 0.0):
+    with _metrics_lock:
+        m = _metrics.get(call_site)
+        if m is None:
+            m = {
+                "calls": 0, "cache_hits": 0, "errors": 0,
+                "tokens_input": 0, "tokens_output": 0, "cost_jpy": 0.0,
+                "latencies": deque(maxlen=LATENCY_WINDOW),
+            }
+            _metrics[call_site] = m
+        m["calls"] += 1
+        m["cache_hits"] += int(cached)
+        m["errors"] += int(error)
+        m["tokens_input"] += tokens_input
+        m["tokens_output"] += tokens_output
+        m["cost_jpy"] += cost_jpy
+        m["latencies"].append(latency_ms)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[idx], 1)
+
+
+def get_gateway_metrics() -> Dict[str, Dict[str, Any]]:
+    """call_siteごとのメトリクスを取得
+
+    Returns:
+        {call_site: {calls, cache_hits, hit_rate, errors, avg_ms, p50_ms, p95_ms,
+                     tokens_input, tokens_output, cost_jpy}}
+    """
+    with _metrics_lock:
+        snapshot = {k: {**v, "latencies": list(v["latencies"])} for k, v in _metrics.items()}
+    result = {}
+    for site, m in snapshot.items():
+        lat = m.pop("latencies")
+        calls = m["calls"]
+        result[site] = {
+            **m,
+            "cost_jpy": round(m["cost_jpy"], 2),
+            "hit_rate": round(m["cache_hits"] / calls, 3) if calls else 0.0,
+            "avg_ms": round(sum(lat) / len(lat), 1) if lat else 0.0,
+            "p50_ms": _percentile(lat, 50),
+            "p95_ms": _percentile(lat, 95),
+        }
+    return result
+
+
+def reset_gateway_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# ============================================================
+# 公開API
+# ============================================================
+
+def chat_completion(call_site: str, messages: List[Dict], model: str = "gpt-4o-mini",
+                    temperature: float = 0.7, max_tokens: int = None,
+                    response_format: Dict = None, cacheable: bool = None,
+                    cache_ttl: float = DEFAULT_CACHE_TTL,
+                    user_id: str = None, course_id: str = None) -> str:
+    """Chat Completionを実行して本文（message.content）を返す
+
+    引数:
+        call_site  : 呼び出し箇所の識別子（例: "reading.true_false"）
+        cacheable  : Noneならtemperature==0のときのみキャッシュ
+        cache_ttl  : キャッシュ有効期間（秒）
+    例外はOpenAIクライアントのものをそのまま送出する（呼び出し側の try/except 互換）。
+    """
+    start = time.perf_counter()
+    if cacheable is None:
+        cacheable = temperature == 0
+
+    cache_key = None
+    if cacheable:
+        cache_key = _make_cache_key("chat", {
+            "model": model, "messages": messages, "temperature": temperature,
+            "max_tokens": max_tokens, "response_format": response_format,
+        })
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            _record_metrics(call_site, (time.perf_counter() - start) * 1000, cached=True)
+            return cached
+
+    params = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens is not None:
+        params["max_tokens"] = max_tokens
+    if response_format is not None:
+        params["response_format"] = response_format
+
+    estimated = _estimate_tokens(messages, max_tokens)
+    budget = _get_budget(model)
+    budget.acquire(estimated)
+    try:
+        with _semaphore:
+            response = get_openai_client().chat.completions.create(**params)
+    except Exception:
+        budget.adjust(-estimated)
+        _record_metrics(call_site, (time.perf_counter() - start) * 1000,
+                        cached=False, error=True)
+        raise
+
+    content = response.choices[0].message.content
+    usage = getattr(response, "usage", None)
+    tokens_in = getattr(usage, "prompt_tokens", 0) or 0
+    tokens_out = getattr(usage, "completion_tokens", 0) or 0
+    if usage is not None:
+        budget.adjust(tokens_in + tokens_out - estimated)
+    cost = estimate_chat_cost_jpy(model, tokens_in, tokens_out)
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    _record_usage(call_site, model, cost, user_id=user_id, course_id=course_id,
+                  tokens_input=tokens_in, tokens_output=tokens_out,
+                  latency_ms=int(latency_ms))
+    _record_metrics(call_site, latency_ms, cached=False,
+                    tokens_input=tokens_in, tokens_output=tokens_out, cost_jpy=cost)
+
+    if cache_key and content is not None:
+        _cache.set(cache_key, content, cache_ttl)
+    return content
+
+
+def synthesize_speech(call_site: str, text: str, voice: str = "alloy",
+                      model: str = "tts-1", speed: float = None,
+                      cacheable: bool = True, cache_ttl: float = DEFAULT_CACHE_TTL,
+                      user_id: str = None, course_id: str = None) -> bytes:
+    """OpenAI TTSで音声を生成してMP3バイト列を返す（同一入力はキャッシュ）"""
+    start = time.perf_counter()
+    cache_key = None
+    if cacheable:
+        cache_key = _make_cache_key("tts", {
+            "model": model, "voice": voice, "input": text, "speed": speed,
+        })
+        cached = _cache.get(cache_key)
+        if cached is not None:
+            _record_metrics(call_site, (time.perf_counter() - start) * 1000, cached=True)
+            return cached
+
+    params = {"model": model, "voice": voice, "input": text}
+    if speed is not None:
+        params["speed"] = speed
+
+    try:
+        with _semaphore:
+            response = get_openai_client().audio.speech.create(**params)
+    except Exception:
+        _record_metrics(call_site, (time.perf_counter() - start) * 1000,
+                        cached=False, error=True)
+        raise
+
+    audio = response.content
+    cost = estimate_tts_cost_jpy(model, len(text))
+    latency_ms = (time.perf_counter() - start) * 1000
+    _record_usage(call_site, model, cost, user_id=user_id, course_id=course_id,
+                  latency_ms=int(latency_ms))
+    _record_metrics(call_site, latency_ms, cached=False, cost_jpy=cost)
+
+    if cache_key and audio:
+        _cache.set(cache_key, audio, cache_ttl)
+    return audio
+
+
+def transcribe_audio(call_site: str, file, model: str = "whisper-1",
+                     language: str = "en", audio_seconds: float = None,
+                     user_id: str = None, course_id: str = None) -> str:
+    """Whisperで文字起こししてテキストを返す
+
+    audio_seconds が分かればコスト計上に使用する（不明なら0円で記録）。
+    """
+    start = time.perf_counter()
+    try:
+        with _semaphore:
+            transcript = get_openai_client().audio.transcriptions.create(
+                model=model,
+                file=file,
+                language=language,
+                response_format="text",
+            )
+    except Exception:
+        _record_metrics(call_site, (time.perf_counter() - start) * 1000,
+                        cached=False, error=True)
+        raise
+
+    text = transcript if isinstance(transcript, str) else transcript.text
+    cost = estimate_whisper_cost_jpy(audio_seconds) if audio_seconds else 0.0
+    latency_ms = (time.perf_counter() - start) * 1000
+    _record_usage(call_site, model, cost, user_id=user_id, course_id=course_id,
+                  audio_seconds=audio_seconds, latency_ms=int(latency_ms))
+    _record_metrics(call_site, latency_ms, cached=False, cost_jpy=cost)
+    return text
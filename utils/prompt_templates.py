@@ -0,0 +1,111 @@
+"""
+Prompt Templates
+================
+評価プロンプト（gpt_eval / writing_eval）の組み立て結果をキャッシュする。
+
+- コース設定から作る指示ブロック（重点方針・言語・詳細度・ウェイト・追加指示）と
+  出力形式の説明は「静的プレフィックス」として1回だけ組み立てる
+- プロンプトは「静的プレフィックス → 学生のテキスト」の順に並べる
+  （同じコース・課題の評価でプレフィックスが一致し、プロバイダ側のプロンプトキャッシュが効く）
+- キャッシュのキーは (course_id, task_type, assignment_id, 設定バージョン)
+  設定バージョンは course_settings.updated_at。upsert_course_settings からも明示的に破棄する
+
+使い方:
+    from utils.prompt_templates import TemplateCache, PromptTemplate, settings_version
+    _TEMPLATES = TemplateCache("speaking")
+    template = _TEMPLATES.get((course_id, task_type, assignment_id, settings_version(course_id)),
+                              lambda: PromptTemplate(system, prefix))
+    messages = template.messages(suffix)
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+
+
+MAX_TEMPLATES = 256
+
+_caches: List["TemplateCache"] = []
+
+
+def settings_version(course_id: str) -> str:
+    """コース設定のバージョン（updated_at）。設定がなければ空文字"""
+    if not course_id:
+        return ""
+    try:
+        from utils.database import get_course_settings
+        s = get_course_settings(course_id) or {}
+        return str(s.get("updated_at") or s.get("created_at") or "")
+    except Exception:
+        return ""
+
+
+class PromptTemplate:
+    """組み立て済みのシステムメッセージと静的プレフィックス"""
+
+    __slots__ = ("system", "prefix")
+
+    def __init__(self, system: str, prefix: str):
+        self.system = system
+        self.prefix = prefix
+
+    def render(self, suffix: str) -> str:
+        return f"{self.prefix}\n{suffix}"
+
+    def messages(self, suffix: str) -> List[Dict]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.render(suffix)},
+        ]
+
+
+class TemplateCache:
+    """キー → PromptTemplate の LRU キャッシュ（キーの先頭要素は course_id）"""
+
+    def __init__(self, name: str, max_entries: int = MAX_TEMPLATES):
+        self.name = name
+        self._max = max_entries
+        self._data: "OrderedDict[Tuple, PromptTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self, key: Tuple, build: Callable[[], PromptTemplate]) -> PromptTemplate:
+        with self._lock:
+            template = self._data.get(key)
+            if template is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return template
+            self.misses += 1
+
+        template = build()
+        with self._lock:
+            self._data[key] = template
+            self._data.move_to_end(key)
+            while len(self._data) > self._max:
+                self._data.popitem(last=False)
+        return template
+
+    def invalidate(self, course_id: str = None):
+        with self._lock:
+            if course_id is None:
+                self._data.clear()
+                return
+            for key in [k for k in self._data if k[0] == course_id]:
+                del self._data[key]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"name": self.name, "entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+def invalidate_prompt_templates(course_id: str = None):
+    """コースの組み立て済みプロンプトを破棄（course_id=None なら全件）"""
+    for cache in _caches:
+        cache.invalidate(course_id)
+
+
+def get_template_stats() -> List[Dict]:
+    return [cache.stats() for cache in _caches]
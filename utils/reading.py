@@ -1,11 +1,9 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion, bind_current_user
 import json
 import time
-
-
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 
 # デモ用記事（既存のまま保持）
@@ -62,53 +60,107 @@ def _get_question_distribution(level: str, num_questions: int) -> dict:
     }
 
 
+# ============================================================
+# 問題セット共有キャッシュ
+# ============================================================
+
+def _content_hash(text, title=""):
+    """記事本文（+タイトル）のハッシュ"""
+    return hashlib.sha256(f"{title}\n{text}".encode("utf-8")).hexdigest()
+
+
+def _cached_question_set(kind, text, title, level, params, generate, use_cache=True):
+    """(記事ハッシュ, 種別, レベル, パラメータ) 単位で生成結果を共有ストアに保存・再利用
+
+    同じ記事・同じレベル・同じ問題分布なら、2人目以降はLLMを呼ばずに即座に返す。
+    一部の生成に失敗した結果（partial）は保存しない。保存期限は database 側の
+    QUESTION_SET_TTL_DAYS。DBが使えない場合は通常どおり生成する。
+    """
+    content_hash = _content_hash(text, title)
+    params_raw = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    cache_key = f"{kind}:{level}:{content_hash}:{hashlib.md5(params_raw.encode()).hexdigest()}"
+
+    if use_cache:
+        try:
+            from utils.database import get_generated_question_set
+            cached = get_generated_question_set(cache_key)
+            if cached:
+                return {**cached, "success": True, "cached": True}
+        except Exception:
+            pass
+
+    result = generate()
+
+    if result.get("success") and not result.get("partial"):
+        try:
+            from utils.database import save_generated_question_set
+            payload = {k: v for k, v in result.items() if k not in ("success", "cached", "partial")}
+            save_generated_question_set(cache_key, kind, content_hash, level, params, payload)
+        except Exception:
+            pass
+    return result
+
+
 # ============================================================
 # メイン問題生成（ハイブリッド: True/False + 4択）
 # ============================================================
 
-def generate_comprehension_questions(text, title, num_questions=5, level="B1"):
+def generate_comprehension_questions(text, title, num_questions=5, level="B1", use_cache=True):
     """読解問題を生成（ハイブリッド版: True/False + 4択 + TOEFL型inference）
     
     モデル:
     - True/False・detail 4択: gpt-4o-mini（コスト抑制）
     - inference・main_idea 4択: gpt-4o（品質重視）
+
+    3種類の問題は並列に生成し、結果は記事・レベル・分布ごとに共有キャッシュする。
     """
     dist = _get_question_distribution(level, num_questions)
+    return _cached_question_set(
+        "comprehension", text, title, level, dist,
+        lambda: _generate_comprehension_questions(text, title, dist, level),
+        use_cache=use_cache,
+    )
+
+
+def _generate_comprehension_questions(text, title, dist, level):
     tf_count = dist["true_false"]
     mc_detail = dist["mc_detail"]
     mc_inference = dist["mc_inference"]
     mc_main_idea = dist["mc_main_idea"]
+    mc_high = mc_inference + mc_main_idea
 
-    all_questions = []
-
-    # --- True/False問題（gpt-4o-mini）---
+    # 出題順（True/False → detail → inference/main_idea）を保ったまま並列実行
+    tasks = []
     if tf_count > 0:
-        tf_result = _generate_true_false(text, title, tf_count, level)
-        if tf_result.get("success"):
-            all_questions.extend(tf_result.get("questions", []))
-
-    # --- detail 4択（gpt-4o-mini）---
+        tasks.append((_generate_true_false, (text, title, tf_count, level)))
     if mc_detail > 0:
-        detail_result = _generate_mc_detail(text, title, mc_detail, level)
-        if detail_result.get("success"):
-            all_questions.extend(detail_result.get("questions", []))
-
-    # --- inference + main_idea 4択（gpt-4o）---
-    mc_high = mc_inference + mc_main_idea
+        tasks.append((_generate_mc_detail, (text, title, mc_detail, level)))
     if mc_high > 0:
-        high_result = _generate_mc_high_order(text, title, mc_inference, mc_main_idea, level)
-        if high_result.get("success"):
-            all_questions.extend(high_result.get("questions", []))
+        tasks.append((_generate_mc_high_order, (text, title, mc_inference, mc_main_idea, level)))
+
+    if not tasks:
+        return {"success": False, "error": "問題の生成に失敗しました"}
+
+    # ワーカースレッドでも API 使用量は呼び出したユーザーに記録する
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(bind_current_user(fn), *args) for fn, args in tasks]
+        results = [f.result() for f in futures]
+
+    all_questions = []
+    for result in results:
+        if result.get("success"):
+            all_questions.extend(result.get("questions", []))
 
     if not all_questions:
         return {"success": False, "error": "問題の生成に失敗しました"}
 
-    return {"success": True, "questions": all_questions}
+    # 一部だけ失敗した場合は表示には使うが、共有キャッシュには保存しない
+    partial = not all(r.get("success") for r in results)
+    return {"success": True, "questions": all_questions, "partial": partial}
 
 
 def _generate_true_false(text, title, count, level):
     """True/False問題をgpt-4o-miniで生成"""
-    client = get_openai_client()
     prompt = f"""You are an EFL reading test designer. Create {count} True/False questions for this article.
 
 Article Title: {title}
@@ -145,7 +197,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_true_false",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert EFL test designer. Every question must be impossible to answer without reading the provided article. Respond in valid JSON only."},
@@ -155,7 +208,7 @@ Output JSON:
             max_tokens=2000,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -164,7 +217,6 @@ Output JSON:
 
 def _generate_mc_detail(text, title, count, level):
     """detail系4択問題をgpt-4o-miniで生成"""
-    client = get_openai_client()
     prompt = f"""You are an EFL reading test designer. Create {count} multiple-choice detail questions.
 
 Article Title: {title}
@@ -200,7 +252,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_mc_detail",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert EFL test designer. Every question must be impossible to answer without reading the provided article. Respond in valid JSON only."},
@@ -210,7 +263,7 @@ Output JSON:
             max_tokens=2000,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -219,7 +272,6 @@ Output JSON:
 
 def _generate_mc_high_order(text, title, inference_count, main_idea_count, level):
     """inference・main_idea 4択をgpt-4oで生成（TOEFL型）"""
-    client = get_openai_client()
 
     inference_instruction = ""
     if inference_count > 0:
@@ -271,7 +323,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_mc_high_order",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert TOEFL iBT reading test designer. Respond in valid JSON only."},
@@ -280,7 +333,7 @@ Output JSON:
             temperature=0.4,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -346,13 +399,23 @@ EXAM_CONFIGS = {
 }
 
 
-def generate_exam_questions(text, title, exam_type="TOEFL", level="B2"):
-    """検定対策問題をgpt-4oで生成
+def generate_exam_questions(text, title, exam_type="TOEFL", level="B2", use_cache=True):
+    """検定対策問題をgpt-4oで生成（記事・検定・レベルごとに共有キャッシュ）
     
     exam_type: "TOEFL" | "TOEIC" | "EIKEN"
     """
-    config = EXAM_CONFIGS.get(exam_type, EXAM_CONFIGS["TOEFL"])
-    client = get_openai_client()
+    if exam_type not in EXAM_CONFIGS:
+        exam_type = "TOEFL"
+    return _cached_question_set(
+        "exam", text, title, level,
+        {"exam_type": exam_type, "distribution": EXAM_CONFIGS[exam_type]["type_distribution"]},
+        lambda: _generate_exam_questions(text, title, exam_type, level),
+        use_cache=use_cache,
+    )
+
+
+def _generate_exam_questions(text, title, exam_type, level):
+    config = EXAM_CONFIGS[exam_type]
 
     dist = config["type_distribution"]
     total = sum(dist.values())
@@ -395,7 +458,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_exam_questions",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": config["system_prompt"] + " Respond in valid JSON only."},
@@ -404,7 +468,7 @@ Output JSON:
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -415,9 +479,16 @@ Output JSON:
 # 既存関数（変更なし）
 # ============================================================
 
-def generate_summary_and_vocabulary(text, title, level="B1"):
-    """要約と重要語彙を生成（gpt-4o-mini）"""
-    client = get_openai_client()
+def generate_summary_and_vocabulary(text, title, level="B1", use_cache=True):
+    """要約と重要語彙を生成（gpt-4o-mini・記事とレベルごとに共有キャッシュ）"""
+    return _cached_question_set(
+        "summary", text, title, level, {},
+        lambda: _generate_summary_and_vocabulary(text, title, level),
+        use_cache=use_cache,
+    )
+
+
+def _generate_summary_and_vocabulary(text, title, level):
     prompt = f"""Analyze this article for a Japanese English learner (Level: {level}).
 
 Article Title: {title}
@@ -446,7 +517,8 @@ Provide analysis in JSON format:
     "related_topics": ["<Related topic 1>", "<Related topic 2>"]
 }}"""
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_summary_and_vocabulary",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a reading instructor helping Japanese English learners. Respond in valid JSON."},
@@ -455,16 +527,26 @@ Provide analysis in JSON format:
             temperature=0.5,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-def generate_article_from_prompt(prompt, level="B1", word_count=200):
+def generate_article_from_prompt(prompt, level="B1", word_count=200, course_id=None, fresh=False):
+    """プロンプトから記事を生成（共有ライブラリ経由・コースの再利用方針に従う。fresh=True なら必ず新しく生成）"""
+    from utils.content_library import get_or_generate
+    return get_or_generate(
+        "reading", prompt, level,
+        lambda: _generate_article(prompt, level, word_count),
+        length=word_count, course_id=course_id, fresh=fresh,
+        generation_args={"topic": prompt, "level": level, "length": word_count},
+    )
+
+
+def _generate_article(prompt, level="B1", word_count=200):
     """プロンプトから記事を生成（gpt-4o-mini）"""
-    client = get_openai_client()
     system_prompt = f"""You are a content creator for English learners. Create engaging, educational articles appropriate for {level} level Japanese university students. Articles should be approximately {word_count} words."""
     user_prompt = f"""Create a reading article based on this request: "{prompt}"
 
@@ -483,19 +565,37 @@ Guidelines:
 - Make the content interesting and relevant to university students
 - Use clear paragraph structure
 - Include specific facts, numbers, and details that can be tested"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.8,
-            response_format={"type": "json_object"}
-        )
-        result = json.loads(response.choices[0].message.content)
+        from utils.text_difficulty import check_level
+        # 表示前にローカルでレベルを確認し、外れていれば1回だけ修正を依頼する
+        for attempt in range(2):
+            content = chat_completion(
+                "reading.generate_article_from_prompt",
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=0.8,
+                response_format={"type": "json_object"}
+            )
+            result = json.loads(content)
+            check = check_level(result.get("text", ""), level, word_count)
+            if check["ok"] or attempt:
+                break
+            profile = check["profile"]
+            mean = (profile.get("sentence_length") or {}).get("mean", "?")
+            messages = messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": (
+                    f"This article reads as {check['estimated_cefr']} level (average sentence length {mean} words, "
+                    f"{profile['words']} words in total). Rewrite it for {level} learners with about "
+                    f"{word_count} words. Keep the same JSON format.")}
+            ]
         result["success"] = True
         result["generated"] = True
+        result["difficulty_check"] = {k: check[k] for k in ("ok", "estimated_cefr", "issues")}
         return result
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -546,7 +646,10 @@ def generate_level_based_questions(text, title, level="B1", num_questions=5):
     """
     if level in ("A1", "A2"):
         # True/Falseのみ
-        result = _generate_true_false(text, title, num_questions, level)
+        result = _cached_question_set(
+            "true_false", text, title, level, {"count": num_questions},
+            lambda: _generate_true_false(text, title, num_questions, level),
+        )
         if result.get("success"):
             return {"success": True, "questions": result.get("questions", []), "has_essay": False}
         return result
@@ -559,8 +662,12 @@ def generate_level_based_questions(text, title, level="B1", num_questions=5):
 
     else:
         # B2以上: 4択 + 記述式1問
-        mc_result = generate_comprehension_questions(text, title, num_questions - 1, level)
-        essay_result = generate_essay_question(text, title, level)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            mc_future = executor.submit(bind_current_user(generate_comprehension_questions),
+                                        text, title, num_questions - 1, level)
+            essay_future = executor.submit(bind_current_user(generate_essay_question), text, title, level)
+            mc_result = mc_future.result()
+            essay_result = essay_future.result()
         
         questions = mc_result.get("questions", []) if mc_result.get("success") else []
         essay = essay_result.get("question") if essay_result.get("success") else None
@@ -573,9 +680,16 @@ def generate_level_based_questions(text, title, level="B1", num_questions=5):
         }
 
 
-def generate_essay_question(text, title, level="B2"):
-    """記述式要約問題を生成"""
-    client = get_openai_client()
+def generate_essay_question(text, title, level="B2", use_cache=True):
+    """記述式要約問題を生成（記事とレベルごとに共有キャッシュ）"""
+    return _cached_question_set(
+        "essay", text, title, level, {},
+        lambda: _generate_essay_question(text, title, level),
+        use_cache=use_cache,
+    )
+
+
+def _generate_essay_question(text, title, level):
     
     word_limit = {"B2": 60, "C1": 80, "C2": 100}.get(level, 60)
     
@@ -607,7 +721,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.generate_essay_question",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an expert EFL test designer. Respond in valid JSON only."},
@@ -617,7 +732,7 @@ Output JSON:
             max_tokens=1000,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -626,7 +741,6 @@ Output JSON:
 
 def evaluate_essay_answer(student_answer, essay_question, key_points, original_text, word_limit=60):
     """記述式回答を評価（コピペ検出・キーポイント確認）"""
-    client = get_openai_client()
     
     # コピペ率の簡易チェック（単語レベル）
     import re
@@ -662,7 +776,8 @@ Output JSON:
 }}"""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "reading.evaluate_essay_answer",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are an EFL writing evaluator. Respond in valid JSON only."},
@@ -672,7 +787,7 @@ Output JSON:
             max_tokens=500,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["word_count"] = word_count
         result["copy_overlap"] = round(overlap * 100)
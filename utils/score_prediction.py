@@ -0,0 +1,350 @@
+"""
+Score Prediction
+================
+練習履歴（exam_practice_logs + practice_logs）から学生ごとのスコア推移を当てはめ、
+TOEIC / TOEFL / IELTS / 英検の予測スコアを信頼区間つきで出す。
+
+- 現在の水準: 半減期 HALF_LIFE_DAYS の指数加重平均（EWMA）
+- 伸び: ソース重み付きの回帰直線の傾き（ログが少ない・期間が短いうちは使わない）
+- 予測 = 水準 + 傾き × (EWMA の遅れ + 予測までの日数)。区間は両方の標準誤差から
+- 学生ごとの十分統計量（Σw, Σwt, Σwy ...）を NumPy の bincount でコース全体まとめて作る。
+  EWMA の重みは固定の基準時刻からの 2^(t/半減期) なので、新しいログは足し込むだけで済む
+- コースごとにメモリ上にキャッシュし、REFRESH_SEC ごとに新しいログだけ読み込む
+
+使い方:
+    from utils.score_prediction import get_course_predictions, predict_student
+    predictions = get_course_predictions(course_id)      # {student_id: {...}}
+    mine = predict_student(student_id, course_id)
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.speech_eval import score_to_cefr, score_to_eiken
+
+
+# ====================================================================
+# 設定
+# ====================================================================
+
+HALF_LIFE_DAYS = 14.0
+DEFAULT_HORIZON_DAYS = 30
+REFRESH_SEC = 60
+REANCHOR_DAYS = 180               # EWMA 重みの基準時刻からこれ以上経ったら作り直す
+Z_95 = 1.96
+
+# 検定対策の練習は重み 1、それ以外の練習（スピーキング・語彙など）は参考程度
+SOURCE_WEIGHTS = {"exam_practice": 1.0}
+OTHER_PRACTICE_WEIGHT = 0.5
+
+# 観測が少ないうちは既定のばらつきに寄せる（PRIOR_SD 点を PRIOR_COUNT 件分）
+PRIOR_SD = 12.0
+PRIOR_COUNT = 2.0
+
+# 傾きを使う条件と上限
+MIN_TREND_LOGS = 3
+MIN_TREND_SD_DAYS = 3.0
+MAX_SLOPE_PER_DAY = 1.0
+UNKNOWN_SLOPE_SD = 0.2            # 傾きが推定できないときの1日あたりの不確かさ
+
+# 正答率（0-100）→ 各試験のスコア。CEFR の境界（40/55/70/85 → A2/B1/B2/C1）を
+# 各試験の score_levels（views/test_prep.TEST_TYPES）に合わせた区分線形の対応表
+SCORE_SCALES = {
+    "toeic": {"percent": [0, 40, 55, 70, 85, 100], "score": [10, 225, 550, 785, 945, 990], "step": 5},
+    "toefl_itp": {"percent": [0, 40, 55, 70, 85, 100], "score": [310, 337, 460, 543, 627, 677], "step": 1},
+    "toefl_ibt": {"percent": [0, 55, 70, 85, 100], "score": [0, 42, 72, 95, 120], "step": 1},
+    "ielts": {"percent": [0, 55, 70, 85, 100], "score": [1.0, 4.0, 5.5, 7.0, 9.0], "step": 0.5},
+}
+
+_SUMS = ("w", "wt", "wtt", "wy", "wty", "wyy", "n",      # 回帰用（ソース重み）
+         "d", "dd", "dt", "dy", "dyy")                   # EWMA 用（ソース重み × 減衰）
+
+
+def _to_days(value) -> Optional[float]:
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp() / 86400.0
+
+
+def _source_weight(row: Dict) -> float:
+    return SOURCE_WEIGHTS.get(row.get("module_type"), OTHER_PRACTICE_WEIGHT)
+
+
+# ====================================================================
+# 学生ごとの十分統計量
+# ====================================================================
+
+class TrajectoryStats:
+    """学生 × 十分統計量の配列（ログの追加は bincount で一括）"""
+
+    def __init__(self, anchor_day: float):
+        self.anchor = anchor_day
+        self.index: Dict[str, int] = {}
+        self.student_ids: List[str] = []
+        self.sums = {k: np.zeros(0) for k in _SUMS}
+        self.last_day = np.zeros(0)
+
+    def _grow(self, student_ids):
+        for sid in student_ids:
+            if sid not in self.index:
+                self.index[sid] = len(self.student_ids)
+                self.student_ids.append(sid)
+        size = len(self.student_ids)
+        pad = size - len(self.last_day)
+        if pad > 0:
+            for k in _SUMS:
+                self.sums[k] = np.concatenate([self.sums[k], np.zeros(pad)])
+            self.last_day = np.concatenate([self.last_day, np.full(pad, -np.inf)])
+
+    def add(self, student_ids: List[str], days: np.ndarray, scores: np.ndarray, weights: np.ndarray):
+        """ログ（学生ID, 日, 正答率, ソース重み）をまとめて足し込む"""
+        if not len(student_ids):
+            return
+        self._grow(set(student_ids))
+        idx = np.fromiter((self.index[s] for s in student_ids), int, len(student_ids))
+        t = np.asarray(days, dtype=float) - self.anchor
+        y = np.clip(np.asarray(scores, dtype=float), 0, 100)
+        w = np.asarray(weights, dtype=float)
+        d = w * np.exp2(t / HALF_LIFE_DAYS)
+        size = len(self.student_ids)
+
+        terms = {"w": w, "wt": w * t, "wtt": w * t * t, "wy": w * y, "wty": w * t * y, "wyy": w * y * y,
+                 "n": np.ones_like(w), "d": d, "dd": d * d, "dt": d * t, "dy": d * y, "dyy": d * y * y}
+        for k, values in terms.items():
+            self.sums[k] += np.bincount(idx, weights=values, minlength=size)
+        np.maximum.at(self.last_day, idx, t)
+
+    def predict(self, now_day: float, horizon_days: float) -> Dict[str, np.ndarray]:
+        """全学生の現在・予測の正答率と標準誤差（配列）"""
+        s = self.sums
+        now = now_day - self.anchor
+
+        # EWMA の水準と標準誤差
+        d = np.maximum(s["d"], 1e-300)
+        level = s["dy"] / d
+        var = np.maximum(s["dyy"] / d - level ** 2, 0)
+        n_eff = s["d"] ** 2 / np.maximum(s["dd"], 1e-300)
+        var = (n_eff * var + PRIOR_COUNT * PRIOR_SD ** 2) / (n_eff + PRIOR_COUNT)
+        se_level = np.sqrt(var / np.maximum(n_eff, 1e-9))
+        lag = np.maximum(now - s["dt"] / d, 0)
+
+        # 回帰直線の傾き
+        w = np.maximum(s["w"], 1e-300)
+        t_mean, y_mean = s["wt"] / w, s["wy"] / w
+        sxx = s["wtt"] - w * t_mean ** 2
+        sxy = s["wty"] - w * t_mean * y_mean
+        syy = s["wyy"] - w * y_mean ** 2
+        trend_ok = (s["n"] >= MIN_TREND_LOGS) & (sxx / w >= MIN_TREND_SD_DAYS ** 2)
+        safe_sxx = np.where(trend_ok, sxx, 1.0)
+        slope = np.where(trend_ok, sxy / safe_sxx, 0.0)
+        sse = np.maximum(syy - slope * sxy, 0)
+        resid_var = sse / w * s["n"] / np.maximum(s["n"] - 2, 1)
+        se_slope = np.where(trend_ok, np.sqrt(resid_var / safe_sxx * w / np.maximum(s["n"], 1)), UNKNOWN_SLOPE_SD)
+        slope = np.clip(slope, -MAX_SLOPE_PER_DAY, MAX_SLOPE_PER_DAY)
+
+        current = level + slope * lag
+        projected = level + slope * (lag + horizon_days)
+        return {
+            "current": np.clip(current, 0, 100),
+            "current_se": np.sqrt(se_level ** 2 + (lag * se_slope) ** 2),
+            "projected": np.clip(projected, 0, 100),
+            "projected_se": np.sqrt(se_level ** 2 + ((lag + horizon_days) * se_slope) ** 2),
+            "slope": slope,
+            "trend_ok": trend_ok,
+            "n": s["n"],
+            "last_day": self.last_day + self.anchor,
+        }
+
+
+# ====================================================================
+# スコア換算
+# ====================================================================
+
+def percent_to_exam_scores(percent, lo, hi) -> Dict[str, Dict]:
+    """正答率（と区間の下限・上限）を各試験のスコアと英検の級に換算（配列でも可）"""
+    result = {}
+    for exam, scale in SCORE_SCALES.items():
+        values = []
+        for p in (percent, lo, hi):
+            raw = np.interp(p, scale["percent"], scale["score"])
+            values.append(np.round(np.asarray(raw) / scale["step"]) * scale["step"])
+        result[exam] = {"score": values[0], "lo": values[1], "hi": values[2]}
+    return result
+
+
+def _scalar(value, step):
+    return int(value) if float(step).is_integer() else round(float(value), 1)
+
+
+def _student_prediction(sid: str, i: int, pred: Dict, exams: Dict) -> Dict:
+    def band(key):
+        p, se = float(pred[key][i]), float(pred[f"{key}_se"][i])
+        return {"percent": round(p, 1), "lo": round(max(0.0, p - Z_95 * se), 1),
+                "hi": round(min(100.0, p + Z_95 * se), 1)}
+
+    current, projected = band("current"), band("projected")
+    return {
+        "student_id": sid,
+        "n_logs": int(pred["n"][i]),
+        "last_practiced": datetime.fromtimestamp(float(pred["last_day"][i]) * 86400, timezone.utc).isoformat(),
+        "trend_per_week": round(float(pred["slope"][i]) * 7, 1) if pred["trend_ok"][i] else None,
+        "current": current,
+        "projected": projected,
+        "cefr": score_to_cefr(current["percent"]),
+        "cefr_range": [score_to_cefr(current["lo"]), score_to_cefr(current["hi"])],
+        "eiken": score_to_eiken(projected["percent"]),
+        "eiken_range": [score_to_eiken(projected["lo"]), score_to_eiken(projected["hi"])],
+        "exams": {
+            exam: {k: _scalar(v[i], SCORE_SCALES[exam]["step"]) for k, v in values.items()}
+            for exam, values in exams.items()
+        },
+    }
+
+
+# ====================================================================
+# コース単位の予測（差分更新つきキャッシュ）
+# ====================================================================
+
+class CoursePredictor:
+    """コース（または学生1人）の予測。refresh() で新しいログだけ読み込む"""
+
+    def __init__(self, course_id: str = None, student_ids: List[str] = None, loader=None):
+        self.course_id = course_id
+        self._fixed_students = student_ids
+        self._loader = loader
+        self._lock = threading.Lock()
+        self.stats: Optional[TrajectoryStats] = None
+        self.students: List[str] = []
+        self.watermark: Optional[str] = None
+        self._seen = set()
+        self.refreshed_at = 0.0
+        self.timings: Dict = {}
+
+    def _students(self) -> List[str]:
+        if self._fixed_students is not None:
+            return list(self._fixed_students)
+        from utils.database import get_course_students
+        return [s["id"] for s in get_course_students(self.course_id) if s.get("id")]
+
+    def _load(self, student_ids, since):
+        if self._loader:
+            return self._loader(student_ids, self.course_id, since)
+        from utils.database import get_prediction_logs
+        return get_prediction_logs(student_ids, self.course_id, since)
+
+    def refresh(self, force: bool = False, now: float = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if not force and self.stats is not None and now - self.refreshed_at < REFRESH_SEC:
+                return
+            started = time.perf_counter()
+            students = self._students()
+            today = now / 86400.0
+            rebuild = (force or self.stats is None or set(students) - set(self.students)
+                       or today - self.stats.anchor > REANCHOR_DAYS)
+            if rebuild:
+                self.stats = TrajectoryStats(anchor_day=today)
+                self.watermark, self._seen = None, set()
+            self.students = students
+
+            # 読み込みが途中で失敗した場合は例外になり、watermark も統計も変えない
+            loaded_rows = self._load(students, self.watermark)
+            # watermark と同じ時刻の行は前回読んだもの（_seen）を除き、今回の読み込み内の重複も1回だけ数える
+            seen = set(self._seen)
+            rows = []
+            for r in loaded_rows:
+                key = (r["source"], r["id"])
+                if key not in seen and r.get("score") is not None:
+                    seen.add(key)
+                    rows.append(r)
+            loaded = time.perf_counter()
+
+            days = [_to_days(r.get("practiced_at")) for r in rows]
+            rows = [(r, d) for r, d in zip(rows, days) if d is not None]
+            self.stats.add([r["student_id"] for r, _ in rows],
+                           np.array([d for _, d in rows]),
+                           np.array([float(r["score"]) for r, _ in rows]),
+                           np.array([_source_weight(r) for r, _ in rows]))
+            # watermark は実際に読んだ行の最新時刻まで。次回は同じ時刻から読み直すので
+            # その時刻の行だけを既読として覚えておく
+            stamps = [r["practiced_at"] for r in loaded_rows if r.get("practiced_at")]
+            if stamps:
+                latest = max(stamps)
+                if self.watermark is None or latest > self.watermark:
+                    self.watermark = latest
+                    self._seen = set()
+                self._seen.update((r["source"], r["id"]) for r in loaded_rows
+                                  if r.get("practiced_at") == self.watermark)
+
+            self.refreshed_at = now
+            self.timings = {"rebuild": bool(rebuild), "logs": len(rows),
+                            "load": round(loaded - started, 3),
+                            "fit": round(time.perf_counter() - loaded, 3)}
+
+    def predictions(self, horizon_days: float = DEFAULT_HORIZON_DAYS, now: float = None) -> Dict[str, Dict]:
+        self.refresh(now=now)
+        with self._lock:
+            stats = self.stats
+            if stats is None or not stats.student_ids:
+                return {}
+            now_day = (time.time() if now is None else now) / 86400.0
+            pred = stats.predict(now_day, horizon_days)
+            z = Z_95
+            exams = percent_to_exam_scores(pred["projected"],
+                                           np.clip(pred["projected"] - z * pred["projected_se"], 0, 100),
+                                           np.clip(pred["projected"] + z * pred["projected_se"], 0, 100))
+            return {sid: _student_prediction(sid, i, pred, exams) for i, sid in enumerate(stats.student_ids)}
+
+
+_predictors: Dict[tuple, CoursePredictor] = {}
+_predictors_lock = threading.Lock()
+
+
+def _get_predictor(key: tuple, **kwargs) -> CoursePredictor:
+    with _predictors_lock:
+        predictor = _predictors.get(key)
+        if predictor is None:
+            predictor = _predictors[key] = CoursePredictor(**kwargs)
+        return predictor
+
+
+def get_course_predictions(course_id: str, horizon_days: float = DEFAULT_HORIZON_DAYS) -> Dict[str, Dict]:
+    """コース全員の予測 {student_id: prediction}（練習ログのない学生は含まない）"""
+    try:
+        return _get_predictor(("course", course_id), course_id=course_id).predictions(horizon_days)
+    except Exception:
+        return {}
+
+
+def predict_student(student_id: str, course_id: str = None,
+                    horizon_days: float = DEFAULT_HORIZON_DAYS) -> Optional[Dict]:
+    """学生1人の予測（コースが分かればコースの一括計算を使う）"""
+    if course_id:
+        prediction = get_course_predictions(course_id, horizon_days).get(student_id)
+        if prediction:
+            return prediction
+    try:
+        predictor = _get_predictor(("student", student_id), student_ids=[student_id])
+        return predictor.predictions(horizon_days).get(student_id)
+    except Exception:
+        return None
+
+
+def invalidate_predictions(course_id: str = None, student_id: str = None):
+    """次の参照で新しいログを読み込ませる（練習結果を記録した直後に呼ぶ）"""
+    with _predictors_lock:
+        for key in (("course", course_id), ("student", student_id)):
+            predictor = _predictors.get(key)
+            if predictor is not None:
+                predictor.refreshed_at = 0.0
@@ -0,0 +1,404 @@
+"""
+Speaking Evaluation Jobs
+========================
+スピーキング課題の評価をジョブキュー経由で行う。
+
+- 提出時: 音声を Storage に保存 → 提出行を作成 → speaking_eval_jobs にジョブを積む
+  （学生のセッションでは評価を待たない。タブを閉じても評価は続く）
+- ワーカー: ジョブを取得し、同時実行数を制限して評価 → update_submission_feedback で書き戻す
+  失敗したジョブはバックオフして再試行、リース切れ（ワーカー停止）はキューに戻す
+  完了・失敗の書き込みは取得時の running・attempts のときだけ行い、遅れて終えたワーカーの結果は捨てる
+- 学生画面: show_submission_status で評価状況を表示（更新ボタンでポーリング）
+- 締切前の監視: get_queue_metrics でキューの深さ・待ち時間・処理時間を集計
+
+ワーカーの起動:
+    python speaking_eval_worker.py --workers 4
+"""
+
+import os
+import socket
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from utils.audio_buffer import AudioBuffer
+
+
+DEFAULT_CONCURRENCY = 4
+# 1ジョブあたりの Azure 認識の並列数（ワーカー全体では DEFAULT_CONCURRENCY 倍になる）
+RECOGNITION_WORKERS_PER_JOB = 4
+POLL_INTERVAL_SEC = 2.0
+LEASE_SEC = 900
+STALE_CHECK_INTERVAL_SEC = 60
+
+_CONTENT_TYPES = {
+    '.wav': 'audio/wav', '.mp3': 'audio/mpeg', '.m4a': 'audio/mp4', '.ogg': 'audio/ogg',
+    '.webm': 'audio/webm', '.mp4': 'video/mp4', '.mov': 'video/quicktime', '.avi': 'video/x-msvideo',
+}
+
+STATUS_LABELS = {
+    'queued': '⏳ 評価待ち / Queued',
+    'running': '🔄 評価中 / Evaluating',
+    'done': '✅ 評価完了 / Done',
+    'failed': '⚠️ 評価失敗 / Failed',
+}
+
+
+# ============================================================
+# 提出（学生セッション側）
+# ============================================================
+
+def submit_speaking_for_evaluation(student_id: str, assignment_id: str, audio_source,
+                                   reference_text: str = "", course_id: str = None,
+                                   task_type: str = "monologue",
+                                   student_text: str = None) -> Dict:
+    """音声を保存して提出行とジョブを作成する（評価はワーカーが行う）
+
+    Returns: {"success": True, "submission": {...}, "job": {...}} / {"success": False, "error": ...}
+    """
+    from utils.database import create_speaking_submission, enqueue_speaking_eval_job, upload_speaking_audio
+
+    try:
+        audio = AudioBuffer.from_source(audio_source)
+        name = getattr(audio_source, 'name', '') or f"recording{audio.suffix}"
+        path = f"{student_id}/{assignment_id}/{uuid.uuid4().hex}{audio.suffix}"
+        upload_speaking_audio(path, bytes(audio.view), _CONTENT_TYPES.get(audio.suffix, 'application/octet-stream'))
+
+        submission = create_speaking_submission(
+            student_id=student_id,
+            assignment_id=assignment_id,
+            student_text=student_text if student_text is not None else reference_text,
+            audio_url=path,
+        )
+        if not submission:
+            return {"success": False, "error": "submission was not created"}
+
+        job = enqueue_speaking_eval_job(
+            submission_id=submission['id'],
+            student_id=student_id,
+            audio_path=path,
+            assignment_id=assignment_id,
+            course_id=course_id,
+            audio_name=name,
+            reference_text=reference_text,
+            task_type=task_type,
+        )
+        return {"success": True, "submission": submission, "job": job}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+# ============================================================
+# 1ジョブの評価（ワーカー側）
+# ============================================================
+
+class RetryableEvaluationError(RuntimeError):
+    """外部サービスの一時的な失敗（再試行すれば成功しうる）"""
+
+
+class LeaseLostError(RuntimeError):
+    """評価中にリースが切れ、ジョブが別のワーカーに渡った・失敗にされた（結果は書き込まない）"""
+
+
+def evaluate_job(job: Dict, final_attempt: bool = False,
+                 recognize: Callable = None, evaluate_language: Callable = None) -> Dict:
+    """ジョブの音声を評価し、提出行にスコアとフィードバックを書き込む
+
+    認識が全チャンクで失敗した場合、または GPT 評価が失敗した場合は
+    RetryableEvaluationError を送出する（最後の試行では GPT 失敗は既定スコアで確定する）。
+    """
+    from utils.database import (
+        download_speaking_audio, renew_speaking_eval_job_lease, update_submission_feedback,
+    )
+    from utils.speech_pipeline import iter_speech_evaluation, default_recognizer, default_language_evaluator
+
+    audio = AudioBuffer.from_source(download_speaking_audio(job['audio_path']),
+                                    name=job.get('audio_name') or job['audio_path'])
+
+    recognize = recognize or default_recognizer()
+    evaluate_language = evaluate_language or default_language_evaluator(
+        job.get('course_id'), job.get('task_type', 'monologue'), job.get('assignment_id'))
+
+    chunk_ok = []
+    language_error = []
+
+    def _recognize(body):
+        result = recognize(body)
+        chunk_ok.append(result.get("raw") is not None or bool(result.get("text")))
+        return result
+
+    def _evaluate_language(text):
+        try:
+            result = evaluate_language(text)
+        except Exception as e:
+            language_error.append(str(e))
+            raise
+        if not result or not result.get("success"):
+            language_error.append((result or {}).get("error", "no result"))
+        return result
+
+    pronunciation = {}
+    done = None
+    for event in iter_speech_evaluation(audio, reference_text=job.get('reference_text') or "",
+                                        course_id=job.get('course_id'),
+                                        task_type=job.get('task_type', 'monologue'),
+                                        assignment_id=job.get('assignment_id'),
+                                        max_workers=RECOGNITION_WORKERS_PER_JOB,
+                                        recognize=_recognize,
+                                        evaluate_language=_evaluate_language):
+        if event["type"] == "error":
+            raise RuntimeError(event["error"])
+        if event["type"] == "pronunciation":
+            pronunciation = event["result"]
+        elif event["type"] == "done":
+            done = event
+
+    if chunk_ok and not any(chunk_ok):
+        raise RetryableEvaluationError("speech recognition failed for every chunk")
+    if language_error and not final_attempt:
+        raise RetryableEvaluationError(f"language evaluation failed: {language_error[0]}")
+
+    azure_scores = pronunciation.get("scores", {})
+    total_score = azure_scores.get("overall", 70)
+    scores = {**done["scores"], "completeness": azure_scores.get("completeness")}
+    # リース切れで別のワーカーが取り直したジョブなら、そちらの結果を上書きしない
+    if not renew_speaking_eval_job_lease(job):
+        raise LeaseLostError(f"job {job['id']} attempt {job.get('attempts')} is no longer running")
+    update_submission_feedback(
+        job['submission_id'],
+        feedback=done["feedback"],
+        scores=scores,
+        total_score=total_score,
+        recognized_text=done["recognized_text"],
+        feedback_detailed={
+            "duration": pronunciation.get("duration"),
+            "intelligibility": pronunciation.get("intelligibility"),
+            "timings": done["timings"],
+        },
+    )
+    return {"scores": scores, "total_score": total_score, "timings": done["timings"]}
+
+
+# ============================================================
+# ワーカー
+# ============================================================
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SpeakingEvalWorker:
+    """ジョブを取得して最大 concurrency 件を並行に評価するワーカー"""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, worker_id: str = None,
+                 poll_interval: float = POLL_INTERVAL_SEC, lease_sec: int = LEASE_SEC,
+                 log: Callable[[str], None] = print):
+        self.concurrency = max(1, concurrency)
+        self.worker_id = worker_id or default_worker_id()
+        self.poll_interval = poll_interval
+        self.lease_sec = lease_sec
+        self.log = log
+        self.stats = {"done": 0, "retried": 0, "failed": 0, "lost": 0}
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _process(self, job: Dict) -> str:
+        from utils.database import complete_speaking_eval_job, fail_speaking_eval_job
+
+        final_attempt = job.get('attempts', 1) >= job.get('max_attempts', 3)
+        started = time.perf_counter()
+        try:
+            result = evaluate_job(job, final_attempt=final_attempt)
+        except LeaseLostError as e:
+            return self._lost(job, e)
+        except Exception as e:
+            status = fail_speaking_eval_job(job, f"{type(e).__name__}: {e}")
+            if status is None:
+                return self._lost(job, e)
+            with self._stats_lock:
+                self.stats["retried" if status == 'queued' else "failed"] += 1
+            self.log(f"✗ {job['id']} attempt {job.get('attempts')}: {e} → {status}")
+            return status
+        if not complete_speaking_eval_job(job, result):
+            return self._lost(job, "job was no longer running when the result was written")
+        with self._stats_lock:
+            self.stats["done"] += 1
+        self.log(f"✓ {job['id']} score={result['total_score']} ({time.perf_counter() - started:.1f}s)")
+        return 'done'
+
+    def _lost(self, job: Dict, reason) -> str:
+        """リースを失ったジョブは何も書き戻さない（今の持ち主の結果を優先する）"""
+        with self._stats_lock:
+            self.stats["lost"] += 1
+        self.log(f"… {job['id']} attempt {job.get('attempts')}: lease lost, result discarded ({reason})")
+        return 'lost'
+
+    def run(self, drain: bool = False):
+        """停止されるまでジョブを処理する（drain=True ならキューが空になった時点で終了）"""
+        from utils.database import claim_speaking_eval_jobs, requeue_stale_speaking_eval_jobs
+
+        running = set()
+        last_stale_check = 0.0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now - last_stale_check >= STALE_CHECK_INTERVAL_SEC:
+                    last_stale_check = now
+                    try:
+                        stale = requeue_stale_speaking_eval_jobs(self.lease_sec)
+                        if stale["requeued"]:
+                            self.log(f"↺ リース切れのジョブを {stale['requeued']} 件キューに戻しました")
+                        if stale["failed"]:
+                            self.log(f"✖ 再試行上限に達したリース切れのジョブ {stale['failed']} 件を失敗にしました")
+                    except Exception as e:
+                        self.log(f"stale check failed: {e}")
+
+                free = self.concurrency - len(running)
+                claimed = []
+                if free > 0:
+                    try:
+                        claimed = claim_speaking_eval_jobs(self.worker_id, free)
+                    except Exception as e:
+                        self.log(f"claim failed: {e}")
+                for job in claimed:
+                    running.add(executor.submit(self._process, job))
+
+                if drain and not running and not claimed:
+                    break
+                if running:
+                    done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    running -= done
+                else:
+                    self._stop.wait(self.poll_interval)
+
+            wait(running)
+        return self.stats
+
+
+# ============================================================
+# キュー指標
+# ============================================================
+
+def _parse_ts(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _percentiles(values: List[float]) -> Dict:
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    return {
+        "p50": round(statistics.median(values), 1),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 1),
+        "max": round(values[-1], 1),
+    }
+
+
+def summarize_queue(rows: List[Dict], window_minutes: int, now: datetime = None) -> Dict:
+    """ジョブ行からキューの深さ・待ち時間・処理時間を集計する"""
+    now = now or datetime.now(timezone.utc)
+    queued = [r for r in rows if r['status'] == 'queued']
+    finished = [r for r in rows if r['status'] in ('done', 'failed')]
+
+    oldest = [_parse_ts(r.get('created_at')) for r in queued]
+    oldest = [ts for ts in oldest if ts]
+    waits, runs = [], []
+    for r in finished:
+        created, started, ended = (_parse_ts(r.get(k)) for k in ('created_at', 'started_at', 'finished_at'))
+        if created and started:
+            waits.append((started - created).total_seconds())
+        if started and ended:
+            runs.append((ended - started).total_seconds())
+
+    done_count = sum(1 for r in finished if r['status'] == 'done')
+    return {
+        "queued": len(queued),
+        "running": sum(1 for r in rows if r['status'] == 'running'),
+        "retrying": sum(1 for r in queued if (r.get('attempts') or 0) > 0),
+        "done": done_count,
+        "failed": len(finished) - done_count,
+        "oldest_queued_sec": round((now - min(oldest)).total_seconds(), 1) if oldest else 0,
+        "wait_sec": _percentiles(waits),
+        "run_sec": _percentiles(runs),
+        "throughput_per_min": round(done_count / max(window_minutes, 1), 2),
+        "window_minutes": window_minutes,
+    }
+
+
+def get_queue_metrics(window_minutes: int = 60) -> Dict:
+    """キューの深さと直近 window_minutes 分のレイテンシ"""
+    from utils.database import get_speaking_eval_job_rows
+
+    try:
+        since = (datetime.utcnow() - timedelta(minutes=window_minutes)).isoformat()
+        return {"success": True, **summarize_queue(get_speaking_eval_job_rows(since), window_minutes)}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+# ============================================================
+# 学生画面
+# ============================================================
+
+def show_submission_status(student_id: str, assignment_id: str, key_prefix: str = "speaking_job"):
+    """課題の評価状況を表示する（更新ボタンで再取得）"""
+    import streamlit as st
+    from utils.database import get_speaking_eval_jobs
+
+    jobs = get_speaking_eval_jobs(student_id, assignment_id, limit=5)
+    if not jobs:
+        return
+
+    st.markdown("#### 📬 評価状況 / Evaluation Status")
+    latest = jobs[0]
+    status = latest.get('status', 'queued')
+    submitted = (latest.get('created_at') or '')[:16].replace('T', ' ')
+    st.caption(f"提出: {submitted} / {STATUS_LABELS.get(status, status)}")
+
+    if status in ('queued', 'running'):
+        if latest.get('attempts', 0) > 1 or (status == 'queued' and latest.get('last_error')):
+            st.caption("一時的なエラーのため再評価待ちです。")
+        st.info("評価が終わるとここに結果が表示されます。ページを閉じても評価は続きます。")
+        if st.button("🔄 状態を更新 / Refresh", key=f"{key_prefix}_refresh_{assignment_id}"):
+            st.rerun()
+    elif status == 'done':
+        result = latest.get('result') or {}
+        scores = result.get('scores', {})
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("総合スコア", f"{result.get('total_score', 0)}点")
+        with col2:
+            st.metric("発音", f"{scores.get('pronunciation', 0)}点")
+        with col3:
+            st.metric("流暢さ", f"{scores.get('fluency', 0)}点")
+        if 'content' in scores:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("内容", f"{scores.get('content', 0)}点")
+            with col2:
+                st.metric("語彙", f"{scores.get('vocabulary', 0)}点")
+            with col3:
+                st.metric("文法", f"{scores.get('grammar', 0)}点")
+        
+        score = result.get('total_score', 0) or 0
+        if score >= 85:
+            st.success("Excellent work! Your pronunciation is very clear. 素晴らしい出来です！")
+        elif score >= 70:
+            st.info("Good job! Keep practicing for smoother delivery. もう少しスムーズに読めるように練習しましょう。")
+        else:
+            st.warning("Listen to the model audio and try again. お手本の音声を聞いてもう一度挑戦！")
+    else:
+        st.warning("評価に失敗しました。教員に連絡するか、もう一度提出してください。")
@@ -1,56 +1,24 @@
 import streamlit as st
 import requests
-import subprocess
-import tempfile
-import os
-import math
 import json
 import base64
+from utils.audio_buffer import AudioBuffer, wav_header
 
-def extract_audio_from_video(video_path, output_path):
-    """動画ファイルから音声を抽出"""
-    cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-vn',  # 映像を無視
-        '-ar', '16000', '-ac', '1', '-acodec', 'pcm_s16le',
-        output_path
-    ]
-    subprocess.run(cmd, capture_output=True, timeout=180)
+def split_audio(source, chunk_seconds=30):
+    """音声を指定秒数ごとに分割（WAVバイト列のリストと長さを返す）
 
-
-def split_audio(wav_path, chunk_seconds=30):
-    """音声を指定秒数ごとに分割"""
-    chunks = []
-    
-    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', 
-           '-of', 'default=noprint_wrappers=1:nokey=1', wav_path]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    duration = float(result.stdout.strip())
-    
-    num_chunks = math.ceil(duration / chunk_seconds)
-    
-    for i in range(num_chunks):
-        start = i * chunk_seconds
-        chunk_path = f"{wav_path}_chunk{i}.wav"
-        
-        cmd = [
-            'ffmpeg', '-y', '-i', wav_path,
-            '-ss', str(start), '-t', str(chunk_seconds),
-            '-ar', '16000', '-ac', '1', '-acodec', 'pcm_s16le',
-            chunk_path
-        ]
-        subprocess.run(cmd, capture_output=True, timeout=60)
-        
-        with open(chunk_path, 'rb') as f:
-            chunks.append(f.read())
-        
-        os.unlink(chunk_path)
-    
-    return chunks, duration
+    source はファイルパス / bytes / UploadedFile。分割はメモリ上で行う。
+    """
+    pcm = AudioBuffer.from_source(source).to_pcm16()
+    chunks = [wav_header(c.nbytes) + c for c in pcm.chunks(chunk_seconds)]
+    return chunks, pcm.duration
 
 
 def evaluate_chunk_simple(audio_data, api_key, region):
-    """シンプルな音声認識"""
+    """シンプルな音声認識
+
+    audio_data は WAVバイト列、または AudioBuffer.wav_chunks() のイテレータ（チャンク転送）
+    """
     
     url = f"https://{region}.stt.speech.microsoft.com/speech/recognition/conversation/cognitiveservices/v1"
     
@@ -87,47 +55,58 @@ def evaluate_chunk_simple(audio_data, api_key, region):
         return {"text": "", "confidence": 0, "raw": None}
 
 
+def summarize_recognition(texts, confidences, reference_text, duration):
+    """チャンクごとの認識結果（テキスト・信頼度）を発音評価の結果にまとめる"""
+    recognized_text = " ".join(t for t in texts if t)
+    confidences = [c for c in confidences if c > 0]
+    
+    if confidences:
+        avg_confidence = sum(confidences) / len(confidences)
+    else:
+        avg_confidence = 0.7 if recognized_text else 0.3
+    
+    base_score = int(avg_confidence * 100)
+    
+    if reference_text:
+        ref_words = len(reference_text.split())
+        rec_words = len(recognized_text.split())
+        completeness = min(100, int((rec_words / max(ref_words, 1)) * 100))
+    else:
+        completeness = 80 if recognized_text else 50
+    
+    overall = int((base_score * 0.7) + (completeness * 0.3))
+    
+    return {
+        "success": True,
+        "recognized_text": recognized_text,
+        "duration": duration,
+        "scores": {
+            "overall": overall,
+            "accuracy": base_score,
+            "fluency": max(50, base_score - 5),
+            "completeness": completeness,
+            "prosody": max(50, base_score - 10)
+        },
+        "problem_words": [],
+        "problem_phonemes": [],
+        "intelligibility": get_intelligibility(base_score, base_score, base_score)
+    }
+
+
 def evaluate_pronunciation(audio_file, reference_text):
     """Azure Speech APIで発音を評価（長い音声・動画対応）"""
     
     api_key = st.secrets["azure_speech"]["api_key"]
     region = st.secrets["azure_speech"]["region"]
     
-    file_name = audio_file.name.lower()
-    suffix = '.' + file_name.split('.')[-1]
-    
-    # 対応形式チェック
-    supported_audio = ['.wav', '.mp3', '.m4a']
-    supported_video = ['.mp4', '.mov', '.webm', '.avi']
-    
-    is_video = suffix in supported_video
-    
     try:
-        # 一時ファイルに保存
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_in:
-            tmp_in.write(audio_file.read())
-            tmp_in_path = tmp_in.name
-        
-        wav_path = tmp_in_path.replace(suffix, '_converted.wav')
-        
-        if is_video:
-            # 動画から音声を抽出
+        # 録音・アップロードをメモリ上のまま 16kHz mono PCM に変換
+        audio = AudioBuffer.from_source(audio_file)
+        if audio.is_video:
             st.info("🎬 動画から音声を抽出中...")
-            extract_audio_from_video(tmp_in_path, wav_path)
-        else:
-            # 音声ファイルをWAVに変換
-            cmd = [
-                'ffmpeg', '-y', '-i', tmp_in_path,
-                '-ar', '16000', '-ac', '1', '-acodec', 'pcm_s16le',
-                wav_path
-            ]
-            subprocess.run(cmd, capture_output=True, timeout=120)
-        
-        os.unlink(tmp_in_path)
-        
-        # 音声を分割
-        chunks, duration = split_audio(wav_path, chunk_seconds=30)
-        os.unlink(wav_path)
+        pcm = audio.to_pcm16()
+        duration = pcm.duration
+        chunks = list(pcm.wav_chunks(30))
         
         st.info(f"📊 音声長: {duration:.1f}秒 / {len(chunks)}チャンクで分析中...")
         
@@ -143,40 +122,7 @@ def evaluate_pronunciation(audio_file, reference_text):
                 all_confidence.append(result["confidence"])
             progress_bar.progress((i + 1) / len(chunks))
         
-        # 結果を統合
-        recognized_text = " ".join(all_text)
-        
-        if all_confidence:
-            avg_confidence = sum(all_confidence) / len(all_confidence)
-        else:
-            avg_confidence = 0.7 if recognized_text else 0.3
-        
-        base_score = int(avg_confidence * 100)
-        
-        if reference_text:
-            ref_words = len(reference_text.split())
-            rec_words = len(recognized_text.split())
-            completeness = min(100, int((rec_words / max(ref_words, 1)) * 100))
-        else:
-            completeness = 80 if recognized_text else 50
-        
-        overall = int((base_score * 0.7) + (completeness * 0.3))
-        
-        return {
-            "success": True,
-            "recognized_text": recognized_text,
-            "duration": duration,
-            "scores": {
-                "overall": overall,
-                "accuracy": base_score,
-                "fluency": max(50, base_score - 5),
-                "completeness": completeness,
-                "prosody": max(50, base_score - 10)
-            },
-            "problem_words": [],
-            "problem_phonemes": [],
-            "intelligibility": get_intelligibility(base_score, base_score, base_score)
-        }
+        return summarize_recognition(all_text, all_confidence, reference_text, duration)
         
     except Exception as e:
         return {
@@ -0,0 +1,221 @@
+"""
+Speech Evaluation Pipeline
+==========================
+スピーチ評価（Azure 音声認識 → GPT 言語評価）をパイプライン化する。
+
+- 音声を短いチャンクに分け、認識リクエストを並列に投げる
+- 完了したチャンクから、先頭から連続している部分の文字起こしを順次返す
+- GPT の言語評価は全チャンクの文字起こしがそろってから全文で行う
+  （途中までの文字起こしで採点すると、後半の文法・語彙が評価されないため）
+- 発音・流暢さ / 内容・語彙・文法 のスコアは、それぞれ出そろった時点で別々に返す
+
+イベントはジェネレータで返すので、st.* の呼び出しは呼び出し元（メインスレッド）で行う。
+
+使い方:
+    from utils.speech_pipeline import iter_speech_evaluation
+    for event in iter_speech_evaluation(speech_audio, course_id=course_id):
+        if event["type"] == "transcript":
+            box.caption(event["text"])
+        elif event["type"] == "done":
+            scores = event["scores"]
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from utils.audio_buffer import AudioBuffer
+
+
+# Azure の短い音声用 REST API は1リクエスト60秒まで。短めに切って並列度を上げる
+CHUNK_SECONDS = 15
+MAX_RECOGNITION_WORKERS = 8
+
+MIN_WORDS_FOR_LANGUAGE = 5
+
+DEFAULT_LANGUAGE_SCORE = 65
+SHORT_SPEECH_SCORE = 50
+SHORT_SPEECH_FEEDBACK = "音声が短すぎるか、認識できませんでした。もう少し長く話してみてください。"
+
+
+# ============================================================
+# 既定のサービス呼び出し
+# ============================================================
+
+def default_recognizer() -> Callable:
+    """Azure Speech のチャンク認識（secrets を読むのは1回だけ）"""
+    import streamlit as st
+    from utils.speech_eval import evaluate_chunk_simple
+
+    api_key = st.secrets["azure_speech"]["api_key"]
+    region = st.secrets["azure_speech"]["region"]
+    return lambda body: evaluate_chunk_simple(body, api_key, region)
+
+
+def default_language_evaluator(course_id, task_type, assignment_id) -> Callable:
+    from utils.gpt_eval import evaluate_language_use
+
+    return lambda text: evaluate_language_use(text, context="speaking", course_id=course_id,
+                                              task_type=task_type, assignment_id=assignment_id)
+
+
+# ============================================================
+# 結果の整形
+# ============================================================
+
+def language_scores(gpt_result: Optional[Dict]) -> Tuple[Dict[str, int], str]:
+    """evaluate_language_use の結果を (内容・語彙・文法のスコア, フィードバック文) にする"""
+    if not gpt_result or not gpt_result.get("success"):
+        return {k: DEFAULT_LANGUAGE_SCORE for k in ("content", "vocabulary", "grammar")}, ""
+
+    gpt_scores = gpt_result.get("scores", {})
+    scores = {k: gpt_scores.get(k, DEFAULT_LANGUAGE_SCORE) for k in ("content", "vocabulary", "grammar")}
+
+    feedback_parts = []
+    content_analysis = gpt_result.get("content_analysis", {})
+    if content_analysis.get('strengths'):
+        feedback_parts.append(f"👍 {content_analysis['strengths']}")
+    if content_analysis.get('suggestions'):
+        feedback_parts.append(f"💡 {content_analysis['suggestions']}")
+    return scores, "\n\n".join(feedback_parts)
+
+
+def _safe_language_eval(evaluate_language: Callable, text: str) -> Optional[Dict]:
+    try:
+        return evaluate_language(text)
+    except Exception:
+        return None
+
+
+def _safe_recognize(recognize: Callable, body) -> Dict:
+    try:
+        return recognize(body)
+    except Exception:
+        return {"text": "", "confidence": 0, "raw": None}
+
+
+# ============================================================
+# パイプライン
+# ============================================================
+
+def iter_speech_evaluation(speech_audio, reference_text: str = "",
+                           course_id: str = None, task_type: str = "monologue",
+                           assignment_id: str = None,
+                           chunk_seconds: int = CHUNK_SECONDS,
+                           max_workers: int = MAX_RECOGNITION_WORKERS,
+                           recognize: Callable = None,
+                           evaluate_language: Callable = None) -> Iterator[Dict]:
+    """スピーチ音声を評価し、途中経過をイベントとして順に返す
+
+    イベント（すべて "type" と開始からの経過秒 "elapsed" を持つ）:
+        audio         : {"duration", "chunks", "is_video"}
+        transcript    : {"text", "done_chunks", "total_chunks"}  先頭から連続した部分の文字起こし
+        pronunciation : {"scores": {"pronunciation", "fluency"}, "result"}
+        language      : {"scores": {"content", "vocabulary", "grammar"}, "feedback", "basis_words"}
+        done          : {"scores", "recognized_text", "feedback", "timings"}
+        error         : {"error"}
+
+    Args:
+        recognize:         WAVチャンク → {"text", "confidence"}（省略時は Azure Speech）
+        evaluate_language: テキスト → evaluate_language_use 形式の結果（省略時は GPT）
+    """
+    from utils.speech_eval import summarize_recognition
+
+    started = time.perf_counter()
+    timings = {}
+
+    def _event(kind, **payload):
+        return {"type": kind, "elapsed": round(time.perf_counter() - started, 3), **payload}
+
+    try:
+        audio = AudioBuffer.from_source(speech_audio)
+        pcm = audio.to_pcm16()
+        # 各チャンクは「WAVヘッダ + PCMスライス」のイテレータ（コピーせずに送信する）
+        bodies = list(pcm.wav_chunks(chunk_seconds))
+        if not bodies:
+            raise ValueError("audio is empty")
+        recognize = recognize or default_recognizer()
+        evaluate_language = evaluate_language or default_language_evaluator(course_id, task_type, assignment_id)
+    except Exception as e:
+        yield _event("error", error=str(e))
+        return
+
+    total = len(bodies)
+    timings["decode"] = round(time.perf_counter() - started, 3)
+    yield _event("audio", duration=pcm.duration, chunks=total, is_video=audio.is_video)
+
+    results = [None] * total
+    prefix = 0  # 先頭から連続して認識済みのチャンク数
+    scores = {}
+    feedback = ""
+    recognized_text = ""
+    language_future = None
+    language_basis = 0
+
+    def _prefix_text(n):
+        return " ".join(r["text"] for r in results[:n] if r["text"])
+
+    # 言語評価（GPT）の API 使用量は呼び出し元のユーザーに記録する
+    from utils.openai_gateway import bind_current_user
+    language_eval = bind_current_user(_safe_language_eval)
+
+    # 認識用ワーカー + 言語評価用の1本
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total)) + 1) as executor:
+        pending = {executor.submit(_safe_recognize, recognize, body): i for i, body in enumerate(bodies)}
+
+        while pending or language_future is not None:
+            waiting = set(pending)
+            if language_future is not None:
+                waiting.add(language_future)
+            done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+
+            advanced = False
+            for future in done:
+                if future is language_future:
+                    continue
+                results[pending.pop(future)] = future.result()
+                while prefix < total and results[prefix] is not None:
+                    prefix += 1
+                    advanced = True
+
+            if advanced:
+                yield _event("transcript", text=_prefix_text(prefix), done_chunks=prefix, total_chunks=total)
+
+            if not pending and "recognition" not in timings:
+                timings["recognition"] = round(time.perf_counter() - started, 3)
+                result = summarize_recognition([r["text"] for r in results],
+                                               [r["confidence"] for r in results],
+                                               reference_text, pcm.duration)
+                recognized_text = result["recognized_text"]
+                azure_scores = result.get("scores", {})
+                pron_scores = {
+                    "pronunciation": azure_scores.get('accuracy', 70),
+                    "fluency": azure_scores.get('fluency', 65),
+                }
+                scores.update(pron_scores)
+                yield _event("pronunciation", scores=pron_scores, result=result)
+
+            # 言語評価は全文がそろった時点で1回だけ開始する
+            if not pending and language_future is None and "language" not in timings:
+                text = _prefix_text(prefix)
+                words = len(text.split())
+                if words >= MIN_WORDS_FOR_LANGUAGE:
+                    language_future = executor.submit(language_eval, evaluate_language, text)
+                    language_basis = words
+                    timings["language_start"] = round(time.perf_counter() - started, 3)
+                else:
+                    lang_scores = {k: SHORT_SPEECH_SCORE for k in ("content", "vocabulary", "grammar")}
+                    feedback = SHORT_SPEECH_FEEDBACK
+                    scores.update(lang_scores)
+                    timings["language"] = round(time.perf_counter() - started, 3)
+                    yield _event("language", scores=lang_scores, feedback=feedback, basis_words=words)
+
+            if language_future is not None and language_future.done():
+                lang_scores, feedback = language_scores(language_future.result())
+                language_future = None
+                scores.update(lang_scores)
+                timings["language"] = round(time.perf_counter() - started, 3)
+                yield _event("language", scores=lang_scores, feedback=feedback, basis_words=language_basis)
+
+    timings["total"] = round(time.perf_counter() - started, 3)
+    yield _event("done", scores=scores, recognized_text=recognized_text, feedback=feedback, timings=timings)
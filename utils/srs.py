@@ -193,7 +193,12 @@ def show_quiz_review(words):
     
     if 'srs_quiz_index' not in st.session_state:
         st.session_state.srs_quiz_index = 0
-        st.session_state.srs_quiz_words = random.sample(words, min(len(words), 10))
+        # 誤答は単語帳全体から紛らわしい訳を選ぶ（開始時に一式を作っておく）
+        from utils.distractors import build_quiz_set
+        st.session_state.srs_quiz_set = build_quiz_set(
+            get_word_book(), "meaning", targets=random.sample(words, min(len(words), 10))
+        )
+        st.session_state.srs_quiz_words = [q['word_data'] for q in st.session_state.srs_quiz_set]
         st.session_state.srs_quiz_score = 0
         st.session_state.srs_quiz_answered = False
         st.session_state.srs_quiz_selected = None
@@ -216,7 +221,7 @@ def show_quiz_review(words):
             st.warning("もう少し復習しましょう 💪")
         
         if st.button("🔄 もう一度"):
-            for key in ['srs_quiz_index', 'srs_quiz_words', 'srs_quiz_score', 'srs_quiz_answered', 'srs_quiz_selected']:
+            for key in ['srs_quiz_index', 'srs_quiz_words', 'srs_quiz_set', 'srs_quiz_score', 'srs_quiz_answered', 'srs_quiz_selected']:
                 if key in st.session_state:
                     del st.session_state[key]
             st.rerun()
@@ -229,19 +234,14 @@ def show_quiz_review(words):
     
     st.markdown(f"### 📝 「{current['word']}」の意味は？")
     
-    # 選択肢を生成
-    all_book = get_word_book()
-    other_words = [w for w in all_book if w['word'] != current['word'] and w.get('definition')]
-    
-    if len(other_words) >= 3:
-        distractors = random.sample(other_words, 3)
-        options = [current['definition']] + [d['definition'] for d in distractors]
-    else:
-        # 単語帳に選択肢が足りない場合のフォールバック
+    # 選択肢（単語帳に選択肢が足りない場合は固定の誤答で補う）
+    question = st.session_state.srs_quiz_set[idx]
+    options = list(question['options'])
+    if len(options) < 4:
         fallback_options = ["動く、移動する", "考える、思考する", "作る、創造する"]
-        options = [current['definition']] + fallback_options[:3]
-    
-    random.shuffle(options)
+        options += [o for o in fallback_options if o not in options][:4 - len(options)]
+        # 再描画で並びが変わらないよう問題ごとに固定の順序で混ぜる
+        random.Random(f"{idx}:{current['word']}").shuffle(options)
     
     if not st.session_state.srs_quiz_answered:
         for i, opt in enumerate(options):
@@ -249,7 +249,7 @@ def show_quiz_review(words):
                 st.session_state.srs_quiz_selected = opt
                 st.session_state.srs_quiz_answered = True
                 
-                if opt == current['definition']:
+                if opt == question['correct']:
                     st.session_state.srs_quiz_score += 1
                     update_srs(current, 4)
                 else:
@@ -257,7 +257,7 @@ def show_quiz_review(words):
                 st.rerun()
     else:
         selected = st.session_state.srs_quiz_selected
-        correct = current['definition']
+        correct = question['correct']
         
         if selected == correct:
             st.success(f"✅ 正解！ - {correct}")
@@ -3,6 +3,9 @@
 各試験の出題形式・トピック・難易度に忠実な問題群
 """
 
+import copy
+import hashlib
+import json
 import random
 
 # ====================================================================
@@ -647,125 +650,254 @@ IELTS_LISTENING = {
 }
 
 
+# ====================================================================
+# インデックス付き問題バンク
+# ====================================================================
+
+DIFFICULTY_KEYS = {
+    "易しい": "easy", "やや易しい": "easy",
+    "標準": "medium",
+    "やや難しい": "hard", "難しい": "hard",
+}
+DIFFICULTY_ORDER = ["easy", "medium", "hard"]
+
+# 読解問題の skill_focus → 問題タイプ（views/test_prep.QUESTION_TYPES の type）
+_READING_SKILL_TYPES = {
+    "主旨把握": "main_idea",
+    "詳細理解": "detail",
+    "文脈からの語彙推測": "vocabulary",
+    "目的・理由の理解": "inference",
+}
+
+# 英検は級を難易度として扱う
+_EIKEN_GRADE_DIFFICULTY = {"grade2": "medium", "pre1": "hard"}
+
+
+def question_id(question: dict) -> str:
+    """内容から決まる問題ID（同じ問題は出どころが違っても同じID）"""
+    body = {k: question.get(k) for k in ("passage", "dialogue", "sentence", "question", "choices", "correct")}
+    digest = hashlib.sha1(json.dumps(body, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+    return f"qb_{digest[:16]}"
+
+
+def difficulty_key(difficulty: str) -> str:
+    """「標準」などの表示ラベル・easy/medium/hard のどちらでも受け付ける"""
+    if difficulty in DIFFICULTY_ORDER:
+        return difficulty
+    return DIFFICULTY_KEYS.get(difficulty, "medium")
+
+
+class QuestionBank:
+    """(試験, セクション, 問題タイプ, 難易度) で引ける問題バンク
+
+    sample() は重複なしで N 問を選び、既出の問題（exclude）は候補が尽きるまで使わない。
+    """
+
+    def __init__(self):
+        self._items = {}   # question_id -> 問題
+        self._source = {}  # question_id -> "builtin" / "teacher" / "db"
+        self._index = {}   # (test, section, sub_type, difficulty) -> [question_id]
+
+    def add(self, question: dict, test_type: str, section: str, sub_type: str = "general",
+            difficulty: str = "medium", source: str = "builtin") -> str:
+        qid = question.get("bank_id") or question_id(question)
+        if qid not in self._items:
+            self._items[qid] = question
+            self._source[qid] = source
+        if not sub_type or sub_type == "all":
+            sub_type = "general"
+        key = (test_type, section, sub_type, difficulty_key(difficulty))
+        bucket = self._index.setdefault(key, [])
+        if qid not in bucket:
+            bucket.append(qid)
+        return qid
+
+    def merged(self, extra_items) -> "QuestionBank":
+        """教員承認済みの問題などを加えた新しいバンク（元のバンクは変更しない）"""
+        bank = QuestionBank()
+        bank._items = dict(self._items)
+        bank._source = dict(self._source)
+        bank._index = {k: list(v) for k, v in self._index.items()}
+        for item in extra_items:
+            bank.add(item["question"], item["test_type"], item["section"],
+                     item.get("sub_type"), item.get("difficulty", "medium"), item.get("source", "teacher"))
+        return bank
+
+    def __len__(self):
+        return len(self._items)
+
+    def keys(self):
+        return list(self._index)
+
+    def get(self, qid: str) -> dict:
+        return self._items.get(qid)
+
+    def count(self, test_type: str, section: str, sub_type: str = "all", difficulty: str = None) -> int:
+        return sum(len(self._bucket(test_type, section, sub_type, d))
+                   for d in ([difficulty_key(difficulty)] if difficulty else DIFFICULTY_ORDER))
+
+    def ids(self, test_type: str, section: str, sub_type: str = "all", difficulty: str = "medium") -> list:
+        """該当する問題IDの一覧"""
+        return list(self._bucket(test_type, section, sub_type, difficulty_key(difficulty)))
+
+    def _bucket(self, test_type, section, sub_type, difficulty) -> list:
+        if sub_type and sub_type != "all":
+            return self._index.get((test_type, section, sub_type, difficulty), [])
+        ids = []
+        for (t, s, _, d), bucket in self._index.items():
+            if t == test_type and s == section and d == difficulty:
+                ids.extend(bucket)
+        return ids
+
+    def _tiers(self, test_type, section, sub_type, difficulty) -> list:
+        """指定難易度 → 近い難易度の順に候補を並べる（問題タイプが合わなければ全タイプ）"""
+        target = DIFFICULTY_ORDER.index(difficulty_key(difficulty))
+        order = sorted(DIFFICULTY_ORDER, key=lambda d: (abs(DIFFICULTY_ORDER.index(d) - target),
+                                                         DIFFICULTY_ORDER.index(d)))
+        tiers = [self._bucket(test_type, section, sub_type, d) for d in order]
+        if sub_type and sub_type != "all":
+            tiers += [self._bucket(test_type, section, "all", d) for d in order]
+        return tiers
+
+    def sample(self, test_type: str, section: str, n: int, difficulty: str = "medium",
+               sub_type: str = "all", exclude=(), rng: random.Random = None) -> list:
+        """重複なしで最大 n 問を選ぶ（返すのはコピー。各問題に bank_id が付く）
+
+        候補の優先順: 指定難易度 → 近い難易度、同じ段階の中では教員承認済みの問題を先に。
+        未出題の候補が足りないときだけ既出の問題を使う。候補全体が n 問に満たなければ少なく返す。
+        """
+        rng = rng or random
+        exclude = set(exclude or ())
+        chosen, picked = [], set()
+
+        for allow_seen in (False, True):
+            for tier in self._tiers(test_type, section, sub_type, difficulty):
+                pool = [qid for qid in tier if qid not in picked and (allow_seen or qid not in exclude)]
+                rng.shuffle(pool)
+                pool.sort(key=lambda qid: self._source[qid] == "builtin")
+                for qid in pool:
+                    if len(chosen) >= n:
+                        break
+                    picked.add(qid)
+                    chosen.append(qid)
+            if len(chosen) >= n:
+                break
+
+        questions = []
+        for qid in chosen:
+            q = copy.deepcopy(self._items[qid])
+            q["bank_id"] = qid
+            questions.append(q)
+        return questions
+
+
+def _add_leveled(bank, test_type, section, sub_type, by_difficulty):
+    for difficulty, pool in by_difficulty.items():
+        for q in pool:
+            bank.add(q, test_type, section, sub_type, difficulty)
+
+
+def _add_reading_passages(bank, test_type, by_difficulty):
+    """パッセージ単位のデータを1問ずつ（パッセージ付きで）登録する"""
+    for difficulty, passages in by_difficulty.items():
+        for passage_data in passages:
+            for q in passage_data.get("questions", []):
+                item = {**q, "passage": passage_data["passage"]}
+                sub_type = _READING_SKILL_TYPES.get(q.get("skill_focus"), "general")
+                bank.add(item, test_type, "reading", sub_type, difficulty)
+
+
+def _build_builtin_bank() -> QuestionBank:
+    bank = QuestionBank()
+
+    for sub, by_difficulty in TOEFL_ITP_LISTENING.items():
+        _add_leveled(bank, "toefl_itp", "listening", sub, by_difficulty)
+    for sub, by_difficulty in TOEFL_ITP_STRUCTURE.items():
+        _add_leveled(bank, "toefl_itp", "structure", sub, by_difficulty)
+    _add_reading_passages(bank, "toefl_itp", TOEFL_ITP_READING)
+
+    for part, by_difficulty in TOEIC_LISTENING.items():
+        _add_leveled(bank, "toeic", "listening", part.replace("part", ""), by_difficulty)
+    for part, by_difficulty in TOEIC_READING.items():
+        for difficulty, pool in by_difficulty.items():
+            for q in pool:
+                if "sentence" in q and "question" not in q:
+                    q = {**q, "question": "Choose the best word or phrase to complete the sentence."}
+                bank.add(q, "toeic", "reading", part.replace("part", ""), difficulty)
+
+    for sub, by_difficulty in TOEFL_IBT_LISTENING.items():
+        _add_leveled(bank, "toefl_ibt", "listening", sub, by_difficulty)
+    _add_reading_passages(bank, "toefl_ibt", TOEFL_ITP_READING)  # 共有
+
+    for grade, sections in EIKEN_QUESTIONS.items():
+        for section, pool in sections.items():
+            for q in pool:
+                bank.add(q, "eiken", section, grade, _EIKEN_GRADE_DIFFICULTY.get(grade, "medium"))
+
+    for sub, by_difficulty in IELTS_LISTENING.items():
+        _add_leveled(bank, "ielts", "listening", sub, by_difficulty)
+
+    return bank
+
+
+_builtin_bank = None
+
+
+def get_builtin_bank() -> QuestionBank:
+    """組み込み問題のバンク（初回に1回だけ構築）"""
+    global _builtin_bank
+    if _builtin_bank is None:
+        _builtin_bank = _build_builtin_bank()
+    return _builtin_bank
+
+
+def approved_items_from_session(question_bank: dict) -> list:
+    """st.session_state.question_bank（{"toefl_itp_listening": [...]}）の承認済み問題"""
+    items = []
+    for bank_key, questions in (question_bank or {}).items():
+        test_type, _, section = bank_key.rpartition("_")
+        for q in questions:
+            if q.get("status") != "approved":
+                continue
+            items.append({
+                "question": q,
+                "test_type": test_type,
+                "section": section,
+                "sub_type": q.get("q_type") or "general",
+                "difficulty": difficulty_key(q.get("difficulty", "medium")),
+                "source": "teacher",
+            })
+    return items
+
+
+def get_question_bank(session_bank: dict = None, course_id: str = None) -> QuestionBank:
+    """組み込み問題 + DBの承認済み問題 + セッション内の承認済み問題"""
+    extra = approved_items_from_session(session_bank)
+    try:
+        from utils.database import get_approved_test_questions
+        for row in get_approved_test_questions(course_id):
+            extra.append({
+                "question": {**row["payload"], "bank_id": row["item_id"]},
+                "test_type": row["test_type"],
+                "section": row["section"],
+                "sub_type": row.get("sub_type") or "general",
+                "difficulty": row.get("difficulty") or "medium",
+                "source": "db",
+            })
+    except Exception:
+        pass
+    bank = get_builtin_bank()
+    return bank.merged(extra) if extra else bank
+
+
 # ====================================================================
 # ユーティリティ
 # ====================================================================
 
 def get_test_questions(test_type, section, difficulty, q_type="all"):
-    """テスト種別・セクション・難易度に応じた問題を返す"""
-    
-    # 難易度マッピング
-    diff_map = {
-        "易しい": "easy", "やや易しい": "easy",
-        "標準": "medium",
-        "やや難しい": "hard", "難しい": "hard",
-    }
-    diff_key = diff_map.get(difficulty, "medium")
-    
-    if test_type == "toefl_itp":
-        return _get_toefl_itp_question(section, diff_key, q_type)
-    elif test_type == "toeic":
-        return _get_toeic_question(section, diff_key, q_type)
-    elif test_type == "toefl_ibt":
-        return _get_toefl_ibt_question(section, diff_key, q_type)
-    elif test_type == "eiken":
-        return _get_eiken_question(section, diff_key, q_type)
-    elif test_type == "ielts":
-        return _get_ielts_question(section, diff_key, q_type)
-    
-    return _fallback_question()
-
-
-def _get_toefl_itp_question(section, difficulty, q_type):
-    if section == "listening":
-        sub = q_type if q_type in ["short_conversation", "lecture"] else random.choice(["short_conversation", "lecture"])
-        bank = TOEFL_ITP_LISTENING.get(sub, {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            return random.choice(pool)
-    
-    elif section == "structure":
-        sub = q_type if q_type in ["sentence_completion", "error_identification"] else random.choice(["sentence_completion", "error_identification"])
-        bank = TOEFL_ITP_STRUCTURE.get(sub, {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            return random.choice(pool)
-    
-    elif section == "reading":
-        bank = TOEFL_ITP_READING
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            passage_data = random.choice(pool)
-            if passage_data.get("questions"):
-                q = random.choice(passage_data["questions"])
-                q["passage"] = passage_data["passage"]
-                return q
-    
-    return _fallback_question()
-
-
-def _get_toeic_question(section, difficulty, q_type):
-    if section == "listening":
-        sub = f"part{q_type}" if q_type in ["1", "2", "3", "4"] else random.choice(["part2", "part3", "part4"])
-        bank = TOEIC_LISTENING.get(sub, {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            return random.choice(pool)
-    
-    elif section == "reading":
-        bank = TOEIC_READING.get("part5", {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            q = random.choice(pool)
-            if "sentence" in q and "question" not in q:
-                q["question"] = "Choose the best word or phrase to complete the sentence."
-            return q
-    
-    return _fallback_question()
-
-
-def _get_toefl_ibt_question(section, difficulty, q_type):
-    if section == "listening":
-        sub = random.choice(["conversation", "lecture"])
-        bank = TOEFL_IBT_LISTENING.get(sub, {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            return random.choice(pool)
-    
-    elif section == "reading":
-        bank = TOEFL_ITP_READING  # 共有
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            passage_data = random.choice(pool)
-            if passage_data.get("questions"):
-                q = random.choice(passage_data["questions"])
-                q["passage"] = passage_data["passage"]
-                return q
-    
-    return _fallback_question()
-
-
-def _get_eiken_question(section, difficulty, q_type):
-    grade = "pre1" if difficulty == "hard" else "grade2"
-    bank = EIKEN_QUESTIONS.get(grade, {})
-    
-    if section in ["reading", "listening"]:
-        pool = bank.get(section, [])
-        if pool:
-            return random.choice(pool)
-    
-    return _fallback_question()
-
-
-def _get_ielts_question(section, difficulty, q_type):
-    if section == "listening":
-        sub = "section3" if difficulty == "hard" else "section1"
-        bank = IELTS_LISTENING.get(sub, {})
-        pool = bank.get(difficulty, bank.get("medium", []))
-        if pool:
-            return random.choice(pool)
-    
-    return _fallback_question()
+    """テスト種別・セクション・難易度に応じた問題を1問返す"""
+    found = get_builtin_bank().sample(test_type, section, 1, difficulty, q_type or "all")
+    return found[0] if found else _fallback_question()
 
 
 def _fallback_question():
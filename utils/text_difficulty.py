@@ -0,0 +1,481 @@
+"""
+Text Difficulty
+===============
+英文の難易度をローカルで判定する（GPT を使わない）。
+
+- 語彙プロファイル: utils/data/cefr_wordlist.txt の見出し語を活用形・派生形まで展開した
+  参照表（初回に1回だけ構築）で各語を A1〜B2 / リスト外（C1+）に分類。
+  表にない大文字始まりの語（固有名詞）と数字はプロファイルから外す
+- 文の長さ: 平均・標準偏差・90パーセンタイル（句読点のない自動字幕では使わない）
+- 読みやすさ: Flesch Reading Ease / Flesch-Kincaid Grade
+- 推定 CEFR = 語彙（リスト内の語で目標カバー率に達するレベル + リスト外の語の割合に応じた加算）・
+  文の長さ・FK Grade の加重平均。語がない（空の）テキストは推定しない（estimated_cefr=None）
+
+1時間分の字幕（約9千語）で十数ミリ秒なので、生成した記事の事前チェックにも使える。
+
+使い方:
+    from utils.text_difficulty import analyze_text, analyze_difficulty, check_level
+    profile = analyze_text(text)
+    result = analyze_difficulty(transcript, level="B1", duration_sec=3600)
+    check = check_level(article_text, "B1")
+"""
+
+import os
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from utils.level_adapter import CEFR_LEVELS
+
+
+BANDS = ["A1", "A2", "B1", "B2"]
+OFF_LIST = "C1+"
+LEVELS = ["A1", "A2", "B1", "B2", "C1", "C2"]
+
+WORDLIST_PATH = os.path.join(os.path.dirname(__file__), "data", "cefr_wordlist.txt")
+
+# 語彙レベル = このカバー率に達するレベル（読解に必要な既知語率の目安。
+# リストが A1〜B2 の約3,300語なので、一般的な目安の 95% より少し下げている）
+COVERAGE_TARGET = 0.92
+# リスト外の語: 割合 1% ごとに語彙レベルを OFF_LIST_SLOPE / 100 上げる。
+# 割合は OFF_LIST_PRIOR_WORDS 語を足した分母で数え、短い文の1語だけで大きく動かないようにする
+OFF_LIST_SLOPE = 10.0
+OFF_LIST_PRIOR_WORDS = 20
+# 推定 CEFR の重み（語彙, 文の長さ, FK Grade）
+ESTIMATE_WEIGHTS = (0.6, 0.2, 0.2)
+# 1文がこれより長ければ句読点のない字幕とみなし、文の指標は使わない
+MAX_PLAUSIBLE_SENTENCE = 60
+# 発話速度（WPM）の区分
+SPEECH_SPEED_WPM = {"slow": 120, "moderate": 170}
+
+# FK Grade → レベル（0=A1 … 5=C2）の対応点
+_FK_POINTS = ([3, 5, 8, 11, 14, 17], [0, 1, 2, 3, 4, 5])
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+(?:['’][A-Za-z]+)*")
+# 数字を含む語（1990s, 3rd, COVID-19 の 19 など）は語数に数えるが語彙プロファイルには入れない
+_WORD_RE = re.compile(r"[A-Za-z0-9]+(?:['’][A-Za-z]+)*")
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*(?:\s+|$)")
+# ピリオドの後でも文を切らない略語（ピリオドを除いた小文字）。1文字（イニシャル）も切らない
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr", "vs", "eg", "ie", "cf", "no", "fig"}
+_VOWEL_GROUP_RE = re.compile(r"[aeiouy]+")
+_VOWELS = set("aeiou")
+
+
+# ====================================================================
+# 参照表
+# ====================================================================
+
+def _cvc(w: str) -> bool:
+    """stop → stopped のように末尾の子音を重ねる形か"""
+    return (len(w) >= 3 and w[-1] not in _VOWELS and w[-1] not in "wxy"
+            and w[-2] in _VOWELS and w[-3] not in _VOWELS)
+
+
+def _inflections(w: str) -> List[str]:
+    forms = [w + "s"]
+    if w.endswith(("s", "x", "z", "ch", "sh", "o")):
+        forms.append(w + "es")
+    if w.endswith("y") and len(w) > 1 and w[-2] not in _VOWELS:
+        stem = w[:-1]
+        forms += [stem + "ies", stem + "ied", stem + "ier", stem + "iest", w + "ing"]
+    elif w.endswith("e"):
+        forms += [w + "d", w + "r", w + "st"]
+        forms.append(w[:-2] + "ying" if w.endswith("ie") else (w + "ing" if w.endswith("ee") else w[:-1] + "ing"))
+    else:
+        forms += [w + "ed", w + "ing", w + "er", w + "est"]
+        if _cvc(w):
+            forms += [w + w[-1] + suffix for suffix in ("ed", "ing", "er", "est")]
+    return forms
+
+
+def _derivations(w: str) -> List[str]:
+    forms = ["un" + w, "re" + w, w + "ment", w + "ful", w + "less", w + "ness", w + "ist"]
+    if w.endswith("y") and len(w) > 1 and w[-2] not in _VOWELS:
+        stem = w[:-1]
+        forms += [stem + "ily", stem + "iness", stem + "iful"]
+    elif w.endswith("le"):
+        forms.append(w[:-1] + "y")
+    elif w.endswith("ic"):
+        forms.append(w + "ally")
+    else:
+        forms.append(w + "ly")
+    if w.endswith("e"):
+        forms += [w[:-1] + "able", w[:-1] + "al", w[:-1] + "or"]
+    else:
+        forms += [w + "able", w + "al", w + "ally", w + "or"]
+    if w.endswith(("ate", "ize", "ise")):
+        forms.append(w[:-1] + "ion" if w.endswith("ate") else w[:-1] + "ation")
+    elif w.endswith(("ct", "pt", "ss")):
+        forms.append(w + "ion")
+    return forms
+
+
+def _read_wordlist(path: str):
+    bands, irregular = {}, {}
+    band = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("# ") and len(line.split()) == 2:
+                band = line[2:]
+                continue
+            if not line or line.startswith("#"):
+                continue
+            for token in line.split():
+                if band == "irregular":
+                    form, _, lemma = token.partition("=")
+                    irregular.setdefault(form, lemma)
+                elif band in BANDS:
+                    bands.setdefault(token, BANDS.index(band))
+    return bands, irregular
+
+
+_TABLE: Optional[Dict[str, int]] = None
+
+
+def get_lookup_table() -> Dict[str, int]:
+    """語形 → レベル番号（0=A1 … 3=B2）の参照表（初回に構築）
+
+    優先順: 見出し語 → 不規則変化 → 規則活用 → 派生語（1レベル上）→ 派生語の活用。
+    同じ語形が複数から作られる場合は先に登録したものを使う。
+    派生語の活用は un-/re- 付きの語だけ全形、接尾辞付きの語は複数形だけ展開する。
+    """
+    global _TABLE
+    if _TABLE is not None:
+        return _TABLE
+
+    lemmas, irregular = _read_wordlist(WORDLIST_PATH)
+    table = dict(lemmas)
+    for form, lemma in irregular.items():
+        if lemma in lemmas:
+            table.setdefault(form, lemmas[lemma])
+    ordered = sorted(lemmas.items(), key=lambda kv: kv[1])
+    for w, band in ordered:
+        for form in _inflections(w):
+            table.setdefault(form, band)
+    derived = {}
+    for w, band in ordered:
+        for form in _derivations(w):
+            if form not in table:
+                derived.setdefault(form, min(band + 1, len(BANDS) - 1))
+    table.update(derived)
+    for form, band in sorted(derived.items(), key=lambda kv: kv[1]):
+        for inflected in (_inflections(form) if form.startswith(("un", "re")) else [form + "s"]):
+            table.setdefault(inflected, band)
+    _TABLE = table
+    return table
+
+
+# ====================================================================
+# 分析
+# ====================================================================
+
+def _fallback_band(table: Dict[str, int], word: str) -> Optional[int]:
+    """参照表にない語: 所有格・縮約を外す / -ly を外して1レベル上（increasingly など）"""
+    if "'" in word:
+        return table.get(word.split("'", 1)[0])
+    if word.endswith("ly") and len(word) > 5:
+        band = table.get(word[:-2])
+        if band is None and word.endswith("ily"):
+            band = table.get(word[:-3] + "y")
+        if band is not None:
+            return min(band + 1, len(BANDS) - 1)
+    return None
+
+
+def word_band(word: str) -> int:
+    """語（句）のレベル番号（0=A1 … 3=B2, リスト外は len(BANDS)）。句は最も高いレベル"""
+    table = get_lookup_table()
+    bands = []
+    for m in _TOKEN_RE.finditer(word or ""):
+        lower = m.group().replace("’", "'").lower()
+        band = table.get(lower)
+        if band is None:
+            band = _fallback_band(table, lower)
+        bands.append(len(BANDS) if band is None else band)
+    return max(bands) if bands else len(BANDS)
+
+
+def _sentence_bounds(text: str) -> List[int]:
+    """文末の位置（略語・イニシャル・小文字が続くピリオドでは切らない）"""
+    bounds = []
+    for m in _SENTENCE_END_RE.finditer(text):
+        end = m.end()
+        if m.group().rstrip() == ".":
+            if end < len(text) and text[end].islower():
+                continue
+            before = text[max(0, m.start() - 12):m.start()].split()
+            prev = before[-1].lstrip("(\"'").replace(".", "").lower() if before else ""
+            if len(prev) == 1 or prev in _ABBREVIATIONS:
+                continue
+        bounds.append(end)
+    if not bounds or bounds[-1] < len(text):
+        bounds.append(len(text))
+    return bounds
+
+
+def _syllables(word: str) -> int:
+    w = word.lower()
+    count = len(_VOWEL_GROUP_RE.findall(w))
+    if w.endswith("e") and not w.endswith(("le", "ee", "ye")) and count > 1:
+        count -= 1
+    return max(1, count)
+
+
+def _percentile(sorted_values: List[int], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return float(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))])
+
+
+def _interp(x: float, xs: List[float], ys: List[float]) -> float:
+    if x <= xs[0]:
+        return ys[0]
+    if x >= xs[-1]:
+        return ys[-1]
+    i = bisect_left(xs, x)
+    x0, x1, y0, y1 = xs[i - 1], xs[i], ys[i - 1], ys[i]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def _sentence_points():
+    """CEFR_LEVELS の文の長さ（中央値）→ レベル番号"""
+    xs, ys = [], []
+    for i, level in enumerate(LEVELS):
+        lo_hi = CEFR_LEVELS.get(level, {}).get("sentence_words")
+        if lo_hi:
+            xs.append(sum(lo_hi) / 2)
+            ys.append(i)
+    return xs, ys
+
+
+def analyze_text(text: str, duration_sec: float = None) -> Dict:
+    """語彙プロファイル・文の長さ・読みやすさ指標を計算"""
+    table = get_lookup_table()
+    text = text or ""
+
+    band_counts = [0] * (len(BANDS) + 1)
+    off_list: Dict[str, int] = {}
+    proper_nouns = 0
+    words = 0
+    syllables = 0
+    syllable_cache: Dict[str, int] = {}
+    sentence_lengths: List[int] = []
+
+    pos = 0
+    for end in _sentence_bounds(text):
+        chunk = text[pos:end]
+        pos = end
+        n_in_sentence = 0
+        for m in _WORD_RE.finditer(chunk):
+            raw = m.group().replace("’", "'")
+            n_in_sentence += 1
+            if not raw.replace("'", "").isalpha():
+                syllables += 1
+                continue
+            lower = raw.lower()
+            band = table.get(lower)
+            if band is None:
+                band = _fallback_band(table, lower)
+            if band is None:
+                # 表にない大文字始まりの語・略語は（文頭でも）固有名詞として語彙プロファイルから外す
+                if raw[0].isupper():
+                    proper_nouns += 1
+                elif len(raw) == 1:
+                    pass  # e.g. / p.m. などの略語の1文字
+                else:
+                    band_counts[len(BANDS)] += 1
+                    off_list[lower] = off_list.get(lower, 0) + 1
+            else:
+                band_counts[band] += 1
+            s = syllable_cache.get(lower)
+            if s is None:
+                s = syllable_cache[lower] = _syllables(lower)
+            syllables += s
+        if n_in_sentence:
+            sentence_lengths.append(n_in_sentence)
+            words += n_in_sentence
+
+    profiled = sum(band_counts)
+    shares = {name: (band_counts[i] / profiled if profiled else 0.0)
+              for i, name in enumerate(BANDS + [OFF_LIST])}
+
+    sentence_lengths.sort()
+    n_sentences = len(sentence_lengths)
+    mean_len = words / n_sentences if n_sentences else 0.0
+    var_len = (sum((x - mean_len) ** 2 for x in sentence_lengths) / n_sentences) if n_sentences else 0.0
+    punctuated = bool(n_sentences) and mean_len <= MAX_PLAUSIBLE_SENTENCE
+
+    readability = None
+    if punctuated and words:
+        spw = syllables / words
+        readability = {
+            "flesch_reading_ease": round(206.835 - 1.015 * mean_len - 84.6 * spw, 1),
+            "flesch_kincaid_grade": round(0.39 * mean_len + 11.8 * spw - 15.59, 1),
+        }
+
+    profile = {
+        "words": words,
+        "sentences": n_sentences,
+        "punctuated": punctuated,
+        "proper_nouns": proper_nouns,
+        "profiled_words": profiled,
+        "lexical_profile": {k: round(v, 4) for k, v in shares.items()},
+        "off_list_words": [w for w, _ in sorted(off_list.items(), key=lambda kv: -kv[1])[:20]],
+        "sentence_length": {
+            "mean": round(mean_len, 1),
+            "sd": round(var_len ** 0.5, 1),
+            "p90": _percentile(sentence_lengths, 0.9),
+        } if punctuated else None,
+        "readability": readability,
+        "avg_syllables": round(syllables / words, 2) if words else 0.0,
+    }
+    if duration_sec:
+        profile["wpm"] = round(words / duration_sec * 60)
+    profile.update(estimate_cefr(profile))
+    return profile
+
+
+def estimate_cefr(profile: Dict) -> Dict:
+    """プロファイル → 推定 CEFR（とレベル番号の内訳）。推定できない（空の）テキストは None"""
+    components = {}
+    w_lex, w_sent, w_fk = ESTIMATE_WEIGHTS
+    total, weight = 0.0, 0.0
+
+    profiled = profile.get("profiled_words", 0)
+    if profiled:
+        shares = profile["lexical_profile"]
+        known = 1.0 - shares[OFF_LIST]
+        lexical = float(len(BANDS))
+        cumulative = 0.0
+        for i, band in enumerate(BANDS):
+            share = shares[band] / known if known else 0.0
+            previous = cumulative
+            cumulative += share
+            if cumulative >= COVERAGE_TARGET and share > 0:
+                # リスト内の語で目標カバー率に達した位置をレベルの境界間で線形補間（0=A1 … 3=B2）
+                lexical = max(0.0, i - 1 + (COVERAGE_TARGET - previous) / share)
+                break
+        # リスト外の語は割合に応じて加算（語彙だけでは C2 と判定しない）
+        off_share = shares[OFF_LIST] * profiled / (profiled + OFF_LIST_PRIOR_WORDS)
+        lexical = min(len(BANDS) + 0.5, lexical + off_share * OFF_LIST_SLOPE)
+        components["lexical"] = round(lexical, 2)
+        total, weight = lexical * w_lex, w_lex
+    if profile.get("sentence_length"):
+        xs, ys = _sentence_points()
+        sentence = _interp(profile["sentence_length"]["mean"], xs, ys)
+        components["sentence"] = round(sentence, 2)
+        total, weight = total + sentence * w_sent, weight + w_sent
+    if profile.get("readability"):
+        fk = _interp(profile["readability"]["flesch_kincaid_grade"], *_FK_POINTS)
+        components["readability"] = round(fk, 2)
+        total, weight = total + fk * w_fk, weight + w_fk
+
+    if not weight:
+        return {"estimated_cefr": None, "level_index": None, "level_components": components}
+    index = total / weight
+    return {
+        "estimated_cefr": LEVELS[min(len(LEVELS) - 1, max(0, int(round(index))))],
+        "level_index": round(index, 2),
+        "level_components": components,
+    }
+
+
+# ====================================================================
+# 既存 API 向けの結果形式
+# ====================================================================
+
+def _level_index(level: str) -> int:
+    return LEVELS.index(level) if level in LEVELS else LEVELS.index("B1")
+
+
+def analyze_difficulty(text: str, level: str = "B1", duration_sec: float = None) -> Dict:
+    """analyze_video_difficulty と同じ形式の難易度分析（estimated_cefr, difficulty_factors, ...）"""
+    profile = analyze_text(text, duration_sec)
+    if profile["level_index"] is None:
+        return {"success": False, "error": "テキストが空です"}
+
+    shares = profile["lexical_profile"]
+    advanced = shares["B2"] + shares[OFF_LIST]
+    if advanced >= 0.12:
+        vocabulary_level = "advanced"
+    elif shares["A1"] + shares["A2"] >= 0.9:
+        vocabulary_level = "basic"
+    else:
+        vocabulary_level = "intermediate"
+
+    factors = {
+        "vocabulary_level": vocabulary_level,
+        "technical_terms": shares[OFF_LIST] >= 0.05,
+    }
+    wpm = profile.get("wpm")
+    if wpm:
+        if wpm < SPEECH_SPEED_WPM["slow"]:
+            factors["speech_speed"] = "slow"
+        elif wpm <= SPEECH_SPEED_WPM["moderate"]:
+            factors["speech_speed"] = "moderate"
+        else:
+            factors["speech_speed"] = "fast"
+
+    gap = profile["level_index"] - _level_index(level)
+    suitability = max(1, min(10, int(round(10 - 3 * max(0.0, abs(gap) - 0.5)))))
+
+    if gap > 1:
+        advice = "学習者のレベルより難しめです。字幕やスクリプトを見ながら、区切って視聴しましょう。"
+    elif gap > 0.5:
+        advice = "少し難しめ（i+1）です。知らない語を確認してから視聴すると効果的です。"
+    elif gap < -1:
+        advice = "易しめの内容です。字幕なしでの聞き取りやシャドーイングに挑戦しましょう。"
+    else:
+        advice = "レベルに合った内容です。内容理解とディクテーションに取り組みましょう。"
+    if profile["off_list_words"]:
+        advice += f" 要チェックの語: {', '.join(profile['off_list_words'][:5])}"
+
+    return {
+        "success": True,
+        "estimated_cefr": profile["estimated_cefr"],
+        "difficulty_factors": factors,
+        "suitability_score": suitability,
+        "recommendations": advice,
+        "profile": {k: profile[k] for k in ("words", "sentences", "lexical_profile", "sentence_length",
+                                            "readability", "level_index", "level_components")
+                    if k in profile},
+        "method": "local",
+    }
+
+
+def check_level(text: str, level: str, word_count: int = None) -> Dict:
+    """生成した教材が目標レベルに合っているかの事前チェック
+
+    Returns: {"ok": bool, "estimated_cefr", "issues": [...], "profile": {...}}
+    """
+    profile = analyze_text(text)
+    target = CEFR_LEVELS.get(level, {})
+    if profile["level_index"] is None:
+        return {"ok": False, "estimated_cefr": None, "issues": ["本文が空です"], "profile": profile}
+    issues = []
+
+    gap = profile["level_index"] - _level_index(level)
+    if gap > 1:
+        issues.append(f"推定レベル {profile['estimated_cefr']} が目標 {level} より高い")
+    elif gap < -1:
+        issues.append(f"推定レベル {profile['estimated_cefr']} が目標 {level} より低い")
+
+    sentence_words = target.get("sentence_words")
+    if sentence_words and profile.get("sentence_length"):
+        mean = profile["sentence_length"]["mean"]
+        lo, hi = sentence_words
+        if mean > hi * 1.3:
+            issues.append(f"1文が長すぎる（平均 {mean}語, 目安 {lo}-{hi}語）")
+        elif mean < lo * 0.6:
+            issues.append(f"1文が短すぎる（平均 {mean}語, 目安 {lo}-{hi}語）")
+
+    if word_count and profile["words"] and not (0.6 * word_count <= profile["words"] <= 1.5 * word_count):
+        issues.append(f"語数 {profile['words']} が指定 {word_count} から大きく外れている")
+
+    return {
+        "ok": not issues,
+        "estimated_cefr": profile["estimated_cefr"],
+        "issues": issues,
+        "profile": profile,
+    }
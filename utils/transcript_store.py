@@ -0,0 +1,334 @@
+"""
+Transcript Store
+================
+YouTube字幕の永続キャッシュとセグメント索引。
+
+- 字幕は video_id + 取得方法（en / any_en / translated）ごとに youtube_transcripts に保存し、
+  2回目以降はネットワークに出ない
+- セグメントは列指向（開始ms・長さms・全文中の文字オフセット）で保持し、
+  時間範囲・文字位置からの切り出しを二分探索で行う
+- 難易度分析・練習問題の生成結果も同じ行に保存し、分析済み動画はAPIを呼ばない
+
+使い方:
+    from utils.transcript_store import get_transcript, get_transcript_index
+    result = get_transcript(video_id, fetch=_fetch_youtube_transcript)
+    clip = get_transcript_index(video_id).clip(30.0, 45.0)
+"""
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+# 同じ動画に複数の取得方法がある場合の優先順位
+METHOD_PRIORITY = ("en", "any_en", "translated")
+MAX_INDEXES_IN_MEMORY = 64
+
+
+# ============================================================
+# セグメント索引
+# ============================================================
+
+def _caption_field(item, name, default=None):
+    """youtube_transcript_api の dict / スニペットオブジェクト両対応"""
+    if isinstance(item, dict):
+        return item.get(name, default)
+    return getattr(item, name, default)
+
+
+class TranscriptIndex:
+    """列指向のセグメント索引
+
+    start_ms / duration_ms / offset は同じ長さの配列で、i番目のセグメントの本文は
+    text[offset[i]:offset[i+1]-1]（最後は末尾まで）。
+    """
+
+    def __init__(self, text: str, start_ms, duration_ms, offset):
+        self.text = text
+        self.start_ms = array('l', start_ms)
+        self.duration_ms = array('l', duration_ms)
+        self.offset = array('l', offset)
+        # 時間範囲の検索用（セグメント終了時刻は単調とは限らないので累積最大値を持つ）
+        running = 0
+        ends = []
+        for s, d in zip(self.start_ms, self.duration_ms):
+            running = max(running, s + d)
+            ends.append(running)
+        self._end_ms = array('l', ends)
+
+    @classmethod
+    def from_captions(cls, captions) -> "TranscriptIndex":
+        starts, durations, offsets, parts = [], [], [], []
+        pos = 0
+        for item in captions:
+            text = (_caption_field(item, 'text', '') or '').replace('\n', ' ').strip()
+            starts.append(int(round(float(_caption_field(item, 'start', 0) or 0) * 1000)))
+            durations.append(int(round(float(_caption_field(item, 'duration', 0) or 0) * 1000)))
+            offsets.append(pos)
+            parts.append(text)
+            pos += len(text) + 1
+        return cls(' '.join(parts), starts, durations, offsets)
+
+    @classmethod
+    def from_columns(cls, text: str, columns: Dict) -> "TranscriptIndex":
+        return cls(text, columns.get('start_ms', []), columns.get('duration_ms', []),
+                   columns.get('offset', []))
+
+    def to_columns(self) -> Dict:
+        return {
+            'start_ms': self.start_ms.tolist(),
+            'duration_ms': self.duration_ms.tolist(),
+            'offset': self.offset.tolist(),
+        }
+
+    def __len__(self):
+        return len(self.start_ms)
+
+    @property
+    def duration_sec(self) -> float:
+        """最後のセグメント終了までの秒数"""
+        return self._end_ms[-1] / 1000 if len(self._end_ms) else 0.0
+
+    def _segment_text(self, i: int) -> str:
+        end = self.offset[i + 1] - 1 if i + 1 < len(self.offset) else len(self.text)
+        return self.text[self.offset[i]:end]
+
+    def segment(self, i: int) -> Dict:
+        return {
+            'text': self._segment_text(i),
+            'start': self.start_ms[i] / 1000,
+            'duration': self.duration_ms[i] / 1000,
+        }
+
+    def segments(self) -> List[Dict]:
+        """従来形式のセグメント一覧（text, start, duration）"""
+        return [self.segment(i) for i in range(len(self))]
+
+    def segment_at(self, seconds: float) -> Optional[int]:
+        """指定時刻に再生中のセグメント番号"""
+        i = bisect_right(self.start_ms, int(seconds * 1000)) - 1
+        return i if i >= 0 else None
+
+    def segment_at_char(self, char_pos: int) -> Optional[int]:
+        """全文中の文字位置を含むセグメント番号"""
+        i = bisect_right(self.offset, char_pos) - 1
+        return i if i >= 0 else None
+
+    def clip(self, start_sec: float, end_sec: float) -> Dict:
+        """時間範囲 [start_sec, end_sec) に重なるセグメントを切り出す
+
+        Returns:
+            {"text", "start", "end", "first", "last"}（該当なしなら text は空）
+        """
+        lo = bisect_right(self._end_ms, int(start_sec * 1000))
+        hi = bisect_left(self.start_ms, int(end_sec * 1000))
+        if lo >= hi:
+            return {'text': '', 'start': start_sec, 'end': end_sec, 'first': None, 'last': None}
+        end_char = self.offset[hi] - 1 if hi < len(self.offset) else len(self.text)
+        return {
+            'text': self.text[self.offset[lo]:end_char],
+            'start': self.start_ms[lo] / 1000,
+            'end': (self.start_ms[hi - 1] + self.duration_ms[hi - 1]) / 1000,
+            'first': lo,
+            'last': hi - 1,
+        }
+
+    def locate(self, phrase: str) -> Optional[Dict]:
+        """全文中のフレーズ位置から再生時間を求める（ディクテーション用）"""
+        pos = self.text.lower().find(phrase.strip().lower())
+        if pos < 0 or not len(self):
+            return None
+        first = self.segment_at_char(pos)
+        last = self.segment_at_char(pos + len(phrase.strip()) - 1)
+        return {
+            'start': self.start_ms[first] / 1000,
+            'end': (self.start_ms[last] + self.duration_ms[last]) / 1000,
+        }
+
+
+# ============================================================
+# プロセス内キャッシュ
+# ============================================================
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[str, TranscriptIndex]" = OrderedDict()
+_records: Dict[str, Dict] = {}
+
+
+def _remember(video_id: str, record: Dict, index: TranscriptIndex):
+    with _lock:
+        _indexes[video_id] = index
+        _indexes.move_to_end(video_id)
+        _records[video_id] = record
+        while len(_indexes) > MAX_INDEXES_IN_MEMORY:
+            old, _ = _indexes.popitem(last=False)
+            _records.pop(old, None)
+
+
+def _best_record(rows: List[Dict]) -> Optional[Dict]:
+    if not rows:
+        return None
+    rank = {m: i for i, m in enumerate(METHOD_PRIORITY)}
+    return min(rows, key=lambda r: rank.get(r.get('method'), len(rank)))
+
+
+def _load(video_id: str):
+    """(record, index) を返す。保存されていなければ (None, None)"""
+    with _lock:
+        if video_id in _records:
+            _indexes.move_to_end(video_id)
+            return _records[video_id], _indexes[video_id]
+    try:
+        from utils.database import get_youtube_transcript_record
+        record = _best_record(get_youtube_transcript_record(video_id))
+    except Exception:
+        record = None
+    if not record:
+        return None, None
+    index = TranscriptIndex.from_columns(record.get('transcript', ''), record.get('segments') or {})
+    _remember(video_id, record, index)
+    return record, index
+
+
+def _result_from_record(record: Dict, index: TranscriptIndex, cached: bool) -> Dict:
+    return {
+        "success": True,
+        "transcript": record.get('transcript', ''),
+        "segments": index.segments(),
+        "method": record.get('method', ''),
+        "language": record.get('language', ''),
+        "cached": cached,
+    }
+
+
+# ============================================================
+# 公開API
+# ============================================================
+
+def get_transcript(video_id: str, fetch: Callable[[str], Dict], use_cache: bool = True) -> Dict:
+    """字幕を取得する。保存済みならネットワークに出ない
+
+    Args:
+        fetch: 未保存時に呼ぶ取得関数。{"success", "segments", "method", "language"?} を返す
+    """
+    if use_cache:
+        record, index = _load(video_id)
+        if record:
+            return _result_from_record(record, index, cached=True)
+
+    fetched = fetch(video_id)
+    if not fetched.get("success"):
+        return fetched
+
+    index = TranscriptIndex.from_captions(fetched.get("segments") or [])
+    record = {
+        'video_id': video_id,
+        'method': fetched.get("method", "en"),
+        'language': fetched.get("language", ""),
+        'transcript': index.text,
+        'segments': index.to_columns(),
+        'analyses': {},
+    }
+    try:
+        from utils.database import save_youtube_transcript_record
+        save_youtube_transcript_record(video_id, record['method'], record['language'],
+                                       record['transcript'], record['segments'])
+    except Exception:
+        pass
+    _remember(video_id, record, index)
+    return _result_from_record(record, index, cached=False)
+
+
+def get_transcript_index(video_id: str) -> Optional[TranscriptIndex]:
+    """保存済み字幕のセグメント索引（未取得ならNone）"""
+    return _load(video_id)[1]
+
+
+def get_cached_analysis(video_id: str, analysis_key: str,
+                        compute: Callable[[], Dict]) -> Dict:
+    """字幕に紐づく分析結果を取得。未保存なら compute() を呼んで保存する
+
+    analysis_key 例: "exercises:B1"
+    """
+    record, _ = _load(video_id)
+    if record:
+        saved = (record.get('analyses') or {}).get(analysis_key)
+        if saved:
+            return {**saved, "success": True, "cached": True}
+
+    result = compute()
+    if record and result.get("success"):
+        payload = {k: v for k, v in result.items() if k not in ("success", "cached")}
+        with _lock:
+            record.setdefault('analyses', {})[analysis_key] = payload
+        try:
+            from utils.database import save_youtube_transcript_analysis
+            save_youtube_transcript_analysis(video_id, record['method'], analysis_key, payload)
+        except Exception:
+            pass
+    return result
+
+
+def annotate_dictation_segments(video_id: str, segments: List[Dict]) -> List[Dict]:
+    """生成されたディクテーション文に動画内の再生位置（start/end秒）を付与したコピーを返す
+
+    segments は保存済みの分析結果と共有されていることがあるので、書き換えない。
+    """
+    index = get_transcript_index(video_id)
+    if index is None:
+        return segments
+    annotated = []
+    for seg in segments:
+        pos = None if 'start' in seg else index.locate(seg.get('text', ''))
+        annotated.append({**seg, **pos} if pos else seg)
+    return annotated
+
+
+def warm_curated_transcripts(video_list: Dict = None, levels: List[str] = None,
+                             analyze: bool = True, max_workers: int = 4,
+                             progress: Optional[Callable[[str], None]] = print) -> Dict:
+    """CURATED_VIDEO_LIST の字幕（と分析結果）を事前に取得・保存する
+
+    Returns:
+        {"videos", "fetched", "cached", "failed"}
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from utils.listening_youtube import (
+        CURATED_VIDEO_LIST, get_youtube_transcript, generate_exercises_from_transcript,
+    )
+
+    log = progress or (lambda msg: None)
+    videos = [v for cat in (video_list or CURATED_VIDEO_LIST).values() for v in cat.get('videos', [])]
+    report = {"videos": len(videos), "fetched": 0, "cached": 0, "failed": 0}
+
+    def _warm(video):
+        result = get_youtube_transcript(video['id'])
+        if not result.get("success"):
+            return video, result
+        if analyze:
+            for level in levels or [video.get('level', 'B1')]:
+                generate_exercises_from_transcript(result['transcript'], video.get('title', ''),
+                                                   level, video_id=video['id'])
+        return video, result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(_warm, v) for v in videos]
+        for future in as_completed(futures):
+            try:
+                video, result = future.result()
+            except Exception as e:
+                report["failed"] += 1
+                log(f"❌ {e}")
+                continue
+            if not result.get("success"):
+                report["failed"] += 1
+                log(f"❌ {video.get('title')}: {result.get('error')}")
+            elif result.get("cached"):
+                report["cached"] += 1
+                log(f"✅ {video.get('title')}（保存済み）")
+            else:
+                report["fetched"] += 1
+                log(f"✅ {video.get('title')}")
+    return report
@@ -1,10 +1,7 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion, synthesize_speech
 import base64
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
 
 def text_to_speech(text, voice="alloy", speed=1.0):
     """
@@ -36,14 +33,7 @@ def text_to_speech(text, voice="alloy", speed=1.0):
     
     # 2. OpenAI TTS フォールバック
     try:
-        client = get_openai_client()
-        response = client.audio.speech.create(
-            model="tts-1",
-            voice=voice,
-            input=text,
-            speed=speed
-        )
-        audio_data = response.content
+        audio_data = synthesize_speech("tts.text_to_speech", text, voice=voice, speed=speed)
         return {"success": True, "audio": audio_data}
     except Exception as e:
         return {"success": False, "error": str(e)}
@@ -64,14 +54,13 @@ def play_audio(audio_data):
 def get_word_pronunciation(word):
     """単語の発音と意味を取得"""
     
-    client = get_openai_client()
-    
     # 音声生成
     audio_result = text_to_speech(word, voice="nova", speed=0.9)
     
     # 意味を取得（簡易版）
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "tts.get_word_pronunciation",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a dictionary. Respond in JSON."},
@@ -79,11 +68,12 @@ def get_word_pronunciation(word):
 {{"word": "{word}", "pronunciation": "<IPA>", "meaning_ja": "<日本語>", "meaning_en": "<English definition>", "example": "<short example>"}}"""}
             ],
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            cacheable=True
         )
         
         import json
-        meaning_data = json.loads(response.choices[0].message.content)
+        meaning_data = json.loads(content)
         
         return {
             "success": True,
@@ -9,10 +9,8 @@
 
 import streamlit as st
 import base64
-import asyncio
-import os
-import tempfile
 import hashlib
+import re
 
 
 # ===== 音声設定 =====
@@ -90,60 +88,83 @@ def _save_to_cache(cache_key, audio_data):
 
 # ===== Edge TTS (メイン) =====
 
+def _edge_voice_name(voice_key):
+    return VOICE_OPTIONS.get(voice_key, VOICE_OPTIONS[DEFAULT_VOICE])['edge']
+
+
 def _generate_edge_tts(text, voice_key=DEFAULT_VOICE, speed=1.0):
-    """Edge TTSで音声生成（無料・高品質）"""
-    try:
-        import edge_tts
-    except ImportError:
+    """Edge TTSで音声生成（無料・高品質）。常駐ループにジョブを投入する"""
+    from utils.edge_tts_service import get_edge_tts_service, is_available, rate_for_speed
+    if not is_available():
         return None
-    
-    voice_config = VOICE_OPTIONS.get(voice_key, VOICE_OPTIONS[DEFAULT_VOICE])
-    voice_name = voice_config['edge']
-    
-    # 速度をEdge TTS形式に変換 (e.g., "+20%" or "-10%")
-    speed_pct = int((speed - 1.0) * 100)
-    rate_str = f"+{speed_pct}%" if speed_pct >= 0 else f"{speed_pct}%"
-    
-    async def _generate():
-        communicate = edge_tts.Communicate(text, voice_name, rate=rate_str)
-        
-        with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as tmp:
-            tmp_path = tmp.name
-        
-        await communicate.save(tmp_path)
-        
-        with open(tmp_path, 'rb') as f:
-            audio_data = f.read()
-        
-        os.unlink(tmp_path)
-        return audio_data
-    
+
     try:
-        # asyncio イベントループ処理
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(asyncio.run, _generate())
-                    return future.result(timeout=30)
-            else:
-                return loop.run_until_complete(_generate())
-        except RuntimeError:
-            return asyncio.run(_generate())
-    
+        return get_edge_tts_service().synthesize(text, _edge_voice_name(voice_key), rate_for_speed(speed))
     except Exception as e:
         st.warning(f"Edge TTS error: {e}")
         return None
 
 
+def prefetch_natural_audio(texts, voice_key=DEFAULT_VOICE, speed=1.0):
+    """複数の短いテキスト（単語カードなど）の音声を先にまとめて生成しておく
+
+    結果を待たずに戻る。生成済みの音声は generate_natural_audio で即座に返る。
+    """
+    from utils.edge_tts_service import get_edge_tts_service, is_available, rate_for_speed
+    if not is_available():
+        return
+    voice_name = _edge_voice_name(voice_key)
+    rate = rate_for_speed(speed)
+    get_edge_tts_service().prefetch((t, voice_name, rate) for t in texts if t and t.strip())
+
+
+# ===== 文単位の分割・合成 =====
+
+# 文単位に分けて合成する最小の文数（これ未満は1回で合成）
+SEGMENT_MIN_SENTENCES = 2
+SENTENCE_GAP_MS = 200
+
+
+def split_sentences(text):
+    """テキストを文単位に分割（空行・改行対応）"""
+    # 改行で分割 → さらに ".!?" で分割
+    lines = text.strip().splitlines()
+    sentences = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        # ピリオド・感嘆符・疑問符で分割（省略符 ... は保持）
+        parts = re.split(r'(?<=[.!?])\s+', line)
+        for part in parts:
+            part = part.strip()
+            if part:
+                sentences.append(part)
+    return sentences
+
+
+def _generate_edge_tts_segmented(sentences, voice_key=DEFAULT_VOICE, speed=1.0):
+    """文ごとに並列合成して1本のMP3に結合（文ごとにキャッシュされるので、
+    文章を一部編集しても変わった文だけが再合成される）"""
+    from utils.edge_tts_service import get_edge_tts_service, is_available, rate_for_speed
+    from utils.mp3_stream import assemble_mp3
+    if not is_available():
+        return None
+
+    voice_name = _edge_voice_name(voice_key)
+    rate = rate_for_speed(speed)
+    audios = get_edge_tts_service().synthesize_many((s, voice_name, rate) for s in sentences)
+    if not all(audios):
+        return None
+    return assemble_mp3(audios, SENTENCE_GAP_MS)
+
+
 # ===== OpenAI TTS (バックアップ) =====
 
 def _generate_openai_tts(text, voice_key=DEFAULT_VOICE, speed=1.0):
     """OpenAI TTSで音声生成（高品質・有料）"""
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+        from utils.openai_gateway import synthesize_speech
     except Exception:
         return None
     
@@ -151,13 +172,12 @@ def _generate_openai_tts(text, voice_key=DEFAULT_VOICE, speed=1.0):
     voice_name = voice_config['openai']
     
     try:
-        response = client.audio.speech.create(
-            model="tts-1",
+        return synthesize_speech(
+            "tts_natural.openai_tts",
+            text[:4096],
             voice=voice_name,
-            input=text[:4096],
             speed=speed
         )
-        return response.content
     except Exception as e:
         st.warning(f"OpenAI TTS error: {e}")
         return None
@@ -207,8 +227,12 @@ def generate_natural_audio(text, voice_key=DEFAULT_VOICE, speed=1.0, use_cache=T
         if cached:
             return cached
     
-    # 1. Edge TTS
-    audio = _generate_edge_tts(text, voice_key, speed)
+    # 1. Edge TTS（長い文章は文単位で合成してタイムアウトを避ける）
+    sentences = split_sentences(text)
+    if len(sentences) >= SEGMENT_MIN_SENTENCES:
+        audio = _generate_edge_tts_segmented(sentences, voice_key, speed)
+    else:
+        audio = _generate_edge_tts(text, voice_key, speed)
     
     # 2. OpenAI TTS (Edgeが使えない場合)
     if audio is None:
@@ -221,25 +245,57 @@ def generate_natural_audio(text, voice_key=DEFAULT_VOICE, speed=1.0, use_cache=T
     return audio
 
 
-def play_natural_tts(text, voice_key=DEFAULT_VOICE, speed=1.0, use_cache=True):
+def _audio_html(audio, autoplay=True):
+    b64 = base64.b64encode(audio).decode()
+    return f"""
+        <audio controls {'autoplay' if autoplay else ''} style="width:100%">
+            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+        </audio>
+        """
+
+
+def start_progressive_audio(text, voice_key=DEFAULT_VOICE, speed=1.0):
+    """最初の1文だけ合成して返し、残りの文は裏で合成を始める
+
+    Returns:
+        (sentences, first_audio)  Edge TTSが使えない場合 first_audio はNone
+    """
+    from utils.edge_tts_service import is_available
+    sentences = split_sentences(text)
+    if not sentences or not is_available():
+        return sentences, None
+    prefetch_natural_audio(sentences[1:], voice_key, speed)
+    return sentences, _generate_edge_tts(sentences[0], voice_key, speed)
+
+
+def play_natural_tts(text, voice_key=DEFAULT_VOICE, speed=1.0, use_cache=True, progressive=True):
     """
     自然な音声で再生（UIに埋め込み）
     
     優先順位: Edge TTS → OpenAI TTS → Web Speech API
+    progressive=True で複数文の場合は、最初の1文をすぐ再生し、全文の準備ができたら差し替える
     """
     if not text or not text.strip():
         return
     
+    if progressive and use_cache and len(split_sentences(text)) >= SEGMENT_MIN_SENTENCES:
+        cached = _get_from_cache(_get_cache_key(text, voice_key, speed))
+        if not cached:
+            _, first_audio = start_progressive_audio(text, voice_key, speed)
+            if first_audio:
+                # 最初の1文はすぐ再生し、その間に残りを合成して全文プレーヤーを出す
+                st.markdown(_audio_html(first_audio), unsafe_allow_html=True)
+                with st.spinner("全文の音声を準備中..."):
+                    audio = generate_natural_audio(text, voice_key, speed, use_cache)
+                if audio:
+                    st.caption("▶️ 全文の音声")
+                    st.markdown(_audio_html(audio, autoplay=False), unsafe_allow_html=True)
+                return
+    
     audio = generate_natural_audio(text, voice_key, speed, use_cache)
     
     if audio:
-        b64 = base64.b64encode(audio).decode()
-        audio_html = f"""
-        <audio controls autoplay style="width:100%">
-            <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-        </audio>
-        """
-        st.markdown(audio_html, unsafe_allow_html=True)
+        st.markdown(_audio_html(audio), unsafe_allow_html=True)
     else:
         # フォールバック
         _play_web_speech_api(text, voice_key, speed)
@@ -314,8 +370,16 @@ def show_tts_quality_note():
     )
 
 
+WORD_AUDIO_SPEED = 0.85
+
+
+def prefetch_word_audio(words):
+    """単語カード一覧の発音を先にまとめて生成（show_word_audio_button が即再生できる）"""
+    prefetch_natural_audio(words, DEFAULT_VOICE, WORD_AUDIO_SPEED)
+
+
 def show_word_audio_button(word, key_prefix="word"):
     """単語の音声再生ボタン（小さめ）"""
     if st.button(f"🔊 {word}", key=f"{key_prefix}_{word}"):
         with st.spinner(""):
-            play_natural_tts(word, DEFAULT_VOICE, 0.85)
+            play_natural_tts(word, DEFAULT_VOICE, WORD_AUDIO_SPEED)
@@ -1,11 +1,8 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion
 import json
 import random
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
 
 # デモ用単語データ（後でDBから取得）
 DEMO_WORD_LISTS = {
@@ -60,11 +57,14 @@ DEMO_WORD_LISTS = {
 }
 
 
-def get_word_details(word):
-    """単語の詳細情報をGPTで生成"""
-    
-    client = get_openai_client()
-    
+def get_word_details(word, use_cache=True):
+    """単語の詳細情報を取得（共有キャッシュになければGPTで生成）"""
+    from utils.word_knowledge import get_or_generate, normalize_word
+    lemma = normalize_word(word)
+    return get_or_generate("details", lemma, lambda: _generate_word_details(lemma), use_cache=use_cache)
+
+
+def _generate_word_details(word):
     prompt = f"""Provide detailed information about the English word "{word}" for a Japanese learner.
 
 Output in JSON format:
@@ -89,17 +89,19 @@ Output in JSON format:
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "vocabulary.get_word_details",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a vocabulary expert helping Japanese learners. Respond in valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            cacheable=True
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
         
@@ -108,51 +110,12 @@ Output in JSON format:
 
 
 def generate_quiz_question(word_data, all_words, quiz_type="meaning"):
-    """クイズ問題を生成"""
-    
-    word = word_data["word"]
-    meaning = word_data["meaning"]
-    example = word_data.get("example", "")
-    
-    # 不正解の選択肢を生成
-    other_words = [w for w in all_words if w["word"] != word]
-    distractors = random.sample(other_words, min(3, len(other_words)))
-    
-    if quiz_type == "meaning":
-        # 意味を当てる
-        question = f"What does **{word}** mean?"
-        correct = meaning
-        options = [meaning] + [d["meaning"] for d in distractors]
-        random.shuffle(options)
-        hint = f"Example: {example}" if example else None
-        
-    elif quiz_type == "word":
-        # 単語を当てる
-        question = f"Which word means **{meaning}**?"
-        correct = word
-        options = [word] + [d["word"] for d in distractors]
-        random.shuffle(options)
-        hint = None
-        
-    elif quiz_type == "fill":
-        # 穴埋め
-        if example:
-            blank_example = example.replace(word, "_____").replace(word.capitalize(), "_____")
-            question = f"Fill in the blank:\n\n*{blank_example}*"
-            correct = word
-            options = [word] + [d["word"] for d in distractors]
-            random.shuffle(options)
-            hint = f"Meaning: {meaning}"
-        else:
-            return generate_quiz_question(word_data, all_words, "meaning")
-    
-    return {
-        "question": question,
-        "correct": correct,
-        "options": options,
-        "hint": hint,
-        "word_data": word_data
-    }
+    """クイズ問題を生成（誤答は utils.distractors の索引から紛らわしい語を選ぶ）
+
+    まとめて出題するときは utils.distractors.build_quiz_set を使う。
+    """
+    from utils.distractors import get_distractor_index
+    return get_distractor_index(all_words).question(word_data, quiz_type)
 
 
 def generate_word_list_from_prompt(prompt, num_words=20, level="B1"):
@@ -161,8 +124,6 @@ def generate_word_list_from_prompt(prompt, num_words=20, level="B1"):
     例: "TOEFL頻出単語", "環境問題の語彙", "ビジネスメールで使う表現"
     """
     
-    client = get_openai_client()
-    
     system_prompt = """You are a vocabulary expert for Japanese English learners.
 Generate word lists based on user requests.
 Always respond in valid JSON format."""
@@ -198,7 +159,8 @@ Make sure:
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "vocabulary.generate_word_list_from_prompt",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -208,7 +170,7 @@ Make sure:
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["generated"] = True
         return result
@@ -217,14 +179,22 @@ Make sure:
         return {"success": False, "error": str(e)}
 
 
-def generate_exercises_for_word(word, exercise_types=["meaning", "example", "collocation"]):
+def generate_exercises_for_word(word, exercise_types=["meaning", "example", "collocation"],
+                                pos=None, use_cache=True):
     """
     1つの単語に対して様々な練習問題を生成
+    （共有キャッシュに見出し語ごとに保存し、再利用する。pos は生成時のヒントにだけ使う。
+    画面からの入力には品詞がないので、事前生成と同じキーになるよう語義では分けない）
     """
-    
-    client = get_openai_client()
-    
-    prompt = f"""Create various exercises for the English word "{word}" for Japanese learners.
+    from utils.word_knowledge import get_or_generate, normalize_word
+    lemma = normalize_word(word)
+    return get_or_generate("exercises", lemma, lambda: _generate_word_exercises(lemma, pos),
+                           use_cache=use_cache)
+
+
+def _generate_word_exercises(word, pos=None):
+    target = f'"{word}" (as a {pos})' if pos else f'"{word}"'
+    prompt = f"""Create various exercises for the English word {target} for Japanese learners.
 
 Generate exercises in JSON format:
 {{
@@ -272,7 +242,8 @@ Generate exercises in JSON format:
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "vocabulary.generate_exercises_for_word",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a vocabulary exercise creator for Japanese English learners. Respond in valid JSON."},
@@ -282,7 +253,7 @@ Generate exercises in JSON format:
             response_format={"type": "json_object"}
         )
         
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
         
@@ -309,7 +280,6 @@ def grade_student_sentence(word: str, sentence: str, context: dict = None) -> di
             "suggestion": str  # 改善提案1文
         }
     """
-    client = get_openai_client()
 
     meaning = context.get("meaning", "") if context else ""
     example = context.get("example", "") if context else ""
@@ -344,7 +314,8 @@ Respond in JSON:
 Be encouraging but honest. Focus on helping them improve."""
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "vocabulary.grade_student_sentence",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful English writing coach for Japanese university students. Respond in valid JSON only."},
@@ -353,7 +324,7 @@ Be encouraging but honest. Focus on helping them improve."""
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         return result
     except Exception as e:
@@ -0,0 +1,229 @@
+"""
+Word Knowledge Store
+====================
+単語の詳細情報・練習問題の共有キャッシュ。
+
+- 生成結果は見出し語（小文字・空白正規化）をキーに word_knowledge に保存し、
+  どの学生・どのコースから開いても同じ結果を再利用する（語義で分けたいときは sense を渡す）
+- 見つかった結果だけをプロセス内に保持する（未保存を覚えないので、保存後すぐに見つかる）
+- 同じ単語への同時リクエストは1回の生成を待ち合わせる（single-flight）
+- DEMO_WORD_LISTS と教員の単語リストは prefill_word_knowledge でまとめて事前生成できる
+
+使い方:
+    from utils.word_knowledge import get_or_generate
+    result = get_or_generate("details", "Analyze", lambda: _generate(...))
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+KINDS = ("details", "exercises")
+MAX_ENTRIES_IN_MEMORY = 2000
+# 他の呼び出しの生成完了を待つ上限（秒）
+WAIT_TIMEOUT = 90
+DEFAULT_MAX_WORKERS = 4
+
+
+def normalize_word(word: str) -> str:
+    """キャッシュキー用の見出し語（小文字・空白と引用符の正規化）"""
+    text = (word or "").replace("’", "'").replace("‐", "-").strip().lower()
+    return " ".join(text.split())
+
+
+def normalize_sense(pos: str = None) -> str:
+    """語義の区別に使う品詞（"Phrasal Verb" → "phrasal_verb"）"""
+    return "_".join((pos or "").strip().lower().split())
+
+
+def knowledge_key(kind: str, word: str, sense: str = "") -> str:
+    """{kind}:{lemma}[:{sense}]"""
+    lemma = normalize_word(word)
+    sense = normalize_sense(sense)
+    return f"{kind}:{lemma}:{sense}" if sense else f"{kind}:{lemma}"
+
+
+# ============================================================
+# プロセス内キャッシュ
+# ============================================================
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, Dict]" = OrderedDict()
+_inflight: Dict[str, Future] = {}
+
+
+def _remember(key: str, payload: Dict):
+    with _lock:
+        _entries[key] = payload
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES_IN_MEMORY:
+            _entries.popitem(last=False)
+
+
+def _cached(key: str) -> Optional[Dict]:
+    with _lock:
+        if key in _entries:
+            _entries.move_to_end(key)
+            return _entries[key]
+    return None
+
+
+def _load(key: str) -> Optional[Dict]:
+    try:
+        from utils.database import get_word_knowledge
+        payload = get_word_knowledge(key)
+    except Exception:
+        payload = None
+    if payload:
+        _remember(key, payload)
+    return payload
+
+
+def _store(key: str, kind: str, word: str, sense: str, payload: Dict):
+    _remember(key, payload)
+    try:
+        from utils.database import save_word_knowledge
+        save_word_knowledge(key, kind, normalize_word(word), normalize_sense(sense), payload)
+    except Exception:
+        pass
+
+
+def clear_memory_cache():
+    """プロセス内キャッシュを破棄（DBの保存内容は残る）"""
+    with _lock:
+        _entries.clear()
+
+
+# ============================================================
+# 公開API
+# ============================================================
+
+def get_or_generate(kind: str, word: str, generate: Callable[[], Dict],
+                    sense: str = "", use_cache: bool = True) -> Dict:
+    """保存済みの単語情報を返す。なければ generate() を1回だけ呼んで保存する
+
+    同じキーを生成中の呼び出しがあれば、その結果を待って共有する。
+    失敗した結果は保存しない（次の呼び出しで再生成する）。
+    """
+    key = knowledge_key(kind, word, sense)
+    if use_cache:
+        payload = _cached(key) or _load(key)
+        if payload:
+            return {**payload, "success": True, "cached": True}
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        try:
+            result = future.result(timeout=WAIT_TIMEOUT)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        return {**result, "cached": True} if result.get("success") else result
+
+    try:
+        result = generate()
+        if result.get("success"):
+            payload = {k: v for k, v in result.items() if k not in ("success", "cached")}
+            _store(key, kind, word, sense, payload)
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+    future.set_result(result)
+    return result
+
+
+def collect_prefill_words(course_id: str = None, include_demo: bool = True) -> List[Tuple[str, str]]:
+    """事前生成の対象語 (word, pos) を重複なしで集める
+
+    DEMO_WORD_LISTS・教材DBの単語リスト・教員が保存した単語リストが対象。
+    """
+    lists = []
+    if include_demo:
+        from utils.vocabulary import DEMO_WORD_LISTS
+        lists.extend(data.get("words", []) for data in DEMO_WORD_LISTS.values())
+    try:
+        from utils.database import get_learning_materials, get_teacher_word_lists
+        for row in get_learning_materials("vocabulary", course_id=course_id):
+            lists.append((row.get("content") or {}).get("words", []))
+        for row in get_teacher_word_lists(course_id):
+            lists.append((row.get("details") or {}).get("words", []))
+    except Exception:
+        pass
+
+    seen = set()
+    words = []
+    for entries in lists:
+        for w in entries or []:
+            word = (w.get("word") or "").strip()
+            if not word:
+                continue
+            ident = (normalize_word(word), normalize_sense(w.get("pos")))
+            if ident in seen:
+                continue
+            seen.add(ident)
+            words.append((word, w.get("pos") or ""))
+    return words
+
+
+def prefill_word_knowledge(words: Iterable[Tuple[str, str]] = None, kinds: List[str] = None,
+                           course_id: str = None, max_workers: int = DEFAULT_MAX_WORKERS,
+                           progress: Optional[Callable[[str], None]] = print) -> Dict:
+    """単語リストの詳細情報・練習問題をまとめて生成・保存する（保存済みはスキップ）
+
+    Returns:
+        {"words", "generated", "cached", "failed"}
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from utils.vocabulary import get_word_details, generate_exercises_for_word
+
+    log = progress or (lambda msg: None)
+    words = list(words) if words is not None else collect_prefill_words(course_id)
+    kinds = [k for k in (kinds or KINDS) if k in KINDS]
+    report = {"words": len(words), "generated": 0, "cached": 0, "failed": 0}
+
+    # details・exercises とも見出し語ごとのキー（品詞違いの同じ語は1回だけ生成する）
+    by_key = {}
+    for word, pos in words:
+        if "details" in kinds:
+            by_key.setdefault(knowledge_key("details", word),
+                              ("details", word, "", lambda word=word: get_word_details(word)))
+        if "exercises" in kinds:
+            by_key.setdefault(knowledge_key("exercises", word),
+                              ("exercises", word, "",
+                               lambda word=word, pos=pos: generate_exercises_for_word(word, pos=pos)))
+    jobs = list(by_key.values())
+
+    # 保存済みのキーはまとめて確認して、API呼び出しの対象から外す
+    try:
+        from utils.database import get_existing_word_knowledge_keys
+        existing = get_existing_word_knowledge_keys([knowledge_key(k, w, s) for k, w, s, _ in jobs])
+    except Exception:
+        existing = set()
+    pending = [job for job in jobs if knowledge_key(job[0], job[1], job[2]) not in existing]
+    report["cached"] = len(jobs) - len(pending)
+    log(f"単語 {len(words)}語 / 生成対象 {len(pending)}件 / 保存済みスキップ {report['cached']}件")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(run): (kind, word) for kind, word, _, run in pending}
+        for i, future in enumerate(as_completed(futures), 1):
+            kind, word = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            if result.get("success"):
+                report["cached" if result.get("cached") else "generated"] += 1
+                log(f"[{i}/{len(pending)}] ✅ {word} — {kind}")
+            else:
+                report["failed"] += 1
+                log(f"[{i}/{len(pending)}] ❌ {word} — {kind}: {result.get('error')}")
+    return report
@@ -1,12 +1,9 @@
 import streamlit as st
-from openai import OpenAI
+from utils.openai_gateway import chat_completion
+from utils.prompt_templates import PromptTemplate, TemplateCache, settings_version
 import json
 
 
-def get_openai_client():
-    return OpenAI(api_key=st.secrets["openai"]["api_key"])
-
-
 def _get_ai_settings(course_id: str) -> dict:
     if not course_id:
         return {}
@@ -106,23 +103,17 @@ def _build_weights_instruction(weights: dict) -> str:
 # Writing評価（メイン）
 # ============================================================
 
-def evaluate_writing(text, task_type="general", level="B1", is_practice=False,
-                     course_id: str = None, assignment_id: str = None):
-    """
-    ライティングを評価（日英バイリンガルフィードバック）
-    course_idが指定された場合、course_settingsの設定をプロンプトに反映。
+_WRITING_TEMPLATES = TemplateCache("writing_eval.evaluate_writing")
+
+_WRITING_SYSTEM = (
+    "You are an expert English writing instructor. "
+    "Provide bilingual (English/Japanese) feedback unless instructed otherwise. "
+    "Always respond in valid JSON format."
+)
 
-    引数:
-        text          : 評価対象テキスト
-        task_type     : "essay"/"summary"/"email_letter"/"general" など
-        level         : CEFR想定レベル
-        is_practice   : 練習モードか（Trueならgpt-4o-mini使用）
-        course_id     : コースID（設定反映に使用）
-        assignment_id : 課題ID（課題別設定を優先する場合）
-    """
-    client = get_openai_client()
-    model = "gpt-4o-mini" if is_practice else "gpt-4o"
-    word_count = len(text.split())
+
+def _build_writing_template(course_id: str, task_type: str, assignment_id: str) -> PromptTemplate:
+    """コース設定を反映した静的プレフィックスを組み立てる（学生の英文は含まない）"""
 
     # ── 設定取得 ──────────────────────────────────────────
     ai_settings = _get_ai_settings(course_id)
@@ -139,15 +130,11 @@ def evaluate_writing(text, task_type="general", level="B1", is_practice=False,
     weights_block  = _build_weights_instruction(weights)
     extra_block    = f"\n## 教員からの追加指示:\n{extra_instr}" if extra_instr else ""
 
-    prompt = f"""You are an expert English writing instructor specializing in Japanese EFL learners.
+    prefix = f"""You are an expert English writing instructor specializing in Japanese EFL learners.
 
 ## Task
-Evaluate the following English writing by a Japanese university student (Level: {level}).
+Evaluate the English writing by a Japanese university student shown at the end of this prompt.
 
-## Student's Writing
-{text}
-
-## Word Count: {word_count}
 ## Task Type: {task_type}
 
 {priority_block}
@@ -216,23 +203,48 @@ Format: "English explanation / 日本語の説明"
 3. Respect World Englishes - note regional variations
 4. For practice mode, focus on top 3-5 errors
 5. Prioritize intelligibility over native-like perfection
+"""
+    return PromptTemplate(_WRITING_SYSTEM, prefix)
+
+
+def evaluate_writing(text, task_type="general", level="B1", is_practice=False,
+                     course_id: str = None, assignment_id: str = None):
+    """
+    ライティングを評価（日英バイリンガルフィードバック）
+    course_idが指定された場合、course_settingsの設定をプロンプトに反映。
+    設定から組み立てたプロンプトの前半はキャッシュし、学生の英文は末尾に付ける。
+
+    引数:
+        text          : 評価対象テキスト
+        task_type     : "essay"/"summary"/"email_letter"/"general" など
+        level         : CEFR想定レベル
+        is_practice   : 練習モードか（Trueならgpt-4o-mini使用）
+        course_id     : コースID（設定反映に使用）
+        assignment_id : 課題ID（課題別設定を優先する場合）
+    """
+    model = "gpt-4o-mini" if is_practice else "gpt-4o"
+    word_count = len(text.split())
+
+    key = (course_id, task_type, assignment_id, settings_version(course_id))
+    template = _WRITING_TEMPLATES.get(
+        key, lambda: _build_writing_template(course_id, task_type, assignment_id))
+
+    suffix = f"""## Student Level: {level}
+## Word Count: {word_count}
+
+## Student's Writing
+{text}
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "writing_eval.evaluate_writing",
             model=model,
-            messages=[
-                {"role": "system", "content": (
-                    "You are an expert English writing instructor. "
-                    "Provide bilingual (English/Japanese) feedback unless instructed otherwise. "
-                    "Always respond in valid JSON format."
-                )},
-                {"role": "user", "content": prompt}
-            ],
+            messages=template.messages(suffix),
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["word_count"] = word_count
         result["model_used"] = model
@@ -340,7 +352,6 @@ def evaluate_translation(japanese_text, english_text, level="B1",
     日本語→英語翻訳をチェック。
     course_idが指定された場合、extra_instructionをプロンプトに反映。
     """
-    client = get_openai_client()
     word_count = len(english_text.split())
 
     ai_settings = _get_ai_settings(course_id)
@@ -409,7 +420,8 @@ Analyze the translation, identify direct translation issues, and suggest natural
 """
 
     try:
-        response = client.chat.completions.create(
+        content = chat_completion(
+            "writing_eval.evaluate_translation",
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": (
@@ -421,7 +433,7 @@ Analyze the translation, identify direct translation issues, and suggest natural
             temperature=0.3,
             response_format={"type": "json_object"}
         )
-        result = json.loads(response.choices[0].message.content)
+        result = json.loads(content)
         result["success"] = True
         result["word_count"] = word_count
         return result
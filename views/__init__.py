@@ -2,12 +2,12 @@
 Views Package
 =============
 画面モジュール
+
+各画面は表示するときに読み込む（views.registry）。
+views.login のような属性アクセスでも、そのときに初めて読み込まれる。
 """
 
-from . import login
-from . import student_home
-from . import teacher_home
-from . import teacher_settings
+import importlib
 
 __all__ = [
     'login',
@@ -15,3 +15,9 @@ __all__ = [
     'teacher_home',
     'teacher_settings'
 ]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
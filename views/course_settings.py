@@ -84,6 +84,11 @@ def _default_ai_feedback() -> dict:
     }
 
 
+def _default_content_reuse() -> dict:
+    from utils.content_library import DEFAULT_POLICY
+    return dict(DEFAULT_POLICY)   # mode: always / limited / fresh
+
+
 # ============================================================
 # ロード・セーブヘルパー
 # ============================================================
@@ -818,6 +823,62 @@ def show_ai_feedback_settings(course_id: str, settings: dict):
         else:
             st.error("保存に失敗しました。")
 
+    st.markdown("---")
+    show_content_reuse_settings(course_id, settings)
+
+
+def show_content_reuse_settings(course_id: str, settings: dict):
+    st.markdown("#### ♻️ AI生成教材の再利用")
+    st.caption(
+        "リーディング記事・リスニング素材は、同じトピック・レベル・長さの依頼があれば"
+        "共有ライブラリの生成済み素材を再利用します（API呼び出しと待ち時間の節約）。"
+    )
+
+    cur = settings.get("content_reuse") or _default_content_reuse()
+    modes = ["always", "limited", "fresh"]
+    mode = st.radio(
+        "再利用の方針",
+        options=modes,
+        format_func=lambda x: {
+            "always":  "♻️ 常に再利用（生成済みがあれば必ず使う）",
+            "limited": "🔁 回数を決めて再利用（使い切ったら新しく生成）",
+            "fresh":   "✨ 毎回生成（再利用しない）",
+        }.get(x, x),
+        index=modes.index(cur.get("mode", "limited")) if cur.get("mode") in modes else 1,
+        key="content_reuse_mode",
+    )
+    max_uses = st.number_input(
+        "1つの素材を提供する回数の上限",
+        min_value=1, max_value=100,
+        value=int(cur.get("max_uses", _default_content_reuse()["max_uses"])),
+        key="content_reuse_max_uses",
+        disabled=mode != "limited",
+    )
+
+    if st.button("💾 再利用設定を保存", key="save_content_reuse"):
+        if _save_settings(course_id, {"content_reuse": {"mode": mode, "max_uses": int(max_uses)}}):
+            st.success("✅ 再利用設定を保存しました。")
+        else:
+            st.error("保存に失敗しました。")
+
+    from utils.content_library import get_prefill_status, start_background_prefill
+    st.caption("このコースでよく依頼されるトピック×レベルの素材を、バックグラウンドで先に生成しておけます。")
+    if st.button("⚡ よく使われる素材を事前生成", key="start_content_prefill"):
+        if start_background_prefill(course_id):
+            st.info("事前生成を開始しました。画面はそのまま使えます。")
+        else:
+            st.info("事前生成はすでに実行中です。")
+    job = get_prefill_status(course_id)
+    if job:
+        report = job.get("report") or {}
+        if job["status"] == "running":
+            st.caption("⏳ 事前生成中…")
+        elif job["status"] == "done":
+            st.caption(f"✅ 事前生成完了: 生成 {report.get('generated', 0)}件 / "
+                       f"在庫あり {report.get('skipped', 0)}件 / 失敗 {report.get('failed', 0)}件")
+        else:
+            st.caption(f"❌ 事前生成に失敗しました: {report.get('error')}")
+
 
 # ============================================================
 # 設定取得ユーティリティ（他モジュールから呼び出し用）
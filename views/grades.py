@@ -8,7 +8,7 @@
 import streamlit as st
 from utils.auth import get_current_user, require_auth
 from datetime import datetime
-import statistics
+import time
 
 
 @require_auth
@@ -116,62 +116,26 @@ def _load_attendance(course_id: str) -> dict:
     return st.session_state.get(f'attendance_scores_{course_id}', {})
 
 
-def _calc_student_total(s: dict, weights: dict, attendance_map: dict) -> dict:
-    def safe(val):
-        return float(val) if val is not None else 0.0
+def _load_gradebook(course_id: str):
+    """学生 × 評価項目の成績行列（utils/gradebook.py）
 
-    speaking        = safe(s.get('speaking_avg'))
-    writing         = safe(s.get('writing_avg'))
-    vocabulary      = safe(s.get('vocabulary_avg'))
-    reading         = safe(s.get('reading_avg'))
-    listening       = safe(s.get('listening_avg'))
-    assignment      = safe(s.get('assignment_avg'))
-    extracurricular = safe(s.get('extracurricular_score'))
-    att_raw = attendance_map.get(s.get('student_id', ''), None)
-    attendance = float(att_raw) if att_raw is not None else 0.0
+    スコア・出席データを読み込み直したとき（データの版が変わったとき）だけ作り直す。
+    配分ごとの合計点・評定は行列側にキャッシュされる。
+    """
+    from utils.gradebook import GradeMatrix
 
-    w = weights
-    total = (
-        speaking        * w.get('speaking', 0) / 100 +
-        writing         * w.get('writing', 0) / 100 +
-        vocabulary      * w.get('vocabulary', 0) / 100 +
-        reading         * w.get('reading', 0) / 100 +
-        listening       * w.get('listening', 0) / 100 +
-        assignment      * w.get('assignment', 0) / 100 +
-        extracurricular * w.get('extracurricular', 0) / 100 +
-        attendance      * w.get('attendance', 0) / 100
+    students_raw = _load_module_scores(course_id)
+    version = (
+        st.session_state.get(f'module_scores_ts_{course_id}', 0),
+        st.session_state.get(f'attendance_scores_ts_{course_id}', 0),
+        len(students_raw),
     )
-
-    return {
-        'name': s.get('name', ''),
-        'student_id': s.get('student_id', ''),
-        'user_id': s.get('user_id', ''),
-        'email': s.get('email', ''),
-        'speaking': speaking, 'speaking_count': s.get('speaking_count', 0),
-        'writing': writing, 'writing_count': s.get('writing_count', 0),
-        'vocabulary': vocabulary, 'vocabulary_count': s.get('vocabulary_count', 0),
-        'reading': reading, 'reading_count': s.get('reading_count', 0),
-        'listening': listening, 'listening_count': s.get('listening_count', 0),
-        'assignment': assignment, 'assignment_count': s.get('assignment_count', 0),
-        'extracurricular': extracurricular,
-        'extracurricular_points': s.get('extracurricular_points', 0),
-        'extracurricular_count': s.get('extracurricular_count', 0),
-        'attendance': attendance, 'attendance_input': att_raw is not None,
-        'total': round(total, 1),
-        'grade': _calc_grade(total),
-        '_raw': s,
-    }
-
-
-def _calc_grade(total: float) -> str:
-    if total >= 90: return "A+"
-    if total >= 80: return "A"
-    if total >= 75: return "B+"
-    if total >= 70: return "B"
-    if total >= 65: return "C+"
-    if total >= 60: return "C"
-    if total >= 50: return "D"
-    return "F"
+    cache_key = f'gradebook_{course_id}'
+    matrix = st.session_state.get(cache_key)
+    if matrix is None or matrix.version != version:
+        matrix = GradeMatrix(students_raw, _load_attendance(course_id), version=version)
+        st.session_state[cache_key] = matrix
+    return matrix
 
 
 # ============================================================
@@ -186,15 +150,14 @@ def show_grade_list(course_id: str):
         return
 
     with st.spinner("成績データを読み込み中..."):
-        students_raw = _load_module_scores(course_id)
+        gradebook = _load_gradebook(course_id)
 
-    if not students_raw:
+    if not len(gradebook):
         st.info("まだ学生データがありません。学生が登録し学習を開始すると成績が表示されます。")
         return
 
     weights = _load_weights(course_id)
-    attendance_map = _load_attendance(course_id)
-    grade_data = [_calc_student_total(s, weights, attendance_map) for s in students_raw]
+    grade_data = gradebook.rows(weights)
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -337,6 +300,14 @@ def show_grade_settings(course_id: str):
         diff = total - 100
         st.error(f"❌ 合計: {total}%（{'あと' if diff < 0 else ''}{ abs(diff) }%{'減らして' if diff > 0 else '増やして'}ください）")
 
+    new_weights = {
+        'speaking': sp, 'writing': wr, 'vocabulary': vo,
+        'reading': rd, 'listening': ls, 'assignment': as_,
+        'extracurricular': ex, 'attendance': at,
+    }
+    if course_id:
+        _show_weight_preview(_load_gradebook(course_id), current, new_weights)
+
     st.markdown("---")
     st.markdown("#### 🏆 評定基準")
     col1, col2 = st.columns(2)
@@ -346,11 +317,6 @@ def show_grade_settings(course_id: str):
         st.markdown("| 評定 | 点数範囲 |\n|------|-------|\n| C+ | 65〜69 |\n| C | 60〜64 |\n| D | 50〜59 |\n| F | 〜49 |")
 
     if st.button("💾 設定を保存（DB）", type="primary", disabled=(total != 100)):
-        new_weights = {
-            'speaking': sp, 'writing': wr, 'vocabulary': vo,
-            'reading': rd, 'listening': ls, 'assignment': as_,
-            'extracurricular': ex, 'attendance': at,
-        }
         try:
             from utils.database import save_grade_weights
             ok = save_grade_weights(course_id, new_weights)
@@ -363,6 +329,25 @@ def show_grade_settings(course_id: str):
             st.error(f"保存エラー: {e}")
 
 
+def _show_weight_preview(gradebook, current: dict, new_weights: dict):
+    """スライダーの配分で成績がどう変わるかの試算（保存前）"""
+    if not len(gradebook):
+        return
+    st.markdown("#### 🔍 この配分での試算")
+    diff = gradebook.what_if(current, new_weights)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("クラス平均", f"{diff['mean_after']:.1f}点",
+                  f"{diff['mean_after'] - diff['mean_before']:+.1f}")
+    with col2:
+        st.metric("評定が上がる学生", f"{diff['grade_up']}名")
+    with col3:
+        st.metric("評定が下がる学生", f"{diff['grade_down']}名")
+    before, after = diff['grades_before'], diff['grades_after']
+    st.caption("評定分布（現在 → 試算）: " + "　".join(
+        f"{g} {before[g]}→{after[g]}" for g in after))
+
+
 # ============================================================
 # Tab 3: 統計・分析
 # ============================================================
@@ -375,46 +360,36 @@ def show_grade_statistics(course_id: str):
         return
 
     with st.spinner("データを読み込み中..."):
-        students_raw = _load_module_scores(course_id)
+        gradebook = _load_gradebook(course_id)
 
-    if not students_raw:
+    if not len(gradebook):
         st.info("まだ成績データがありません")
         return
 
     weights = _load_weights(course_id)
-    attendance_map = _load_attendance(course_id)
-    grade_data = [_calc_student_total(s, weights, attendance_map) for s in students_raw]
+    summary = gradebook.summary(weights)
 
-    totals = [g['total'] for g in grade_data if g['total'] > 0]
-
-    if not totals:
+    if not summary['count']:
         st.info("スコアデータがまだありません")
         return
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        st.metric("クラス平均", f"{statistics.mean(totals):.1f}点")
+        st.metric("クラス平均", f"{summary['mean']:.1f}点")
     with col2:
-        st.metric("最高点", f"{max(totals):.1f}点")
+        st.metric("最高点", f"{summary['max']:.1f}点")
     with col3:
-        st.metric("最低点", f"{min(totals):.1f}点")
+        st.metric("最低点", f"{summary['min']:.1f}点")
     with col4:
-        stdev = statistics.stdev(totals) if len(totals) > 1 else 0
-        st.metric("標準偏差", f"{stdev:.1f}")
+        st.metric("標準偏差", f"{summary['stdev']:.1f}")
 
     st.markdown("---")
     st.markdown("#### 🏆 評定分布")
 
-    grade_counts = {}
-    for g in grade_data:
-        gr = g['grade']
-        grade_counts[gr] = grade_counts.get(gr, 0) + 1
-
-    grade_order = ["A+", "A", "B+", "B", "C+", "C", "D", "F"]
-    total_students = len(grade_data)
-    max_count = max(grade_counts.values()) if grade_counts else 1
-    for gr in grade_order:
-        count = grade_counts.get(gr, 0)
+    grade_counts = summary['grades']
+    total_students = len(gradebook)
+    max_count = max(grade_counts.values()) or 1
+    for gr, count in grade_counts.items():
         pct = count / total_students * 100 if total_students > 0 else 0
         col1, col2, col3 = st.columns([1, 4, 1])
         with col1:
@@ -424,6 +399,12 @@ def show_grade_statistics(course_id: str):
         with col3:
             st.caption(f"{count}名 ({pct:.0f}%)")
 
+    st.markdown("---")
+    st.markdown("#### 📊 合計点の分布")
+    import pandas as pd
+    hist = gradebook.histogram(weights)
+    st.bar_chart(pd.DataFrame({"人数": list(hist.values())}, index=list(hist.keys())))
+
     st.markdown("---")
     st.markdown("#### 📊 モジュール別クラス平均")
 
@@ -432,13 +413,13 @@ def show_grade_statistics(course_id: str):
         ("📚 Vocabulary", "vocabulary"), ("📖 Reading", "reading"),
         ("👂 Listening", "listening"), ("📝 課題提出", "assignment"),
     ]
+    averages = gradebook.module_averages()
     col1, col2, col3 = st.columns(3)
     for i, (label, key) in enumerate(modules):
-        vals = [g[key] for g in grade_data if g.get(key, 0) > 0]
-        avg = statistics.mean(vals) if vals else None
+        avg = averages[key]['avg']
         with [col1, col2, col3][i % 3]:
             if avg is not None:
-                st.metric(label, f"{avg:.1f}点", help=f"データあり: {len(vals)}名")
+                st.metric(label, f"{avg:.1f}点", help=f"データあり: {averages[key]['n']}名")
             else:
                 st.metric(label, "データなし")
 
@@ -675,14 +656,13 @@ def _show_module_heatmap(course_id: str):
     st.markdown("#### 🗂️ クラス全体 モジュール別スコアマップ")
     st.caption("各学生のモジュール別スコアを色で表示します。空欄は未練習。")
 
-    students_raw = _load_module_scores(course_id)
-    if not students_raw:
+    gradebook = _load_gradebook(course_id)
+    if not len(gradebook):
         st.info("データがありません")
         return
 
     weights = _load_weights(course_id)
-    attendance_map = _load_attendance(course_id)
-    grade_data = [_calc_student_total(s, weights, attendance_map) for s in students_raw]
+    grade_data = gradebook.rows(weights)
 
     # ソートオプション
     sort_key = st.selectbox(
@@ -791,18 +771,18 @@ def _show_export(course_id: str):
     include_modules = st.checkbox("モジュール別スコアを含める", value=True, key="exp_modules")
     include_counts  = st.checkbox("練習回数を含める", value=False, key="exp_counts")
     include_att     = st.checkbox("出席点を含める（CSVインポート済みの場合）", value=True, key="exp_att")
+    include_pct     = st.checkbox("パーセンタイル（クラス内順位）を含める", value=False, key="exp_pct")
 
     if st.button("📥 CSVを生成してダウンロード", type="primary"):
         with st.spinner("成績データを集計中..."):
-            students_raw = _load_module_scores(course_id)
+            gradebook = _load_gradebook(course_id)
 
-        if not students_raw:
+        if not len(gradebook):
             st.warning("エクスポートするデータがありません")
             return
 
         weights = _load_weights(course_id)
-        attendance_map = _load_attendance(course_id)
-        grade_data = [_calc_student_total(s, weights, attendance_map) for s in students_raw]
+        grade_data = gradebook.rows(weights)
 
         import pandas as pd
         rows = []
@@ -826,6 +806,8 @@ def _show_export(course_id: str):
                 row['課題提出数']      = g['assignment_count']
             row['合計点'] = g['total']
             row['評定']   = g['grade']
+            if include_pct:
+                row['パーセンタイル'] = round(g['percentile'], 1)
             rows.append(row)
 
         df = pd.DataFrame(rows)
@@ -888,6 +870,7 @@ B234567,100
                         errors.append(f"{sid}: 数値変換エラー ({row[score_col]})")
 
                 st.session_state[f'attendance_scores_{course_id}'] = att_map
+                st.session_state[f'attendance_scores_ts_{course_id}'] = time.time()
                 st.success(f"✅ {len(att_map)}件の出席データを適用しました。「成績一覧」タブで確認できます。")
                 if errors:
                     st.warning("以下の行はスキップされました:\n" + "\n".join(errors))
@@ -901,4 +884,5 @@ B234567,100
         st.success(f"現在 {len(existing)}名分の出席データが読み込まれています。")
         if st.button("🗑️ 出席データをクリア"):
             st.session_state.pop(f'attendance_scores_{course_id}', None)
+            st.session_state.pop(f'attendance_scores_ts_{course_id}', None)
             st.rerun()
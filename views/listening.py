@@ -1,5 +1,6 @@
 import streamlit as st
 from utils.auth import get_current_user, require_auth
+from utils.background_tasks import start_task, poll_task, is_running
 from utils.listening import (
     generate_audio_with_openai,
     generate_dialogue_audio_with_speakers,
@@ -8,6 +9,7 @@ from utils.listening import (
     generate_listening_from_prompt
 )
 from utils.materials_loader import load_materials
+from utils.content_library import teacher_course_id, show_library_source, show_library_search
 from utils.listening_youtube import (
     extract_youtube_id,
     get_youtube_transcript,
@@ -98,9 +100,10 @@ def show_youtube_with_whisper_teacher():
                     st.success(f"✅ {'Whisper AIで文字起こし' if method == 'whisper' else 'YouTube字幕を取得'}完了！")
                     transcript = transcript_result.get("transcript", "")
                     with st.spinner("学習素材を生成中..."):
-                        difficulty = analyze_video_difficulty(transcript, level)
+                        difficulty = analyze_video_difficulty(transcript, level, video_id=video_id)
                         exercises = generate_exercises_from_transcript(
-                            transcript, video_title or transcript_result.get("title", ""), level
+                            transcript, video_title or transcript_result.get("title", ""), level,
+                            video_id=video_id
                         )
                     if exercises.get("success"):
                         st.session_state['t_yt_exercises'] = exercises
@@ -188,16 +191,28 @@ def show_ai_listening_generator():
             key="t_ai_dur"
         )
     
-    if st.button("🚀 生成", type="primary", disabled=not prompt, key="t_ai_gen"):
-        with st.spinner("生成中..."):
-            result = generate_listening_from_prompt(prompt, level, duration)
+    generate_clicked = st.button("🚀 生成", type="primary", disabled=not prompt or is_running('t_ai_gen'),
+                                 key="t_ai_gen")
+    # ライブラリの素材を再利用せず、新しいバリエーションを生成する
+    fresh_clicked = st.button("🆕 新しく生成", disabled=not prompt or is_running('t_ai_gen'), key="t_ai_gen_fresh")
+    if generate_clicked or fresh_clicked:
+        start_task('t_ai_gen', 'listening.generate_listening_from_prompt', generate_listening_from_prompt,
+                   prompt, level, duration, course_id=teacher_course_id(), fresh=fresh_clicked)
+    
+    result = poll_task('t_ai_gen', "生成中...")
+    if result is not None:
         if result.get("success"):
             st.session_state['t_gen_listening'] = result
             st.success("✅ 生成完了！")
+        elif not result.get("cancelled"):
+            st.error(f"Error: {result.get('error')}")
+    
+    show_library_search('t_gen_listening', 'listening', teacher_course_id())
     
     if 't_gen_listening' in st.session_state:
         data = st.session_state['t_gen_listening']
         st.markdown(f"### {data.get('title', '')}")
+        show_library_source(data, 'listening')
         with st.expander("📜 スクリプト"):
             st.markdown(data.get('script', ''))
 
@@ -286,10 +301,13 @@ def show_youtube_learning_student():
                 if not user_input.strip():
                     st.warning("テキストを入力してからチェックしてください")
                 else:
-                    with st.spinner("AIが添削中..."):
-                        result = check_youtube_dictation(user_input)
+                    with st.spinner("添削中..."):
+                        # 字幕があれば字幕と照合してローカル採点
+                        transcript_result = get_youtube_transcript(video_id)
+                        reference = transcript_result.get("transcript") if transcript_result.get("success") else None
+                        result = check_youtube_dictation(user_input, reference=reference)
                     if result.get("success"):
-                        feedback = result.get("feedback", {})
+                        feedback = result
                         score = feedback.get("score", 0)
                         st.metric("スコア", f"{score}/100")
                         if score >= 80:
@@ -367,8 +385,10 @@ def show_curated_video_list():
                 transcript_result = get_transcript_auto(video['id'])
                 if transcript_result.get("success"):
                     transcript = transcript_result.get("transcript", "")
-                    exercises = generate_exercises_from_transcript(transcript, video['title'], video['level'])
-                    difficulty = analyze_video_difficulty(transcript, video['level'])
+                    exercises = generate_exercises_from_transcript(
+                        transcript, video['title'], video['level'], video_id=video['id']
+                    )
+                    difficulty = analyze_video_difficulty(transcript, video['level'], video_id=video['id'])
                     if exercises.get("success"):
                         st.session_state['s_yt_exercises'] = exercises
                         st.session_state['s_yt_difficulty'] = difficulty
@@ -524,6 +544,9 @@ def show_youtube_dictation(exercises):
     idx = st.selectbox("セグメント", range(len(segments)), format_func=lambda i: f"Segment {i+1}", key="dict_seg")
     segment = segments[idx]
     original = segment.get('text', '')
+    if 'start' in segment:
+        start, end = int(segment['start']), int(segment.get('end', segment['start']))
+        st.caption(f"⏱ 動画の {start // 60}:{start % 60:02d} 〜 {end // 60}:{end % 60:02d}")
     if st.button("🔊 再生", key="dict_play"):
         with st.spinner("生成中..."):
             audio = generate_audio_with_openai(original)
@@ -691,6 +714,11 @@ def show_material_quiz(material, material_key):
     quiz_key = f"material_quiz_{material_key}"
     
     if quiz_key not in st.session_state:
+        # 事前生成済みのクイズがあればそのまま使う
+        pregenerated = (material.get('_derived') or {}).get(f"listening_quiz:{material.get('level', 'B1')}")
+        if pregenerated and pregenerated.get('result', {}).get('questions'):
+            st.session_state[quiz_key] = pregenerated['result']['questions']
+            st.rerun()
         if st.button("🤖 クイズを生成", type="primary", key=f"gen_quiz_{material_key}"):
             with st.spinner("クイズを生成中..."):
                 from utils.listening import generate_quiz_from_script
@@ -874,9 +902,14 @@ def show_student_ai_generator():
     prompt = st.text_area("トピック", placeholder="例: 友人との会話", height=80, key="s_ai_prompt")
     level = st.select_slider("レベル", ["A2", "B1", "B2"], value="B1", key="s_ai_level")
 
-    if st.button("🚀 生成", type="primary", disabled=not prompt, key="s_ai_gen"):
+    generate_clicked = st.button("🚀 生成", type="primary", disabled=not prompt, key="s_ai_gen")
+    # ライブラリの素材を再利用せず、新しいバリエーションを生成する
+    fresh_clicked = st.button("🆕 新しく生成", disabled=not prompt, key="s_ai_gen_fresh")
+    if generate_clicked or fresh_clicked:
         with st.spinner("生成中..."):
-            result = generate_listening_from_prompt(prompt, level, "short")
+            result = generate_listening_from_prompt(prompt, level, "short",
+                                                    course_id=get_student_course_id(get_current_user()),
+                                                    fresh=fresh_clicked)
         if result.get("success"):
             st.session_state['s_listening'] = result
             # 音声・ディクテーションのキャッシュをクリア
@@ -888,6 +921,7 @@ def show_student_ai_generator():
     if 's_listening' in st.session_state:
         data = st.session_state['s_listening']
         st.markdown(f"### {data.get('title', '')}")
+        show_library_source(data, 'listening')
 
         # 練習モード選択
         practice_mode = st.radio(
@@ -13,6 +13,7 @@ from utils.reading import (
     EXAM_CONFIGS,
 )
 from utils.materials_loader import load_materials
+from utils.content_library import teacher_course_id, show_library_source, show_library_search
 import time
 import json
 from utils.tts_natural import show_tts_player, stop_audio
@@ -92,9 +93,13 @@ def show_ai_article_generator():
     with col2:
         word_count = st.slider("語数 / Word count", 150, 500, 250)
     
-    if st.button("🚀 記事を生成 / Generate", type="primary", disabled=not prompt):
+    generate_clicked = st.button("🚀 記事を生成 / Generate", type="primary", disabled=not prompt)
+    # ライブラリの記事を再利用せず、新しいバリエーションを生成する
+    fresh_clicked = st.button("🆕 新しく生成 / New Version", disabled=not prompt, key="t_article_fresh")
+    if generate_clicked or fresh_clicked:
         with st.spinner("記事を生成中... / Generating..."):
-            result = generate_article_from_prompt(prompt, level, word_count)
+            result = generate_article_from_prompt(prompt, level, word_count,
+                                                  course_id=teacher_course_id(), fresh=fresh_clicked)
         
         if result.get("success"):
             st.session_state['generated_article'] = result
@@ -102,12 +107,16 @@ def show_ai_article_generator():
         else:
             st.error(f"Error: {result.get('error')}")
     
+    show_library_search('generated_article', 'reading', teacher_course_id())
+    
     if 'generated_article' in st.session_state:
         article = st.session_state['generated_article']
         
         st.markdown("---")
         st.markdown(f"### 📰 {article.get('title', 'Generated Article')}")
         st.caption(f"Level: {article.get('level')} | Category: {article.get('category')} | Words: {article.get('word_count')}")
+        show_difficulty_check(article)
+        show_library_source(article, 'reading')
         
         st.markdown(article.get('text', ''))
         
@@ -134,6 +143,37 @@ def show_ai_article_generator():
             show_questions_preview(st.session_state['generated_questions'])
 
 
+def _student_course_id():
+    """学生の course_id（grades.pyと同じパターンで取得）"""
+    course_id = None
+    # まず selected_class / teacher_classes パターン（学生版）
+    selected_class = st.session_state.get('selected_class', '')
+    classes = st.session_state.get('student_classes', {})
+    if selected_class and selected_class in classes:
+        c = classes[selected_class]
+        course_id = c.get('db_id') or c.get('course_id')
+    # フォールバック: student_registered_classes
+    if not course_id:
+        registered = st.session_state.get('student_registered_classes', [])
+        if registered:
+            first = registered[0]
+            if isinstance(first, dict):
+                # db_id / course_id を優先（class_keyはUUIDではない可能性あり）
+                course_id = first.get('db_id') or first.get('course_id') or first.get('id')
+    return course_id
+
+
+def show_difficulty_check(article):
+    """生成記事のレベル事前チェック結果を表示"""
+    check = article.get('difficulty_check')
+    if not check:
+        return
+    if check.get('ok'):
+        st.caption(f"📏 推定レベル: {check.get('estimated_cefr')}（目標レベルの範囲内）")
+    else:
+        st.warning(f"📏 推定レベル: {check.get('estimated_cefr')} — " + " / ".join(check.get('issues', [])))
+
+
 def show_questions_preview(data):
     """生成された問題をプレビュー"""
     
@@ -640,22 +680,7 @@ def _save_reading_quiz_to_db(questions, score_pct):
         
         student_id = user['id']
         
-        # コースIDを取得（grades.pyと同じパターンで取得）
-        course_id = None
-        # まず selected_class / teacher_classes パターン（学生版）
-        selected_class = st.session_state.get('selected_class', '')
-        classes = st.session_state.get('student_classes', {})
-        if selected_class and selected_class in classes:
-            c = classes[selected_class]
-            course_id = c.get('db_id') or c.get('course_id')
-        # フォールバック: student_registered_classes
-        if not course_id:
-            registered = st.session_state.get('student_registered_classes', [])
-            if registered:
-                first = registered[0]
-                if isinstance(first, dict):
-                    # db_id / course_id を優先（class_keyはUUIDではない可能性あり）
-                    course_id = first.get('db_id') or first.get('course_id') or first.get('id')
+        course_id = _student_course_id()
         
         # 記事情報を取得
         # current_articleはキー文字列なので、materialsから実際のデータを取得
@@ -767,9 +792,13 @@ def show_student_ai_generator():
     with col2:
         word_count = st.slider("語数", 150, 400, 200, key="student_wc")
     
-    if st.button("🚀 生成 / Generate", type="primary", disabled=not prompt):
+    generate_clicked = st.button("🚀 生成 / Generate", type="primary", disabled=not prompt)
+    # ライブラリの記事を再利用せず、新しいバリエーションを生成する
+    fresh_clicked = st.button("🆕 新しく生成 / New Version", disabled=not prompt, key="s_article_fresh")
+    if generate_clicked or fresh_clicked:
         with st.spinner("記事を生成中..."):
-            result = generate_article_from_prompt(prompt, level, word_count)
+            result = generate_article_from_prompt(prompt, level, word_count,
+                                                  course_id=_student_course_id(), fresh=fresh_clicked)
         
         if result.get("success"):
             st.session_state['student_article'] = result
@@ -783,6 +812,8 @@ def show_student_ai_generator():
         st.markdown("---")
         st.markdown(f"### 📰 {article.get('title', '')}")
         st.caption(f"Level: {article.get('level')} | Words: {article.get('word_count')}")
+        show_difficulty_check(article)
+        show_library_source(article, 'reading')
         st.markdown(article.get('text', ''))
         
         # 読み上げ機能
@@ -0,0 +1,79 @@
+"""
+View Registry
+=============
+画面名（session_state.current_view）→ 画面モジュールの対応表。
+
+- モジュールは表示するときに初めて import する（ログイン画面だけなら他の画面は読み込まない）
+- 読み込めない画面は、役割ごとのホーム画面に差し替える（従来の safe_import と同じ挙動）
+- 一度読み込んだ画面は sys.modules に残るので、再実行（rerun）ごとのコストは辞書引きだけ
+
+使い方:
+    from views.registry import resolve_view
+    resolve_view(view, user["role"])()
+"""
+
+import importlib
+from typing import Callable, Dict, Optional, Tuple
+
+
+# 画面名 → (モジュール, 読み込めないときの差し替え先)
+VIEW_MODULES: Dict[str, Tuple[str, Optional[str]]] = {
+    "login": ("views.login", None),
+    "teacher_home": ("views.teacher_home", None),
+    "student_home": ("views.student_home", None),
+    "speaking": ("views.speaking", "student_home"),
+    "speaking_chat": ("views.speaking_chat", "student_home"),
+    "writing": ("views.writing_submit", "student_home"),
+    "vocabulary": ("views.vocabulary", "student_home"),
+    "reading": ("views.reading", "student_home"),
+    "listening": ("views.listening", "student_home"),
+    "course_settings": ("views.course_settings", "teacher_home"),
+    "class_settings": ("views.class_settings", "teacher_home"),
+    "teacher_dashboard": ("views.teacher_dashboard", "teacher_home"),
+    "student_management": ("views.student_management", "teacher_home"),
+    "student_portfolio": ("views.student_portfolio", "student_home"),
+    "assignments": ("views.assignments", "teacher_home"),
+    "grades": ("views.grades", "teacher_home"),
+    "learning_log": ("views.learning_log", "student_home"),
+    "test_prep": ("views.test_prep", "student_home"),
+    "learning_resources": ("views.learning_resources", "student_home"),
+    "material_manager": ("views.material_manager", "teacher_home"),
+}
+
+TEACHER_ONLY_VIEWS = ("teacher_home", "teacher_dashboard", "student_management",
+                      "assignments", "grades", "class_settings", "course_settings")
+
+# 読み込みに失敗した画面（同じプロセスでは再試行しない）
+_unavailable: Dict[str, str] = {}
+
+
+def home_view(role: str) -> str:
+    return "teacher_home" if role == "teacher" else "student_home"
+
+
+def load_view(name: str):
+    """画面モジュールを読み込む（未登録・読み込み失敗なら None）"""
+    entry = VIEW_MODULES.get(name)
+    if entry is None or name in _unavailable:
+        return None
+    try:
+        return importlib.import_module(entry[0])
+    except ImportError as e:
+        _unavailable[name] = str(e)
+        return None
+
+
+def resolve_view(name: str, role: str) -> Callable[[], None]:
+    """表示する画面の show 関数（学生の教員専用画面・未登録・読み込み失敗はホームへ）"""
+    if role == "student" and name in TEACHER_ONLY_VIEWS:
+        name = "student_home"
+    module = load_view(name)
+    if module is None:
+        fallback = (VIEW_MODULES.get(name) or (None, None))[1] or home_view(role)
+        module = load_view(fallback) or load_view(home_view(role))
+    return module.show
+
+
+def get_unavailable_views() -> Dict[str, str]:
+    """読み込めなかった画面と理由（動作確認用）"""
+    return dict(_unavailable)
@@ -2,6 +2,7 @@ import streamlit as st
 from utils.auth import get_current_user, require_auth
 from datetime import datetime
 from utils.loading_tips import loading_with_tips, show_quick_tip
+from utils.background_tasks import start_task, poll_task, is_running
 from utils.database import (
     log_speaking_practice,
     get_speaking_practice_history,
@@ -524,51 +525,62 @@ def show_ai_text_generation(user):
         include_tips = st.checkbox("発音のヒントを含める", value=True)
     
     # 生成ボタン
-    if st.button("🎯 テキストを生成", type="primary", use_container_width=True):
+    if st.button("🎯 テキストを生成", type="primary", use_container_width=True,
+                 disabled=is_running('speaking_ai_text')):
         if not topic:
             st.warning("トピックを入力してください")
         else:
-            with loading_with_tips("テキストを生成中... / Generating text...", context="generating"):
-                generated = generate_reading_text(
-                    topic, difficulty, length, style,
-                    include_vocab, include_tips
+            # 生成は別スレッドで行い、結果は次の再実行で受け取る（生成中も画面を操作できる）
+            st.session_state['speaking_ai_text_request'] = {
+                "topic": topic, "difficulty": difficulty, "style": style,
+            }
+            start_task('speaking_ai_text', 'speaking.generate_reading_text', generate_reading_text,
+                       topic, difficulty, length, style, include_vocab, include_tips)
+    
+    generated = poll_task('speaking_ai_text', "テキストを生成中... / Generating text...")
+    if generated is not None:
+        # 入力欄が変わっていても、生成を依頼したときのトピック・難易度で保存する
+        request = st.session_state.pop('speaking_ai_text_request', {})
+        topic = request.get('topic', topic)
+        difficulty = request.get('difficulty', difficulty)
+        style = request.get('style', style)
+        if generated.get('text'):
+            # --- Supabaseに保存 ---
+            db_text = None
+            try:
+                db_text = save_ai_generated_text(
+                    student_id=user['id'],
+                    title=topic[:30],
+                    text=generated['text'],
+                    level=difficulty,
+                    course_id=_resolve_course_id(),
+                    topic=topic,
+                    style=style,
+                    vocabulary=generated.get('vocabulary', []),
+                    tips=generated.get('tips', ''),
                 )
-                
-                if generated:
-                    # --- Supabaseに保存 ---
-                    db_text = None
-                    try:
-                        db_text = save_ai_generated_text(
-                            student_id=user['id'],
-                            title=topic[:30],
-                            text=generated['text'],
-                            level=difficulty,
-                            course_id=_resolve_course_id(),
-                            topic=topic,
-                            style=style,
-                            vocabulary=generated.get('vocabulary', []),
-                            tips=generated.get('tips', ''),
-                        )
-                    except Exception as e:
-                        st.warning(f"DB保存に失敗: {e}")
-                    
-                    # --- session_stateにもキャッシュ ---
-                    if f'ai_texts_{user_key}' not in st.session_state:
-                        st.session_state[f'ai_texts_{user_key}'] = []
-                    
-                    new_text = {
-                        "id": db_text['id'] if db_text else datetime.now().strftime("%Y%m%d%H%M%S"),
-                        "title": topic[:30],
-                        "text": generated['text'],
-                        "level": difficulty,
-                        "vocabulary": generated.get('vocabulary', []),
-                        "tips": generated.get('tips', ''),
-                        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M")
-                    }
-                    
-                    st.session_state[f'ai_texts_{user_key}'].append(new_text)
-                    st.success("テキストを生成しました！")
-                    st.rerun()
+            except Exception as e:
+                st.warning(f"DB保存に失敗: {e}")
+            
+            # --- session_stateにもキャッシュ ---
+            if f'ai_texts_{user_key}' not in st.session_state:
+                st.session_state[f'ai_texts_{user_key}'] = []
+            
+            new_text = {
+                "id": db_text['id'] if db_text else datetime.now().strftime("%Y%m%d%H%M%S"),
+                "title": topic[:30],
+                "text": generated['text'],
+                "level": difficulty,
+                "vocabulary": generated.get('vocabulary', []),
+                "tips": generated.get('tips', ''),
+                "created_at": datetime.now().strftime("%Y-%m-%d %H:%M")
+            }
+            
+            st.session_state[f'ai_texts_{user_key}'].append(new_text)
+            st.success("テキストを生成しました！")
+            st.rerun()
+        elif not generated.get('cancelled'):
+            st.error(f"テキストの生成に失敗しました: {generated.get('error')}")
     
     # 生成済みテキスト一覧
     st.markdown("---")
@@ -864,26 +876,13 @@ def show_practice_interface(material, user):
 
 def _split_sentences(text):
     """テキストを文単位に分割（空行・改行対応）"""
-    import re
-    # 改行で分割 → さらに ".!?" で分割
-    lines = text.strip().splitlines()
-    sentences = []
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        # ピリオド・感嘆符・疑問符で分割（省略符 ... は保持）
-        parts = re.split(r'(?<=[.!?])\s+', line)
-        for part in parts:
-            part = part.strip()
-            if part:
-                sentences.append(part)
-    return sentences
+    from utils.tts_natural import split_sentences
+    return split_sentences(text)
 
 
 def _show_sentence_by_sentence_practice(material, user):
     """1センテンスずつ練習モード（Speakアプリ風）"""
-    from utils.tts_natural import generate_natural_audio, VOICE_OPTIONS, DEFAULT_VOICE
+    from utils.tts_natural import generate_natural_audio, prefetch_natural_audio, VOICE_OPTIONS, DEFAULT_VOICE
     import base64
 
     sentences = _split_sentences(material['text'])
@@ -936,6 +935,12 @@ def _show_sentence_by_sentence_practice(material, user):
     voice = st.session_state[voice_key_k]
     speed = st.session_state[speed_key_k]
 
+    # 全文の音声と同じ文単位キャッシュを使うので、先に全センテンスを裏で合成しておく
+    prefetch_key = f"sbs_prefetched_{mat_id}"
+    if st.session_state.get(prefetch_key) != (voice, speed):
+        prefetch_natural_audio(sentences, voice, speed)
+        st.session_state[prefetch_key] = (voice, speed)
+
     # ===== 進捗バー =====
     st.markdown(f"**進捗: {idx + 1} / {total} センテンス**")
     st.progress((idx + 1) / total)
@@ -1310,89 +1315,49 @@ def show_speech_practice(user):
 def _evaluate_speech_real(speech_audio, topic="", course_id=None, task_type="monologue", assignment_id=None):
     """スピーチ音声を実APIで評価（Azure Speech + GPT）
     
+    認識とGPT評価はパイプラインで重ねて実行し、途中経過（文字起こし・各スコア）を順に表示する。
+    
     Returns: (scores_dict, recognized_text, feedback_text)
     """
-    import tempfile
-    import os
-    
     scores = {}
     recognized_text = ""
     feedback_text = ""
     
     try:
-        # 音声データをファイルオブジェクトに変換
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
-            if isinstance(speech_audio, bytes):
-                tmp.write(speech_audio)
-            else:
-                tmp.write(speech_audio.read() if hasattr(speech_audio, 'read') else speech_audio)
-            tmp_path = tmp.name
-        
-        # Azure Speech APIで発音評価
-        class AudioFile:
-            def __init__(self, path):
-                self.name = path
-            def read(self):
-                with open(self.name, 'rb') as f:
-                    return f.read()
+        from utils.speech_pipeline import iter_speech_evaluation
         
-        from utils.speech_eval import evaluate_pronunciation
-        result = evaluate_pronunciation(AudioFile(tmp_path), reference_text="")
+        status_box = st.empty()
+        transcript_box = st.empty()
+        pron_box = st.empty()
+        lang_box = st.empty()
         
-        # 一時ファイル削除
-        try:
-            os.unlink(tmp_path)
-        except Exception:
-            pass
+        for event in iter_speech_evaluation(speech_audio, reference_text="", course_id=course_id,
+                                            task_type=task_type, assignment_id=assignment_id):
+            kind = event["type"]
+            if kind == "audio":
+                prefix = "🎬 動画から音声を抽出しました / " if event["is_video"] else ""
+                status_box.caption(f"{prefix}📊 音声長: {event['duration']:.1f}秒 / {event['chunks']}チャンクで分析中...")
+            elif kind == "transcript":
+                transcript_box.caption(
+                    f"📝 認識済み {event['done_chunks']}/{event['total_chunks']}: {event['text']}")
+            elif kind == "pronunciation":
+                s = event["scores"]
+                pron_box.info(f"🗣️ 発音 {s['pronunciation']}点 / 流暢さ {s['fluency']}点")
+            elif kind == "language":
+                s = event["scores"]
+                lang_box.info(f"📚 内容 {s['content']}点 / 語彙 {s['vocabulary']}点 / 文法 {s['grammar']}点")
+            elif kind == "error":
+                # Azure APIエラー時のフォールバック
+                st.warning(f"音声評価でエラーが発生しました: {event['error']}")
+                return None, "", ""
+            elif kind == "done":
+                scores = event["scores"]
+                recognized_text = event["recognized_text"]
+                feedback_text = event["feedback"]
         
-        if result.get("success"):
-            azure_scores = result.get("scores", {})
-            recognized_text = result.get("recognized_text", "")
-            
-            # 発音系スコア
-            scores['pronunciation'] = azure_scores.get('accuracy', 70)
-            scores['fluency'] = azure_scores.get('fluency', 65)
-            
-            # GPT評価（認識テキストがある場合）
-            if recognized_text and len(recognized_text.split()) >= 5:
-                try:
-                    from utils.gpt_eval import evaluate_language_use
-                    gpt_result = evaluate_language_use(recognized_text, context="speaking", course_id=course_id, task_type=task_type, assignment_id=assignment_id)
-                    
-                    if gpt_result.get("success"):
-                        gpt_scores = gpt_result.get("scores", {})
-                        scores['content'] = gpt_scores.get('content', 65)
-                        scores['vocabulary'] = gpt_scores.get('vocabulary', 65)
-                        scores['grammar'] = gpt_scores.get('grammar', 65)
-                        
-                        # GPTフィードバックテキスト
-                        content_analysis = gpt_result.get("content_analysis", {})
-                        if content_analysis:
-                            feedback_parts = []
-                            if content_analysis.get('strengths'):
-                                feedback_parts.append(f"👍 {content_analysis['strengths']}")
-                            if content_analysis.get('suggestions'):
-                                feedback_parts.append(f"💡 {content_analysis['suggestions']}")
-                            feedback_text = "\n\n".join(feedback_parts)
-                    else:
-                        scores['content'] = 65
-                        scores['vocabulary'] = 65
-                        scores['grammar'] = 65
-                except Exception:
-                    scores['content'] = 65
-                    scores['vocabulary'] = 65
-                    scores['grammar'] = 65
-            else:
-                # 認識テキストが短すぎる場合
-                scores['content'] = 50
-                scores['vocabulary'] = 50
-                scores['grammar'] = 50
-                feedback_text = "音声が短すぎるか、認識できませんでした。もう少し長く話してみてください。"
-        else:
-            # Azure APIエラー時のフォールバック
-            error_msg = result.get("error", "Unknown error")
-            st.warning(f"音声評価でエラーが発生しました: {error_msg}")
-            return None, "", ""
+        # 途中経過は最終結果の表示に置き換える
+        for box in (status_box, transcript_box, pron_box, lang_box):
+            box.empty()
     
     except Exception as e:
         st.warning(f"評価処理でエラーが発生しました: {e}")
@@ -1561,58 +1526,25 @@ def show_assignment_submission(user):
                 st.warning("⚠️ テキストを入力してから提出してください")
             else:
                 if st.button("📤 提出して評価 / Submit & Evaluate", type="primary"):
-                    with loading_with_tips("提出中... / Submitting & evaluating...", context="evaluation"):
-                        # Azure Speech APIで実評価
-                        from utils.speech_eval import evaluate_pronunciation
-                        eval_result = evaluate_pronunciation(uploaded, reference_text=target_text or "")
-                        
-                        if eval_result.get("success"):
-                            azure_scores = eval_result.get("scores", {})
-                            score = azure_scores.get("overall", 70)
-                            pronunciation = azure_scores.get("accuracy", 70)
-                            fluency = azure_scores.get("fluency", 65)
-                            recognized_text = eval_result.get("recognized_text", "")
-                        else:
-                            st.warning(f"音声評価エラー: {eval_result.get('error', 'Unknown')}")
-                            score = 0
-                            pronunciation = 0
-                            fluency = 0
-                            recognized_text = ""
-                        
-                        # --- Supabaseに保存 ---
-                        try:
-                            create_speaking_submission(
-                                student_id=user['id'],
-                                assignment_id=selected['id'],
-                                score=score,
-                                pronunciation=pronunciation,
-                                fluency=fluency,
-                                student_text=target_text,
-                                recognized_text=recognized_text,
-                            )
-                        except Exception as e:
-                            st.warning(f"DB保存エラー: {e}")
-                        
-                        st.success("✅ 提出完了！ / Submitted successfully!")
-                        
-                        if recognized_text:
-                            with st.expander("📝 認識されたテキスト"):
-                                st.markdown(recognized_text)
-                        
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            st.metric("総合スコア", f"{score}点")
-                        with col2:
-                            st.metric("発音", f"{pronunciation}点")
-                        with col3:
-                            st.metric("流暢さ", f"{fluency}点")
-                        
-                        if score >= 85:
-                            st.success("Excellent work! Your pronunciation is very clear. 素晴らしい出来です！")
-                        elif score >= 70:
-                            st.info("Good job! Keep practicing for smoother delivery. もう少しスムーズに読めるように練習しましょう。")
-                        else:
-                            st.warning("Listen to the model audio and try again. お手本の音声を聞いてもう一度挑戦！")
+                    # 評価は評価ワーカーが行う（ここでは保存してキューに積むだけ）
+                    from utils.speaking_jobs import submit_speaking_for_evaluation
+                    with loading_with_tips("提出中... / Submitting...", context="evaluation"):
+                        submit_result = submit_speaking_for_evaluation(
+                            student_id=user['id'],
+                            assignment_id=selected['id'],
+                            audio_source=uploaded,
+                            reference_text=target_text or "",
+                            course_id=course_id,
+                            task_type="read_aloud" if "音読" in type_label else "monologue",
+                        )
+                    
+                    if submit_result.get("success"):
+                        st.success("✅ 提出完了！評価が終わると下に結果が表示されます。 / Submitted! Your evaluation is in the queue.")
+                    else:
+                        st.warning(f"提出エラー: {submit_result.get('error', 'Unknown')}")
+        
+        from utils.speaking_jobs import show_submission_status
+        show_submission_status(user['id'], selected['id'], key_prefix="assign_status")
 
 
 def show_practice_history(user):
@@ -1770,7 +1702,7 @@ def show_submission_review():
                     
                     if st.button("💾 保存", key=f"save_{sub['id']}"):
                         try:
-                            update_submission_feedback(sub['id'], feedback=new_fb)
+                            update_submission_feedback(sub['id'], feedback=new_fb, by_teacher=True)
                             st.success("フィードバックを保存しました！")
                         except Exception as e:
                             st.error(f"保存に失敗: {e}")
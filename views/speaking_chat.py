@@ -289,18 +289,17 @@ def _process_whisper_audio(audio_file, situation_key, level):
                 tmp_path = tmp.name
             
             try:
-                from openai import OpenAI
-                client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+                from utils.openai_gateway import transcribe_audio
                 
                 with open(tmp_path, 'rb') as f:
-                    transcript = client.audio.transcriptions.create(
+                    transcript = transcribe_audio(
+                        "speaking_chat.whisper",
+                        f,
                         model="whisper-1",
-                        file=f,
                         language="en",
-                        response_format="text"
                     )
                 
-                text = transcript.strip() if isinstance(transcript, str) else transcript.text.strip()
+                text = transcript.strip()
             finally:
                 os.unlink(tmp_path)
             
@@ -190,7 +190,34 @@ def show_student_view():
             
             if can_submit:
                 if st.button("📤 提出して評価", type="primary"):
-                    evaluate_and_show_results(uploaded_file, target_text)
+                    if is_demo:
+                        evaluate_and_show_results(uploaded_file, target_text)
+                    else:
+                        queue_submission(user, selected, uploaded_file, target_text)
+        
+        if not is_demo:
+            from utils.speaking_jobs import show_submission_status
+            show_submission_status(user['id'], selected['id'], key_prefix="submit_status")
+
+
+def queue_submission(user, selected, uploaded_file, target_text):
+    """提出を保存して評価キューに積む（評価は評価ワーカーが行う）"""
+    from utils.speaking_jobs import submit_speaking_for_evaluation
+    
+    with st.spinner("📤 提出中..."):
+        result = submit_speaking_for_evaluation(
+            student_id=user['id'],
+            assignment_id=selected['id'],
+            audio_source=uploaded_file,
+            reference_text=target_text or "",
+            course_id=selected.get('course_id'),
+            task_type="read_aloud" if selected['type'] == 'teacher_text' else "monologue",
+        )
+    
+    if result.get("success"):
+        st.success("✅ 提出完了！評価が終わると下に結果が表示されます（ページを閉じても評価は続きます）")
+    else:
+        st.error(f"提出エラー: {result.get('error', '不明なエラー')}")
 
 
 def evaluate_and_show_results(uploaded_file, target_text):
@@ -359,6 +386,7 @@ def _load_speaking_assignments(user):
                     'text': a.get('target_text', '') or a.get('description', '') or '',
                     'instructions': a.get('instructions', '') or a.get('description', ''),
                     'require_text': a.get('require_text_submission', True),
+                    'course_id': course_id,
                 })
         
         return speaking
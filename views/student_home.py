@@ -279,7 +279,10 @@ def show_learning_summary():
 
         avg_score = sum(all_scores) / len(all_scores) if all_scores else 0
         streak = gdata.get('current_streak', 0)
-        cefr = estimate_cefr(avg_score) if all_scores else '-'
+        from utils.level_estimator import get_level
+        cefr = get_level((st.session_state.get('user') or {}).get('id'))
+        if not cefr:
+            cefr = estimate_cefr(avg_score) if all_scores else '-'
 
         col1, col2, col3, col4 = st.columns(4)
         with col1:
@@ -184,6 +184,18 @@ def _load_class_students_batch(course_id: str) -> list:
             else:
                 info['days_since_active'] = 99
 
+        # 6. 推定CEFRレベル（技能別の状態を1クエリで）
+        try:
+            from utils.level_estimator import get_course_levels, OVERALL, MIN_CONFIDENT_COUNT
+            levels = get_course_levels(course_id, student_ids)
+            for sid, info in student_map.items():
+                overall = levels.get(sid, {}).get(OVERALL)
+                info['cefr_level'] = overall['level'] if overall else None
+                info['cefr_provisional'] = bool(overall) and (overall.get('count') or 0) < MIN_CONFIDENT_COUNT
+                info['skill_levels'] = {k: v['level'] for k, v in levels.get(sid, {}).items() if k != OVERALL}
+        except Exception:
+            pass
+
         return list(student_map.values())
 
     except Exception as e:
@@ -417,7 +429,10 @@ def show_student_list(students):
                 st.markdown(f"⚠️ **{s['name']}**")
             else:
                 st.markdown(f"**{s['name']}**")
-            st.caption(s.get('student_id', ''))
+            caption = s.get('student_id', '')
+            if s.get('cefr_level'):
+                caption += f" | CEFR {s['cefr_level']}" + ("（暫定）" if s.get('cefr_provisional') else "")
+            st.caption(caption)
         with col2:
             score = s.get('avg_score', 0)
             color = "🟢" if score >= 70 else "🟡" if score >= 50 else "🔴"
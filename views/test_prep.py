@@ -1,5 +1,7 @@
 import streamlit as st
 from utils.auth import get_current_user, require_auth
+from utils.content_library import teacher_course_id
+from utils.background_tasks import start_task, poll_task, is_running
 from datetime import datetime, timedelta
 import random
 import json
@@ -308,7 +310,7 @@ def show():
     with tab2:
         show_ai_practice_tab(test_info, user_data, user_key)
     with tab3:
-        show_mock_test_tab(test_info, user_data)
+        show_mock_test_tab(test_info, user_data, user_key)
     with tab4:
         show_score_progress_tab(test_info, user_data)
     with tab5:
@@ -368,10 +370,8 @@ def show_class_exam_status():
         try:
             from utils.database import get_course_students
             enrolled = get_course_students(course_id)
-            # TODO: test_prep用のデータ（目標スコア、予測スコア等）を
-            #       専用テーブルまたはstudent_profilesから取得する
-            # 現在は登録学生の名前だけ表示
-            students = [{'name': s.get('name', ''), 'student_id': s.get('student_id', '')} for s in enrolled]
+            # 予測スコアは utils.score_prediction でコース全員分をまとめて計算
+            students = [{'name': s.get('name', ''), 'student_id': s.get('id') or s.get('student_id', '')} for s in enrolled]
         except Exception:
             pass
     
@@ -379,26 +379,35 @@ def show_class_exam_status():
         st.info("受験予定者を登録してください。学生がクラスに登録すると一覧に表示されます。")
         return
     
+    from utils.score_prediction import get_course_predictions, DEFAULT_HORIZON_DAYS
+    predictions = get_course_predictions(course_id)
+    
     cols = st.columns([2, 1, 1, 1])
     with cols[0]:
         st.markdown("**学生**")
     with cols[1]:
-        st.markdown("**目標**")
-    with cols[2]:
         st.markdown("**練習数**")
+    with cols[2]:
+        st.markdown(f"**予測（{DEFAULT_HORIZON_DAYS}日後）**")
     with cols[3]:
-        st.markdown("**ステータス**")
+        st.markdown("**伸び**")
     
     for s in students:
+        p = predictions.get(s['student_id'])
         cols = st.columns([2, 1, 1, 1])
         with cols[0]:
             st.markdown(f"📝 {s['name']}")
         with cols[1]:
-            st.caption("未設定")
+            st.caption(str(p['n_logs']) if p else "-")
         with cols[2]:
-            st.caption("-")
+            if p:
+                itp = p['exams']['toefl_itp']
+                st.caption(f"{itp['score']}（{itp['lo']}〜{itp['hi']}）")
+            else:
+                st.caption("練習記録なし")
         with cols[3]:
-            st.caption("登録済")
+            trend = p['trend_per_week'] if p else None
+            st.caption(f"{trend:+.1f}点/週" if trend is not None else "-")
 
 
 def show_teacher_ai_generation():
@@ -467,25 +476,29 @@ def show_teacher_ai_generation():
             key="teacher_topic"
         )
     
-    if st.button("🤖 問題を生成", type="primary", key="teacher_generate"):
-        with st.spinner(f"{num_questions}問を生成中..."):
-            generated = generate_questions_batch(
-                test_type, section, selected_q_type, difficulty, num_questions
-            )
-            
-            if generated:
-                # 問題バンクに追加
-                bank_key = f"{test_type}_{section}"
-                if bank_key not in st.session_state.question_bank:
-                    st.session_state.question_bank[bank_key] = []
-                
-                for q in generated:
-                    q['id'] = f"q_{datetime.now().timestamp()}_{random.randint(1000,9999)}"
-                    q['created_at'] = datetime.now().strftime("%Y-%m-%d %H:%M")
-                    q['status'] = 'pending'  # pending, approved, rejected
-                    st.session_state.question_bank[bank_key].append(q)
-                
-                st.success(f"✅ {len(generated)}問を生成しました！問題バンクで確認・承認してください。")
+    if st.button("🤖 問題を生成", type="primary", key="teacher_generate",
+                 disabled=is_running('teacher_generate')):
+        st.session_state['teacher_generate_bank_key'] = f"{test_type}_{section}"
+        start_task('teacher_generate', 'test_prep.generate_questions_batch', generate_questions_batch,
+                   test_type, section, selected_q_type, difficulty, num_questions)
+    
+    generated = poll_task('teacher_generate', f"{num_questions}問を生成中...")
+    if isinstance(generated, dict):
+        if not generated.get("cancelled"):
+            st.error(f"問題の生成に失敗しました: {generated.get('error')}")
+    elif generated:
+        # 問題バンクに追加（生成を依頼したときの試験・セクションへ）
+        bank_key = st.session_state.pop('teacher_generate_bank_key', f"{test_type}_{section}")
+        if bank_key not in st.session_state.question_bank:
+            st.session_state.question_bank[bank_key] = []
+        
+        for q in generated:
+            q['id'] = f"q_{datetime.now().timestamp()}_{random.randint(1000,9999)}"
+            q['created_at'] = datetime.now().strftime("%Y-%m-%d %H:%M")
+            q['status'] = 'pending'  # pending, approved, rejected
+            st.session_state.question_bank[bank_key].append(q)
+        
+        st.success(f"✅ {len(generated)}問を生成しました！問題バンクで確認・承認してください。")
     
     # 最近生成した問題のプレビュー
     bank_key = f"{test_type}_{section}"
@@ -568,14 +581,20 @@ def show_question_bank_management():
         with col3:
             with st.popover("操作"):
                 if st.button("✅ 承認", key=f"approve_{q['id']}"):
-                    q['status'] = 'approved'
-                    st.rerun()
+                    if not teacher_course_id():
+                        st.warning("承認した問題はクラスの学生に出題されます。先にクラスを選択してください")
+                    else:
+                        q['status'] = 'approved'
+                        _save_bank_question(q, 'approved')
+                        st.rerun()
                 if st.button("❌ 却下", key=f"reject_{q['id']}"):
                     q['status'] = 'rejected'
+                    _save_bank_question(q, 'rejected')
                     st.rerun()
                 if st.button("✏️ 編集", key=f"edit_{q['id']}"):
                     st.session_state['editing_question'] = q
                 if st.button("🗑️ 削除", key=f"delete_{q['id']}"):
+                    _save_bank_question(q, 'rejected')
                     bank_key = q['bank_key']
                     st.session_state.question_bank[bank_key] = [
                         x for x in st.session_state.question_bank[bank_key] if x['id'] != q['id']
@@ -583,6 +602,29 @@ def show_question_bank_management():
                     st.rerun()
 
 
+def _save_bank_question(q, status):
+    """承認・却下をDBに反映（承認済みの問題は選択中のクラスの学生の問題バンクに入る）"""
+    try:
+        from utils.database import save_test_question_item
+        from utils.test_question_bank import question_id, difficulty_key
+        test_type, _, section = q['bank_key'].rpartition('_')
+        payload = {k: v for k, v in q.items()
+                   if k not in ('id', 'bank_key', 'bank_id', 'status', 'created_at')}
+        save_test_question_item(
+            item_id=q.get('bank_id') or question_id(q),
+            test_type=test_type,
+            section=section,
+            payload=payload,
+            sub_type=q.get('q_type') or 'general',
+            difficulty=difficulty_key(q.get('difficulty', 'medium')),
+            status=status,
+            course_id=teacher_course_id(),
+            created_by=(get_current_user() or {}).get('id'),
+        )
+    except Exception:
+        pass
+
+
 def show_teacher_settings():
     """教員設定"""
     
@@ -730,7 +772,8 @@ def show_ai_practice_tab(test_info, user_data, user_key):
         
         # 問題を生成
         with st.spinner("問題を生成中..."):
-            questions = get_practice_questions(test_type, section, selected_q_type, difficulty, num_questions)
+            questions = get_practice_questions(test_type, section, selected_q_type, difficulty, num_questions,
+                                               user_key, _student_course_id(get_current_user() or {}))
             st.session_state['current_practice']['questions'] = questions
         
         st.rerun()
@@ -769,47 +812,58 @@ def show_ai_practice_tab(test_info, user_data, user_key):
         st.info("まだ練習履歴がありません")
 
 
-def get_practice_questions(test_type, section, q_type, difficulty, num):
-    """練習問題を取得（問題バンクまたはAI生成）"""
+def get_practice_questions(test_type, section, q_type, difficulty, num, user_key=None, course_id=None):
+    """練習問題を num 問取得（組み込み + コースの承認済み問題から重複なしで、既出の問題はなるべく避ける）
+
+    バンクの問題が足りない分は生成した問題で補う。
+    """
+    from utils.test_question_bank import get_question_bank
     
-    bank_key = f"{test_type}_{section}"
-    bank = st.session_state.question_bank.get(bank_key, [])
+    seen = _seen_question_ids(user_key)
+    bank = get_question_bank(st.session_state.get('question_bank'), course_id)
+    questions = bank.sample(test_type, section, num, difficulty, q_type, exclude=seen)
     
-    # 承認済みの問題から取得
-    approved = [q for q in bank if q.get('status') == 'approved']
+    # バンクの候補を使い切っても足りない分（デモモード）
+    questions += [_generate_question(test_type, section, q_type, difficulty)
+                  for _ in range(num - len(questions))]
     
-    if len(approved) >= num:
-        # 問題バンクから出題
-        return random.sample(approved, num)
-    else:
-        # 不足分をAI生成（デモモード）
-        generated = generate_questions_batch(test_type, section, q_type, difficulty, num)
-        return generated
+    seen.update(q['bank_id'] for q in questions if q.get('bank_id'))
+    return questions
+
+
+def _seen_question_ids(user_key):
+    """このセッションで出題済みの問題ID（ユーザーごと）"""
+    seen_by_user = st.session_state.setdefault('test_prep_seen', {})
+    return seen_by_user.setdefault(user_key or 'default', set())
 
 
 def generate_questions_batch(test_type, section, q_type, difficulty, num):
-    """問題を一括生成（デモモード）"""
-    
-    questions = []
-    
-    # デモ用問題を生成
-    for i in range(num):
-        if section == "listening":
-            q = generate_listening_question(test_type, q_type, difficulty)
-        elif section == "structure":
-            q = generate_structure_question(test_type, q_type, difficulty)
-        elif section == "reading":
-            q = generate_reading_question(test_type, q_type, difficulty)
-        else:
-            q = generate_general_question(test_type, section, difficulty)
-        
-        q['id'] = f"gen_{i}_{random.randint(1000, 9999)}"
+    """問題を num 問一括生成（デモモード: 組み込みの問題バンクから重複なしで選び、足りない分は生成）"""
+    from utils.test_question_bank import get_builtin_bank
+    
+    questions = get_builtin_bank().sample(test_type, section, num, difficulty, q_type)
+    questions += [_generate_question(test_type, section, q_type, difficulty)
+                  for _ in range(num - len(questions))]
+    
+    for i, q in enumerate(questions):
+        q['id'] = q.get('bank_id') or f"gen_{i}_{random.randint(1000, 9999)}"
         q['difficulty'] = difficulty
-        questions.append(q)
+        q['q_type'] = q_type
     
     return questions
 
 
+def _generate_question(test_type, section, q_type, difficulty):
+    """セクションに応じた問題を1問生成"""
+    if section == "listening":
+        return generate_listening_question(test_type, q_type, difficulty)
+    if section == "structure":
+        return generate_structure_question(test_type, q_type, difficulty)
+    if section == "reading":
+        return generate_reading_question(test_type, q_type, difficulty)
+    return generate_general_question(test_type, section, difficulty)
+
+
 def generate_listening_question(test_type, q_type, difficulty):
     """リスニング練習問題生成（問題バンクから取得）"""
     try:
@@ -927,46 +981,7 @@ def show_practice_session(practice, user_key):
         audio_col1, audio_col2 = st.columns([3, 1])
         with audio_col1:
             if st.button("🔊 音声を再生 / Play Audio", key=f"play_dialogue_{current_idx}", type="primary", use_container_width=True):
-                with st.spinner("音声を生成中..."):
-                    try:
-                        from utils.tts_natural import generate_natural_audio
-                        
-                        # 話者を分けて自然に再生
-                        lines = dialogue_text.strip().split("\n")
-                        combined_audio = b""
-                        
-                        for line in lines:
-                            line = line.strip()
-                            if not line:
-                                continue
-                            
-                            # 話者判定
-                            if line.startswith("W:") or line.startswith("Woman:"):
-                                voice = "アメリカ英語 (女性)"
-                                speak_text = line.split(":", 1)[1].strip()
-                            elif line.startswith("M:") or line.startswith("Man:"):
-                                voice = "アメリカ英語 (男性)"
-                                speak_text = line.split(":", 1)[1].strip()
-                            else:
-                                voice = "アメリカ英語 (女性)"
-                                speak_text = line
-                            
-                            audio_part = generate_natural_audio(speak_text, voice, 0.9)
-                            if audio_part:
-                                combined_audio += audio_part
-                        
-                        if combined_audio:
-                            import base64
-                            b64 = base64.b64encode(combined_audio).decode()
-                            st.markdown(f"""
-                            <audio controls autoplay style="width:100%">
-                                <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
-                            </audio>
-                            """, unsafe_allow_html=True)
-                        else:
-                            st.warning("音声生成に失敗しました。テキストで確認してください。")
-                    except Exception as e:
-                        st.warning(f"音声再生エラー: {e}。テキストで確認してください。")
+                _play_dialogue_audio(dialogue_text)
         
         with audio_col2:
             speed_opt = st.selectbox("速度", [0.75, 0.85, 1.0], index=2, format_func=lambda x: f"{x}x", key=f"speed_dialogue_{current_idx}")
@@ -1039,6 +1054,50 @@ def show_practice_session(practice, user_key):
         st.rerun()
 
 
+def _play_dialogue_audio(dialogue_text):
+    """ダイアログを話者ごとの声で読み上げて再生"""
+    with st.spinner("音声を生成中..."):
+        try:
+            from utils.tts_natural import generate_natural_audio
+            
+            # 話者を分けて自然に再生
+            lines = dialogue_text.strip().split("\n")
+            combined_audio = b""
+            
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                
+                # 話者判定
+                if line.startswith("W:") or line.startswith("Woman:"):
+                    voice = "アメリカ英語 (女性)"
+                    speak_text = line.split(":", 1)[1].strip()
+                elif line.startswith("M:") or line.startswith("Man:"):
+                    voice = "アメリカ英語 (男性)"
+                    speak_text = line.split(":", 1)[1].strip()
+                else:
+                    voice = "アメリカ英語 (女性)"
+                    speak_text = line
+                
+                audio_part = generate_natural_audio(speak_text, voice, 0.9)
+                if audio_part:
+                    combined_audio += audio_part
+            
+            if combined_audio:
+                import base64
+                b64 = base64.b64encode(combined_audio).decode()
+                st.markdown(f"""
+                <audio controls autoplay style="width:100%">
+                    <source src="data:audio/mp3;base64,{b64}" type="audio/mp3">
+                </audio>
+                """, unsafe_allow_html=True)
+            else:
+                st.warning("音声生成に失敗しました。テキストで確認してください。")
+        except Exception as e:
+            st.warning(f"音声再生エラー: {e}。テキストで確認してください。")
+
+
 def show_practice_results(practice, user_key):
     """練習結果表示"""
     
@@ -1089,13 +1148,19 @@ def show_practice_results(practice, user_key):
     if 'practice_history' not in user_data:
         user_data['practice_history'] = []
     
-    user_data['practice_history'].insert(0, {
-        'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
-        'section': practice['section'],
-        'score': score,
-        'time': elapsed,
-        'num_questions': len(questions)
-    })
+    if not practice.get('logged'):
+        practice['logged'] = True
+        user_data['practice_history'].insert(0, {
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
+            'section': practice['section'],
+            'score': score,
+            'time': elapsed,
+            'num_questions': len(questions)
+        })
+        _log_exam_practice(practice['test_type'], practice['section'], score,
+                           total_questions=len(questions), correct_count=correct_count,
+                           duration_seconds=int((datetime.now() - practice['started_at']).total_seconds()),
+                           level=practice.get('difficulty'))
     
     st.markdown("---")
     
@@ -1113,190 +1178,209 @@ def show_practice_results(practice, user_key):
             st.rerun()
 
 
-def show_mock_test_tab(test_info, user_data):
-    """模擬テストタブ"""
+def _log_exam_practice(exam_type, section, score, **kwargs):
+    """練習結果を exam_practice_logs に記録（スコア予測の入力）"""
+    user = get_current_user() or {}
+    if not user.get('id'):
+        return
+    course_id = _student_course_id(user)
+    try:
+        from utils.database import log_exam_practice
+        from utils.score_prediction import invalidate_predictions
+        log_exam_practice(user['id'], exam_type, section, score, course_id=course_id, **kwargs)
+        invalidate_predictions(course_id, user['id'])
+    except Exception as e:
+        print(f"[test_prep] log_exam_practice error: {e}")
+
+
+def show_mock_test_tab(test_info, user_data, user_key=None):
+    """模擬テストタブ（問題バンクからの適応型・セクション時間制）"""
     
     st.markdown("### 📝 模擬テスト")
     
-    import random
-    
-    test_key = test_info.get('key', 'test')
-    mock_state_key = f'mock_test_{test_key}'
+    from utils.mock_test import build_section_plan, MockTestSession
+    from utils.test_question_bank import get_question_bank
     
-    if mock_state_key not in st.session_state:
-        st.session_state[mock_state_key] = {
-            'started': False,
-            'current_q': 0,
-            'answers': {},
-            'submitted': False,
-            'score': 0,
-        }
-    
-    mock = st.session_state[mock_state_key]
-    
-    # 模擬テスト問題（テスト別）
-    sections_raw = test_info.get('sections', [{'name': 'Listening'}, {'name': 'Reading'}, {'name': 'Grammar'}])
-    # sectionsがdictのリストの場合、名前を抽出
-    if sections_raw and isinstance(sections_raw[0], dict):
-        sections = [s.get('name', s.get('key', 'Section')) for s in sections_raw]
-    else:
-        sections = sections_raw
-    
-    mock_questions = []
-    for section in sections:
-        for i in range(5):
-            q_num = len(mock_questions) + 1
-            mock_questions.append({
-                'id': q_num,
-                'section': section,
-                'question': f"[{section}] Question {i+1}: Choose the best answer to complete the sentence.",
-                'sentence': [
-                    "The project was _____ successful than we expected.",
-                    "She has been working here _____ five years.",
-                    "If I _____ more time, I would travel the world.",
-                    "The report _____ by the committee last week.",
-                    "He suggested that she _____ the meeting early.",
-                ][i % 5],
-                'options': [
-                    ["A) more", "B) most", "C) much", "D) many"],
-                    ["A) since", "B) for", "C) during", "D) while"],
-                    ["A) have", "B) had", "C) having", "D) has"],
-                    ["A) was reviewed", "B) reviewed", "C) is reviewing", "D) reviews"],
-                    ["A) attends", "B) attend", "C) attending", "D) attended"],
-                ][i % 5],
-                'correct': [0, 1, 1, 0, 1][i % 5],
-            })
-    
-    total_q = len(mock_questions)
-    time_limit = total_q * 1  # 1分/問
-    
-    if not mock['started'] and not mock['submitted']:
+    test_type = user_data['selected_test']
+    mock_state_key = f'mock_test_{test_type}'
+    user = get_current_user() or {}
+    course_id = _student_course_id(user)
+    bank = get_question_bank(st.session_state.get('question_bank'), course_id)
+    
+    session = st.session_state.get(mock_state_key)
+    
+    if session is None:
+        length = st.radio(
+            "形式",
+            ["short", "full"],
+            format_func=lambda x: "ミニ模試（各セクション10問）" if x == "short" else "フルレングス（本番の問題数）",
+            horizontal=True,
+            key=f"mock_length_{test_type}",
+        )
+        plan = build_section_plan(test_type, test_info, bank, length)
+        if not plan:
+            st.info("この試験の模擬テスト用の問題がまだありません")
+            return
+        
+        total_q = sum(s['n_items'] for s in plan)
+        total_min = sum(s['time_limit_sec'] for s in plan) // 60
+        section_lines = "\n".join(
+            f"- {s['name']}: {s['n_items']}問 / {s['time_limit_sec'] // 60}分" for s in plan
+        )
         st.markdown(f"""
-        **テスト情報:**
-        - 問題数: {total_q}問
-        - セクション: {', '.join(sections)}
-        - 目安時間: {time_limit}分
-        """)
+**テスト情報:**
+- 問題数: {total_q}問（目安 {total_min}分）
+{section_lines}
+""")
+        st.caption("回答に合わせて次の問題の難易度が変わります。各セクションは制限時間を過ぎると終了します。")
         
         if st.button("🚀 模擬テスト開始", type="primary"):
-            mock['started'] = True
-            mock['current_q'] = 0
-            mock['answers'] = {}
-            mock['submitted'] = False
+            item_stats = {}
+            try:
+                from utils.database import get_item_stats
+                item_stats = get_item_stats(course_id)
+            except Exception:
+                pass
+            st.session_state[mock_state_key] = MockTestSession(
+                test_type, plan, bank, item_stats, exclude=_seen_question_ids(user_key)
+            )
             st.rerun()
         return
     
-    if mock['started'] and not mock['submitted']:
-        # 進捗
-        answered = len(mock['answers'])
-        st.progress(answered / total_q)
-        st.caption(f"回答済み: {answered}/{total_q}")
+    question = session.current_question()
+    
+    if question is not None:
+        section = session.section
+        done = len(session.section_responses(section['key']))
+        time_left = max(0, int(session.time_left()))
         
-        # 問題表示
-        idx = mock['current_q']
-        q = mock_questions[idx]
+        st.markdown(f"#### {section['name']}")
+        st.progress(done / section['n_items'])
+        col1, col2 = st.columns(2)
+        with col1:
+            st.caption(f"問題 {done + 1} / {section['n_items']}（セクション {session.section_index + 1} / {len(session.plan)}）")
+        with col2:
+            st.caption(f"⏱ 残り {time_left // 60}:{time_left % 60:02d}")
         
-        st.markdown(f"#### 問題 {q['id']} / {total_q}  [{q['section']}]")
-        st.markdown(f"**{q['sentence']}**")
+        if 'passage' in question:
+            with st.expander("📖 パッセージを読む", expanded=True):
+                st.markdown(question['passage'])
+        if 'dialogue' in question:
+            if st.button("🔊 音声を再生 / Play Audio", key=f"mock_play_{question['bank_id']}"):
+                _play_dialogue_audio(question['dialogue'])
+            with st.expander("📝 スクリプトを見る（※実際の試験では見られません）"):
+                st.markdown(question['dialogue'].replace("\n", "  \n"))
+        if 'sentence' in question:
+            st.markdown(f"**{question['sentence']}**")
+        st.markdown(f"**{question.get('question', 'Choose the correct answer:')}**")
         
         selected = st.radio(
             "回答を選択",
-            q['options'],
-            key=f"mock_q_{q['id']}",
-            index=mock['answers'].get(q['id'], None)
+            question['choices'],
+            key=f"mock_q_{session.attempt_id}_{question['bank_id']}",
+            index=None,
         )
         
-        # 回答保存
-        if selected:
-            mock['answers'][q['id']] = q['options'].index(selected)
-        
-        # ナビゲーション
-        col1, col2, col3 = st.columns(3)
+        col1, col2 = st.columns(2)
         with col1:
-            if idx > 0:
-                if st.button("← 前の問題"):
-                    mock['current_q'] = idx - 1
-                    st.rerun()
+            if st.button("回答して次へ →", type="primary", disabled=selected is None):
+                if session.answer(selected[0]) is None:
+                    st.warning("制限時間を過ぎたため、このセクションは終了しました")
+                st.rerun()
         with col2:
-            if idx < total_q - 1:
-                if st.button("次の問題 →"):
-                    mock['current_q'] = idx + 1
-                    st.rerun()
-        with col3:
-            if len(mock['answers']) == total_q:
-                if st.button("📤 提出する", type="primary"):
-                    # 採点
-                    score = 0
-                    for mq in mock_questions:
-                        if mock['answers'].get(mq['id']) == mq['correct']:
-                            score += 1
-                    mock['score'] = score
-                    mock['submitted'] = True
-                    st.rerun()
-        
-        # 問題ジャンプ
-        with st.expander("📋 問題一覧"):
-            cols = st.columns(10)
-            for i, mq in enumerate(mock_questions):
-                with cols[i % 10]:
-                    answered_mark = "✅" if mq['id'] in mock['answers'] else "⬜"
-                    if st.button(f"{answered_mark}{mq['id']}", key=f"jump_{mq['id']}"):
-                        mock['current_q'] = i
-                        st.rerun()
+            if st.button("⏭ このセクションを終了"):
+                session.end_section()
+                st.rerun()
         return
     
-    if mock['submitted']:
-        # 結果表示
-        score = mock['score']
-        pct = (score / total_q * 100) if total_q > 0 else 0
-        
-        st.markdown("### 🎯 模擬テスト結果")
-        
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric("正解数", f"{score}/{total_q}")
-        with col2:
-            st.metric("正答率", f"{pct:.0f}%")
-        with col3:
-            if pct >= 80:
-                st.metric("評価", "A 🎉")
-            elif pct >= 60:
-                st.metric("評価", "B 👍")
-            else:
-                st.metric("評価", "C 💪")
-        
-        # セクション別結果
-        st.markdown("#### セクション別:")
-        for section in sections:
-            section_qs = [q for q in mock_questions if q['section'] == section]
-            section_correct = sum(1 for q in section_qs if mock['answers'].get(q['id']) == q['correct'])
-            section_pct = (section_correct / len(section_qs) * 100) if section_qs else 0
-            st.markdown(f"- **{section}**: {section_correct}/{len(section_qs)} ({section_pct:.0f}%)")
-        
-        # 正誤一覧
-        with st.expander("📋 正誤一覧"):
-            for q in mock_questions:
-                user_ans = mock['answers'].get(q['id'])
-                correct = q['correct']
-                is_correct = user_ans == correct
-                
-                mark = "✅" if is_correct else "❌"
-                st.markdown(f"{mark} **Q{q['id']}** [{q['section']}] {q['sentence']}")
-                if not is_correct:
-                    st.caption(f"  あなたの回答: {q['options'][user_ans] if user_ans is not None else '未回答'} → 正解: {q['options'][correct]}")
-        
-        # XP
+    # 結果表示
+    result = session.results()
+    
+    if not user_data.get('_mock_saved', {}).get(session.attempt_id):
+        _seen_question_ids(user_key).update(r['item_id'] for r in session.responses)
+        user_data.setdefault('mock_test_results', []).insert(0, {
+            'date': datetime.now().strftime("%Y-%m-%d %H:%M"),
+            'test_type': test_type,
+            'score': result['percent'],
+            'ability': result['ability'],
+            'sections': {s['key']: s['percent'] for s in result['sections']},
+        })
+        if user.get('id') and session.responses:
+            from utils.mock_test import save_mock_test
+            saved = save_mock_test(session, user['id'], course_id)
+            if not saved.get('success'):
+                st.caption(f"⚠️ 結果の保存に失敗しました: {saved.get('error')}")
+        if session.responses:
+            _log_exam_practice(test_type, 'mock', result['percent'], total_questions=result['planned'],
+                               correct_count=result['correct'], duration_seconds=result['duration_sec'])
         try:
             from utils.gamification import award_xp
-            xp = award_xp('listening_complete', extra_xp=int(pct / 5))
+            xp = award_xp('listening_complete', extra_xp=int(result['percent'] / 5))
             if xp > 0:
                 st.success(f"✨ +{xp} XP")
         except Exception:
             pass
-        
-        if st.button("🔄 もう一度受験する"):
-            del st.session_state[mock_state_key]
-            st.rerun()
+        user_data.setdefault('_mock_saved', {})[session.attempt_id] = True
+    
+    st.markdown("### 🎯 模擬テスト結果")
+    
+    pct = result['percent']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("正解数", f"{result['correct']}/{result['planned']}")
+    with col2:
+        st.metric("正答率", f"{pct}%")
+    with col3:
+        if pct >= 80:
+            st.metric("評価", "A 🎉")
+        elif pct >= 60:
+            st.metric("評価", "B 👍")
+        else:
+            st.metric("評価", "C 💪")
+    st.caption(f"能力推定値 θ = {result['ability']:+.2f}（±{result['ability_se']:.2f}） / 所要時間 {result['duration_sec'] // 60}分")
+    
+    # セクション別結果
+    st.markdown("#### セクション別:")
+    for s in result['sections']:
+        note = "（時間切れ）" if s['timed_out'] else ""
+        st.markdown(
+            f"- **{s['name']}**: {s['correct']}/{s['planned']}（回答 {s['answered']}問, {s['percent']}%）"
+            f" 平均 {s['avg_latency_sec']}秒/問{note}"
+        )
+    
+    # 正誤一覧
+    with st.expander("📋 正誤一覧"):
+        for r in session.responses:
+            q = bank.get(r['item_id']) or {}
+            mark = "✅" if r['correct'] else "❌"
+            text = q.get('sentence') or q.get('question', '')
+            st.markdown(f"{mark} **Q{r['position']}** [{r['section']}] {text}")
+            if not r['correct']:
+                st.caption(f"  あなたの回答: {r['choice'] or '未回答'} → 正解: {q.get('correct', '-')}")
+                if q.get('explanation'):
+                    st.caption(f"  {q['explanation']}")
+    
+    if st.button("🔄 もう一度受験する"):
+        del st.session_state[mock_state_key]
+        st.rerun()
+
+
+def _student_course_id(user):
+    """学生の所属コース（セッション内で1回だけ解決）"""
+    if '_test_prep_course_id' not in st.session_state:
+        course_id = None
+        current_course = st.session_state.get('current_course')
+        if isinstance(current_course, dict):
+            course_id = current_course.get('id') or current_course.get('course_id')
+        if not course_id and user.get('id'):
+            try:
+                from utils.database import get_student_courses
+                courses = get_student_courses(user['id'])
+                course_id = courses[0]['id'] if courses else None
+            except Exception:
+                course_id = None
+        st.session_state['_test_prep_course_id'] = course_id
+    return st.session_state['_test_prep_course_id']
 
 
 def show_score_progress_tab(test_info, user_data):
@@ -1304,6 +1388,18 @@ def show_score_progress_tab(test_info, user_data):
     
     st.markdown("### 📈 スコア推移")
     
+    # 予測スコア（DBの練習履歴から）
+    user = get_current_user() or {}
+    if user.get('id'):
+        from utils.score_prediction import predict_student, DEFAULT_HORIZON_DAYS
+        test_date = user_data.get('test_date')
+        days_left = (test_date - datetime.now().date()).days if test_date else 0
+        horizon = days_left if days_left > 0 else DEFAULT_HORIZON_DAYS
+        prediction = predict_student(user['id'], _student_course_id(user), horizon)
+        if prediction:
+            _show_score_prediction(prediction, user_data['selected_test'], test_info, horizon, bool(days_left > 0))
+            st.markdown("---")
+    
     history = user_data.get('practice_history', [])
     
     if not history:
@@ -1317,6 +1413,34 @@ def show_score_progress_tab(test_info, user_data):
     st.line_chart({"日付": dates, "スコア": scores}, x="日付", y="スコア")
 
 
+def _show_score_prediction(prediction, test_type, test_info, horizon, is_test_date):
+    """予測スコア（95%区間つき）"""
+    
+    when = "受験日" if is_test_date else f"{horizon}日後"
+    st.markdown(f"#### 🔮 予測スコア（{when}）")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if test_type == 'eiken':
+            lo, hi = prediction['eiken_range']
+            st.metric("英検", prediction['eiken'])
+            st.caption(f"範囲: {lo} 〜 {hi}")
+        else:
+            exam = prediction['exams'][test_type]
+            st.metric(test_info['name'], exam['score'])
+            st.caption(f"95%区間: {exam['lo']} 〜 {exam['hi']}")
+    with col2:
+        st.metric("現在の正答率", f"{prediction['current']['percent']:.0f}%")
+        st.caption(f"CEFR {prediction['cefr']}（{prediction['cefr_range'][0]}〜{prediction['cefr_range'][1]}）")
+    with col3:
+        trend = prediction['trend_per_week']
+        st.metric("伸び", f"{trend:+.1f}点/週" if trend is not None else "-")
+        st.caption(f"練習記録 {prediction['n_logs']}件")
+    
+    if prediction['trend_per_week'] is None:
+        st.caption("※ 練習記録が増えると伸びを含めた予測になります")
+
+
 def show_study_plan_tab(test_info, user_data):
     """学習プランタブ"""
     
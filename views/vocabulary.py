@@ -1,13 +1,14 @@
 import streamlit as st
 from utils.auth import get_current_user, require_auth
+from utils.background_tasks import start_task, poll_task, is_running
 from utils.vocabulary import (
     get_word_details, 
-    generate_quiz_question,
     generate_word_list_from_prompt,
     generate_exercises_for_word,
     grade_student_sentence,          # ← 追加
 )
 from utils.materials_loader import load_materials
+from utils.tts_natural import prefetch_word_audio, show_word_audio_button
 from utils.database import (
     add_vocabulary,
     get_student_vocabulary,
@@ -87,14 +88,16 @@ def show_ai_list_generator():
     with col2:
         level = st.select_slider("レベル / Level", ["A1", "A2", "B1", "B2", "C1"], value="B1")
     
-    if st.button("🚀 生成 / Generate", type="primary", disabled=not prompt):
-        with st.spinner("単語リストを生成中... / Generating..."):
-            result = generate_word_list_from_prompt(prompt, num_words, level)
-        
+    if st.button("🚀 生成 / Generate", type="primary", disabled=not prompt or is_running('ai_word_list')):
+        start_task('ai_word_list', 'vocabulary.generate_word_list_from_prompt',
+                   generate_word_list_from_prompt, prompt, num_words, level)
+    
+    result = poll_task('ai_word_list', "単語リストを生成中... / Generating...")
+    if result is not None:
         if result.get("success"):
             st.session_state['generated_list'] = result
             st.success("✅ 生成完了！ / Generated!")
-        else:
+        elif not result.get("cancelled"):
             st.error(f"Error: {result.get('error')}")
     
     # 生成結果を表示
@@ -436,6 +439,7 @@ def show_generated_list_for_student(result):
     if st.button("🃏 このリストでフラッシュカード学習", type="primary"):
         st.session_state['custom_flashcard_words'] = words
         st.session_state['custom_flashcard_index'] = 0
+        st.session_state['custom_flashcard_audio_prefetched'] = False
         st.session_state['custom_flashcard_flipped'] = False
         st.rerun()
     
@@ -462,6 +466,10 @@ def show_custom_flashcards():
     idx = st.session_state.get('custom_flashcard_index', 0)
     flipped = st.session_state.get('custom_flashcard_flipped', False)
     
+    if not st.session_state.get('custom_flashcard_audio_prefetched'):
+        prefetch_word_audio([w['word'] for w in words])
+        st.session_state['custom_flashcard_audio_prefetched'] = True
+    
     current = words[idx]
     
     st.progress((idx + 1) / len(words))
@@ -483,6 +491,8 @@ def show_custom_flashcards():
         </div>
         """, unsafe_allow_html=True)
     
+    show_word_audio_button(current['word'], key_prefix="custom_flashcard")
+    
     col1, col2, col3 = st.columns(3)
     with col1:
         if st.button("◀️ 前", key="custom_prev"):
@@ -546,6 +556,11 @@ def show_flashcards():
             st.session_state.flashcard_flipped = False
             st.session_state.flashcard_list = selected_list
         
+        # リスト全体の発音を裏で先に生成
+        if st.session_state.get('flashcard_audio_prefetched') != selected_list:
+            prefetch_word_audio([w['word'] for w in words])
+            st.session_state.flashcard_audio_prefetched = selected_list
+        
         current_word = words[st.session_state.flashcard_index]
         
         st.progress((st.session_state.flashcard_index + 1) / len(words))
@@ -570,6 +585,8 @@ def show_flashcards():
             </div>
             """, unsafe_allow_html=True)
         
+        show_word_audio_button(current_word['word'], key_prefix="flashcard")
+        
         st.markdown("---")
         
         col1, col2, col3, col4, col5 = st.columns(5)
@@ -768,21 +785,26 @@ def show_quiz():
         num_q = st.slider("問題数", 5, min(20, len(words)), min(10, len(words)))
         
         if st.button("🚀 開始", type="primary"):
-            st.session_state.quiz_started = True
-            st.session_state.quiz_score = 0
-            st.session_state.quiz_total = num_q
-            st.session_state.quiz_questions = random.sample(words, num_q)
-            st.session_state.quiz_index = 0
-            st.session_state.quiz_answered = False
-            st.session_state.quiz_type = quiz_type
-            st.rerun()
+            from utils.distractors import build_quiz_set   # numpy を使うので出題時に読み込む
+            questions = build_quiz_set(words, quiz_type, num_q)
+            if not questions:
+                st.warning("このリストからは問題を作れませんでした。単語数の多いリストか、別のクイズタイプを選んでください。")
+            else:
+                st.session_state.quiz_started = True
+                st.session_state.quiz_score = 0
+                # 単語数や選択肢が足りないと指定より少なくなるので、実際の問題数を使う
+                st.session_state.quiz_questions = questions
+                st.session_state.quiz_total = len(questions)
+                st.session_state.quiz_index = 0
+                st.session_state.quiz_answered = False
+                st.session_state.quiz_type = quiz_type
+                st.rerun()
     else:
-        if st.session_state.quiz_index < st.session_state.quiz_total:
+        if st.session_state.quiz_index < min(st.session_state.quiz_total, len(st.session_state.get('quiz_questions') or [])):
             st.progress(st.session_state.quiz_index / st.session_state.quiz_total)
             st.markdown(f"**Q{st.session_state.quiz_index + 1}/{st.session_state.quiz_total}** | Score: {st.session_state.quiz_score}")
             
-            current = st.session_state.quiz_questions[st.session_state.quiz_index]
-            q = generate_quiz_question(current, words, st.session_state.quiz_type)
+            q = st.session_state.quiz_questions[st.session_state.quiz_index]
             
             st.markdown(f"### {q['question']}")
             
@@ -805,7 +827,7 @@ def show_quiz():
                     st.session_state.quiz_answered = False
                     st.rerun()
         else:
-            pct = (st.session_state.quiz_score / st.session_state.quiz_total) * 100
+            pct = (st.session_state.quiz_score / st.session_state.quiz_total) * 100 if st.session_state.quiz_total else 0
             st.markdown(f"## 🎉 完了！ Score: {st.session_state.quiz_score}/{st.session_state.quiz_total} ({pct:.0f}%)")
             
             # --- Supabaseに保存 ---
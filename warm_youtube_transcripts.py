@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+English Learning Platform — おすすめ動画の字幕ウォームアップ
+実行: python warm_youtube_transcripts.py [--levels B1 B2] [--no-analyze]
+
+CURATED_VIDEO_LIST の字幕・難易度分析・練習問題を youtube_transcripts に保存する。
+保存済みの動画はネットワーク・APIを使わないので、何度実行しても問題ない。
+"""
+
+import sys
+import os
+import argparse
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.transcript_store import warm_curated_transcripts
+
+# 色付き出力
+GREEN = "\033[92m"
+RED = "\033[91m"
+BOLD = "\033[1m"
+RESET = "\033[0m"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="おすすめ動画の字幕と分析結果を事前に保存する")
+    parser.add_argument("--levels", nargs="+", default=None,
+                        help="分析するCEFRレベル（省略時は動画のレベル）")
+    parser.add_argument("--workers", type=int, default=4, help="並列数")
+    parser.add_argument("--no-analyze", action="store_true", help="字幕の保存のみ行う")
+    args = parser.parse_args(argv)
+
+    print(f"\n{BOLD}{'='*60}")
+    print("  📺 おすすめ動画の字幕ウォームアップ")
+    print(f"{'='*60}{RESET}")
+
+    report = warm_curated_transcripts(
+        levels=args.levels,
+        analyze=not args.no_analyze,
+        max_workers=args.workers,
+    )
+
+    print(f"\n  動画: {report['videos']} / 新規取得: {GREEN}{report['fetched']}{RESET}"
+          f" / 保存済み: {report['cached']} / 失敗: {RED}{report['failed']}{RESET}\n")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())